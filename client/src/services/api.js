@@ -144,6 +144,16 @@ export const studentAPI = {
     }
   },
 
+  // Poll a photo processing job started by uploadPhoto
+  getPhotoJob: async (jobId) => {
+    try {
+      const response = await api.get(`/student/photo-jobs/${jobId}`);
+      return response.data;
+    } catch (error) {
+      throw error.response?.data || { message: 'Failed to fetch photo status' };
+    }
+  },
+
   // Get application status
   getApplicationStatus: async () => {
     try {
@@ -11,6 +11,13 @@ from models import db, bcrypt
 from utils.helpers import setup_logger, error_response
 from utils.logging_config import LogManager, log_security_event, log_user_activity
 from utils.security import SecurityManager
+from utils.metrics import MetricsManager, metrics_response
+from utils.query_instrumentation import QueryInstrumentation
+from utils.tracing import TracingManager
+from utils.email_service import email_service
+from utils.upload_spool import UploadRequest
+from utils.exports import create_change_indexes
+from utils.analytics_cache import install_data_version_listeners, ensure_data_version
 
 def create_app(config_name=None):
     """Application factory pattern"""
@@ -18,13 +25,21 @@ def create_app(config_name=None):
         config_name = os.environ.get('FLASK_ENV', 'development')
     
     app = Flask(__name__)
+    app.request_class = UploadRequest  # upload routes spool file parts to the upload volume
     app.config.from_object(config.get(config_name, config['default']))
     
     # Initialize extensions
     db.init_app(app)
+    install_data_version_listeners()
     bcrypt.init_app(app)
     jwt = JWTManager(app)
     app.jwt_manager = jwt  # Store reference for security manager
+    email_service.init_app(app)
+    
+    # Request metrics (hooks registered before the limiter's, so rate-limited requests are timed too)
+    MetricsManager(app)
+    QueryInstrumentation(app)
+    TracingManager(app)
     
     # Initialize rate limiter
     limiter = Limiter(
@@ -38,8 +53,9 @@ def create_app(config_name=None):
     CORS(app, 
          origins=['http://localhost:5173', 'http://localhost:3000'],  # React dev servers
          supports_credentials=True,
-         allow_headers=['Content-Type', 'Authorization'],
-         methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'])
+         allow_headers=['Content-Type', 'Authorization', 'Upload-Offset'],
+         expose_headers=['Upload-Offset', 'X-Next-Cursor'],
+         methods=['GET', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'])
     
     # JWT error handlers
     @jwt.expired_token_loader
@@ -89,12 +105,15 @@ def create_app(config_name=None):
     from routes.auth import auth_bp
     from routes.student import student_bp
     from routes.admin import admin_bp
+    from routes.verify import verify_bp
     from api_docs import api_bp
     
     app.register_blueprint(auth_bp)
     app.register_blueprint(student_bp)
     app.register_blueprint(admin_bp)
     app.register_blueprint(api_bp)
+    app.register_blueprint(verify_bp)
+    limiter.exempt(verify_bp)  # gate scanners share an address; a check is a signature and a dict lookup
     
     # Health check endpoint
     @app.route('/health')
@@ -107,6 +126,12 @@ def create_app(config_name=None):
             'timestamp': datetime.utcnow().isoformat()
         })
     
+    # Prometheus-style metrics endpoint (scraped every few seconds; METRICS_AUTH_TOKEN guards it)
+    @app.route('/metrics')
+    @limiter.exempt
+    def metrics():
+        return metrics_response()
+    
     # API info endpoint
     @app.route('/api/info')
     def api_info():
@@ -119,7 +144,9 @@ def create_app(config_name=None):
                 'auth': '/auth/*',
                 'student': '/student/*',
                 'admin': '/admin/*',
-                'health': '/health'
+                'verify': '/verify/<payload>',
+                'health': '/health',
+                'metrics': '/metrics'
             },
             'documentation': '/api/docs'  # Future endpoint for API docs
         })
@@ -139,6 +166,20 @@ def create_app(config_name=None):
         # Setup advanced security (after JWT manager is set)
         security_manager = SecurityManager(app)
         
+        # Indexes added to existing tables (create_all only makes new tables)
+        try:
+            for name in create_change_indexes():
+                app.logger.info(f'Created index {name}')
+        except Exception as e:
+            app.logger.warning(f'Could not create change indexes: {str(e)}')
+        
+        # Data version rows (the tables may not exist yet)
+        try:
+            ensure_data_version()
+        except Exception as e:
+            db.session.rollback()
+            app.logger.warning(f'Could not create data versions: {str(e)}')
+        
         app.logger.info('GAU-ID-View Backend API created successfully')
     
     return app
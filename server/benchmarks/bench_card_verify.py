@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Card verification throughput: signed payload checks against a DB lookup per scan
+
+Creates N students on a throwaway SQLite database with --revoked of their
+cards revoked, then counts verifications per second for:
+
+  db lookup      the old path: find the profile by ID number for each scan
+  verify()       `verify_card_payload` (HMAC check + revocation set lookup)
+  GET /verify    the public endpoint through the Flask test client
+
+Usage:
+    python benchmarks/bench_card_verify.py
+    python benchmarks/bench_card_verify.py --students 20000 --revoked 500 --seconds 3
+"""
+import os
+import sys
+import time
+import shutil
+import random
+import argparse
+import tempfile
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def make_app(database_path):
+    from app import create_app
+    from config import config, TestingConfig
+
+    class BenchmarkConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{database_path}'
+
+    config['benchmark'] = BenchmarkConfig
+    return create_app('benchmark')
+
+def build_students(count, revoked):
+    """Approved students with signed payloads; returns (payloads, id_numbers)"""
+    from models import db, User, StudentProfile, CardRevocation
+    from utils.card_verification import sign_card_payload
+
+    users = [User(
+        name=f'Student {index}', reg_number=f'GAU/CS/2024/{index:05d}', email=f'student{index}@students.gau.ac.ke',
+        department='Computer Science', password_hash='x'
+    ) for index in range(count)]
+    db.session.add_all(users)
+    db.session.flush()
+    profiles = [StudentProfile(
+        user_id=user.id, id_number=f'GAU2024{index:08d}', status='approved', expiry_date=date(2027, 10, 19)
+    ) for index, user in enumerate(users)]
+    db.session.add_all(profiles)
+    db.session.add_all(CardRevocation(user_id=user.id, card_version=1, reason='Lost') for user in users[:revoked])
+    db.session.commit()
+    payloads = [sign_card_payload(p.user_id, p.id_number, p.expiry_date) for p in profiles]
+    return payloads, [p.id_number for p in profiles]
+
+def measure(name, check, items, seconds):
+    """Run `check` over shuffled `items` for about `seconds`; prints the rate"""
+    items = list(items)
+    random.shuffle(items)
+    done = 0
+    started = time.perf_counter()
+    deadline = started + seconds
+    while time.perf_counter() < deadline:
+        for item in items[:1000]:
+            check(item)
+        done += min(len(items), 1000)
+        items.append(items.pop(0))
+    elapsed = time.perf_counter() - started
+    print(f"{name:<14} {done:>9} {elapsed:>8.2f} {done / elapsed:>12.0f} {elapsed / done * 1e6:>9.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--students', type=int, default=5000)
+    parser.add_argument('--revoked', type=int, default=200)
+    parser.add_argument('--seconds', type=float, default=2.0, help='time per measurement')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-verify-')
+    try:
+        app = make_app(os.path.join(workdir, 'bench.db'))
+        from models import db, StudentProfile
+        from utils.card_verification import verify_card_payload, get_revocation_set
+
+        with app.app_context():
+            db.create_all()
+            payloads, id_numbers = build_students(args.students, args.revoked)
+            revocations = get_revocation_set()
+            print(f"{args.students} students, {len(revocations.revoked)} revoked cards in memory")
+            print(f"{'path':<14} {'checks':>9} {'seconds':>8} {'checks/sec':>12} {'us/check':>9}")
+
+            def db_lookup(id_number):
+                profile = StudentProfile.query.filter_by(id_number=id_number).first()
+                return profile.status == 'approved' and profile.expiry_date >= date.today()
+
+            measure('db lookup', db_lookup, id_numbers, args.seconds)
+            measure('verify()', verify_card_payload, payloads, args.seconds)
+
+        client = app.test_client()
+        measure('GET /verify', lambda payload: client.get(f'/verify/{payload}'), payloads, args.seconds)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
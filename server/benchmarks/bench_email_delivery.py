@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+End-to-end notification latency and throughput against a local SMTP sink
+
+Drives a registration burst (one transaction per student, as the register
+route does) and a bulk-approval burst (one transaction, as bulk-approve
+does) through the outbox and `EmailWorker`, and the same welcome burst
+through `EmailService.send_email` on the pooled senders. Latency is measured
+from the moment the producing transaction commits (or `send_email` returns)
+until the sink acknowledges the message.
+
+Usage:
+    python benchmarks/bench_email_delivery.py --students 300 --workers 2
+    python benchmarks/bench_email_delivery.py --data-delay 0.01 --fail-rate 0.05
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+from datetime import datetime, date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.smtp_sink import SMTPSink
+from app import create_app
+from config import config, TestingConfig
+from models import db, User, StudentProfile
+from email_worker import EmailWorker
+from utils.email_outbox import queue_welcome_email, queue_status_update_email
+from utils.email_service import send_welcome_email
+from utils.mail_pool import shutdown_mail_pool
+
+def make_app(sink, db_path, args):
+    # The engine is built in create_app, so the file database must be in the config class
+    class BenchmarkConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{db_path}'
+        SQLALCHEMY_ENGINE_OPTIONS = {'connect_args': {'timeout': 30}}
+
+    config['benchmark'] = BenchmarkConfig
+    app = create_app('benchmark')
+    app.config.update({
+        'MAIL_SERVER': '127.0.0.1',
+        'MAIL_PORT': sink.port,
+        'MAIL_USE_TLS': False,
+        'MAIL_USERNAME': 'bench',
+        'MAIL_PASSWORD': None,
+        'MAIL_SUPPRESS_SEND': False,
+        'MAIL_POOL_WORKERS': args.workers,
+        'MAIL_QUEUE_SIZE': args.students + 1,
+        'EMAIL_OUTBOX_BATCH_SIZE': args.batch_size,
+        'EMAIL_OUTBOX_BACKOFF_BASE': 0.2,  # keep injected failures from stalling the run
+        'EMAIL_OUTBOX_BACKOFF_MAX': 2,
+        'EMAIL_WORKER_POLL_INTERVAL': args.poll_interval
+    })
+    with app.app_context():
+        db.create_all()
+    return app
+
+def register_students(app, count, offset=0):
+    """One committed transaction per student; returns {email: commit time}"""
+    committed = {}
+    with app.app_context():
+        for index in range(offset, offset + count):
+            user = User(
+                name=f'Student {index}', reg_number=f'GAU/BENCH/{index:05d}',
+                email=f'student{index}@students.gau.ac.ke', department='Computer Science',
+                password_hash='x'
+            )
+            db.session.add(user)
+            db.session.flush()
+            db.session.add(StudentProfile(user_id=user.id, course='BSc Computer Science', status='pending'))
+            queue_welcome_email(user)
+            db.session.commit()
+            committed[user.email] = time.time()
+    return committed
+
+def approve_all(app):
+    """Bulk approval in a single transaction; returns {email: commit time}"""
+    with app.app_context():
+        students = User.query.join(StudentProfile).filter(StudentProfile.status == 'pending').all()
+        now = datetime.utcnow()
+        for student in students:
+            profile = student.profile
+            profile.status = 'approved'
+            profile.approved_at = now
+            profile.expiry_date = date.today() + timedelta(days=365)
+            profile.last_updated = now
+            queue_status_update_email(student, 'approved', event_time=now)
+        db.session.commit()
+        committed_at = time.time()
+        return {student.email: committed_at for student in students}
+
+def run_workers(app, count):
+    workers = [EmailWorker(app, worker_id=f'bench-{index}') for index in range(count)]
+    threads = [threading.Thread(target=worker.run, daemon=True) for worker in workers]
+    for thread in threads:
+        thread.start()
+
+    def stop():
+        for worker in workers:
+            worker.stop()
+        for thread in threads:
+            thread.join(30)
+    return stop
+
+def measure(sink, produce, timeout):
+    """Run a producer and wait for the sink; returns (enqueued, wall seconds, latencies)"""
+    sink.reset()
+    start = time.time()
+    enqueued = produce()
+    sink.wait_for(len(enqueued), timeout)
+    elapsed = max((message.received_at for message in sink.captured), default=time.time()) - start
+
+    latencies = sorted(
+        message.received_at - enqueued[message.recipients[0]]
+        for message in sink.captured if message.recipients[0] in enqueued
+    )
+    return enqueued, elapsed, latencies
+
+def percentile(values, q):
+    return values[min(int(q * len(values)), len(values) - 1)] if values else float('nan')
+
+def report(name, sink, enqueued, elapsed, latencies):
+    print(f'{name:<34} {len(enqueued):>6} {sink.messages:>9} {sink.messages / elapsed:>9.1f} '
+          f'{percentile(latencies, 0.50) * 1000:>8.0f} {percentile(latencies, 0.95) * 1000:>8.0f} '
+          f'{(latencies[-1] if latencies else float("nan")) * 1000:>8.0f} '
+          f'{sink.connections:>6} {sink.failures:>7}')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--students', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=1, help='outbox workers / pooled sender threads')
+    parser.add_argument('--batch-size', type=int, default=50)
+    parser.add_argument('--poll-interval', type=float, default=0.1, help='worker idle poll (seconds)')
+    parser.add_argument('--connect-delay', type=float, default=0.05,
+                        help='simulated TLS handshake + login cost per connection (seconds)')
+    parser.add_argument('--data-delay', type=float, default=0.002, help='relay time per message (seconds)')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='fraction of messages answered 451')
+    parser.add_argument('--timeout', type=float, default=300)
+    args = parser.parse_args()
+
+    sink = SMTPSink(connect_delay=args.connect_delay, data_delay=args.data_delay,
+                    fail_rate=args.fail_rate, seed=1).start()
+    db_fd, db_path = tempfile.mkstemp(suffix='.db')
+    try:
+        app = make_app(sink, db_path, args)
+        print(f'{args.students} students, {args.workers} worker(s), connect {args.connect_delay * 1000:.0f}ms, '
+              f'relay {args.data_delay * 1000:.0f}ms/msg, {args.fail_rate:.0%} injected 451s\n')
+        print(f"{'scenario':<34} {'queued':>6} {'delivered':>9} {'msgs/sec':>9} "
+              f"{'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'conns':>6} {'failed':>7}")
+
+        stop_workers = run_workers(app, args.workers)
+        try:
+            results = measure(sink, lambda: register_students(app, args.students), args.timeout)
+            report('outbox: registration burst', sink, *results)
+            results = measure(sink, lambda: approve_all(app), args.timeout)
+            report('outbox: bulk approval', sink, *results)
+        finally:
+            stop_workers()
+
+        def send_direct():
+            sent = {}
+            with app.app_context():
+                for student in User.query.order_by(User.id).all():
+                    send_welcome_email(student)
+                    sent[student.email] = time.time()
+            return sent
+
+        # Pool retries are blocking sleeps, so only compare it without injected failures
+        sink.fail_rate = 0.0
+        results = measure(sink, send_direct, args.timeout)
+        report('EmailService pool: welcome burst', sink, *results)
+        shutdown_mail_pool()
+    finally:
+        sink.stop()
+        os.close(db_fd)
+        os.unlink(db_path)
+
+if __name__ == '__main__':
+    main()
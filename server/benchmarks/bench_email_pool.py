@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Email throughput: pooled SMTP connections vs. a thread + connection per message
+
+Usage:
+    python benchmarks/bench_email_pool.py --messages 500 --connect-delay 0.05
+"""
+import os
+import sys
+import time
+import smtplib
+import argparse
+import threading
+from email.message import EmailMessage
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.smtp_sink import SMTPSink
+from utils.mail_pool import MailPool
+
+def build_message(index):
+    msg = EmailMessage()
+    msg['Subject'] = f'GAU-ID-View: Application Approved #{index}'
+    msg['From'] = 'admin@gau.ac.ke'
+    msg['To'] = f'student{index}@students.gau.ac.ke'
+    msg.set_content('Your student ID card application has been approved.')
+    msg.add_alternative('<p>Your student ID card application has been <b>approved</b>.</p>' * 40, subtype='html')
+    return msg['From'], [msg['To']], msg.as_bytes()
+
+def wait_for(sink, expected, timeout=120):
+    deadline = time.monotonic() + timeout
+    while sink.messages < expected and time.monotonic() < deadline:
+        time.sleep(0.005)
+
+def run_thread_per_message(sink, messages):
+    """Previous behaviour: one daemon thread and one SMTP session per email"""
+    def send(sender, recipients, body):
+        try:
+            smtp = smtplib.SMTP('127.0.0.1', sink.port, timeout=30)
+            try:
+                smtp.sendmail(sender, recipients, body)
+            finally:
+                smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            pass  # lost, as with the old fire-and-forget threads
+
+    start = time.perf_counter()
+    threads = []
+    for message in messages:
+        thread = threading.Thread(target=send, args=message, daemon=True)
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start
+
+def run_pool(sink, messages, workers):
+    settings = {
+        'server': '127.0.0.1', 'port': sink.port, 'use_tls': False, 'use_ssl': False,
+        'username': None, 'password': None, 'timeout': 30,
+        'max_messages': 100, 'idle_timeout': 60
+    }
+    pool = MailPool(settings, workers=workers, queue_size=len(messages) + 1)
+    start = time.perf_counter()
+    for message in messages:
+        pool.submit(*message)
+    pool.shutdown(timeout=300)
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--messages', type=int, default=500)
+    parser.add_argument('--workers', type=int, default=2, help='pooled sender threads')
+    parser.add_argument('--connect-delay', type=float, default=0.05,
+                        help='simulated TLS handshake + login cost per connection (seconds)')
+    args = parser.parse_args()
+
+    messages = [build_message(i) for i in range(args.messages)]
+    print(f'{args.messages} messages, simulated connection setup {args.connect_delay * 1000:.0f}ms\n')
+    print(f"{'strategy':<28} {'seconds':>8} {'msgs/sec':>10} {'connections':>12} {'delivered':>10}")
+
+    for name, runner in (
+        ('thread per message', lambda sink: run_thread_per_message(sink, messages)),
+        (f'pool ({args.workers} workers)', lambda sink: run_pool(sink, messages, args.workers)),
+    ):
+        sink = SMTPSink(connect_delay=args.connect_delay).start()
+        try:
+            elapsed = runner(sink)
+            wait_for(sink, len(messages), timeout=5)
+            print(f'{name:<28} {elapsed:>8.2f} {sink.messages / elapsed:>10.1f} '
+                  f'{sink.connections:>12} {sink.messages:>10}')
+        finally:
+            sink.stop()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Email template renders/sec: compiling the template per email vs. the compiled cache
+
+Usage:
+    python benchmarks/bench_email_templates.py --renders 2000
+"""
+import os
+import sys
+import time
+import argparse
+from types import SimpleNamespace
+from jinja2 import Environment, DictLoader
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.email_service import EmailTemplateGenerator, email_templates, render_email
+from utils.email_templates import CompiledEmailTemplates
+
+SOURCES = {
+    'base.html': EmailTemplateGenerator.get_base_template,
+    'welcome.html': EmailTemplateGenerator.get_welcome_template,
+    'status_update.html': EmailTemplateGenerator.get_status_template
+}
+
+def make_user(index):
+    return SimpleNamespace(
+        name=f'Student {index}', email=f'student{index}@students.gau.ac.ke',
+        reg_number=f'GAU/CS/{index:05d}', department='Computer Science'
+    )
+
+def contexts(count):
+    for index in range(count):
+        if index % 2:
+            yield 'status_update.html', EmailTemplateGenerator.status_context(make_user(index), 'approved')
+        else:
+            yield 'welcome.html', EmailTemplateGenerator.welcome_context(make_user(index))
+
+def render_uncached(count):
+    """Per-email compile, as render_template_string did, plus the regex text fallback"""
+    import re
+    for name, context in contexts(count):
+        env = Environment(loader=DictLoader({key: source() for key, source in SOURCES.items()}), autoescape=True)
+        html_body = env.get_template(name).render(**context)
+        re.sub(re.compile('<.*?>'), '', html_body)
+
+def render_uncached_inlined(count):
+    """Per-email compile including CSS inlining and text generation"""
+    for name, context in contexts(count):
+        CompiledEmailTemplates(SOURCES).render(name, **context)
+
+def render_cached(count):
+    for name, context in contexts(count):
+        render_email(name, **context)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--renders', type=int, default=2000)
+    args = parser.parse_args()
+
+    # Warm the cache so its one-off build cost is reported separately
+    start = time.perf_counter()
+    email_templates.get('welcome.html')
+    email_templates.get('status_update.html')
+    build_time = time.perf_counter() - start
+    print(f'one-off build (CSS inline + compile html/text): {build_time * 1000:.1f}ms\n')
+
+    print(f"{'strategy':<44} {'renders/sec':>12} {'ms/render':>10}")
+    for name, runner, count in (
+        ('compile per email (previous)', render_uncached, max(args.renders // 10, 50)),
+        ('compile + inline per email', render_uncached_inlined, max(args.renders // 20, 20)),
+        ('compiled cache (html + text)', render_cached, args.renders),
+    ):
+        start = time.perf_counter()
+        runner(count)
+        elapsed = time.perf_counter() - start
+        print(f'{name:<44} {count / elapsed:>12.0f} {elapsed / count * 1000:>10.3f}')
+
+if __name__ == '__main__':
+    main()
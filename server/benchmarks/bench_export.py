@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Student export: time to first byte, total time and peak memory
+
+Fills a throwaway SQLite database with N students and profiles, then
+fetches GET /admin/export/students through the Flask test client three
+times, tracking Python allocations with tracemalloc: the first export
+(streamed from the database and saved), then the same export again,
+served from the saved artifact with and without gzip. Finally --changed
+students are edited and the incremental export's query for the last day
+is timed.
+
+Usage:
+    python benchmarks/bench_export.py --students 50000
+    python benchmarks/bench_export.py --students 500000 --changed 300
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+from datetime import datetime, date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def make_app(workdir):
+    from app import create_app
+    from config import config, TestingConfig
+
+    class BenchmarkConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{os.path.join(workdir, "bench.db")}'
+        EXPORT_FOLDER = os.path.join(workdir, 'exports')
+
+    config['benchmark'] = BenchmarkConfig
+    return create_app('benchmark')
+
+def build_students(count):
+    """N students with profiles (bulk inserted) and an admin; returns the admin's id"""
+    from models import db, User, StudentProfile
+
+    departments = ['Computer Science', 'Education', 'Business', 'Information Technology']
+    now = datetime.utcnow() - timedelta(days=2)
+    db.session.execute(User.__table__.insert(), [{
+        'name': f'Student Number {index}', 'reg_number': f'GAU/BEN/{index:06d}',
+        'email': f'student{index}@students.gau.ac.ke', 'department': departments[index % 4],
+        'password_hash': 'x', 'role': 'student', 'is_active': True, 'created_at': now, 'updated_at': now
+    } for index in range(count)])
+    db.session.execute(StudentProfile.__table__.insert(), [{
+        'user_id': index + 1, 'id_number': f'GAU2024{index:07d}', 'phone': '0712345678',
+        'course': 'BSc', 'year_of_study': 'Year 2', 'status': 'approved' if index % 3 else 'pending',
+        'card_printed': False, 'card_issued': False, 'expiry_date': date(2027, 10, 19),
+        'submitted_at': now, 'approved_at': now, 'last_updated': now
+    } for index in range(count)])
+    admin = User(
+        name='Bench Admin', reg_number='GAU/ADM/BENCH', email='bench-admin@gau.ac.ke',
+        department='Administration', password_hash='x', role='admin'
+    )
+    db.session.add(admin)
+    db.session.commit()
+    return admin.id
+
+def run_export(client, headers, url):
+    """Stream one export; returns (first byte seconds, total seconds, bytes, peak MB)"""
+    tracemalloc.start()
+    started = time.perf_counter()
+    response = client.get(url, headers=headers, buffered=False)
+    first_byte = None
+    size = 0
+    for chunk in response.response:
+        if first_byte is None:
+            first_byte = time.perf_counter() - started
+        size += len(chunk)
+    response.close()
+    total = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return first_byte or total, total, size, peak / 1024 / 1024
+
+def time_changes(changed, repeat=20):
+    """Edit `changed` profiles, then time the query for a day of changes; returns (rows, ms)"""
+    from models import db, StudentProfile
+    from utils.exports import student_changes_query, change_rows
+
+    now = datetime.utcnow()
+    db.session.execute(
+        StudentProfile.__table__.update().where(StudentProfile.id % 97 == 0).where(StudentProfile.id <= changed * 97)
+        .values(status='approved', last_updated=now)
+    )
+    db.session.commit()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        rows = list(change_rows(student_changes_query(now - timedelta(days=1), now + timedelta(seconds=1))))
+        timings.append(time.perf_counter() - started)
+    return len(rows), sorted(timings)[len(timings) // 2] * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--students', type=int, default=50000)
+    parser.add_argument('--changed', type=int, default=300, help='students edited before the change query')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-export-')
+    try:
+        app = make_app(workdir)
+        from flask_jwt_extended import create_access_token
+        from models import db
+
+        with app.app_context():
+            db.create_all()
+            admin_id = build_students(args.students)
+            token = create_access_token(identity=admin_id)
+
+        client = app.test_client()
+        print(f"{args.students} students")
+        print(f"{'run':<14} {'first byte s':>12} {'total s':>8} {'MB out':>7} {'peak MB':>8}")
+        runs = [('first, gzip', 'gzip'), ('cached, gzip', 'gzip'), ('cached, csv', 'identity')]
+        for name, encoding in runs:
+            headers = {'Authorization': f'Bearer {token}', 'Accept-Encoding': encoding}
+            first_byte, total, size, peak = run_export(client, headers, '/admin/export/students')
+            print(f"{name:<14} {first_byte:>12.3f} {total:>8.2f} {size / 1024 / 1024:>7.1f} {peak:>8.1f}")
+
+        with app.app_context():
+            rows, ms = time_changes(args.changed)
+            print(f"changes query: {rows} rows changed in the last day, {ms:.1f} ms (median)")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
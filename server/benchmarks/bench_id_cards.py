@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+ID card print run: cold render, warm re-run and a re-run after a few edits
+
+Builds an upload folder with a handful of stored photos and N card
+records, then times `render_card_batch` writing the A4 PDF three times:
+with an empty card cache, with every card cached, and with --changed of
+the cards edited (only those are drawn again).
+
+Usage:
+    python benchmarks/bench_id_cards.py --cards 2000
+    python benchmarks/bench_id_cards.py --cards 500 --workers 4
+"""
+import os
+import sys
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+
+def make_app(upload_dir, cache_dir):
+    from app import create_app
+    from config import config, TestingConfig
+
+    class BenchmarkConfig(TestingConfig):
+        UPLOAD_FOLDER = upload_dir
+        CARD_CACHE_FOLDER = cache_dir
+
+    config['benchmark'] = BenchmarkConfig
+    return create_app('benchmark')
+
+def build_cards(upload_dir, count, photos=20):
+    """Card records in `card_data` form, sharing `photos` stored profile photos"""
+    from utils.file_handler import store_photo
+
+    photo_paths = []
+    for index in range(photos):
+        shade = 40 + index * 9
+        photo_paths.append(store_photo(upload_dir, Image.new('RGB', (800, 1067), (shade, 120, 255 - shade))))
+    return [{
+        'university': 'Garissa University',
+        'name': f'Student Number {index} Abdullahi',
+        'reg_number': f'GAU/CS/2024/{index:04d}',
+        'id_number': f'GAU2024{index:08X}',
+        'department': 'Computer Science',
+        'expiry_date': '19 Oct 2027',
+        'photo': photo_paths[index % photos],
+        'qr': f'GAU-ID:GAU2024{index:08X}:GAU/CS/2024/{index:04d}',
+    } for index in range(count)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--cards', type=int, default=2000)
+    parser.add_argument('--changed', type=int, default=20, help='cards edited before the third run')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-cards-')
+    upload_dir = os.path.join(workdir, 'uploads')
+    cache_dir = os.path.join(workdir, 'cards')
+    try:
+        app = make_app(upload_dir, cache_dir)
+        from utils.id_cards import render_card_batch
+
+        with app.app_context():
+            cards = build_cards(upload_dir, args.cards)
+            print(f"{'run':<14} {'cards':>6} {'drawn':>6} {'sheets':>7} {'seconds':>8} {'cards/sec':>10} {'PDF MB':>7}")
+            runs = [('cold cache', cards), ('warm cache', cards)]
+            edited = [dict(card, department='Information Technology') if index < args.changed else card
+                      for index, card in enumerate(cards)]
+            runs.append((f'{args.changed} edited', edited))
+            for name, batch in runs:
+                pdf_path = os.path.join(workdir, 'cards.pdf')
+                with open(pdf_path, 'wb') as out:
+                    stats = render_card_batch(batch, out, workers=args.workers)
+                print(f"{name:<14} {stats['cards']:>6} {stats['rendered']:>6} {stats['sheets']:>7} "
+                      f"{stats['seconds']:>8.1f} {stats['cards'] / stats['seconds']:>10.0f} "
+                      f"{os.path.getsize(pdf_path) / 1024 / 1024:>7.0f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
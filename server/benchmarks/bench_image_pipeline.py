@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Per-photo CPU and memory: single-decode pipeline vs. the previous decode-three-times path
+
+Each strategy runs in a fresh process so its peak RSS is its own. Photos
+are 2000px tall, the largest the upload rules accept (a 2000x2000 square
+fails the passport aspect-ratio check): 1500 wide is 3:4, 1800 wide is the
+widest allowed and lets draft mode decode at half size.
+
+Usage:
+    python benchmarks/bench_image_pipeline.py --photos 20
+    python benchmarks/bench_image_pipeline.py --sizes 1600x2000
+"""
+import io
+import os
+import sys
+import time
+import resource
+import argparse
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+
+def make_phone_photo(width, height, quality=92):
+    """Noisy gradient photo; noise keeps the JPEG as large as a real camera file"""
+    base = Image.linear_gradient('L').resize((width, height))
+    noise = Image.effect_noise((width, height), 40)
+    img = Image.merge('RGB', (base, Image.blend(base, noise, 0.5), noise))
+    output = io.BytesIO()
+    img.save(output, 'JPEG', quality=quality)
+    return output.getvalue()
+
+def previous_pipeline(data, directory):
+    """verify(), reopen for size, save upload to disk, reopen, resize, write again"""
+    upload = io.BytesIO(data)
+    Image.open(upload).verify()
+    upload.seek(0)
+    width, height = Image.open(upload).size
+    assert 300 <= width <= 2000 and 400 <= height <= 2000
+    upload.seek(0)
+
+    path = os.path.join(directory, 'photo.jpg')
+    with open(path, 'wb') as f:
+        f.write(upload.read())
+    with Image.open(path) as img:
+        if img.mode in ('RGBA', 'P'):
+            img = img.convert('RGB')
+        if img.width > 800:
+            img = img.resize((800, int(img.height * 800 / img.width)), Image.Resampling.LANCZOS)
+        img.save(path, 'JPEG', quality=85, optimize=True)
+
+def single_decode_pipeline(data, directory):
+    """Header validation, one draft-mode decode, one encode, atomic write"""
+    from utils.file_handler import validate_image_file, process_photo, atomic_write
+    upload = io.BytesIO(data)
+    ok, message = validate_image_file(upload)
+    assert ok, message
+    photo = process_photo(upload.read())
+    with atomic_write(os.path.join(directory, 'photo.jpg')) as f:
+        f.write(photo)
+
+def run(strategy, data, photos):
+    """Runs in a child process; returns (cpu s/photo, wall s/photo, peak RSS growth MB)"""
+    import utils.file_handler  # imported before the baseline so only decoding is counted
+    runner = {'previous': previous_pipeline, 'single-decode': single_decode_pipeline}[strategy]
+    with tempfile.TemporaryDirectory() as directory:
+        baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        cpu, wall = time.process_time(), time.perf_counter()
+        for _ in range(photos):
+            runner(data, directory)
+        cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return cpu / photos, wall / photos, (peak - baseline) / 1024
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--photos', type=int, default=20)
+    parser.add_argument('--sizes', default='1500x2000,1800x2000', help='comma-separated WxH photo sizes')
+    args = parser.parse_args()
+
+    print(f"{'photo':<22} {'strategy':<16} {'cpu ms/photo':>13} {'wall ms/photo':>14} {'peak RSS +MB':>13}")
+    context = multiprocessing.get_context('spawn')
+    for size in args.sizes.split(','):
+        width, height = (int(value) for value in size.lower().split('x'))
+        data = make_phone_photo(width, height)
+        label = f'{width}x{height} {len(data) / 1024 / 1024:.1f}MB'
+
+        for strategy in ('previous', 'single-decode'):
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                cpu, wall, rss = pool.submit(run, strategy, data, args.photos).result()
+            print(f'{label:<22} {strategy:<16} {cpu * 1000:>13.1f} {wall * 1000:>14.1f} {rss:>13.1f}')
+
+if __name__ == '__main__':
+    main()
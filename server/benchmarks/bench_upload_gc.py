@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Upload GC time and peak memory over a large sharded upload tree
+
+Builds an upload folder of empty content-addressed files (a quarter of
+them old and unreferenced), records the rest in stored_blobs, then runs
+`upload_gc.collect` in dry-run mode in a fresh process so its peak RSS is
+its own.
+
+Usage:
+    python benchmarks/bench_upload_gc.py --files 100000
+    python benchmarks/bench_upload_gc.py --files 500000 --orphan-rate 0.1
+"""
+import os
+import io
+import sys
+import time
+import random
+import shutil
+import resource
+import argparse
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def make_app(db_path, upload_dir):
+    from app import create_app
+    from config import config, TestingConfig
+
+    # The engine is built in create_app, so the file database must be in the config class
+    class BenchmarkConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{db_path}'
+        UPLOAD_FOLDER = upload_dir
+
+    config['benchmark'] = BenchmarkConfig
+    return create_app('benchmark')
+
+def build_tree(db_path, upload_dir, files, orphan_rate, seed=1):
+    """Empty files under documents/supporting/ab/cd/<sha256>.pdf; referenced ones get a stored_blobs row"""
+    from models import db, StoredBlob
+    from utils.blob_store import blob_path
+
+    app = make_app(db_path, upload_dir)
+    rng = random.Random(seed)
+    old = time.time() - 7 * 24 * 3600
+    with app.app_context():
+        db.create_all()
+        rows = []
+        for _ in range(files):
+            digest = '%064x' % rng.getrandbits(256)
+            path = blob_path('documents/supporting', digest, 'pdf')
+            full_path = os.path.join(upload_dir, path)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            open(full_path, 'wb').close()
+            os.utime(full_path, (old, old))
+            if rng.random() >= orphan_rate:
+                rows.append({'path': path, 'sha256': digest, 'size': 0, 'ref_count': 1})
+            if len(rows) >= 5000:
+                db.session.execute(StoredBlob.__table__.insert(), rows)
+                rows = []
+        if rows:
+            db.session.execute(StoredBlob.__table__.insert(), rows)
+        db.session.commit()
+
+def run_gc(db_path, upload_dir):
+    """Runs in a child process; returns (seconds, peak RSS growth MB, stats)"""
+    app = make_app(db_path, upload_dir)
+    import upload_gc
+
+    with app.app_context():
+        baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        started = time.perf_counter()
+        stats = upload_gc.collect(upload_dir, dry_run=True, out=io.StringIO())
+        elapsed = time.perf_counter() - started
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return elapsed, (peak - baseline) / 1024, dict(stats)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--files', type=int, default=100000)
+    parser.add_argument('--orphan-rate', type=float, default=0.25)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-gc-')
+    db_path = os.path.join(workdir, 'bench.db')
+    upload_dir = os.path.join(workdir, 'uploads')
+    context = multiprocessing.get_context('spawn')
+    try:
+        started = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            pool.submit(build_tree, db_path, upload_dir, args.files, args.orphan_rate).result()
+        print(f'built {args.files} files in {time.perf_counter() - started:.0f}s')
+
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            elapsed, rss, stats = pool.submit(run_gc, db_path, upload_dir).result()
+        print(f"{'files':>9} {'referenced':>11} {'orphans':>9} {'seconds':>9} {'files/sec':>10} {'peak RSS +MB':>13}")
+        print(f"{stats['files']:>9} {stats.get('referenced', 0):>11} {stats.get('orphans', 0):>9} "
+              f"{elapsed:>9.1f} {stats['files'] / elapsed:>10.0f} {rss:>13.1f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Local SMTP server that stands in for a real relay
+
+Used by the tests and email benchmarks so delivery can be measured without
+Gmail. Every accepted message is captured with its envelope and timing, and
+the sink can be told to behave like a slow or flaky provider:
+
+- `connect_delay`: seconds per new connection (TLS handshake + login)
+- `data_delay`: seconds before each message is acknowledged
+- `fail_rate`: fraction of messages answered with `fail_code`
+- `fail_next(count, code)`: fail the next messages deterministically;
+  code 421 also closes the session, code None drops it without a reply
+- `reject`: addresses refused at RCPT TO with 550
+
+Usage:
+    python benchmarks/smtp_sink.py --port 2525 --connect-delay 0.05
+    python benchmarks/smtp_sink.py --data-delay 0.02 --fail-rate 0.1 --fail-code 451
+"""
+import re
+import time
+import email
+import random
+import argparse
+import threading
+import collections
+import socketserver
+from email import policy
+
+_ADDRESS = re.compile(r'<([^>]*)>')
+
+class CapturedMessage:
+    """One message accepted by the sink"""
+
+    __slots__ = ('sender', 'recipients', 'data', 'connection_id', 'started_at', 'received_at')
+
+    def __init__(self, sender, recipients, data, connection_id, started_at, received_at):
+        self.sender = sender
+        self.recipients = recipients
+        self.data = data
+        self.connection_id = connection_id
+        self.started_at = started_at  # time.time() at MAIL FROM
+        self.received_at = received_at  # time.time() when acknowledged
+
+    @property
+    def size(self):
+        return len(self.data)
+
+    @property
+    def duration(self):
+        """Seconds the client spent on this transaction, MAIL FROM to 250"""
+        return self.received_at - self.started_at
+
+    @property
+    def message(self):
+        return email.message_from_bytes(self.data, policy=policy.default)
+
+    def __getitem__(self, header):
+        return self.message[header]
+
+    def __repr__(self):
+        return f'<CapturedMessage {self.sender} -> {", ".join(self.recipients)} ({self.size} bytes)>'
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    """Speaks just enough SMTP for smtplib clients"""
+
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        sink = self.server
+        if sink.connect_delay:
+            time.sleep(sink.connect_delay)
+        with sink.lock:
+            sink.connections += 1
+            connection_id = sink.connections
+        self.reply('220 localhost sink ready')
+
+        sender, recipients, started_at = None, [], None
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            text = line.decode(errors='replace').strip()
+            command = text.upper()
+
+            if command.startswith(('EHLO', 'HELO')):
+                self.reply('250 localhost')
+            elif command.startswith('MAIL'):
+                sender, recipients, started_at = _parse_address(text), [], time.time()
+                self.reply('250 OK')
+            elif command.startswith('RCPT'):
+                address = _parse_address(text)
+                if address.lower() in sink.reject:
+                    self.reply('550 No such user here')
+                else:
+                    recipients.append(address)
+                    self.reply('250 OK')
+            elif command.startswith(('RSET', 'NOOP')):
+                if command.startswith('RSET'):
+                    sender, recipients = None, []
+                self.reply('250 OK')
+            elif command == 'DATA':
+                if not recipients:
+                    self.reply('554 No valid recipients')
+                    continue
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                chunks = []
+                while True:
+                    data = self.rfile.readline()
+                    if not data or data in (b'.\r\n', b'.\n'):
+                        break
+                    chunks.append(data[1:] if data.startswith(b'..') else data)
+                if sink.data_delay:
+                    time.sleep(sink.data_delay)
+
+                code = sink.next_failure()
+                if code == sink.DROP:
+                    return
+                if code:
+                    with sink.lock:
+                        sink.failures += 1
+                    self.reply(f'{code} Injected failure')
+                    if code == 421:
+                        return
+                    continue
+
+                sink.record(CapturedMessage(
+                    sender, recipients, b''.join(chunks), connection_id,
+                    started_at or time.time(), time.time()
+                ))
+                self.reply('250 OK queued')
+                sender, recipients = None, []
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+def _parse_address(line):
+    match = _ADDRESS.search(line)
+    return match.group(1) if match else line.partition(':')[2].strip()
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    """Threaded sink; port 0 picks a free port"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 128
+
+    DROP = 'drop'
+
+    def __init__(self, host='127.0.0.1', port=0, connect_delay=0.0, data_delay=0.0,
+                 fail_rate=0.0, fail_code=451, reject=(), capture=True, max_captured=None, seed=None):
+        super().__init__((host, port), SMTPSinkHandler)
+        self.connect_delay = connect_delay
+        self.data_delay = data_delay
+        self.fail_rate = fail_rate
+        self.fail_code = fail_code
+        self.reject = {address.lower() for address in reject}
+        self.capture = capture
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.received = threading.Condition(self.lock)
+        self.captured = collections.deque(maxlen=max_captured)
+        self._scheduled_failures = collections.deque()
+        self.reset()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def reset(self):
+        """Forget captured messages and counters (injected failures stay configured)"""
+        with self.lock:
+            self.connections = 0
+            self.messages = 0
+            self.failures = 0
+            self.bytes_received = 0
+            self.captured.clear()
+
+    def fail_next(self, count=1, code=451):
+        """Answer the next `count` messages with `code`; None drops the connection"""
+        with self.lock:
+            self._scheduled_failures.extend([self.DROP if code is None else code] * count)
+
+    def next_failure(self):
+        with self.lock:
+            if self._scheduled_failures:
+                return self._scheduled_failures.popleft()
+            if self.fail_rate and self.random.random() < self.fail_rate:
+                return self.fail_code
+        return None
+
+    def record(self, message):
+        with self.received:
+            self.messages += 1
+            self.bytes_received += message.size
+            if self.capture:
+                self.captured.append(message)
+            self.received.notify_all()
+
+    def wait_for(self, count, timeout=10.0):
+        """Block until `count` messages were accepted; returns whether they were"""
+        with self.received:
+            return self.received.wait_for(lambda: self.messages >= count, timeout)
+
+    def messages_to(self, address):
+        with self.lock:
+            return [message for message in self.captured if address in message.recipients]
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local SMTP sink')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=2525)
+    parser.add_argument('--connect-delay', type=float, default=0.0, help='seconds per new connection')
+    parser.add_argument('--data-delay', type=float, default=0.0, help='seconds before each message is accepted')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='fraction of messages to fail')
+    parser.add_argument('--fail-code', type=int, default=451, help='SMTP reply used for injected failures')
+    parser.add_argument('--verbose', action='store_true', help='print each accepted message')
+    args = parser.parse_args()
+
+    sink = SMTPSink(args.host, args.port, args.connect_delay, args.data_delay,
+                    args.fail_rate, args.fail_code, capture=args.verbose, max_captured=1)
+    if args.verbose:
+        _record = sink.record
+
+        def record(message):
+            _record(message)
+            print(f'{time.strftime("%H:%M:%S")} {message.sender} -> {", ".join(message.recipients)} '
+                  f'{message["Subject"]!r} {message.size}B {message.duration * 1000:.1f}ms')
+        sink.record = record
+
+    print(f'SMTP sink listening on {args.host}:{sink.port}')
+    try:
+        sink.serve_forever()
+    except KeyboardInterrupt:
+        print(f'\n{sink.messages} messages over {sink.connections} connections, {sink.failures} failed')
@@ -20,6 +20,16 @@ class Config:
     UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER') or 'uploads'
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'pdf'}
+    UPLOAD_SESSION_TTL = int(os.environ.get('UPLOAD_SESSION_TTL') or 24 * 3600)  # idle seconds before a resumable upload is dropped
+    UPLOAD_CHUNK_SIZE = 1024 * 1024  # chunk size suggested to resumable upload clients
+    
+    # Uploaded file serving
+    FILE_SERVING = os.environ.get('FILE_SERVING') or 'flask'  # 'flask', 'x-accel' (nginx) or 'x-sendfile'
+    FILE_ACCEL_PREFIX = os.environ.get('FILE_ACCEL_PREFIX') or '/internal-uploads/'  # nginx internal location
+    FILE_URL_PREFIX = os.environ.get('FILE_URL_PREFIX') or '/student/files'
+    FILE_URLS_SIGNED = os.environ.get('FILE_URLS_SIGNED', 'true').lower() in ['true', 'on', '1']
+    FILE_URL_SECRET = os.environ.get('FILE_URL_SECRET')  # falls back to SECRET_KEY
+    FILE_URL_TTL = int(os.environ.get('FILE_URL_TTL') or 3600)  # seconds; links stay valid 1-2 TTLs
     
     # Email Configuration (for future use)
     MAIL_SERVER = os.environ.get('MAIL_SERVER') or 'smtp.gmail.com'
@@ -27,11 +37,94 @@ class Config:
     MAIL_USE_TLS = os.environ.get('MAIL_USE_TLS', 'true').lower() in ['true', 'on', '1']
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
+    MAIL_USE_SSL = os.environ.get('MAIL_USE_SSL', 'false').lower() in ['true', 'on', '1']
+    MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER') or 'admin@gau.ac.ke'
+    MAIL_TIMEOUT = 30  # seconds per SMTP operation
+    
+    # Pooled SMTP senders (per worker process)
+    MAIL_POOL_WORKERS = int(os.environ.get('MAIL_POOL_WORKERS') or 2)
+    MAIL_QUEUE_SIZE = int(os.environ.get('MAIL_QUEUE_SIZE') or 1000)
+    MAIL_SEND_RETRIES = 2
+    MAIL_MAX_MESSAGES_PER_CONNECTION = 100
+    MAIL_CONNECTION_IDLE_TIMEOUT = 60  # seconds before a pooled connection is reopened
+    
+    # Email outbox (delivered by email_worker.py)
+    EMAIL_OUTBOX_BATCH_SIZE = int(os.environ.get('EMAIL_OUTBOX_BATCH_SIZE') or 50)
+    EMAIL_OUTBOX_MAX_ATTEMPTS = 8
+    EMAIL_OUTBOX_BACKOFF_BASE = 30  # seconds, doubled per attempt
+    EMAIL_OUTBOX_BACKOFF_MAX = 3600
+    EMAIL_OUTBOX_LOCK_TIMEOUT = 300  # seconds before a stuck claim is retried
+    EMAIL_WORKER_POLL_INTERVAL = float(os.environ.get('EMAIL_WORKER_POLL_INTERVAL') or 5)
+    
+    # Announcement broadcasts (sent by email_worker.py)
+    BROADCAST_DEFAULT_MODE = 'merge'  # 'merge' (one personalised email each) or 'bcc'
+    BROADCAST_CHUNK_SIZE = 50
+    BROADCAST_BCC_MAX_RECIPIENTS = 50  # providers cap recipients per message
+    BROADCAST_RATE_PER_MINUTE = int(os.environ.get('BROADCAST_RATE_PER_MINUTE') or 300)
+    BROADCAST_LEASE_SECONDS = 120
+    
+    # Photo processing jobs (per worker process)
+    IMAGE_JOBS_INLINE = False  # True processes in the request instead of the pool
+    IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS') or 2)
+    IMAGE_QUEUE_MAX = int(os.environ.get('IMAGE_QUEUE_MAX') or 16)  # outstanding jobs before uploads get 503
+    IMAGE_JOB_TIMEOUT = 120  # seconds before an unfinished job is reported failed
+    
+    # ID card printing
+    CARD_CACHE_FOLDER = os.environ.get('CARD_CACHE_FOLDER') or 'card_cache'  # rendered cards, keyed by content
+    CARD_WORKERS = int(os.environ.get('CARD_WORKERS') or 0)  # 0 = one per CPU
+    CARD_FONT = os.environ.get('CARD_FONT')  # TrueType font file; Pillow's built-in font otherwise
+    CARD_BATCH_MAX = 200  # cards per request; larger print runs use print_cards.py
+    CARD_SIGNING_SECRET = os.environ.get('CARD_SIGNING_SECRET')  # falls back to SECRET_KEY
+    CARD_REVOCATION_REFRESH = int(os.environ.get('CARD_REVOCATION_REFRESH') or 60)  # seconds; 0 = load once
+    
+    # Student exports
+    EXPORT_FOLDER = os.environ.get('EXPORT_FOLDER') or 'exports'  # finished export artifacts (gzipped CSV)
+    EXPORT_JOBS_INLINE = False  # True runs export jobs in the request instead of the worker threads
+    EXPORT_WORKERS = int(os.environ.get('EXPORT_WORKERS') or 2)
+    EXPORT_INLINE_MAX_ROWS = 5000  # larger exports requested through /admin/exports run in the background
+    EXPORT_JOB_TIMEOUT = 1800  # seconds before an unfinished job is reported failed
+    EXPORT_MAX_AGE = int(os.environ.get('EXPORT_MAX_AGE') or 24 * 3600)  # seconds an artifact is kept
+    EXPORT_CACHE_MAX_MB = int(os.environ.get('EXPORT_CACHE_MAX_MB') or 1024)  # least recently used go first
+    EXPORT_CHANGES_SETTLE = 60  # seconds; change exports stop this far behind now so in-flight commits are not skipped
+    
+    # Analytics cache (per worker process); results also end with the data version
+    ANALYTICS_CACHE_ENABLED = os.environ.get('ANALYTICS_CACHE_ENABLED', 'true').lower() in ['true', 'on', '1']
+    ANALYTICS_CACHE_MAX_ENTRIES = 256
+    ANALYTICS_CACHE_TTLS = {  # seconds, a ceiling for results that drift with the clock; unlisted methods are not cached
+        'get_overview_stats': 60,
+        'get_monthly_trends': 600,
+        'get_department_statistics': 300,
+        'get_status_distribution': 300,
+        'get_processing_times': 600,
+        'get_recent_activities': 300,
+    }
     
     # University Configuration
     UNIVERSITY_NAME = 'Garissa University'
     UNIVERSITY_CODE = 'GAU'
     UNIVERSITY_EMAIL = 'admin@gau.ac.ke'
+    
+    # Metrics Configuration
+    # Shared directory for per-worker metric files (unset = single process)
+    METRICS_DIR = os.environ.get('METRICS_DIR')
+    METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL') or 1.0)
+    METRICS_AUTH_TOKEN = os.environ.get('METRICS_AUTH_TOKEN')
+    
+    # Query Instrumentation
+    SQL_SLOW_QUERY_THRESHOLD = float(os.environ.get('SQL_SLOW_QUERY_THRESHOLD') or 0.5)  # seconds
+    SQL_EXPLAIN_SLOW_QUERIES = os.environ.get('SQL_EXPLAIN_SLOW_QUERIES', 'false').lower() in ['true', 'on', '1']
+    SQL_N_PLUS_ONE_THRESHOLD = int(os.environ.get('SQL_N_PLUS_ONE_THRESHOLD') or 10)
+    SQL_SLOWEST_STATEMENTS = 3
+    
+    # On-demand profiling (admin only, signed per-path tokens)
+    PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'true').lower() in ['true', 'on', '1']
+    PROFILING_SECRET = os.environ.get('PROFILING_SECRET')  # falls back to SECRET_KEY
+    PROFILING_TOKEN_TTL = 300  # seconds
+    PROFILING_RATE_LIMIT = 10  # profiled requests per admin per hour
+    
+    # Request tracing (JSON lines in logs/traces.jsonl)
+    TRACING_ENABLED = os.environ.get('TRACING_ENABLED', 'true').lower() in ['true', 'on', '1']
+    TRACING_SAMPLE_RATE = float(os.environ.get('TRACING_SAMPLE_RATE') or 1.0)
 
 class DevelopmentConfig(Config):
     """Development configuration"""
@@ -42,11 +135,17 @@ class ProductionConfig(Config):
     """Production configuration"""
     DEBUG = False
     FLASK_ENV = 'production'
+    TRACING_SAMPLE_RATE = float(os.environ.get('TRACING_SAMPLE_RATE') or 0.01)  # one request in a hundred
 
 class TestingConfig(Config):
     """Testing configuration"""
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    MAIL_SUPPRESS_SEND = True
+    IMAGE_JOBS_INLINE = True
+    CARD_REVOCATION_REFRESH = 0
+    EXPORT_JOBS_INLINE = True
+    EXPORT_CHANGES_SETTLE = 0
 
 config = {
     'development': DevelopmentConfig,
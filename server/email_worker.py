@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Email outbox delivery worker
+
+Claims due rows from the `email_outbox` table in batches, plus the next
+due chunk of any running announcement broadcast, and sends them over one
+persistent SMTP connection. Several workers can run side by side.
+Stop it with SIGTERM/SIGINT; the current batch is finished first.
+
+Usage:
+    python email_worker.py                 # run until stopped
+    python email_worker.py --once          # deliver what is due, then exit
+"""
+import os
+import sys
+import time
+import signal
+import socket
+import argparse
+from app import create_app
+from models import db
+from utils.email_outbox import claim_batch, deliver_batch
+from utils.broadcasts import claim_due_broadcast, send_broadcast_chunk
+from utils.email_service import email_service
+from utils.mail_pool import SMTPConnection, smtp_settings
+from utils.metrics import metrics
+
+class EmailWorker:
+    """Polls the outbox and delivers claimed batches"""
+
+    def __init__(self, app, worker_id=None, batch_size=None, interval=None):
+        self.app = app
+        self.worker_id = worker_id or f'{socket.gethostname()}:{os.getpid()}'
+        self.batch_size = batch_size or app.config.get('EMAIL_OUTBOX_BATCH_SIZE', 50)
+        self.interval = interval or app.config.get('EMAIL_WORKER_POLL_INTERVAL', 5)
+        self.stopping = False
+        self.connection = None
+
+    def stop(self, signum=None, frame=None):
+        self.app.logger.info(f"Email worker {self.worker_id} stopping after current batch")
+        self.stopping = True
+
+    def _connection(self):
+        if not email_service.smtp_configured() or self.app.config.get('MAIL_SUPPRESS_SEND'):
+            return None
+        if self.connection is None:
+            self.connection = SMTPConnection(smtp_settings(self.app.config))
+        return self.connection
+
+    def run_once(self):
+        """Deliver one outbox batch and one broadcast chunk; returns the work done"""
+        with self.app.app_context():
+            try:
+                entries = claim_batch(self.worker_id, self.batch_size)
+                if entries:
+                    delivered = deliver_batch(entries, self._connection())
+                    self.app.logger.info(
+                        f"Email worker {self.worker_id} delivered {delivered}/{len(entries)} emails"
+                    )
+                
+                # Broadcasts are paced, so at most one chunk per pass
+                broadcast = claim_due_broadcast()
+                if broadcast is not None:
+                    send_broadcast_chunk(broadcast, self._connection())
+                
+                return len(entries) + (1 if broadcast is not None else 0)
+            finally:
+                db.session.remove()
+                metrics.flush()
+
+    def run(self, once=False):
+        self.app.logger.info(f"Email worker {self.worker_id} started")
+        try:
+            while not self.stopping:
+                claimed = self.run_once()
+                if once and claimed < self.batch_size:
+                    break
+                if claimed < self.batch_size:
+                    # Queue drained: wait, but wake promptly on shutdown
+                    deadline = time.monotonic() + self.interval
+                    while not self.stopping and time.monotonic() < deadline:
+                        time.sleep(min(self.interval, 0.2))
+        finally:
+            if self.connection is not None:
+                self.connection.close()
+            metrics.flush(force=True)
+            self.app.logger.info(f"Email worker {self.worker_id} stopped")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Deliver queued emails from the outbox')
+    parser.add_argument('--once', action='store_true', help='exit when nothing more is due')
+    parser.add_argument('--batch-size', type=int, help='rows claimed per batch')
+    parser.add_argument('--interval', type=float, help='seconds between polls when idle')
+    parser.add_argument('--worker-id', help='name recorded on claimed rows')
+    args = parser.parse_args(argv)
+
+    app = create_app(os.environ.get('FLASK_ENV', 'production'))
+    worker = EmailWorker(app, args.worker_id, args.batch_size, args.interval)
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+
+    with app.app_context():
+        db.create_all()
+
+    worker.run(once=args.once)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
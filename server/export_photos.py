@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Write student photos for the print vendor as a ZIP with a CSV manifest
+
+Entries are stored JPEGs named photos/<id_number>.jpg; manifest.csv maps
+each ID number to its file (empty when the photo is missing). The
+archive is written as it is built, one photo at a time, so memory stays
+flat for any number of students. --out - writes it to stdout.
+
+Usage:
+    python export_photos.py --out approved_photos.zip
+    python export_photos.py --department "Computer Science" --out cs.zip
+    python export_photos.py --size full --out - | ssh vendor 'cat > photos.zip'
+"""
+import os
+import sys
+import time
+import argparse
+
+# Add the server directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+from utils.file_handler import PHOTO_SIZES
+from utils.export_jobs import normalize_filters
+from utils.photo_export import photo_archive_query, photo_archive_chunks
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--status', default='approved', help='profile status to export (default: approved)')
+    parser.add_argument('--department', help='only this department')
+    parser.add_argument('--size', default='print', choices=['full'] + list(PHOTO_SIZES),
+                        help='photo size (default: print, 600x800)')
+    parser.add_argument('--out', default='photos.zip', help='ZIP to write, - for stdout')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    stats = {}
+    app = create_app()
+    with app.app_context():
+        query = photo_archive_query(normalize_filters({'status': args.status, 'department': args.department}))
+        upload_dir = app.config.get('UPLOAD_FOLDER', 'uploads')
+        out = sys.stdout.buffer if args.out == '-' else open(args.out, 'wb')
+        try:
+            for chunk in photo_archive_chunks(query, upload_dir, args.size, stats):
+                out.write(chunk)
+        finally:
+            if out is not sys.stdout.buffer:
+                out.close()
+
+    print(f"{stats['photos']} photos ({stats['bytes'] / 1024 / 1024:.1f} MB), {stats['missing']} missing, "
+          f"in {time.perf_counter() - started:.1f}s", file=sys.stderr if args.out == '-' else sys.stdout)
+    if args.out != '-':
+        print(f"Written to {args.out}")
+
+if __name__ == '__main__':
+    main()
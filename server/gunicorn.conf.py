@@ -11,6 +11,7 @@ workers = multiprocessing.cpu_count() * 2 + 1
 worker_class = "sync"
 worker_connections = 1000
 timeout = 30
+graceful_timeout = 30  # also bounds how long queued email may take to drain
 keepalive = 2
 
 # Restart workers after this many requests, to help prevent memory leaks
@@ -41,4 +42,23 @@ certfile = os.environ.get('SSL_CERTFILE')
 # Security
 limit_request_line = 4094
 limit_request_fields = 100
-limit_request_field_size = 8190
\ No newline at end of file
+limit_request_field_size = 8190
+
+# Metrics: workers share a directory of per-process metric files
+os.environ.setdefault('METRICS_DIR', '/tmp/gau-id-view-metrics')
+
+def on_starting(server):
+    """Clear metric files left over from a previous master"""
+    from utils.metrics import clear_metrics_directory
+    clear_metrics_directory(os.environ.get('METRICS_DIR'))
+
+def worker_exit(server, worker):
+    """Finish photo jobs, send queued email and persist the final counters of a recycled worker"""
+    from utils.image_jobs import shutdown_image_queue
+    shutdown_image_queue(timeout=(graceful_timeout - 5) / 2)
+    
+    from utils.mail_pool import shutdown_mail_pool
+    shutdown_mail_pool(timeout=(graceful_timeout - 5) / 2)
+    
+    from utils.metrics import metrics
+    metrics.flush(force=True)
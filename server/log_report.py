@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Per-endpoint request statistics from the JSON application logs
+
+Reads the current and rotated (optionally gzipped) logs line by line, so
+memory stays flat regardless of log volume.
+
+Usage:
+    python log_report.py                          # all of logs/app.log*
+    python log_report.py --since 6h --sort p95
+    python log_report.py --since 2025-01-10T00:00 --until 2025-01-11T00:00 --json
+"""
+import os
+import sys
+import json
+import argparse
+from utils.log_analytics import analyze, find_log_files, iter_records, parse_time
+
+DEFAULT_LOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs')
+SORT_KEYS = {
+    'count': 'count',
+    'p50': 'p50_ms',
+    'p95': 'p95_ms',
+    'p99': 'p99_ms',
+    'errors': 'error_rate'
+}
+
+def render_table(report, top, sort_key, out):
+    header = f"{'endpoint':<48} {'count':>7} {'5xx%':>6} {'4xx%':>6} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}  slowest"
+    out.write(header + '\n')
+    out.write('-' * len(header) + '\n')
+
+    def row(name, stats):
+        slowest = ' '.join(item['request_id'] for item in stats['slowest'][:3])
+        out.write(
+            f"{name[:48]:<48} {stats['count']:>7} "
+            f"{stats['error_rate'] * 100:>6.2f} {stats['client_error_rate'] * 100:>6.2f} "
+            f"{_fmt_ms(stats['p50_ms'])} {_fmt_ms(stats['p95_ms'])} {_fmt_ms(stats['p99_ms'])} "
+            f"{_fmt_ms(stats['max_ms'])}  {slowest}\n"
+        )
+
+    ranked = sorted(
+        report['endpoints'].items(),
+        key=lambda item: item[1][sort_key] or 0,
+        reverse=True
+    )
+    for name, stats in ranked[:top]:
+        if stats['count']:
+            row(name, stats)
+
+    out.write('-' * len(header) + '\n')
+    row('ALL', report['overall'])
+
+    problems = [(name, s) for name, s in ranked if s['slow_queries'] or s['n_plus_one']]
+    if problems:
+        out.write('\nDatabase warnings:\n')
+        for name, stats in problems:
+            out.write(f"  {name}: {stats['slow_queries']} slow queries, {stats['n_plus_one']} possible N+1\n")
+
+def _fmt_ms(value):
+    return f'{value:>7.1f}ms' if value is not None else f"{'-':>9}"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Summarize request latency and errors from JSON logs')
+    parser.add_argument('--log-dir', default=DEFAULT_LOG_DIR, help='directory holding the logs')
+    parser.add_argument('--log', action='append', help='log base name (repeatable, default: app.log)')
+    parser.add_argument('--since', help='ISO timestamp (UTC) or relative window such as 30m, 6h, 7d')
+    parser.add_argument('--until', help='ISO timestamp (UTC) or relative window')
+    parser.add_argument('--top', type=int, default=20, help='endpoints to show in the table')
+    parser.add_argument('--sort', choices=sorted(SORT_KEYS), default='count')
+    parser.add_argument('--slowest', type=int, default=5, help='slowest request ids kept per endpoint')
+    parser.add_argument('--json', action='store_true', help='print the full report as JSON')
+    args = parser.parse_args(argv)
+
+    # Performance warnings propagate into app.log, so it alone covers everything
+    paths = []
+    for base_name in args.log or ['app.log']:
+        paths.extend(find_log_files(args.log_dir, base_name))
+    if not paths:
+        print(f'No log files found in {args.log_dir}', file=sys.stderr)
+        return 1
+
+    try:
+        since, until = parse_time(args.since), parse_time(args.until)
+    except ValueError as e:
+        print(f'Invalid time: {e}', file=sys.stderr)
+        return 2
+
+    report = analyze(iter_records(paths), since=since, until=until, slowest_limit=args.slowest)
+    report['files'] = paths
+
+    if args.json:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+    else:
+        render_table(report, args.top, SORT_KEYS[args.sort], sys.stdout)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
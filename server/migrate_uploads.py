@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Move flat uploads into the content-addressed, sharded store
+
+    photos/profiles/photo_12_1700000000_ab12cd34.jpg
+        -> photos/profiles/3f/a9/3fa9...c1.jpg (plus its @size derivatives)
+
+Directories are read with os.scandir one entry at a time and files are
+hashed in 64KB chunks, so memory stays flat however many uploads there
+are. Each file is hard-linked to its new path, the rows that point at it
+are updated, and the old file is removed only after the batch commits:
+an interrupted run leaves every record pointing at a file that exists and
+can simply be run again. Identical files collapse into one blob whose
+reference count is the number of records using it.
+
+Usage:
+    python migrate_uploads.py --dry-run
+    python migrate_uploads.py --batch-size 200
+"""
+import os
+import sys
+import argparse
+
+# Add the server directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+from models import db, StudentProfile, ImageJob
+from utils.blob_store import import_blob, acquire_blob, hash_file, blob_path
+from utils.file_handler import PROFILE_PHOTO_DIR, PHOTO_SIZES, PHOTO_FORMATS, photo_variant_path
+
+DOCUMENT_DIR = 'documents/supporting'
+
+def legacy_files(upload_dir, namespace):
+    """Flat files directly in a namespace directory (not shards, temp files or derivatives)"""
+    directory = os.path.join(upload_dir, namespace)
+    if not os.path.isdir(directory):
+        return
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_file() and not entry.name.startswith('.') and '@' not in entry.name and '.' in entry.name:
+                yield f"{namespace}/{entry.name}"
+
+def photo_derivatives(old_path, new_path):
+    """(old, new) relative paths of every derivative of a photo"""
+    for size in ('full',) + tuple(PHOTO_SIZES):
+        for image_format in PHOTO_FORMATS:
+            old_variant = photo_variant_path(old_path, size, image_format)
+            if old_variant != old_path:
+                yield old_variant, photo_variant_path(new_path, size, image_format)
+
+def migrate_photo(upload_dir, old_path, digest, stats):
+    extension = old_path.rsplit('.', 1)[1]
+    new_path, digest, size = import_blob(
+        upload_dir, PROFILE_PHOTO_DIR, os.path.join(upload_dir, old_path), extension, digest
+    )
+
+    # Derivatives follow the photo; identical photos already have them
+    moved = [old_path]
+    for old_variant, new_variant in photo_derivatives(old_path, new_path):
+        old_full = os.path.join(upload_dir, old_variant)
+        if os.path.exists(old_full):
+            new_full = os.path.join(upload_dir, new_variant)
+            if not os.path.exists(new_full):
+                try:
+                    os.link(old_full, new_full)
+                except OSError:
+                    pass  # regenerated from the photo on first request
+            moved.append(old_variant)
+
+    references = StudentProfile.query.filter_by(photo_url=old_path).update(
+        {StudentProfile.photo_url: new_path}, synchronize_session=False
+    )
+    ImageJob.query.filter_by(result_path=old_path).update(
+        {ImageJob.result_path: new_path}, synchronize_session=False
+    )
+    if references:
+        acquire_blob(new_path, digest, size, count=references)
+    else:
+        stats['unreferenced'] += 1
+    stats['references'] += references
+    return moved
+
+def migrate_document(upload_dir, old_path, digest, stats):
+    # Documents have no owning row: the upload itself is their one reference
+    extension = old_path.rsplit('.', 1)[1]
+    new_path, digest, size = import_blob(
+        upload_dir, DOCUMENT_DIR, os.path.join(upload_dir, old_path), extension, digest
+    )
+    acquire_blob(new_path, digest, size)
+    stats['references'] += 1
+    return [old_path]
+
+def run(upload_dir, batch_size, dry_run):
+    stats = {'files': 0, 'bytes': 0, 'duplicates': 0, 'references': 0, 'unreferenced': 0}
+    seen = set()
+    pending = []
+
+    def flush():
+        db.session.commit()
+        for path in pending:
+            os.unlink(os.path.join(upload_dir, path))
+        pending.clear()
+
+    for namespace, migrate in ((PROFILE_PHOTO_DIR, migrate_photo), (DOCUMENT_DIR, migrate_document)):
+        for old_path in legacy_files(upload_dir, namespace):
+            digest, size = hash_file(os.path.join(upload_dir, old_path))
+            target = blob_path(namespace, digest, old_path.rsplit('.', 1)[1])
+            if target in seen or os.path.exists(os.path.join(upload_dir, target)):
+                stats['duplicates'] += 1
+            seen.add(target)
+            stats['files'] += 1
+            stats['bytes'] += size
+
+            if dry_run:
+                print(f"{old_path} -> {target}")
+                continue
+            pending.extend(migrate(upload_dir, old_path, digest, stats))
+            if stats['files'] % batch_size == 0:
+                flush()
+                print(f"{stats['files']} files migrated")
+
+    if not dry_run:
+        flush()
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--batch-size', type=int, default=200, help='files per commit')
+    parser.add_argument('--dry-run', action='store_true', help='list the moves without changing anything')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        upload_dir = app.config.get('UPLOAD_FOLDER', 'uploads')
+        stats = run(upload_dir, args.batch_size, args.dry_run)
+
+    print(f"{'Would migrate' if args.dry_run else 'Migrated'} {stats['files']} files "
+          f"({stats['bytes'] / 1024 / 1024:.1f}MB), {stats['duplicates']} duplicates merged")
+    if not args.dry_run:
+        print(f"{stats['references']} references recorded, "
+              f"{stats['unreferenced']} photos no record points at")
+
+if __name__ == '__main__':
+    main()
@@ -2,7 +2,9 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_bcrypt import Bcrypt
 from datetime import datetime
+from utils.tracing import span
 import uuid
+import json
 
 db = SQLAlchemy()
 bcrypt = Bcrypt()
@@ -24,19 +26,22 @@ class User(db.Model):
     role = db.Column(db.Enum('student', 'staff', 'admin', name='user_roles'), default='student')
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     # Relationships
     profile = db.relationship('StudentProfile', backref='user', uselist=False, cascade='all, delete-orphan')
+    documents = db.relationship('StudentDocument', backref='user', lazy='dynamic', cascade='all, delete-orphan')
     admin_activities = db.relationship('AdminActivity', foreign_keys='AdminActivity.admin_id', backref='admin_user', lazy='dynamic')
     
     def set_password(self, password):
         """Hash and set password"""
-        self.password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+        with span('bcrypt.hash'):
+            self.password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
     
     def check_password(self, password):
         """Check password against hash"""
-        return bcrypt.check_password_hash(self.password_hash, password)
+        with span('bcrypt.check'):
+            return bcrypt.check_password_hash(self.password_hash, password)
     
     def to_dict(self):
         """Convert user to dictionary"""
@@ -83,7 +88,7 @@ class StudentProfile(db.Model):
     approved_at = db.Column(db.DateTime)
     printed_at = db.Column(db.DateTime)
     issued_at = db.Column(db.DateTime)
-    last_updated = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    last_updated = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     # Admin notes
     admin_notes = db.Column(db.Text)
@@ -191,4 +196,231 @@ class SystemSettings(db.Model):
             'description': self.description,
             'updated_by': self.updated_by,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
\ No newline at end of file
+        }
+
+class EmailOutbox(db.Model):
+    """Notification emails awaiting delivery by email_worker.py"""
+    __tablename__ = 'email_outbox'
+    __table_args__ = (
+        db.Index('ix_email_outbox_due', 'status', 'next_attempt_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    idempotency_key = db.Column(db.String(150), unique=True, nullable=False)
+    recipient = db.Column(db.String(120), nullable=False)
+    template = db.Column(db.String(50), nullable=False)
+    context = db.Column(db.Text)  # JSON template variables
+    status = db.Column(db.Enum('pending', 'sending', 'sent', 'dead', name='outbox_status'), default='pending')
+    attempts = db.Column(db.Integer, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+    locked_by = db.Column(db.String(64))
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'idempotency_key': self.idempotency_key,
+            'recipient': self.recipient,
+            'template': self.template,
+            'status': self.status,
+            'attempts': self.attempts,
+            'next_attempt_at': self.next_attempt_at.isoformat() if self.next_attempt_at else None,
+            'last_error': self.last_error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'sent_at': self.sent_at.isoformat() if self.sent_at else None
+        }
+
+class AnnouncementBroadcast(db.Model):
+    """Progress of emailing an announcement to its target audience"""
+    __tablename__ = 'announcement_broadcasts'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    announcement_id = db.Column(db.Integer, db.ForeignKey('announcements.id'), unique=True, nullable=False)
+    mode = db.Column(db.Enum('bcc', 'merge', name='broadcast_modes'), default='merge')
+    status = db.Column(db.Enum('running', 'paused', 'completed', 'cancelled', 'failed', name='broadcast_status'), default='running')
+    target_role = db.Column(db.String(20), nullable=False)
+    chunk_size = db.Column(db.Integer, default=50)
+    rate_per_minute = db.Column(db.Integer, default=300)
+    last_user_id = db.Column(db.Integer, default=0)  # keyset cursor: recipients up to here are done
+    total_recipients = db.Column(db.Integer, default=0)
+    sent_count = db.Column(db.Integer, default=0)
+    failed_count = db.Column(db.Integer, default=0)
+    next_chunk_at = db.Column(db.DateTime, default=datetime.utcnow)
+    locked_until = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    completed_at = db.Column(db.DateTime)
+    
+    # Relationship
+    announcement = db.relationship('Announcement', backref=db.backref('broadcast', uselist=False))
+    
+    def to_dict(self):
+        processed = (self.sent_count or 0) + (self.failed_count or 0)
+        return {
+            'id': self.id,
+            'announcement_id': self.announcement_id,
+            'mode': self.mode,
+            'status': self.status,
+            'target_role': self.target_role,
+            'chunk_size': self.chunk_size,
+            'rate_per_minute': self.rate_per_minute,
+            'total_recipients': self.total_recipients,
+            'sent_count': self.sent_count,
+            'failed_count': self.failed_count,
+            'progress_percent': round(processed / self.total_recipients * 100, 1) if self.total_recipients else 100.0,
+            'next_chunk_at': self.next_chunk_at.isoformat() if self.next_chunk_at else None,
+            'last_error': self.last_error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None
+        }
+
+class ImageJob(db.Model):
+    """Background processing of an uploaded photo"""
+    __tablename__ = 'image_jobs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    status = db.Column(db.Enum('queued', 'done', 'failed', 'superseded', name='image_job_status'), default='queued')
+    source_path = db.Column(db.String(255), nullable=False)  # raw upload, removed once processed
+    result_path = db.Column(db.String(255))
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+class StudentDocument(db.Model):
+    """A supporting document uploaded by a student"""
+    __tablename__ = 'student_documents'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    file_path = db.Column(db.String(255), nullable=False)
+    description = db.Column(db.Text)
+    uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'file_path': self.file_path,
+            'description': self.description,
+            'uploaded_at': self.uploaded_at.isoformat() if self.uploaded_at else None
+        }
+
+class UploadSession(db.Model):
+    """A resumable document upload whose chunks are still arriving"""
+    __tablename__ = 'upload_sessions'
+    
+    id = db.Column(db.String(32), primary_key=True)  # random token, also names the spool file
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    filename = db.Column(db.String(255), nullable=False)
+    description = db.Column(db.Text)
+    total_size = db.Column(db.Integer, nullable=False)
+    received = db.Column(db.Integer, nullable=False, default=0)  # bytes safely on disk
+    spool_path = db.Column(db.String(255), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'filename': self.filename,
+            'size': self.total_size,
+            'offset': self.received,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+class CardRevocation(db.Model):
+    """ID cards that must no longer verify: a student's cards up to `card_version`"""
+    __tablename__ = 'card_revocations'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False, index=True)  # no foreign key: outlives deleted students
+    id_number = db.Column(db.String(50))
+    card_version = db.Column(db.Integer, nullable=False)
+    reason = db.Column(db.String(255))
+    revoked_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+    revoked_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'id_number': self.id_number,
+            'card_version': self.card_version,
+            'reason': self.reason,
+            'revoked_by': self.revoked_by,
+            'revoked_at': self.revoked_at.isoformat() if self.revoked_at else None
+        }
+
+class ExportJob(db.Model):
+    """A student export, and the artifact it produced, keyed by its filters and the data version"""
+    __tablename__ = 'export_jobs'
+    
+    id = db.Column(db.String(32), primary_key=True, default=lambda: uuid.uuid4().hex)
+    key = db.Column(db.String(64), nullable=False, index=True)  # filters + data version
+    filter_hash = db.Column(db.String(64), nullable=False)
+    filters = db.Column(db.Text)  # JSON
+    data_version = db.Column(db.String(32))
+    status = db.Column(db.Enum('queued', 'running', 'done', 'failed', name='export_job_status'), default='queued')
+    requested_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+    path = db.Column(db.String(255))  # under EXPORT_FOLDER
+    row_count = db.Column(db.Integer)
+    size = db.Column(db.Integer)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    last_used_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'filters': json.loads(self.filters) if self.filters else {},
+            'row_count': self.row_count,
+            'size': self.size,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+class DataVersion(db.Model):
+    """A counter bumped by every commit that writes the data it covers"""
+    __tablename__ = 'data_versions'
+    
+    name = db.Column(db.String(50), primary_key=True)  # 'analytics' or 'students'
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class StoredBlob(db.Model):
+    """A content-addressed upload and how many records point at it"""
+    __tablename__ = 'stored_blobs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    path = db.Column(db.String(255), unique=True, nullable=False)  # <namespace>/ab/cd/<sha256>.<ext>
+    sha256 = db.Column(db.String(64), nullable=False, index=True)
+    size = db.Column(db.Integer)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'path': self.path,
+            'sha256': self.sha256,
+            'size': self.size,
+            'ref_count': self.ref_count,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
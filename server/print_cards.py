@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Render ID cards for a print run as an A4 PDF, ten cards per sheet
+
+Cards are drawn in a process pool and cached by their printed content
+(CARD_CACHE_FOLDER), so re-running a batch after a few corrections only
+redraws the cards that changed. --cache-only warms the cache without
+writing a PDF.
+
+Usage:
+    python print_cards.py --out approved.pdf
+    python print_cards.py --department "Computer Science" --out cs.pdf
+    python print_cards.py --ids 12 15 19 --out reprint.pdf
+    python print_cards.py --cache-only --workers 8
+"""
+import os
+import sys
+import argparse
+
+# Add the server directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy.orm import joinedload
+from app import create_app
+from models import User, StudentProfile
+from utils.id_cards import card_data, render_card_batch
+from utils.card_verification import card_versions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--status', default='approved', help='profile status to print (default: approved)')
+    parser.add_argument('--department', help='only this department')
+    parser.add_argument('--ids', type=int, nargs='+', help='these student user IDs, whatever their status')
+    parser.add_argument('--out', default='id_cards.pdf', help='PDF to write')
+    parser.add_argument('--cache-only', action='store_true', help='render into the card cache, no PDF')
+    parser.add_argument('--workers', type=int, help='pool processes (default: CARD_WORKERS or one per CPU)')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        query = StudentProfile.query.join(User).options(joinedload(StudentProfile.user))
+        if args.ids:
+            query = query.filter(User.id.in_(args.ids))
+        else:
+            query = query.filter(StudentProfile.status == args.status)
+            if args.department:
+                query = query.filter(User.department == args.department)
+        profiles = query.order_by(User.department, User.name).all()
+        versions = card_versions(profile.user_id for profile in profiles)
+        cards = [card_data(profile, versions[profile.user_id]) for profile in profiles]
+
+        if not cards:
+            print("No students to print")
+            return
+
+        if args.cache_only:
+            stats = render_card_batch(cards, workers=args.workers)
+        else:
+            with open(args.out, 'wb') as out:
+                stats = render_card_batch(cards, out, workers=args.workers)
+
+    print(f"{stats['cards']} cards ({stats['rendered']} rendered, {stats['cached']} from cache) "
+          f"in {stats['seconds']:.1f}s")
+    if not args.cache_only:
+        print(f"{stats['sheets']} sheets written to {args.out}")
+
+if __name__ == '__main__':
+    main()
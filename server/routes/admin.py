@@ -1,24 +1,51 @@
 # Admin Routes for GAU-ID-View
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify, current_app, send_file, stream_with_context
 from flask_jwt_extended import jwt_required
-from models import User, StudentProfile, Announcement, AdminActivity, SystemSettings, db
+from models import (
+    User, StudentProfile, Announcement, AdminActivity, SystemSettings, EmailOutbox,
+    AnnouncementBroadcast, ImageJob, UploadSession, ExportJob, db
+)
 from utils.helpers import (
     success_response, error_response, role_required, get_current_user,
-    log_admin_activity, paginate_query, filter_students, generate_csv_export
+    log_admin_activity, paginate_query, filter_students
 )
 from utils.analytics import AnalyticsManager
+from utils.analytics_cache import analytics_etag, not_modified, with_etag
+from utils.email_outbox import queue_status_update_email, outbox_stats, requeue_dead
+from utils.broadcasts import start_broadcast, apply_broadcast_action
+from utils.file_handler import get_file_url, is_profile_photo, delete_photo, delete_file, PHOTO_SIZES
+from utils.blob_store import release_blob
+from utils.id_cards import card_data, card_image, render_card_batch
+from utils.card_verification import card_versions, revoke_card, apply_revocation
+from utils.export_jobs import (
+    normalize_filters, new_export_job, find_export, stream_export, gunzip_chunks, accepts_gzip,
+    send_export, request_export, expire_stale_export, artifact_full_path
+)
+from utils.exports import (
+    student_changes_query, change_rows, csv_chunks, gzip_chunks, encode_cursor, decode_cursor,
+    InvalidCursor, CHANGE_HEADER
+)
+from utils.photo_export import photo_archive_query, photo_archive_chunks
+from utils.tracing import span
 from utils.security import secure_endpoint, audit_sensitive_action
+from utils.profiling import (
+    profiled_endpoint, generate_profile_token, list_profiles, PROFILE_HEADER
+)
 from schemas import (
     AnnouncementSchema, ApplicationActionSchema, BulkActionSchema,
     SystemSettingsSchema, StudentSearchSchema, validate_json, validate_args
 )
-from datetime import datetime, timedelta, date
+from datetime import datetime, timedelta, date, timezone
 from sqlalchemy import func, and_, or_
+from sqlalchemy.orm import joinedload
+import os
+import tempfile
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
 @admin_bp.route('/dashboard', methods=['GET'])
 @role_required('admin', 'staff')
+@profiled_endpoint()
 def get_dashboard():
     """Get admin dashboard statistics"""
     try:
@@ -154,11 +181,14 @@ def get_students():
         
         # Format student data with profiles
         students_data = []
-        for student in pagination_result['items']:
-            student_data = student.to_dict()
-            if student.profile:
-                student_data['profile'] = student.profile.to_dict()
-            students_data.append(student_data)
+        with span('serialize.students', count=len(pagination_result['items'])):
+            for student in pagination_result['items']:
+                student_data = student.to_dict()
+                if student.profile:
+                    student_data['profile'] = student.profile.to_dict()
+                    # Lists show thumbnails, not the full-size photo
+                    student_data['profile']['photo_thumb_url'] = get_file_url(student.profile.photo_url, 'thumb')
+                students_data.append(student_data)
         
         result = pagination_result.copy()
         result['items'] = students_data
@@ -181,6 +211,7 @@ def get_student_details(student_id):
         student_data = student.to_dict()
         if student.profile:
             student_data['profile'] = student.profile.to_dict()
+            student_data['profile']['photo_review_url'] = get_file_url(student.profile.photo_url, 'medium')
         
         # Get admin activities for this student
         activities = AdminActivity.query.filter_by(target_user_id=student_id).order_by(
@@ -219,6 +250,7 @@ def approve_student(student_id):
         profile.admin_notes = data.get('notes', '')
         profile.last_updated = datetime.utcnow()
         
+        queue_status_update_email(student, 'approved', event_time=profile.last_updated)
         db.session.commit()
         
         # Log admin activity
@@ -266,6 +298,9 @@ def reject_student(student_id):
         profile.admin_notes = data.get('notes', '')
         profile.last_updated = datetime.utcnow()
         
+        queue_status_update_email(
+            student, 'rejected', details=profile.rejection_reason, event_time=profile.last_updated
+        )
         db.session.commit()
         
         # Log admin activity
@@ -325,6 +360,7 @@ def bulk_approve_students():
             profile.expiry_date = date.today() + timedelta(days=365)
             profile.admin_notes = data.get('notes', 'Bulk approved')
             profile.last_updated = datetime.utcnow()
+            queue_status_update_email(student, 'approved', event_time=profile.last_updated)
             
             approved_students.append({
                 'id': student.id,
@@ -371,8 +407,24 @@ def remove_student(student_id):
         data = request.get_json() or {}
         permanent_delete = data.get('permanent', False)
         
+        stored_files = []
+        spool_paths = []
+        revocation = None
+        if student.profile and student.profile.status in ('approved', 'printed', 'issued'):
+            # A removed student's card (approved cards may already be printed) must stop verifying at the gate
+            revocation = revoke_card(
+                student.id, student.profile.id_number, reason='Account removed', revoked_by=admin_user.id
+            )
         if permanent_delete:
-            # Permanent deletion (use with caution)
+            # Permanent deletion (use with caution); uploads lose this student's references
+            if student.profile and student.profile.photo_url:
+                stored_files.append(student.profile.photo_url)
+            stored_files.extend(document.file_path for document in student.documents)
+            for path in stored_files:
+                release_blob(path)
+            ImageJob.query.filter_by(user_id=student.id).delete()
+            spool_paths = [path for (path,) in db.session.query(UploadSession.spool_path).filter_by(user_id=student.id)]
+            UploadSession.query.filter_by(user_id=student.id).delete()
             db.session.delete(student)
             action = 'delete_student'
             message = "Student account permanently deleted"
@@ -384,6 +436,17 @@ def remove_student(student_id):
             message = "Student account deactivated"
         
         db.session.commit()
+        if revocation:
+            apply_revocation(revocation)
+        
+        # Files another record still uses are kept; upload_gc.py sweeps anything missed here
+        for path in stored_files:
+            if is_profile_photo(path):
+                delete_photo(path)
+            else:
+                delete_file(path)
+        for path in spool_paths:
+            delete_file(path)  # unfinished resumable uploads
         
         # Log admin activity
         log_admin_activity(
@@ -466,6 +529,18 @@ def create_announcement():
         )
         
         db.session.add(announcement)
+        
+        # Optional email broadcast, delivered in paced chunks by email_worker.py
+        broadcast = None
+        broadcast_options = data.get('broadcast')
+        if broadcast_options:
+            options = broadcast_options if isinstance(broadcast_options, dict) else {}
+            try:
+                broadcast = start_broadcast(announcement, admin_user.id, mode=options.get('mode'))
+            except ValueError as e:
+                db.session.rollback()
+                return error_response(str(e), status_code=400)
+        
         db.session.commit()
         
         # Log admin activity
@@ -473,13 +548,17 @@ def create_announcement():
             admin_id=admin_user.id,
             action='create_announcement',
             details=f"Created announcement: {announcement.title}"
+                    + (f" (emailing {broadcast.total_recipients} recipients)" if broadcast else '')
         )
         
         current_app.logger.info(f"Announcement created by admin {admin_user.id}: {announcement.title}")
         
+        response_data = announcement.to_dict()
+        response_data['broadcast'] = broadcast.to_dict() if broadcast else None
+        
         return success_response(
             "Announcement created successfully",
-            data=announcement.to_dict(),
+            data=response_data,
             status_code=201
         )
         
@@ -488,8 +567,88 @@ def create_announcement():
         current_app.logger.error(f"Create announcement error: {str(e)}")
         return error_response("Failed to create announcement", status_code=500)
 
+@admin_bp.route('/announcements/<int:announcement_id>/broadcast', methods=['POST'])
+@role_required('admin')
+def broadcast_announcement(announcement_id):
+    """Email an existing announcement to its target audience"""
+    try:
+        admin_user = get_current_user()
+        announcement = db.session.get(Announcement, announcement_id)
+        if not announcement:
+            return error_response("Announcement not found", status_code=404)
+        if announcement.broadcast is not None:
+            return error_response("Announcement has already been broadcast", status_code=409)
+        
+        data = request.get_json() or {}
+        try:
+            broadcast = start_broadcast(announcement, admin_user.id, mode=data.get('mode'))
+        except ValueError as e:
+            return error_response(str(e), status_code=400)
+        db.session.commit()
+        
+        log_admin_activity(
+            admin_id=admin_user.id,
+            action='broadcast_announcement',
+            details=f"Broadcasting announcement {announcement.id} to {broadcast.total_recipients} recipients"
+        )
+        
+        return success_response("Broadcast started", data=broadcast.to_dict(), status_code=201)
+        
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Broadcast announcement error: {str(e)}")
+        return error_response("Failed to start broadcast", status_code=500)
+
+@admin_bp.route('/announcements/<int:announcement_id>/broadcast', methods=['GET'])
+@role_required('admin', 'staff')
+def get_broadcast_progress(announcement_id):
+    """Delivery progress of an announcement broadcast"""
+    try:
+        broadcast = AnnouncementBroadcast.query.filter_by(announcement_id=announcement_id).first()
+        if not broadcast:
+            return error_response("Broadcast not found", status_code=404)
+        
+        return success_response("Broadcast progress retrieved successfully", data=broadcast.to_dict())
+        
+    except Exception as e:
+        current_app.logger.error(f"Broadcast progress error: {str(e)}")
+        return error_response("Failed to retrieve broadcast progress", status_code=500)
+
+@admin_bp.route('/announcements/<int:announcement_id>/broadcast', methods=['PUT'])
+@role_required('admin')
+def update_broadcast(announcement_id):
+    """Pause, resume or cancel a broadcast"""
+    try:
+        admin_user = get_current_user()
+        broadcast = AnnouncementBroadcast.query.filter_by(announcement_id=announcement_id).first()
+        if not broadcast:
+            return error_response("Broadcast not found", status_code=404)
+        
+        action = (request.get_json() or {}).get('action')
+        if action not in ('pause', 'resume', 'cancel'):
+            return error_response("Action must be pause, resume or cancel", status_code=400)
+        if not apply_broadcast_action(broadcast, action):
+            return error_response(
+                f"Cannot {action} a broadcast that is {broadcast.status}", status_code=400
+            )
+        db.session.commit()
+        
+        log_admin_activity(
+            admin_id=admin_user.id,
+            action=f'{action}_broadcast',
+            details=f"Broadcast for announcement {announcement_id} is now {broadcast.status}"
+        )
+        
+        return success_response(f"Broadcast {broadcast.status}", data=broadcast.to_dict())
+        
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Update broadcast error: {str(e)}")
+        return error_response("Failed to update broadcast", status_code=500)
+
 @admin_bp.route('/analytics', methods=['GET'])
 @role_required('admin', 'staff')
+@profiled_endpoint()
 def get_analytics():
     """Get detailed analytics and statistics"""
     try:
@@ -571,86 +730,380 @@ def get_analytics():
         current_app.logger.error(f"Get analytics error: {str(e)}")
         return error_response("Failed to retrieve analytics", status_code=500)
 
+def export_filename():
+    return f'gau_students_export_{datetime.now().strftime("%Y%m%d")}.csv'
+
 @admin_bp.route('/export/students', methods=['GET'])
 @role_required('admin')
 def export_students():
-    """Export students data as CSV"""
+    """
+    Export students data as CSV
+    
+    Served from the saved artifact when the same filters were exported
+    and no student data has changed since; otherwise streamed as rows are
+    read and saved on the way out. Gzipped when the client accepts it
+    (?gzip=0 to opt out).
+    """
     try:
         # Get filters from query parameters
-        filters = {
-            'department': request.args.get('department'),
-            'status': request.args.get('status'),
-            'year_of_study': request.args.get('year_of_study'),
-            'search': request.args.get('search')
-        }
+        filters = normalize_filters(request.args)
+        admin_id = get_current_user().id
+        
+        def logged(count, cached=False):
+            # Log admin activity once the last row is out
+            log_admin_activity(
+                admin_id=admin_id,
+                action='export_students_data',
+                details=f"Exported {count} student records" + (" (cached)" if cached else "")
+            )
         
-        # Build query
-        query = User.query.filter_by(role='student')
-        query = filter_students(query, filters)
+        job = new_export_job(filters, requested_by=admin_id)
+        cached = find_export(job.key)
+        if cached:
+            logged(cached.row_count, cached=True)
+            return send_export(cached, export_filename(), accepts_gzip())
+        
+        chunks = stream_export(job, on_complete=logged)
+        compress = accepts_gzip()
+        if not compress:
+            chunks = gunzip_chunks(chunks)
+        
+        response = current_app.response_class(stream_with_context(chunks), mimetype='text/csv')
+        response.headers['Content-Disposition'] = f'attachment; filename="{export_filename()}"'
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.headers['Vary'] = 'Accept-Encoding'
+        if compress:
+            response.headers['Content-Encoding'] = 'gzip'
+        return response
         
-        students = query.all()
+    except Exception as e:
+        current_app.logger.error(f"Export students error: {str(e)}")
+        return error_response("Failed to export students data", status_code=500)
+
+@admin_bp.route('/export/students/changes', methods=['GET'])
+@role_required('admin')
+def export_student_changes():
+    """
+    Students changed since a cursor, as streamed CSV
+    
+    `cursor` is the X-Next-Cursor of the previous call; the first call
+    passes `since` (ISO date or time) or nothing for every student. Rows
+    are whole students (deactivations included) with a `Changed At`
+    column; the same filters as the full export apply.
+    """
+    try:
+        if request.args.get('cursor'):
+            since = decode_cursor(request.args['cursor'])
+        elif request.args.get('since'):
+            since = datetime.fromisoformat(request.args['since'])
+            if since.tzinfo:
+                since = since.astimezone(timezone.utc).replace(tzinfo=None)
+        else:
+            since = datetime.min
+        
+        # Stop a little behind now, so rows stamped but not yet committed land in the next window
+        until = datetime.utcnow() - timedelta(seconds=current_app.config.get('EXPORT_CHANGES_SETTLE', 60))
+        if since > until:
+            since = until
+        
+        query = student_changes_query(since, until, normalize_filters(request.args))
+        admin_id = get_current_user().id
+        
+        def rows():
+            count = 0
+            for row in change_rows(query):
+                count += 1
+                yield row
+            log_admin_activity(
+                admin_id=admin_id,
+                action='export_student_changes',
+                details=f"Exported {count} student records changed since {since.isoformat()}"
+            )
         
-        # Prepare data for CSV
-        csv_data = []
-        for student in students:
-            profile = student.profile
-            row = {
-                'Name': student.name,
-                'Registration Number': student.reg_number,
-                'Email': student.email,
-                'Department': student.department,
-                'Phone': profile.phone if profile else '',
-                'Course': profile.course if profile else '',
-                'Year of Study': profile.year_of_study if profile else '',
-                'ID Number': profile.id_number if profile else '',
-                'Status': profile.status if profile else '',
-                'Submitted Date': profile.submitted_at.strftime('%Y-%m-%d') if profile and profile.submitted_at else '',
-                'Approved Date': profile.approved_at.strftime('%Y-%m-%d') if profile and profile.approved_at else '',
-                'Card Printed': 'Yes' if profile and profile.card_printed else 'No',
-                'Card Issued': 'Yes' if profile and profile.card_issued else 'No',
-                'Created Date': student.created_at.strftime('%Y-%m-%d'),
-                'Is Active': 'Yes' if student.is_active else 'No'
-            }
-            csv_data.append(row)
+        chunks = csv_chunks(rows(), header=CHANGE_HEADER)
+        compress = accepts_gzip()
+        if compress:
+            chunks = gzip_chunks(chunks)
         
-        csv_content = generate_csv_export(csv_data, 'students_export.csv')
-        if not csv_content:
-            return error_response("Failed to generate CSV export", status_code=500)
+        response = current_app.response_class(stream_with_context(chunks), mimetype='text/csv')
+        response.headers['X-Next-Cursor'] = encode_cursor(until)
+        response.headers['Content-Disposition'] = (
+            f'attachment; filename="gau_students_changes_{until.strftime("%Y%m%d_%H%M%S")}.csv"'
+        )
+        response.headers['Cache-Control'] = 'private, no-store'
+        response.headers['Vary'] = 'Accept-Encoding'
+        if compress:
+            response.headers['Content-Encoding'] = 'gzip'
+        return response
+        
+    except (InvalidCursor, ValueError):
+        return error_response("Invalid cursor or since timestamp", status_code=400)
+    except Exception as e:
+        current_app.logger.error(f"Export student changes error: {str(e)}")
+        return error_response("Failed to export student changes", status_code=500)
+
+@admin_bp.route('/export/photos', methods=['GET'])
+@role_required('admin')
+def export_photos():
+    """
+    Student photos for the print vendor, as a streamed ZIP
+    
+    Stored JPEG entries `photos/<id_number>.jpg` plus `manifest.csv`
+    mapping ID numbers to files. `status` (default approved) and
+    `department` filter the students; `size` is `print` (600x800, the
+    default) or `full`. The archive is built as it is sent, never on disk.
+    """
+    try:
+        size = request.args.get('size', 'print')
+        if size != 'full' and size not in PHOTO_SIZES:
+            return error_response("Invalid photo size", status_code=400)
+        
+        filters = normalize_filters({
+            'status': request.args.get('status', 'approved'),
+            'department': request.args.get('department')
+        })
+        query = photo_archive_query(filters)
+        upload_dir = current_app.config.get('UPLOAD_FOLDER', 'uploads')
+        admin_id = get_current_user().id
+        
+        def chunks():
+            stats = {}
+            yield from photo_archive_chunks(query, upload_dir, size, stats)
+            # Log admin activity once the archive is complete
+            log_admin_activity(
+                admin_id=admin_id,
+                action='export_student_photos',
+                details=f"Exported {stats['photos']} student photos ({stats['missing']} missing)"
+            )
+        
+        response = current_app.response_class(stream_with_context(chunks()), mimetype='application/zip')
+        response.headers['Content-Disposition'] = (
+            f'attachment; filename="gau_photos_{datetime.now().strftime("%Y%m%d")}.zip"'
+        )
+        response.headers['Cache-Control'] = 'private, no-store'
+        return response
+        
+    except Exception as e:
+        current_app.logger.error(f"Export photos error: {str(e)}")
+        return error_response("Failed to export student photos", status_code=500)
+
+def export_job_data(job):
+    data = job.to_dict()
+    data['status_url'] = f'/admin/exports/{job.id}'
+    if job.status == 'done':
+        data['download_url'] = f'/admin/exports/{job.id}/download'
+    return data
+
+@admin_bp.route('/exports', methods=['POST'])
+@role_required('admin')
+def create_export():
+    """
+    Request a student export as a job
+    
+    JSON body: the `/admin/export/students` filters. An identical export
+    of unchanged data is returned at once (200); small exports are written
+    before responding, larger ones run in the background (202, poll the
+    status URL).
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        admin_user = get_current_user()
+        job = request_export(normalize_filters(data), requested_by=admin_user.id)
+        
+        if job.status == 'failed':
+            return error_response(f"Export failed: {job.error}", status_code=500)
+        
+        if job.status == 'done':
+            log_admin_activity(
+                admin_id=admin_user.id,
+                action='export_students_data',
+                details=f"Exported {job.row_count} student records (job {job.id})"
+            )
+            return success_response("Export ready", data=export_job_data(job))
+        
+        response, status = success_response("Export started", data=export_job_data(job), status_code=202)
+        response.headers['Location'] = f'/admin/exports/{job.id}'
+        return response, status
+        
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Create export error: {str(e)}")
+        return error_response("Failed to start export", status_code=500)
+
+@admin_bp.route('/exports/<job_id>', methods=['GET'])
+@role_required('admin')
+def get_export(job_id):
+    """Poll an export job"""
+    try:
+        job = db.session.get(ExportJob, job_id)
+        if not job:
+            return error_response("Export not found", status_code=404)
+        expire_stale_export(job)
+        return success_response("Export retrieved", data=export_job_data(job))
+        
+    except Exception as e:
+        current_app.logger.error(f"Get export error: {str(e)}")
+        return error_response("Failed to retrieve export", status_code=500)
+
+@admin_bp.route('/exports/<job_id>/download', methods=['GET'])
+@role_required('admin')
+def download_export(job_id):
+    """A finished export's CSV, with Range and ETag support"""
+    try:
+        job = db.session.get(ExportJob, job_id)
+        if not job:
+            return error_response("Export not found", status_code=404)
+        if job.status != 'done':
+            return error_response(f"Export is {job.status}", status_code=409)
+        if not os.path.exists(artifact_full_path(job)):
+            return error_response("Export has expired, please request it again", status_code=410)
+        
+        job.last_used_at = datetime.utcnow()
+        db.session.commit()
+        return send_export(job, export_filename(), accepts_gzip())
+        
+    except Exception as e:
+        current_app.logger.error(f"Download export error: {str(e)}")
+        return error_response("Failed to download export", status_code=500)
+
+@admin_bp.route('/students/<int:student_id>/id-card', methods=['GET'])
+@role_required('admin', 'staff')
+def get_id_card(student_id):
+    """Rendered ID card for one student (?format=png|jpeg)"""
+    try:
+        student = User.query.filter_by(id=student_id, role='student').first()
+        if not student or not student.profile:
+            return error_response("Student not found", status_code=404)
+        
+        image_format = request.args.get('format', 'png')
+        if image_format not in ('png', 'jpeg'):
+            return error_response("Format must be png or jpeg", status_code=400)
+        
+        with span('id_card.render'):
+            data = card_image(student.profile, image_format)
+        
+        response = current_app.response_class(data, mimetype=f'image/{image_format}')
+        extension = 'jpg' if image_format == 'jpeg' else 'png'
+        response.headers['Content-Disposition'] = f'inline; filename="id_card_{student.profile.id_number}.{extension}"'
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+        
+    except Exception as e:
+        current_app.logger.error(f"ID card error: {str(e)}")
+        return error_response("Failed to render ID card", status_code=500)
+
+@admin_bp.route('/id-cards/print', methods=['POST'])
+@role_required('admin')
+def print_id_cards():
+    """
+    A4 PDF of ID cards, ten per sheet
+    
+    JSON body: `student_ids`, or `status` (default 'approved') with an
+    optional `department`. Up to CARD_BATCH_MAX cards per request; whole
+    print runs go through print_cards.py.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        query = StudentProfile.query.join(User).options(joinedload(StudentProfile.user))
+        if data.get('student_ids'):
+            query = query.filter(User.id.in_(data['student_ids']))
+        else:
+            query = query.filter(StudentProfile.status == data.get('status', 'approved'))
+            if data.get('department'):
+                query = query.filter(User.department == data['department'])
+        
+        count = query.count()
+        limit = current_app.config.get('CARD_BATCH_MAX', 200)
+        if count == 0:
+            return error_response("No students to print", status_code=404)
+        if count > limit:
+            return error_response(
+                f"{count} cards requested; at most {limit} per request, use print_cards.py for larger runs",
+                status_code=400
+            )
+        
+        profiles = query.order_by(User.department, User.name).all()
+        versions = card_versions(profile.user_id for profile in profiles)
+        cards = [card_data(profile, versions[profile.user_id]) for profile in profiles]
+        output = tempfile.TemporaryFile()
+        with span('id_card.batch', cards=count):
+            stats = render_card_batch(cards, output)
+        output.seek(0)
         
-        # Log admin activity
         admin_user = get_current_user()
         log_admin_activity(
             admin_id=admin_user.id,
-            action='export_students_data',
-            details=f"Exported {len(csv_data)} student records"
+            action='print_id_cards',
+            details=f"Rendered {stats['cards']} ID cards on {stats['sheets']} sheets ({stats['cached']} cached)"
         )
         
-        return success_response(
-            "Students data exported successfully",
-            data={
-                'csv_content': csv_content,
-                'record_count': len(csv_data),
-                'filename': f'gau_students_export_{datetime.now().strftime("%Y%m%d")}.csv'
-            }
+        return send_file(
+            output, mimetype='application/pdf', as_attachment=True,
+            download_name=f'gau_id_cards_{datetime.now().strftime("%Y%m%d_%H%M")}.pdf'
         )
         
     except Exception as e:
-        current_app.logger.error(f"Export students error: {str(e)}")
-        return error_response("Failed to export students data", status_code=500)
+        current_app.logger.error(f"Print ID cards error: {str(e)}")
+        return error_response("Failed to render ID cards", status_code=500)
+
+@admin_bp.route('/id-cards/<int:student_id>/revoke', methods=['POST'])
+@role_required('admin')
+def revoke_id_card(student_id):
+    """
+    Revoke a student's printed ID card (lost, stolen, withdrawn)
+    
+    JSON body: `reason`. The card stops verifying at once on this server
+    and within CARD_REVOCATION_REFRESH seconds on the others; cards
+    printed afterwards carry the next card version and verify as usual.
+    """
+    try:
+        admin_user = get_current_user()
+        student = User.query.filter_by(id=student_id, role='student').first()
+        if not student or not student.profile:
+            return error_response("Student not found", status_code=404)
+        
+        data = request.get_json(silent=True) or {}
+        reason = (data.get('reason') or '').strip()
+        if not reason:
+            return error_response("Revocation reason is required", status_code=400)
+        
+        revocation = revoke_card(student.id, student.profile.id_number, reason=reason[:255], revoked_by=admin_user.id)
+        db.session.commit()
+        apply_revocation(revocation)
+        
+        log_admin_activity(
+            admin_id=admin_user.id,
+            action='revoke_id_card',
+            target_user_id=student_id,
+            details=f"Revoked ID card v{revocation.card_version} for {student.name}: {reason}"
+        )
+        
+        return success_response("ID card revoked", data=revocation.to_dict())
+        
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Revoke ID card error: {str(e)}")
+        return error_response("Failed to revoke ID card", status_code=500)
 
 # Analytics endpoints
 @admin_bp.route('/analytics/overview', methods=['GET'])
 @role_required('admin', 'staff')
 @secure_endpoint()
+@profiled_endpoint()
 def get_analytics_overview():
     """Get comprehensive analytics overview"""
     try:
-        analytics_data = AnalyticsManager.get_overview_stats()
+        method = AnalyticsManager.get_overview_stats
+        etag = analytics_etag(method)
+        if etag and request.if_none_match.contains_weak(etag):
+            return not_modified(etag, method)
         
-        return success_response(
+        analytics_data = method()
+        
+        return with_etag(success_response(
             "Analytics overview retrieved successfully",
             data=analytics_data
-        )
+        ), etag)
         
     except Exception as e:
         current_app.logger.error(f"Analytics overview error: {str(e)}")
@@ -659,6 +1112,7 @@ def get_analytics_overview():
 @admin_bp.route('/analytics/trends', methods=['GET'])
 @role_required('admin', 'staff')
 @secure_endpoint()
+@profiled_endpoint()
 def get_monthly_trends():
     """Get monthly trends analysis"""
     try:
@@ -666,15 +1120,20 @@ def get_monthly_trends():
         if months > 24:  # Limit to 24 months
             months = 24
         
-        trends_data = AnalyticsManager.get_monthly_trends(months)
+        method = AnalyticsManager.get_monthly_trends
+        etag = analytics_etag(method, months)
+        if etag and request.if_none_match.contains_weak(etag):
+            return not_modified(etag, method)
         
-        return success_response(
+        trends_data = method(months)
+        
+        return with_etag(success_response(
             "Monthly trends retrieved successfully",
             data={
                 'trends': trends_data,
                 'period_months': months
             }
-        )
+        ), etag)
         
     except Exception as e:
         current_app.logger.error(f"Monthly trends error: {str(e)}")
@@ -683,15 +1142,21 @@ def get_monthly_trends():
 @admin_bp.route('/analytics/departments', methods=['GET'])
 @role_required('admin', 'staff')
 @secure_endpoint()
+@profiled_endpoint()
 def get_department_analytics():
     """Get department-wise analytics"""
     try:
-        dept_stats = AnalyticsManager.get_department_statistics()
+        method = AnalyticsManager.get_department_statistics
+        etag = analytics_etag(method)
+        if etag and request.if_none_match.contains_weak(etag):
+            return not_modified(etag, method)
         
-        return success_response(
+        dept_stats = method()
+        
+        return with_etag(success_response(
             "Department analytics retrieved successfully",
             data=dept_stats
-        )
+        ), etag)
         
     except Exception as e:
         current_app.logger.error(f"Department analytics error: {str(e)}")
@@ -700,15 +1165,21 @@ def get_department_analytics():
 @admin_bp.route('/analytics/status-distribution', methods=['GET'])
 @role_required('admin', 'staff')
 @secure_endpoint()
+@profiled_endpoint()
 def get_status_distribution():
     """Get application status distribution"""
     try:
-        distribution = AnalyticsManager.get_status_distribution()
+        method = AnalyticsManager.get_status_distribution
+        etag = analytics_etag(method)
+        if etag and request.if_none_match.contains_weak(etag):
+            return not_modified(etag, method)
         
-        return success_response(
+        distribution = method()
+        
+        return with_etag(success_response(
             "Status distribution retrieved successfully",
             data=distribution
-        )
+        ), etag)
         
     except Exception as e:
         current_app.logger.error(f"Status distribution error: {str(e)}")
@@ -717,15 +1188,21 @@ def get_status_distribution():
 @admin_bp.route('/analytics/processing-times', methods=['GET'])
 @role_required('admin', 'staff')
 @secure_endpoint()
+@profiled_endpoint()
 def get_processing_times():
     """Get average processing times"""
     try:
-        processing_times = AnalyticsManager.get_processing_times()
+        method = AnalyticsManager.get_processing_times
+        etag = analytics_etag(method)
+        if etag and request.if_none_match.contains_weak(etag):
+            return not_modified(etag, method)
         
-        return success_response(
+        processing_times = method()
+        
+        return with_etag(success_response(
             "Processing times retrieved successfully",
             data=processing_times
-        )
+        ), etag)
         
     except Exception as e:
         current_app.logger.error(f"Processing times error: {str(e)}")
@@ -734,6 +1211,7 @@ def get_processing_times():
 @admin_bp.route('/analytics/system-health', methods=['GET'])
 @role_required('admin')
 @secure_endpoint()
+@profiled_endpoint()
 def get_system_health():
     """Get system health metrics (admin only)"""
     try:
@@ -751,6 +1229,7 @@ def get_system_health():
 @admin_bp.route('/analytics/recent-activities', methods=['GET'])
 @role_required('admin', 'staff')
 @secure_endpoint()
+@profiled_endpoint()
 def get_recent_activities():
     """Get recent admin activities"""
     try:
@@ -758,15 +1237,20 @@ def get_recent_activities():
         if limit > 100:  # Limit to 100 records
             limit = 100
         
-        activities = AnalyticsManager.get_recent_activities(limit)
+        method = AnalyticsManager.get_recent_activities
+        etag = analytics_etag(method, limit)
+        if etag and request.if_none_match.contains_weak(etag):
+            return not_modified(etag, method)
         
-        return success_response(
+        activities = method(limit)
+        
+        return with_etag(success_response(
             "Recent activities retrieved successfully",
             data={
                 'activities': activities,
                 'limit': limit
             }
-        )
+        ), etag)
         
     except Exception as e:
         current_app.logger.error(f"Recent activities error: {str(e)}")
@@ -776,6 +1260,7 @@ def get_recent_activities():
 @role_required('admin')
 @secure_endpoint()
 @audit_sensitive_action('GENERATE_ANALYTICS_REPORT')
+@profiled_endpoint()
 def generate_analytics_report():
     """Generate comprehensive analytics report"""
     try:
@@ -804,7 +1289,8 @@ def generate_analytics_report():
                 return error_response("Invalid end_date format", status_code=400)
         
         # Generate report
-        report = AnalyticsManager.generate_report(report_type, start_date, end_date)
+        with span('analytics.generate_report', report_type=report_type):
+            report = AnalyticsManager.generate_report(report_type, start_date, end_date)
         
         # Log the report generation
         log_admin_activity(
@@ -822,6 +1308,109 @@ def generate_analytics_report():
         current_app.logger.error(f"Report generation error: {str(e)}")
         return error_response("Failed to generate report", status_code=500)
 
+# Profiling endpoints
+@admin_bp.route('/profiling/token', methods=['POST'])
+@role_required('admin')
+@secure_endpoint()
+@audit_sensitive_action('ISSUE_PROFILING_TOKEN')
+def issue_profiling_token():
+    """Issue a short-lived token to profile one request path"""
+    try:
+        data = request.get_json() or {}
+        path = data.get('path', '')
+        if not path.startswith('/admin/'):
+            return error_response("Only /admin/ paths can be profiled", status_code=400)
+        
+        admin_user = get_current_user()
+        token, expires = generate_profile_token(admin_user.id, path)
+        
+        return success_response(
+            "Profiling token issued",
+            data={
+                'token': token,
+                'header': PROFILE_HEADER,
+                'path': path,
+                'expires_at': datetime.utcfromtimestamp(expires).isoformat()
+            }
+        )
+        
+    except Exception as e:
+        current_app.logger.error(f"Profiling token error: {str(e)}")
+        return error_response("Failed to issue profiling token", status_code=500)
+
+@admin_bp.route('/profiling/profiles', methods=['GET'])
+@role_required('admin')
+@secure_endpoint()
+def get_profiles():
+    """List saved request profiles"""
+    try:
+        return success_response("Profiles retrieved successfully", data={'profiles': list_profiles()})
+        
+    except Exception as e:
+        current_app.logger.error(f"List profiles error: {str(e)}")
+        return error_response("Failed to list profiles", status_code=500)
+
+# Email outbox endpoints
+@admin_bp.route('/email/outbox', methods=['GET'])
+@role_required('admin')
+def get_email_outbox_stats():
+    """Email outbox queue depth and delivery latency"""
+    try:
+        window_hours = request.args.get('hours', 24, type=int)
+        return success_response(
+            "Email outbox statistics retrieved successfully",
+            data=outbox_stats(window_hours=max(1, min(window_hours, 24 * 30)))
+        )
+        
+    except Exception as e:
+        current_app.logger.error(f"Email outbox stats error: {str(e)}")
+        return error_response("Failed to retrieve email outbox statistics", status_code=500)
+
+@admin_bp.route('/email/outbox/dead', methods=['GET'])
+@role_required('admin')
+def get_dead_emails():
+    """Emails that exhausted their retries or were permanently refused"""
+    try:
+        page = request.args.get('page', 1, type=int)
+        per_page = min(request.args.get('per_page', 20, type=int), 100)
+        
+        query = EmailOutbox.query.filter_by(status='dead').order_by(EmailOutbox.created_at.desc())
+        result = paginate_query(query, page, per_page)
+        result['items'] = [entry.to_dict() for entry in result['items']]
+        
+        return success_response("Dead-lettered emails retrieved successfully", data=result)
+        
+    except Exception as e:
+        current_app.logger.error(f"Dead email list error: {str(e)}")
+        return error_response("Failed to retrieve dead-lettered emails", status_code=500)
+
+@admin_bp.route('/email/outbox/retry', methods=['POST'])
+@role_required('admin')
+@audit_sensitive_action('RETRY_DEAD_EMAILS')
+def retry_dead_emails():
+    """Requeue dead-lettered emails for delivery"""
+    try:
+        data = request.get_json() or {}
+        email_ids = data.get('email_ids')
+        if not isinstance(email_ids, list) or not email_ids:
+            return error_response("email_ids must be a non-empty list", status_code=400)
+        
+        requeued = requeue_dead(email_ids)
+        
+        admin_user = get_current_user()
+        log_admin_activity(
+            admin_id=admin_user.id,
+            action='retry_dead_emails',
+            details=f"Requeued {requeued} dead-lettered emails"
+        )
+        
+        return success_response(f"Requeued {requeued} emails", data={'requeued': requeued})
+        
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Retry dead emails error: {str(e)}")
+        return error_response("Failed to requeue emails", status_code=500)
+
 def calculate_approval_rate():
     """Calculate approval rate percentage"""
     try:
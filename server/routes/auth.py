@@ -17,7 +17,8 @@ from utils.security import (
     security_headers, rate_limit_check, secure_endpoint
 )
 from utils.logging_config import log_security_event, log_user_activity
-from utils.email_service import send_welcome_email, send_status_update_email
+from utils.email_outbox import queue_welcome_email
+from utils.tracing import span
 from datetime import datetime, timedelta
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/auth')
@@ -34,7 +35,8 @@ def register():
         # Validate with schema
         try:
             schema = RegisterSchema()
-            data = schema.load(json_data)
+            with span('marshmallow.load', schema='RegisterSchema'):
+                data = schema.load(json_data)
         except Exception as schema_error:
             # Fallback to manual validation if schema fails
             print(f"Schema error: {schema_error}")
@@ -96,15 +98,10 @@ def register():
         )
         
         db.session.add(profile)
-        db.session.commit()
         
-        # Send professional welcome email
-        try:
-            send_welcome_email(user)
-            current_app.logger.info(f"Welcome email sent to new student: {user.email}")
-        except Exception as e:
-            current_app.logger.error(f"Failed to send welcome email to {user.email}: {str(e)}")
-            # Don't fail registration if email fails
+        # Welcome email is delivered by email_worker.py once this commits
+        queue_welcome_email(user)
+        db.session.commit()
         
         current_app.logger.info(f"New student registered: {user.email}")
         
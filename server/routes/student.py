@@ -1,17 +1,30 @@
 # Student Routes for GAU-ID-View
-from flask import Blueprint, request, jsonify, current_app, send_file
+from flask import Blueprint, request, jsonify, current_app, url_for
 from flask_jwt_extended import jwt_required
-from models import User, StudentProfile, Announcement, db
+from werkzeug.security import safe_join
+from models import User, StudentProfile, Announcement, ImageJob, StudentDocument, db
 from utils.helpers import (
     success_response, error_response, validate_profile_data,
     role_required, get_current_user, save_uploaded_file
 )
-from utils.file_handler import save_uploaded_file as secure_save_file, delete_file, get_file_url
+from utils.file_handler import (
+    save_uploaded_file as secure_save_file, delete_file, get_file_url,
+    is_profile_photo, ensure_photo_variant, negotiate_image_format, photo_variant_source, PHOTO_SIZES,
+    accepts_upload
+)
+from utils.file_serving import verify_file_signature, send_upload
 from schemas import (
-    StudentProfileUpdateSchema, IDApplicationSchema, FileUploadSchema,
+    StudentProfileUpdateSchema, IDApplicationSchema, FileUploadSchema, UploadSessionSchema,
     validate_json, validate_args
 )
-from datetime import datetime, date
+from utils.image_jobs import get_image_queue, ImageQueueFull, expire_stale_job
+from utils.upload_sessions import (
+    UploadSessionError, create_upload_session, get_upload_session, append_chunk,
+    complete_upload_session, discard_upload_session
+)
+from utils.tracing import span
+import time
+from datetime import datetime, date, timedelta
 import os
 
 student_bp = Blueprint('student', __name__, url_prefix='/student')
@@ -402,6 +415,7 @@ def calculate_profile_completion(user, profile):
 
 @student_bp.route('/upload-photo', methods=['POST'])
 @role_required('student')
+@accepts_upload('photo')
 def upload_photo():
     """Upload profile photo"""
     try:
@@ -421,39 +435,79 @@ def upload_photo():
         if file.filename == '':
             return error_response("No file selected", status_code=400)
         
-        # Save the file
-        success, message, file_path = secure_save_file(
-            file, user.id, 'photo', 'profiles'
-        )
+        # Backpressure: refuse rather than queue more work than the pool can keep up with
+        queue = get_image_queue()
+        try:
+            queue.reserve()
+        except ImageQueueFull:
+            response, status_code = error_response(
+                "Photo processing is busy, please try again shortly", status_code=503
+            )
+            response.headers['Retry-After'] = '5'
+            return response, status_code
+        
+        try:
+            # Store the validated original; resizing happens in the image pool
+            with span('upload.photo'):
+                success, message, source_path = secure_save_file(
+                    file, user.id, 'photo', 'incoming', process=False
+                )
+            
+            if not success:
+                queue.release()
+                return error_response(message, status_code=400)
+            
+            job = ImageJob(user_id=user.id, source_path=source_path)
+            db.session.add(job)
+            db.session.commit()
+            queue.submit(job)
+        except Exception:
+            queue.release()
+            raise
         
-        if not success:
-            return error_response(message, status_code=400)
+        current_app.logger.info(f"Photo uploaded for user {user.id}: job {job.id}")
         
-        # Delete old photo if exists
-        if profile.photo_url:
-            delete_file(profile.photo_url)
-        
-        # Update profile with new photo path
-        profile.photo_url = file_path
-        profile.last_updated = datetime.utcnow()
-        db.session.commit()
-        
-        current_app.logger.info(f"Photo uploaded for user {user.id}: {file_path}")
+        if job.status == 'failed':
+            return error_response(job.error, status_code=400)
         
         return success_response(
-            message="Photo uploaded successfully",
-            data={
-                'photo_url': get_file_url(file_path),
-                'uploaded_at': datetime.utcnow().isoformat()
-            }
+            message="Photo uploaded successfully" if job.status == 'done' else "Photo uploaded, processing",
+            data=photo_job_data(job),
+            status_code=200 if job.status == 'done' else 202
         )
         
     except Exception as e:
+        db.session.rollback()
         current_app.logger.error(f"Photo upload error: {str(e)}")
         return error_response("Photo upload failed", status_code=500)
 
+@student_bp.route('/photo-jobs/<int:job_id>', methods=['GET'])
+@role_required('student')
+def get_photo_job(job_id):
+    """Status of a photo processing job"""
+    try:
+        user = get_current_user()
+        job = ImageJob.query.filter_by(id=job_id, user_id=user.id).first()
+        if not job:
+            return error_response("Photo job not found", status_code=404)
+        
+        expire_stale_job(job)
+        return success_response("Photo job retrieved successfully", data=photo_job_data(job))
+        
+    except Exception as e:
+        current_app.logger.error(f"Photo job error: {str(e)}")
+        return error_response("Failed to get photo job", status_code=500)
+
+def photo_job_data(job):
+    data = job.to_dict()
+    data['job_id'] = job.id
+    data['status_url'] = url_for('student.get_photo_job', job_id=job.id)
+    data['photo_url'] = get_file_url(job.result_path) if job.status == 'done' else None
+    return data
+
 @student_bp.route('/upload-document', methods=['POST'])
 @role_required('student')
+@accepts_upload('document')
 def upload_document():
     """Upload supporting document"""
     try:
@@ -473,41 +527,233 @@ def upload_document():
         description = request.form.get('description', '')
         
         # Save the file
-        success, message, file_path = secure_save_file(
-            file, user.id, 'document', 'supporting'
-        )
+        with span('upload.document'):
+            success, message, file_path = secure_save_file(
+                file, user.id, 'document', 'supporting'
+            )
         
         if not success:
             return error_response(message, status_code=400)
         
+        # The row is the reference save_uploaded_file counted for the stored file
+        document = StudentDocument(user_id=user.id, file_path=file_path, description=description)
+        db.session.add(document)
+        db.session.commit()
+        
         current_app.logger.info(f"Document uploaded for user {user.id}: {file_path}")
         
-        return success_response(
-            message="Document uploaded successfully",
-            data={
-                'file_path': file_path,
-                'file_url': get_file_url(file_path),
-                'description': description,
-                'uploaded_at': datetime.utcnow().isoformat()
-            }
-        )
+        data = document.to_dict()
+        data['file_url'] = get_file_url(file_path)
+        return success_response(message="Document uploaded successfully", data=data)
         
     except Exception as e:
+        db.session.rollback()
         current_app.logger.error(f"Document upload error: {str(e)}")
         return error_response("Document upload failed", status_code=500)
 
+# Resumable document uploads: create a session, PATCH chunks at Upload-Offset, then complete
+
+def upload_session_data(session):
+    data = session.to_dict()
+    data['session_id'] = session.id
+    data['upload_url'] = url_for('student.upload_document_chunk', session_id=session.id)
+    data['complete_url'] = url_for('student.complete_document_upload', session_id=session.id)
+    data['chunk_size'] = current_app.config.get('UPLOAD_CHUNK_SIZE', 1024 * 1024)
+    ttl = current_app.config.get('UPLOAD_SESSION_TTL', 24 * 3600)
+    data['expires_at'] = (session.updated_at + timedelta(seconds=ttl)).isoformat()
+    return data
+
+def upload_session_response(message, session, status_code=200):
+    response, status_code = success_response(message, data=upload_session_data(session), status_code=status_code)
+    response.headers['Upload-Offset'] = str(session.received)
+    response.headers['Cache-Control'] = 'no-store'
+    return response, status_code
+
+@student_bp.route('/upload-sessions', methods=['POST'])
+@role_required('student')
+@validate_json(UploadSessionSchema)
+def create_document_upload():
+    """Start a resumable document upload"""
+    try:
+        user = get_current_user()
+        data = request.validated_json
+        try:
+            session = create_upload_session(user.id, data['filename'], data['size'], data.get('description', ''))
+        except UploadSessionError as e:
+            return error_response(e.message, status_code=e.status_code)
+        db.session.commit()
+        
+        return upload_session_response("Upload session created", session, status_code=201)
+        
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Upload session error: {str(e)}")
+        return error_response("Failed to create upload session", status_code=500)
+
+@student_bp.route('/upload-sessions/<session_id>', methods=['GET'])
+@role_required('student')
+def get_document_upload(session_id):
+    """Offset to resume a document upload from"""
+    try:
+        session = get_upload_session(session_id, get_current_user().id)
+        if not session:
+            return error_response("Upload session not found", status_code=404)
+        
+        return upload_session_response("Upload session retrieved successfully", session)
+        
+    except Exception as e:
+        current_app.logger.error(f"Upload session error: {str(e)}")
+        return error_response("Failed to get upload session", status_code=500)
+
+@student_bp.route('/upload-sessions/<session_id>', methods=['PATCH'])
+@role_required('student')
+def upload_document_chunk(session_id):
+    """
+    Append a chunk to a document upload
+    
+    The body is raw bytes written at `Upload-Offset` (header, or
+    `?offset=`), which must equal the offset the server already has;
+    otherwise 409 with the current offset so the client can resume.
+    """
+    try:
+        session = get_upload_session(session_id, get_current_user().id)
+        if not session:
+            return error_response("Upload session not found", status_code=404)
+        
+        offset = request.headers.get('Upload-Offset', request.args.get('offset'))
+        try:
+            offset = int(offset)
+        except (TypeError, ValueError):
+            return error_response("Upload-Offset header is required", status_code=400)
+        
+        try:
+            with span('upload.chunk'):
+                append_chunk(session, offset, request.stream, request.content_length)
+        except UploadSessionError as e:
+            db.session.rollback()
+            received = session.received
+            if e.status_code == 415:
+                discard_upload_session(session, 'rejected')  # resuming cannot fix the content
+            response, status_code = error_response(e.message, status_code=e.status_code)
+            response.headers['Upload-Offset'] = str(received)
+            return response, status_code
+        db.session.commit()
+        
+        return upload_session_response("Chunk received", session)
+        
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Upload chunk error: {str(e)}")
+        return error_response("Failed to store chunk", status_code=500)
+
+@student_bp.route('/upload-sessions/<session_id>/complete', methods=['POST'])
+@role_required('student')
+def complete_document_upload(session_id):
+    """Validate and store a fully uploaded document"""
+    try:
+        user = get_current_user()
+        session = get_upload_session(session_id, user.id)
+        if not session:
+            return error_response("Upload session not found", status_code=404)
+        
+        try:
+            with span('upload.document'):
+                success, message, file_path = complete_upload_session(session)
+        except UploadSessionError as e:
+            return error_response(e.message, status_code=e.status_code)
+        
+        if not success:
+            db.session.rollback()
+            discard_upload_session(session, 'rejected')
+            return error_response(message, status_code=400)
+        
+        document = StudentDocument(user_id=user.id, file_path=file_path, description=session.description)
+        db.session.add(document)
+        db.session.delete(session)
+        db.session.commit()
+        
+        current_app.logger.info(f"Document uploaded for user {user.id}: {file_path}")
+        
+        data = document.to_dict()
+        data['file_url'] = get_file_url(file_path)
+        return success_response(message="Document uploaded successfully", data=data)
+        
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Document upload error: {str(e)}")
+        return error_response("Document upload failed", status_code=500)
+
+@student_bp.route('/upload-sessions/<session_id>', methods=['DELETE'])
+@role_required('student')
+def cancel_document_upload(session_id):
+    """Abandon a document upload and free its spool file"""
+    try:
+        session = get_upload_session(session_id, get_current_user().id)
+        if not session:
+            return error_response("Upload session not found", status_code=404)
+        
+        discard_upload_session(session)
+        return success_response("Upload session cancelled")
+        
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Upload session error: {str(e)}")
+        return error_response("Failed to cancel upload session", status_code=500)
+
 @student_bp.route('/files/<path:filename>')
 def serve_file(filename):
-    """Serve uploaded files (for development only)"""
+    """
+    Serve uploaded files
+    
+    URLs from `get_file_url` carry an expiring HMAC signature instead of
+    a login, so nginx can be pointed here without Python checking a JWT
+    or touching the database; the body itself is handed back to nginx
+    (X-Accel-Redirect) or Apache (X-Sendfile) when FILE_SERVING says so.
+    
+    Profile photos take `?size=thumb|medium|print|full` and
+    `?format=jpeg|webp`; without `format` WebP is sent to clients whose
+    Accept header lists it. Missing derivatives are regenerated on demand.
+    """
     try:
         upload_dir = current_app.config.get('UPLOAD_FOLDER', 'uploads')
-        file_path = os.path.join(upload_dir, filename)
+        if safe_join(upload_dir, filename) is None:
+            # `..` segments or an absolute path: never touch anything outside the upload folder
+            return error_response("File not found", status_code=404)
         
-        if not os.path.exists(file_path):
+        max_age = None
+        if current_app.config.get('FILE_URLS_SIGNED', True):
+            expires = request.args.get('expires')
+            if not verify_file_signature(filename, expires, request.args.get('sig')):
+                return error_response("Invalid or expired file link", status_code=403)
+            max_age = int(expires) - int(time.time())
+        
+        negotiated = False
+        if is_profile_photo(filename):
+            size = request.args.get('size', 'full')
+            if size != 'full' and size not in PHOTO_SIZES:
+                return error_response(f"Unknown photo size: {size}", status_code=400)
+            
+            image_format = negotiate_image_format(request.args.get('format'), request.accept_mimetypes)
+            if image_format is None:
+                return error_response(f"Unknown photo format: {request.args.get('format')}", status_code=400)
+            negotiated = 'format' not in request.args
+            
+            if os.path.exists(os.path.join(upload_dir, filename)):
+                filename = ensure_photo_variant(filename, size, image_format)
+        elif not os.path.exists(os.path.join(upload_dir, filename)):
+            # A derivative linked directly (get_file_url with a size) that is not stored yet
+            source = photo_variant_source(filename)
+            if source and os.path.exists(os.path.join(upload_dir, source[0])):
+                filename = ensure_photo_variant(*source)
+        
+        response = send_upload(filename, max_age)
+        if response is None:
             return error_response("File not found", status_code=404)
         
-        return send_file(file_path)
+        if negotiated:
+            response.vary.add('Accept')
+        return response
         
     except Exception as e:
         current_app.logger.error(f"File serve error: {str(e)}")
-        return error_response("Failed to serve file", status_code=500)
\ No newline at end of file
+        return error_response("Failed to serve file", status_code=500)
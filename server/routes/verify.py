@@ -0,0 +1,27 @@
+# Public ID card verification for GAU-ID-View
+from flask import Blueprint, current_app
+from utils.helpers import success_response, error_response
+from utils.card_verification import verify_card_payload, InvalidCardPayload
+
+verify_bp = Blueprint('verify', __name__, url_prefix='/verify')
+
+@verify_bp.route('/<path:payload>', methods=['GET'])
+def verify_card(payload):
+    """
+    Check a scanned card QR payload (gates, library desks)
+
+    No login and no database read: the signature and expiry come from the
+    payload, revocations from this process's in-memory set. Always 200 for
+    a card payload, with `valid` and a `reason`; 400 for anything else.
+    """
+    try:
+        result = verify_card_payload(payload)
+    except InvalidCardPayload as e:
+        return error_response(str(e), status_code=400)
+    except Exception as e:
+        current_app.logger.error(f"Card verification error: {str(e)}")
+        return error_response("Failed to verify card", status_code=500)
+
+    response, status = success_response("Card is valid" if result['valid'] else "Card is not valid", data=result)
+    response.headers['Cache-Control'] = 'no-store'
+    return response, status
@@ -142,6 +142,11 @@ class FileUploadSchema(Schema):
     file_type = fields.Str(required=True, validate=validate.OneOf(['photo', 'document']))
     description = fields.Str(validate=validate.Length(max=200))
 
+class UploadSessionSchema(Schema):
+    filename = fields.Str(required=True, validate=validate.Length(min=1, max=255))
+    size = fields.Int(required=True, validate=validate.Range(min=1))
+    description = fields.Str(validate=validate.Length(max=200))
+
 # Response schemas
 class UserResponseSchema(Schema):
     id = fields.Int()
@@ -185,10 +190,12 @@ def validate_json(schema_class):
         def wrapper(*args, **kwargs):
             from flask import request, jsonify
             from utils.helpers import error_response
+            from utils.tracing import span
             
             try:
                 schema = schema_class()
-                result = schema.load(request.get_json() or {})
+                with span('marshmallow.load', schema=schema_class.__name__):
+                    result = schema.load(request.get_json() or {})
                 request.validated_json = result
                 return f(*args, **kwargs)
             except ValidationError as err:
@@ -206,10 +213,12 @@ def validate_args(schema_class):
         def wrapper(*args, **kwargs):
             from flask import request
             from utils.helpers import error_response
+            from utils.tracing import span
             
             try:
                 schema = schema_class()
-                result = schema.load(request.args.to_dict())
+                with span('marshmallow.load', schema=schema_class.__name__):
+                    result = schema.load(request.args.to_dict())
                 request.validated_args = result
                 return f(*args, **kwargs)
             except ValidationError as err:
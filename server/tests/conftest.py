@@ -0,0 +1,25 @@
+# Shared fixtures for GAU-ID-View tests
+import os
+import sys
+import pytest
+
+# Add the server directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.smtp_sink import SMTPSink
+
+@pytest.fixture
+def smtp_sink():
+    """In-process SMTP server capturing every message sent to it"""
+    sink = SMTPSink().start()
+    yield sink
+    sink.stop()
+
+@pytest.fixture
+def smtp_settings(smtp_sink):
+    """`SMTPConnection` settings pointing at the sink"""
+    return {
+        'server': '127.0.0.1', 'port': smtp_sink.port, 'use_tls': False, 'use_ssl': False,
+        'username': None, 'password': None, 'timeout': 5,
+        'max_messages': 100, 'idle_timeout': 60
+    }
@@ -0,0 +1,143 @@
+# Tests for GAU-ID-View cached analytics and conditional responses
+import os
+import sys
+import pytest
+from sqlalchemy import event
+
+# Add the server directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask_jwt_extended import create_access_token
+from app import create_app
+from models import db, User, StudentProfile, AdminActivity
+from utils.analytics import AnalyticsManager
+from utils.analytics_cache import data_version, get_analytics_cache, ANALYTICS_CACHE, STUDENTS_VERSION
+
+def cache_count(method, result):
+    return ANALYTICS_CACHE.samples.get((('method', method), ('result', result)), 0)
+
+class TestAnalyticsCache:
+    """Test suite for the analytics result cache, data versions and ETags"""
+
+    @pytest.fixture
+    def app(self):
+        """Create application with an admin and two students, one approved"""
+        app = create_app('testing')
+
+        with app.app_context():
+            db.create_all()
+            for index in range(2):
+                student = User(
+                    name=f'Stats Student {index}', reg_number=f'GAU/STA/00{index}',
+                    email=f'stats{index}@students.gau.ac.ke', department='Education', password_hash='x'
+                )
+                db.session.add(student)
+                db.session.flush()
+                db.session.add(StudentProfile(user_id=student.id, status='approved' if index else 'pending'))
+            db.session.add(User(
+                name='Stats Admin', reg_number='GAU/ADM/STA', email='stats-admin@gau.ac.ke',
+                department='Administration', password_hash='x', role='admin'
+            ))
+            db.session.commit()
+            yield app
+            db.session.remove()
+            db.drop_all()
+
+    def _headers(self, **extra):
+        admin = User.query.filter_by(role='admin').first()
+        return dict({'Authorization': f'Bearer {create_access_token(identity=admin.id)}'}, **extra)
+
+    def test_writes_bump_data_version(self, app):
+        """Test ORM and bulk writes bump the versions covering their tables, other writes and rollbacks do not"""
+        version = data_version()
+        profile = StudentProfile.query.first()
+        profile.status = 'reviewing'
+        db.session.commit()
+        assert data_version() == version + 1
+
+        db.session.execute(User.__table__.update().where(User.role == 'student').values(department='Business'))
+        db.session.commit()
+        assert data_version() == version + 2
+
+        db.session.add(AdminActivity(admin_id=profile.user_id, action='test'))
+        db.session.rollback()
+        db.session.commit()
+        assert profile.status == 'reviewing'
+        profile.status = 'reviewing'  # unchanged, so nothing is written
+        db.session.commit()
+        assert data_version() == version + 2
+
+        # Admin activity is analytics data, but not student data
+        students = data_version(STUDENTS_VERSION)
+        db.session.add(AdminActivity(admin_id=profile.user_id, action='test'))
+        db.session.commit()
+        assert data_version() == version + 3 and data_version(STUDENTS_VERSION) == students
+        profile.status = 'approved'
+        db.session.commit()
+        assert data_version() == version + 4 and data_version(STUDENTS_VERSION) == students + 1
+
+    def test_results_cached_until_data_changes(self, app):
+        """Test a repeated call is a hit, and a write makes the next call recompute"""
+        misses = cache_count('get_status_distribution', 'miss')
+        first = AnalyticsManager.get_status_distribution()
+        assert AnalyticsManager.get_status_distribution() is first
+        assert cache_count('get_status_distribution', 'miss') == misses + 1
+
+        profile = StudentProfile.query.filter_by(status='pending').one()
+        profile.status = 'approved'
+        db.session.commit()
+        assert AnalyticsManager.get_status_distribution() == {'approved': {'count': 2, 'percentage': 100.0}}
+
+        # Keyword and positional arguments share an entry; other arguments do not
+        trends = AnalyticsManager.get_monthly_trends(6)
+        assert AnalyticsManager.get_monthly_trends(months=6) is trends
+        assert AnalyticsManager.get_monthly_trends(3) is not trends
+
+        app.config['ANALYTICS_CACHE_ENABLED'] = False
+        assert AnalyticsManager.get_status_distribution() is not AnalyticsManager.get_status_distribution()
+
+    def test_etag_and_not_modified(self, app):
+        """Test an unchanged dashboard gets 304 without running analytics queries, and a change a new ETag"""
+        client = app.test_client()
+        response = client.get('/admin/analytics/overview', headers=self._headers())
+        assert response.status_code == 200 and response.get_json()['data']['total_students'] == 2
+        etag = response.headers['ETag']
+        assert etag.startswith('W/') and response.headers['Cache-Control'] == 'private, no-cache'
+
+        headers = self._headers(**{'If-None-Match': etag})
+        statements = []
+
+        def listener(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            response = client.get('/admin/analytics/overview', headers=headers)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+        assert response.status_code == 304 and response.headers['ETag'] == etag and not response.data
+        assert not any('student_profiles' in statement for statement in statements)
+
+        db.session.add(User(
+            name='Stats Student 2', reg_number='GAU/STA/002', email='stats2@students.gau.ac.ke',
+            department='Education', password_hash='x'
+        ))
+        db.session.commit()
+        response = client.get('/admin/analytics/overview', headers=headers)
+        assert response.status_code == 200 and response.headers['ETag'] != etag
+        assert response.get_json()['data']['total_students'] == 3
+
+        response = client.get('/admin/analytics/trends?months=3', headers=headers)
+        assert response.status_code == 200 and len(response.get_json()['data']['trends']) == 3
+        assert 'ETag' not in client.get('/admin/analytics/system-health', headers=self._headers()).headers
+
+    def test_ttl_is_a_ceiling(self, app, monkeypatch):
+        """Test a cached result is recomputed once its TTL window ends, even with no writes"""
+        app.config['ANALYTICS_CACHE_TTLS'] = dict(app.config['ANALYTICS_CACHE_TTLS'], get_overview_stats=60)
+        now = [1_000_000.0]
+        monkeypatch.setattr('utils.analytics_cache.time.time', lambda: now[0])
+        first = AnalyticsManager.get_overview_stats()
+        assert AnalyticsManager.get_overview_stats() is first
+        now[0] += 60
+        assert AnalyticsManager.get_overview_stats() is not first
+        assert len(get_analytics_cache().entries) == 2
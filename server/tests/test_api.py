@@ -99,6 +99,14 @@ class TestGAUIDViewAPI:
         assert response.status_code == 200
         assert 'healthy' in response.json['status']
     
+    def test_metrics_endpoint(self, client):
+        """Test Prometheus metrics endpoint"""
+        client.get('/health')
+        response = client.get('/metrics')
+        assert response.status_code == 200
+        assert response.content_type.startswith('text/plain')
+        assert 'http_requests_total{endpoint="/health",method="GET",status="200"}' in response.get_data(as_text=True)
+    
     def test_api_info(self, client):
         """Test API info endpoint"""
         response = client.get('/api/info')
@@ -0,0 +1,453 @@
+# Tests for GAU-ID-View pooled email delivery
+import os
+import sys
+import time
+import tempfile
+import threading
+import pytest
+import smtplib
+from datetime import datetime, timedelta
+from sqlalchemy.orm import Query
+
+# Add the server directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.smtp_sink import SMTPSink
+from app import create_app
+from models import db, User, EmailOutbox, Announcement, AnnouncementBroadcast
+from utils.mail_pool import MailPool, SMTPConnection
+from types import SimpleNamespace
+from utils.email_service import build_status_update_email, email_templates
+from utils.email_templates import inline_css, parse_css_rules
+from utils.broadcasts import start_broadcast, claim_due_broadcast, send_broadcast_chunk, BROADCAST_RECIPIENTS
+from utils.email_outbox import (
+    queue_welcome_email, queue_status_update_email, claim_batch, deliver_batch,
+    outbox_stats, requeue_dead, message_id_for
+)
+from email_worker import EmailWorker
+
+class TestMailPool:
+    """Test suite for persistent SMTP connections"""
+
+    def test_pool_reuses_connections(self, smtp_sink, smtp_settings):
+        """Test that many messages share one connection per sender thread"""
+        pool = MailPool(smtp_settings, workers=2)
+        for index in range(20):
+            assert pool.submit('admin@gau.ac.ke', [f'student{index}@gau.ac.ke'], b'Subject: hi\r\n\r\nbody\r\n')
+        pool.shutdown(timeout=10)
+
+        assert smtp_sink.messages == 20
+        assert smtp_sink.connections <= 2
+        assert not pool.submit('admin@gau.ac.ke', ['late@gau.ac.ke'], b'body')
+
+    def test_connection_recycled_after_message_cap(self, smtp_sink, smtp_settings):
+        """Test that a connection is reopened after max_messages"""
+        connection = SMTPConnection(dict(smtp_settings, max_messages=3))
+        for _ in range(7):
+            connection.send('admin@gau.ac.ke', ['student@gau.ac.ke'], b'Subject: hi\r\n\r\nbody\r\n')
+        connection.close()
+
+        assert smtp_sink.messages == 7
+        assert smtp_sink.connections == 3
+
+    def test_dropped_session_is_reopened(self, smtp_sink, smtp_settings):
+        """Test that a message is resent once on a new session after a disconnect"""
+        smtp_sink.fail_next(1, code=None)
+        connection = SMTPConnection(smtp_settings)
+        connection.send('admin@gau.ac.ke', ['student@gau.ac.ke'], b'Subject: hi\r\n\r\nbody\r\n')
+        connection.close()
+
+        assert smtp_sink.messages == 1
+        assert smtp_sink.connections == 2
+        assert smtp_sink.captured[0].recipients == ['student@gau.ac.ke']
+        assert smtp_sink.captured[0]['Subject'] == 'hi'
+
+    def test_shutdown_with_full_queue_keeps_deadline(self, smtp_settings):
+        """Test shutdown returns by its deadline when the queue is full and SMTP is stuck"""
+        pool = MailPool(smtp_settings, workers=1, queue_size=1)
+        release = threading.Event()
+        pool._deliver = lambda *args: release.wait(5)  # SMTP hanging
+        assert pool.submit('admin@gau.ac.ke', ['a@gau.ac.ke'], b'body')
+        time.sleep(0.1)  # the sender thread holds the first message
+        assert pool.submit('admin@gau.ac.ke', ['b@gau.ac.ke'], b'body')  # the queue is now full
+
+        started = time.monotonic()
+        pool.shutdown(timeout=0.5)
+        assert time.monotonic() - started < 2
+        release.set()
+
+class TestEmailOutbox:
+    """Test suite for the durable email outbox"""
+
+    @pytest.fixture
+    def app(self):
+        """Create application with a temporary database"""
+        db_fd, db_path = tempfile.mkstemp(suffix='.db')
+        
+        app = create_app('testing')
+        app.config.update({
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}',
+            'EMAIL_OUTBOX_MAX_ATTEMPTS': 2
+        })
+        
+        with app.app_context():
+            db.create_all()
+            yield app
+            db.session.remove()
+            db.drop_all()
+        
+        os.close(db_fd)
+        os.unlink(db_path)
+
+    @pytest.fixture
+    def student(self, app):
+        user = User(
+            name='Outbox Student', reg_number='GAU/OUT/001', email='outbox@students.gau.ac.ke',
+            department='Computer Science', password_hash='x'
+        )
+        db.session.add(user)
+        db.session.commit()
+        return user
+
+    def test_enqueue_is_idempotent(self, app, student):
+        """Test that the same event is only queued once"""
+        queue_welcome_email(student)
+        queue_welcome_email(student)
+        db.session.commit()
+
+        assert EmailOutbox.query.count() == 1
+        assert outbox_stats()['queue_depth'] == 1
+
+    def test_concurrent_enqueue_reuses_the_committed_row(self, app, student, monkeypatch):
+        """Test losing the insert race to another request keeps the caller's transaction usable"""
+        with db.engine.begin() as connection:
+            connection.execute(EmailOutbox.__table__.insert().values(
+                idempotency_key=f'welcome:{student.id}', recipient=student.email, template='welcome',
+                context='{}', status='pending', next_attempt_at=datetime.utcnow()
+            ))
+        student.department = 'Education'
+        monkeypatch.setattr(Query, 'first', lambda query: None)  # the other insert lands after our check
+        entry = queue_welcome_email(student)
+        monkeypatch.undo()
+        db.session.commit()
+
+        assert entry.context == '{}' and EmailOutbox.query.count() == 1
+        assert db.session.get(User, student.id).department == 'Education'
+
+    def test_claim_and_deliver(self, app, student, smtp_sink, smtp_settings):
+        """Test that claimed rows are sent over one connection and marked sent"""
+        queue_welcome_email(student)
+        db.session.commit()
+
+        connection = SMTPConnection(smtp_settings)
+        entries = claim_batch('test-worker')
+        assert len(entries) == 1
+        assert claim_batch('other-worker') == []
+
+        assert deliver_batch(entries, connection) == 1
+        connection.close()
+
+        entry = EmailOutbox.query.first()
+        assert entry.status == 'sent'
+        assert smtp_sink.messages == 1
+        assert smtp_sink.captured[0]['Message-ID'] == message_id_for(entry)
+        assert outbox_stats()['delivery_latency_seconds']['delivered'] == 1
+
+    def test_transient_reply_retried_permanent_dead_lettered(self, app, student, smtp_sink, smtp_settings):
+        """Test that 4xx replies are rescheduled and refused recipients dead-lettered"""
+        queue_welcome_email(student)
+        bounced = User(
+            name='Gone Student', reg_number='GAU/OUT/002', email='gone@students.gau.ac.ke',
+            department='Computer Science', password_hash='x'
+        )
+        db.session.add(bounced)
+        db.session.flush()
+        queue_welcome_email(bounced)
+        db.session.commit()
+
+        smtp_sink.fail_next(1, code=451)
+        smtp_sink.reject.add('gone@students.gau.ac.ke')
+        connection = SMTPConnection(smtp_settings)
+        assert deliver_batch(claim_batch('test-worker'), connection) == 0
+
+        first, second = EmailOutbox.query.order_by(EmailOutbox.id).all()
+        assert (first.status, second.status) == ('pending', 'dead')
+        assert first.last_error.startswith('SMTPDataError: (451')
+
+        first.next_attempt_at = datetime.utcnow()
+        db.session.commit()
+        assert deliver_batch(claim_batch('test-worker'), connection) == 1
+        connection.close()
+
+        assert smtp_sink.failures == 1
+        assert smtp_sink.connections == 1
+        assert [message.recipients for message in smtp_sink.captured] == [['outbox@students.gau.ac.ke']]
+
+    def test_worker_delivers_registration_and_approval(self, app, student, smtp_sink):
+        """Test the worker sends queued notifications to the configured relay"""
+        app.config.update({
+            'MAIL_SERVER': '127.0.0.1', 'MAIL_PORT': smtp_sink.port, 'MAIL_USE_TLS': False,
+            'MAIL_USERNAME': 'sink', 'MAIL_PASSWORD': None, 'MAIL_SUPPRESS_SEND': False
+        })
+        queue_welcome_email(student)
+        queue_status_update_email(student, 'approved')
+        db.session.commit()
+
+        worker = EmailWorker(app, worker_id='test-worker')
+        assert worker.run_once() == 2
+        worker.connection.close()
+
+        assert smtp_sink.wait_for(2, timeout=5)
+        subjects = [message['Subject'] for message in smtp_sink.messages_to('outbox@students.gau.ac.ke')]
+        assert subjects == [
+            '🎉 Welcome to GAU-ID-View - Your Account is Ready!',
+            'GAU-ID-View: Application Approved! 🎉'
+        ]
+        assert all(message.received_at >= message.started_at for message in smtp_sink.captured)
+
+    def test_failures_back_off_then_dead_letter(self, app, student):
+        """Test retry scheduling and dead-lettering after max attempts"""
+        queue_welcome_email(student)
+        db.session.commit()
+
+        # Nothing listens on this port
+        sink = SMTPSink()
+        port = sink.port
+        sink.server_close()
+        connection = SMTPConnection({
+            'server': '127.0.0.1', 'port': port, 'use_tls': False, 'use_ssl': False,
+            'username': None, 'password': None, 'timeout': 1, 'max_messages': 100, 'idle_timeout': 60
+        })
+
+        deliver_batch(claim_batch('test-worker'), connection)
+        entry = EmailOutbox.query.first()
+        assert entry.status == 'pending'
+        assert entry.next_attempt_at > datetime.utcnow()
+
+        entry.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+        db.session.commit()
+        deliver_batch(claim_batch('test-worker'), connection)
+        assert EmailOutbox.query.first().status == 'dead'
+
+        assert requeue_dead([entry.id]) == 1
+        assert EmailOutbox.query.first().status == 'pending'
+
+class TestEmailTemplates:
+    """Test suite for compiled email templates"""
+
+    def test_css_inlined_and_templates_cached(self):
+        """Test that class rules become inline styles and author styles win"""
+        rules = parse_css_rules('.box { color: red; padding: 4px } p { margin: 0 } .box:hover { color: blue }')
+        html = inline_css('<body><div class="box" style="color: green">x</div><p>y</p></body>', rules)
+
+        assert 'style="color: green; padding: 4px"' in html
+        assert '<p style="margin: 0">' in html
+        assert email_templates.get('welcome.html')[0] is email_templates.get('welcome.html')[0]
+
+    def test_status_email_escapes_user_data(self):
+        """Test that user data is bound as variables and escaped in HTML"""
+        user = SimpleNamespace(
+            name='<b>Amina</b>', email='amina@students.gau.ac.ke',
+            reg_number='GAU/CS/001', department='Computer Science'
+        )
+        subject, html_body, text_body = build_status_update_email(user, 'rejected', 'Photo {{ too dark }}')
+
+        assert subject == 'GAU-ID-View: Application Update Required 📝'
+        assert '&lt;b&gt;Amina&lt;/b&gt;' in html_body
+        assert 'Photo {{ too dark }}' in html_body
+        assert 'Hello <b>Amina</b>' in text_body
+        assert 'class="highlight-box" style="background: linear-gradient(135deg, #f56565' in html_body
+
+class ScriptedConnection:
+    """SMTP stand-in that records recipients and runs a callback before the Nth send"""
+
+    def __init__(self, on_send=None, crash_on=None):
+        self.on_send = on_send or {}
+        self.crash_on = crash_on
+        self.sent = []
+
+    def send(self, sender, recipients, message_bytes):
+        number = len(self.sent) + 1
+        if number == self.crash_on:
+            raise SystemExit('worker killed')
+        self.sent.extend(recipients)
+        if number in self.on_send:
+            self.on_send[number]()
+        return {}
+
+    def close(self):
+        pass
+
+class TestAnnouncementBroadcast:
+    """Test suite for chunked announcement broadcasts"""
+
+    @pytest.fixture
+    def app(self):
+        """Create application with seven students"""
+        db_fd, db_path = tempfile.mkstemp(suffix='.db')
+        
+        app = create_app('testing')
+        app.config.update({
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}',
+            'BROADCAST_CHUNK_SIZE': 3,
+            'BROADCAST_RATE_PER_MINUTE': 60000
+        })
+        
+        with app.app_context():
+            db.create_all()
+            for index in range(7):
+                db.session.add(User(
+                    name=f'Student {index}', reg_number=f'GAU/BC/{index:03d}',
+                    email=f'student{index}@students.gau.ac.ke', department='Education', password_hash='x'
+                ))
+            db.session.add(User(
+                name='Staff', reg_number='GAU/ST/001', email='staff@gau.ac.ke',
+                department='Registry', password_hash='x', role='staff'
+            ))
+            db.session.commit()
+            yield app
+            db.session.remove()
+            db.drop_all()
+        
+        os.close(db_fd)
+        os.unlink(db_path)
+
+    def _announcement(self):
+        announcement = Announcement(
+            title='ID card collection day', message='Collect your card from the registry on Friday.',
+            priority='urgent', target_role='student', created_by=1
+        )
+        db.session.add(announcement)
+        return announcement
+
+    def _drain(self, connection):
+        while True:
+            broadcast = claim_due_broadcast()
+            if broadcast is None:
+                return
+            send_broadcast_chunk(broadcast, connection)
+            broadcast.next_chunk_at = datetime.utcnow()
+            db.session.commit()
+
+    def test_merge_broadcast_pages_through_audience(self, app, smtp_sink, smtp_settings):
+        """Test keyset chunks reach every student once and complete"""
+        broadcast = start_broadcast(self._announcement(), created_by=1, mode='merge')
+        db.session.commit()
+        assert broadcast.total_recipients == 7
+
+        connection = SMTPConnection(smtp_settings)
+        self._drain(connection)
+        connection.close()
+
+        assert smtp_sink.messages == 7
+        assert smtp_sink.connections == 1
+        assert len(smtp_sink.messages_to('student6@students.gau.ac.ke')) == 1
+        assert broadcast.status == 'completed'
+        assert broadcast.to_dict()['progress_percent'] == 100.0
+
+    def test_bcc_broadcast_sends_one_message_per_chunk(self, app, smtp_sink, smtp_settings):
+        """Test BCC mode renders and sends once per chunk"""
+        broadcast = start_broadcast(self._announcement(), created_by=1, mode='bcc', rate_per_minute=60)
+        db.session.commit()
+
+        connection = SMTPConnection(smtp_settings)
+        send_broadcast_chunk(claim_due_broadcast(), connection)
+        assert broadcast.sent_count == 3
+        assert claim_due_broadcast() is None  # paced: next chunk not yet due
+
+        broadcast.next_chunk_at = datetime.utcnow()
+        db.session.commit()
+        self._drain(connection)
+        connection.close()
+
+        assert smtp_sink.messages == 3
+        assert broadcast.sent_count == 7
+        assert smtp_sink.captured[0]['Bcc'] is None  # BCC stays out of the headers
+
+    def test_merge_progress_saved_per_recipient(self, app):
+        """Test a worker dying mid-chunk leaves the cursor after the last recipient mailed"""
+        broadcast = start_broadcast(self._announcement(), created_by=1, mode='merge')
+        db.session.commit()
+        connection = ScriptedConnection(crash_on=2)
+
+        with pytest.raises(SystemExit):
+            send_broadcast_chunk(claim_due_broadcast(), connection)
+        db.session.rollback()
+        assert broadcast.sent_count == 1
+        assert broadcast.last_user_id == User.query.filter_by(email=connection.sent[0]).one().id
+
+    def test_temporary_reply_retried_from_that_recipient(self, app, smtp_sink, smtp_settings):
+        """Test a 4xx reply stops the chunk and the recipient is mailed on retry; only 5xx counts as failed"""
+        broadcast = start_broadcast(self._announcement(), created_by=1, mode='merge')
+        db.session.commit()
+        smtp_sink.reject.add('student2@students.gau.ac.ke')
+        smtp_sink.fail_next(1, code=451)  # greylisted
+        connection = SMTPConnection(smtp_settings)
+
+        assert send_broadcast_chunk(claim_due_broadcast(), connection) == 0
+        assert broadcast.last_user_id == 0 and broadcast.sent_count == broadcast.failed_count == 0
+        assert broadcast.last_error.startswith('SMTPDataError: (451')
+        assert broadcast.next_chunk_at > datetime.utcnow() + timedelta(seconds=50)
+
+        broadcast.next_chunk_at = datetime.utcnow()
+        db.session.commit()
+        self._drain(connection)
+        connection.close()
+        assert len(smtp_sink.messages_to('student0@students.gau.ac.ke')) == 1
+        assert smtp_sink.messages == 6
+        assert broadcast.status == 'completed' and broadcast.sent_count == 6 and broadcast.failed_count == 1
+
+    def test_smtp_failure_mid_chunk_keeps_counts(self, app):
+        """Test recipients mailed before a connection failure are saved and counted in the metric"""
+        broadcast = start_broadcast(self._announcement(), created_by=1, mode='merge')
+        db.session.commit()
+        sent = BROADCAST_RECIPIENTS.samples.get((('outcome', 'sent'),), 0)
+
+        def disconnect():
+            raise smtplib.SMTPServerDisconnected('Connection unexpectedly closed')
+
+        connection = ScriptedConnection(on_send={3: disconnect})
+        send_broadcast_chunk(claim_due_broadcast(), connection)
+        assert broadcast.sent_count == 2 and broadcast.last_error.startswith('SMTPServerDisconnected')
+        assert BROADCAST_RECIPIENTS.samples.get((('outcome', 'sent'),), 0) == sent + 2
+
+    def test_cancel_mid_chunk_stops_and_sticks(self, app):
+        """Test a broadcast cancelled while a chunk is sending stops there and is not completed"""
+        broadcast = start_broadcast(self._announcement(), created_by=1, mode='merge')
+        db.session.commit()
+
+        def cancel():
+            AnnouncementBroadcast.query.filter_by(id=broadcast.id).update({'status': 'cancelled'})
+            db.session.commit()
+
+        connection = ScriptedConnection(on_send={1: cancel})
+        send_broadcast_chunk(claim_due_broadcast(), connection)
+        assert len(connection.sent) == 1 and broadcast.status == 'cancelled'
+        assert broadcast.next_chunk_at <= datetime.utcnow()  # not rescheduled
+
+        # A worker that reaches the end of the audience does not mark it completed either
+        broadcast.last_user_id = 10 ** 6
+        db.session.commit()
+        assert send_broadcast_chunk(broadcast, connection) == 0
+        assert broadcast.status == 'cancelled' and broadcast.completed_at is None
+
+    def test_lease_renewed_and_lost(self, app):
+        """Test each message renews the lease, and a chunk stops once another worker holds it"""
+        broadcast = start_broadcast(self._announcement(), created_by=1, mode='merge')
+        db.session.commit()
+        claimed = claim_due_broadcast()
+        leases = []
+
+        def steal():
+            leases.append(broadcast.locked_until)
+            if len(leases) == 2:
+                AnnouncementBroadcast.query.filter_by(id=broadcast.id).update(
+                    {'locked_until': datetime.utcnow() + timedelta(minutes=10)}
+                )
+                db.session.commit()
+
+        connection = ScriptedConnection(on_send={1: steal, 2: steal})
+        send_broadcast_chunk(claimed, connection)
+        assert leases[1] > leases[0]  # renewed after the first message
+        assert len(connection.sent) == 2 and broadcast.sent_count == 1  # the thief owns the rest
+
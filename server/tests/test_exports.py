@@ -0,0 +1,354 @@
+# Tests for GAU-ID-View student exports
+import io
+import os
+import csv
+import sys
+import gzip
+import pytest
+import zipfile
+from datetime import datetime, timedelta
+from sqlalchemy import text, event
+from PIL import Image
+
+# Add the server directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask_jwt_extended import create_access_token
+from app import create_app
+from models import db, User, StudentProfile, AdminActivity, ExportJob
+from utils.exports import csv_chunks, student_changes_query, EXPORT_HEADER, CHANGE_HEADER
+from utils.export_jobs import evict_exports, student_data_version
+from utils.file_handler import store_photo
+from utils.photo_export import photo_archive_chunks, MANIFEST_NAME
+
+def read_csv(data):
+    return list(csv.reader(io.StringIO(data.decode('utf-8'))))
+
+class TestStreamingExport:
+    """Test suite for the streamed CSV student export"""
+
+    @pytest.fixture
+    def app(self, tmp_path):
+        """Create application with an admin and students in two departments, one without a profile"""
+        app = create_app('testing')
+        app.config['EXPORT_FOLDER'] = str(tmp_path / 'exports')
+
+        with app.app_context():
+            db.create_all()
+            for index in range(6):
+                student = User(
+                    name=f'Export Student {index}', reg_number=f'GAU/EXP/00{index}',
+                    email=f'export{index}@students.gau.ac.ke',
+                    department='Computer Science' if index % 2 else 'Education', password_hash='x'
+                )
+                db.session.add(student)
+                db.session.flush()
+                if index < 5:
+                    db.session.add(StudentProfile(
+                        user_id=student.id, status='approved' if index < 2 else 'pending',
+                        year_of_study='Year 2', approved_at=datetime(2024, 9, 1) if index < 2 else None,
+                        card_printed=index == 0
+                    ))
+            db.session.add(User(
+                name='Export Admin', reg_number='GAU/ADM/EXP', email='export-admin@gau.ac.ke',
+                department='Administration', password_hash='x', role='admin'
+            ))
+            db.session.commit()
+            yield app
+            db.session.remove()
+            db.drop_all()
+
+    def _headers(self, **extra):
+        admin = User.query.filter_by(role='admin').first()
+        return dict({'Authorization': f'Bearer {create_access_token(identity=admin.id)}'}, **extra)
+
+    def test_export_streams_csv(self, app):
+        """Test the export is a streamed CSV of every student, with the admin action logged"""
+        response = app.test_client().get('/admin/export/students', headers=self._headers())
+        assert response.status_code == 200 and response.mimetype == 'text/csv'
+        assert response.is_streamed and 'Content-Encoding' not in response.headers
+        assert 'attachment' in response.headers['Content-Disposition']
+
+        rows = read_csv(response.data)
+        assert rows[0] == EXPORT_HEADER and len(rows) == 7
+        first = dict(zip(rows[0], rows[1]))
+        assert first['Name'] == 'Export Student 0' and first['Status'] == 'approved'
+        assert first['Approved Date'] == '2024-09-01' and first['Card Printed'] == 'Yes'
+        assert dict(zip(rows[0], rows[6]))['Status'] == ''  # no profile yet
+        assert AdminActivity.query.filter_by(action='export_students_data').one().details == 'Exported 6 student records'
+
+    def test_repeat_export_is_served_from_artifact(self, app, tmp_path):
+        """Test an identical export is read from disk until the data changes, with ETag and Range"""
+        client = app.test_client()
+        gzip_headers = self._headers(**{'Accept-Encoding': 'gzip'})
+        first = client.get('/admin/export/students?status=approved', headers=gzip_headers)
+        assert first.is_streamed
+        body = first.data
+        job = ExportJob.query.one()
+        assert job.status == 'done' and job.row_count == 2
+        assert sorted(os.listdir(tmp_path / 'exports')) == [f'{job.id}.csv.gz']
+
+        again = client.get('/admin/export/students?status=approved&department=', headers=gzip_headers)
+        assert again.data == body and again.headers['ETag']
+        assert again.headers['Content-Encoding'] == 'gzip' and ExportJob.query.count() == 1
+        etag = again.headers['ETag']
+        response = client.get('/admin/export/students?status=approved', headers=dict(gzip_headers, **{'If-None-Match': etag}))
+        assert response.status_code == 304
+        response = client.get('/admin/export/students?status=approved', headers=dict(gzip_headers, Range='bytes=0-9'))
+        assert response.status_code == 206 and response.data == body[:10]
+        plain = client.get('/admin/export/students?status=approved', headers=self._headers())
+        assert len(read_csv(plain.data)) == 3
+        response = client.get('/admin/export/students?status=approved',
+                              headers=self._headers(**{'If-None-Match': plain.headers['ETag']}))
+        assert response.status_code == 304
+
+        statements = []
+
+        def listener(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            version = student_data_version()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+        assert len(statements) == 1 and 'data_versions' in statements[0]
+
+        profile = StudentProfile.query.first()
+        profile.phone = '0700000000'
+        db.session.commit()
+        assert student_data_version() != version
+        assert client.get('/admin/export/students?status=approved', headers=gzip_headers).data != body
+        assert ExportJob.query.count() == 2
+
+    def test_export_jobs(self, app):
+        """Test export jobs: small ones finish in the request, large ones are polled, then downloaded"""
+        client = app.test_client()
+        response = client.post('/admin/exports', headers=self._headers(), json={'status': 'pending'})
+        assert response.status_code == 200
+        job = response.get_json()['data']
+        assert job['status'] == 'done' and job['row_count'] == 3
+        download = client.get(job['download_url'], headers=self._headers())
+        assert [row[0] for row in read_csv(download.data)[1:]] == [f'Export Student {index}' for index in (2, 3, 4)]
+
+        # The same request again reuses the artifact
+        response = client.post('/admin/exports', headers=self._headers(), json={'status': 'pending', 'search': ' '})
+        assert response.get_json()['data']['id'] == job['id']
+
+        app.config['EXPORT_INLINE_MAX_ROWS'] = 1
+        response = client.post('/admin/exports', headers=self._headers(), json={})
+        assert response.status_code in (200, 202)
+        status = client.get(response.get_json()['data']['status_url'], headers=self._headers()).get_json()['data']
+        assert status['status'] == 'done' and status['row_count'] == 6
+
+        assert client.get('/admin/exports/missing', headers=self._headers()).status_code == 404
+
+    def test_eviction_by_age_and_size(self, app, tmp_path):
+        """Test artifacts past EXPORT_MAX_AGE go, then least recently used ones beyond the size budget"""
+        client = app.test_client()
+        for status in ('approved', 'pending'):
+            client.post('/admin/exports', headers=self._headers(), json={'status': status})
+        approved, pending = ExportJob.query.order_by(ExportJob.created_at).all()
+
+        app.config['EXPORT_CACHE_MAX_MB'] = 0
+        approved.size = 0  # fits any budget
+        pending.last_used_at = pending.last_used_at.replace(year=2000)
+        db.session.commit()
+        assert evict_exports() == 1
+        assert [job.id for job in ExportJob.query] == [approved.id]
+        assert os.listdir(tmp_path / 'exports') == [f'{approved.id}.csv.gz']
+
+        approved.created_at = approved.created_at.replace(year=2000)
+        db.session.commit()
+        assert evict_exports() == 1 and ExportJob.query.count() == 0
+        assert os.listdir(tmp_path / 'exports') == []
+
+    def test_export_filters_and_gzip(self, app):
+        """Test the list filters apply, together, and gzip follows Accept-Encoding"""
+        client = app.test_client()
+        response = client.get(
+            '/admin/export/students?status=pending&year_of_study=Year 2&department=computer',
+            headers=self._headers(**{'Accept-Encoding': 'gzip'})
+        )
+        assert response.headers['Content-Encoding'] == 'gzip'
+        rows = read_csv(gzip.decompress(response.data))
+        assert [row[0] for row in rows[1:]] == ['Export Student 3']
+
+        response = client.get('/admin/export/students?gzip=0', headers=self._headers(**{'Accept-Encoding': 'gzip'}))
+        assert 'Content-Encoding' not in response.headers and len(read_csv(response.data)) == 7
+
+    def test_csv_chunks_are_bounded(self):
+        """Test large exports go out in chunks of about the chunk size"""
+        rows = ([str(index), 'x' * 100] for index in range(5000))
+        chunks = list(csv_chunks(rows, header=['n', 'text'], chunk_size=16 * 1024))
+        assert len(chunks) > 30
+        assert max(len(chunk) for chunk in chunks) < 16 * 1024 + 200
+        assert len(read_csv(b''.join(chunks))) == 5001
+
+class TestChangeExport:
+    """Test suite for the incremental (changed since a cursor) student export"""
+
+    @pytest.fixture
+    def app(self, tmp_path):
+        """Create application with an admin and four students last changed two days ago"""
+        app = create_app('testing')
+        app.config['EXPORT_FOLDER'] = str(tmp_path / 'exports')
+
+        with app.app_context():
+            db.create_all()
+            old = datetime.utcnow() - timedelta(days=2)
+            for index in range(4):
+                student = User(
+                    name=f'Delta Student {index}', reg_number=f'GAU/DLT/00{index}',
+                    email=f'delta{index}@students.gau.ac.ke', department='Education', password_hash='x',
+                    created_at=old, updated_at=old
+                )
+                db.session.add(student)
+                db.session.flush()
+                db.session.add(StudentProfile(user_id=student.id, status='pending', submitted_at=old, last_updated=old))
+            db.session.add(User(
+                name='Delta Admin', reg_number='GAU/ADM/DLT', email='delta-admin@gau.ac.ke',
+                department='Administration', password_hash='x', role='admin', updated_at=old
+            ))
+            db.session.commit()
+            yield app
+            db.session.remove()
+            db.drop_all()
+
+    def _changes(self, app, **params):
+        admin = User.query.filter_by(role='admin').first()
+        headers = {'Authorization': f'Bearer {create_access_token(identity=admin.id)}'}
+        response = app.test_client().get('/admin/export/students/changes', headers=headers, query_string=params)
+        assert response.status_code == 200, response.data
+        rows = read_csv(response.data)
+        assert rows[0] == CHANGE_HEADER
+        return [dict(zip(rows[0], row)) for row in rows[1:]], response.headers['X-Next-Cursor']
+
+    def test_changes_since_cursor(self, app):
+        """Test each call returns only what changed since the previous cursor, deactivations included"""
+        rows, cursor = self._changes(app)
+        assert len(rows) == 4
+
+        rows, cursor = self._changes(app, cursor=cursor)
+        assert rows == []
+
+        students = User.query.filter_by(role='student').order_by(User.id).all()
+        students[1].profile.status = 'approved'
+        students[3].is_active = False
+        db.session.commit()
+        rows, cursor = self._changes(app, cursor=cursor)
+        assert [(row['Name'], row['Status'], row['Is Active']) for row in rows] == [
+            ('Delta Student 1', 'approved', 'Yes'), ('Delta Student 3', 'pending', 'No')
+        ]
+        assert rows[0]['Student ID'] == str(students[1].id) and rows[0]['Changed At']
+
+        assert self._changes(app, cursor=cursor)[0] == []
+        since = (datetime.utcnow() - timedelta(days=1)).isoformat()
+        assert len(self._changes(app, since=since)[0]) == 2
+        assert len(self._changes(app, since=since, status='approved')[0]) == 1
+
+        admin = User.query.filter_by(role='admin').first()
+        headers = {'Authorization': f'Bearer {create_access_token(identity=admin.id)}'}
+        response = app.test_client().get('/admin/export/students/changes?cursor=bogus', headers=headers)
+        assert response.status_code == 400
+
+    def test_changes_query_uses_timestamp_indexes(self, app):
+        """Test both change scans are index range scans, not table scans"""
+        now = datetime.utcnow()
+        statement = student_changes_query(now - timedelta(days=1), now).statement
+        compiled = statement.compile(db.engine, compile_kwargs={'literal_binds': True})
+        plan = ' '.join(row[-1] for row in db.session.execute(text(f'EXPLAIN QUERY PLAN {compiled}')))
+        assert 'ix_users_updated_at' in plan and 'ix_student_profiles_last_updated' in plan
+
+class TestPhotoArchive:
+    """Test suite for the streamed ZIP of student photos for the print vendor"""
+
+    @pytest.fixture
+    def app(self, tmp_path):
+        """Create application with four students with photos (one file missing) and one without"""
+        app = create_app('testing')
+        app.config['UPLOAD_FOLDER'] = str(tmp_path / 'uploads')
+
+        with app.app_context():
+            db.create_all()
+            for index in range(5):
+                student = User(
+                    name=f'Photo Student {index}', reg_number=f'GAU/PHO/00{index}',
+                    email=f'photo{index}@students.gau.ac.ke',
+                    department='Computer Science' if index % 2 else 'Education', password_hash='x'
+                )
+                db.session.add(student)
+                db.session.flush()
+                if index < 3:
+                    photo = store_photo(app.config['UPLOAD_FOLDER'], Image.new('RGB', (800, 1067), (40 * index, 30, 30)))
+                elif index == 3:
+                    photo = 'photos/profiles/ab/cd/missing.jpg'
+                else:
+                    photo = None
+                db.session.add(StudentProfile(
+                    user_id=student.id, id_number=f'GAU2024PHO{index}', photo_url=photo,
+                    status='pending' if index == 2 else 'approved'
+                ))
+            db.session.add(User(
+                name='Photo Admin', reg_number='GAU/ADM/PHO', email='photo-admin@gau.ac.ke',
+                department='Administration', password_hash='x', role='admin'
+            ))
+            db.session.commit()
+            yield app
+            db.session.remove()
+            db.drop_all()
+
+    def _archive(self, app, **params):
+        admin = User.query.filter_by(role='admin').first()
+        headers = {'Authorization': f'Bearer {create_access_token(identity=admin.id)}'}
+        response = app.test_client().get('/admin/export/photos', headers=headers, query_string=params)
+        assert response.status_code == 200, response.data
+        assert response.is_streamed and response.mimetype == 'application/zip'
+        archive = zipfile.ZipFile(io.BytesIO(response.data))
+        assert archive.testzip() is None
+        manifest = read_csv(archive.read(MANIFEST_NAME))
+        return archive, [dict(zip(manifest[0], row)) for row in manifest[1:]]
+
+    def test_archive_of_approved_photos(self, app):
+        """Test approved students' print-size photos are stored entries, listed in the manifest"""
+        archive, manifest = self._archive(app)
+        assert [(row['id_number'], row['file']) for row in manifest] == [
+            ('GAU2024PHO0', 'photos/GAU2024PHO0.jpg'), ('GAU2024PHO1', 'photos/GAU2024PHO1.jpg'),
+            ('GAU2024PHO3', '')
+        ]
+        assert archive.namelist() == ['photos/GAU2024PHO0.jpg', 'photos/GAU2024PHO1.jpg', MANIFEST_NAME]
+        for row in manifest[:2]:
+            entry = archive.getinfo(row['file'])
+            assert entry.compress_type == zipfile.ZIP_STORED and entry.file_size == int(row['bytes'])
+            with Image.open(archive.open(entry)) as img:
+                assert img.format == 'JPEG' and img.size == (600, 800)
+        assert manifest[0]['reg_number'] == 'GAU/PHO/000' and manifest[1]['department'] == 'Computer Science'
+        assert AdminActivity.query.filter_by(action='export_student_photos').one().details == (
+            'Exported 2 student photos (1 missing)'
+        )
+
+    def test_archive_filters_and_size(self, app):
+        """Test status and department filters, full-size photos and an unknown size"""
+        archive, manifest = self._archive(app, status='pending', size='full')
+        assert [row['id_number'] for row in manifest] == ['GAU2024PHO2']
+        with Image.open(archive.open('photos/GAU2024PHO2.jpg')) as img:
+            assert img.size == (800, 1067)
+
+        _, manifest = self._archive(app, department='computer')
+        assert [row['id_number'] for row in manifest] == ['GAU2024PHO1', 'GAU2024PHO3']
+
+        admin = User.query.filter_by(role='admin').first()
+        headers = {'Authorization': f'Bearer {create_access_token(identity=admin.id)}'}
+        assert app.test_client().get('/admin/export/photos?size=huge', headers=headers).status_code == 400
+
+    def test_archive_chunks_are_bounded(self, app, tmp_path):
+        """Test a large photo goes out in read-sized chunks, never whole"""
+        data = os.urandom(1024 * 1024)
+        (tmp_path / 'large.jpg').write_bytes(data)
+        rows = [(f'GAU2024BIG{index}', 'large.jpg', '', '', '') for index in range(3)]
+        stats = {}
+        chunks = list(photo_archive_chunks(rows, str(tmp_path), size='full', stats=stats))
+        assert max(len(chunk) for chunk in chunks) <= 64 * 1024 + 200
+        assert stats == {'photos': 3, 'missing': 0, 'bytes': 3 * 1024 * 1024}
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(chunks)))
+        assert archive.read('photos/GAU2024BIG2.jpg') == data
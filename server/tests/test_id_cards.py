@@ -0,0 +1,252 @@
+# Tests for GAU-ID-View ID card rendering
+import io
+import os
+import sys
+import pytest
+from datetime import date, timedelta
+from PIL import Image
+from sqlalchemy import event
+
+# Add the server directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask_jwt_extended import create_access_token
+from app import create_app
+from models import db, User, StudentProfile
+from utils.file_handler import store_photo
+from utils.id_cards import (
+    card_data, card_key, card_image, render_card, render_card_batch, CARD_SIZE, CARD_PHOTO_BOX, CARD_QR_BOX
+)
+from utils.card_verification import sign_card_payload, verify_card_payload, get_revocation_set
+
+def pdf_pages(data):
+    """Page count of a PDF, after checking every xref offset lands on its object"""
+    start = int(data.rsplit(b'startxref\n', 1)[1].split()[0])
+    lines = data[start:].split(b'\n')
+    assert lines[0] == b'xref'
+    for number in range(1, int(lines[1].split()[1])):
+        offset = int(lines[2 + number][:10])
+        assert data[offset:].startswith(f'{number} 0 obj'.encode())
+    return data.count(b'/Type /Page ')
+
+class TestIDCards:
+    """Test suite for card rendering, the card cache and A4 sheets"""
+
+    @pytest.fixture
+    def app(self, tmp_path):
+        """Create application with three approved students, one with a stored photo"""
+        app = create_app('testing')
+        app.config['UPLOAD_FOLDER'] = str(tmp_path / 'uploads')
+        app.config['CARD_CACHE_FOLDER'] = str(tmp_path / 'cards')
+
+        with app.app_context():
+            db.create_all()
+            photo = store_photo(app.config['UPLOAD_FOLDER'], Image.new('RGB', (800, 1067), (200, 30, 30)))
+            for index in range(3):
+                student = User(
+                    name=f'Card Student {index}', reg_number=f'GAU/CARD/00{index}',
+                    email=f'card{index}@students.gau.ac.ke', department='Computer Science', password_hash='x'
+                )
+                db.session.add(student)
+                db.session.flush()
+                db.session.add(StudentProfile(
+                    user_id=student.id, status='approved', expiry_date=date(2027, 10, 19),
+                    photo_url=photo if index == 0 else None
+                ))
+            admin = User(
+                name='Card Admin', reg_number='GAU/ADM/CARD', email='card-admin@gau.ac.ke',
+                department='Administration', password_hash='x', role='admin'
+            )
+            db.session.add(admin)
+            db.session.commit()
+            yield app
+            db.session.remove()
+            db.drop_all()
+
+    @pytest.fixture
+    def profiles(self, app):
+        return StudentProfile.query.order_by(StudentProfile.id).all()
+
+    def _headers(self, role='admin'):
+        user = User.query.filter_by(role=role).first()
+        return {'Authorization': f'Bearer {create_access_token(identity=user.id)}'}
+
+    def test_card_has_photo_and_qr(self, app, profiles):
+        """Test the card is CR80 at 300 dpi with the print photo and a QR code"""
+        card = render_card(card_data(profiles[0]), app.config['UPLOAD_FOLDER'])
+        assert card.size == CARD_SIZE
+
+        red, green, blue = card.getpixel((CARD_PHOTO_BOX[0] + 150, CARD_PHOTO_BOX[1] + 200))
+        assert red > 150 and green < 80 and blue < 80
+        qr = card.crop(CARD_QR_BOX).convert('L')
+        assert qr.getextrema() == (0, 255)
+
+        # No photo on file: a placeholder, not a failure
+        card = render_card(card_data(profiles[1]), app.config['UPLOAD_FOLDER'])
+        assert card.getpixel((CARD_PHOTO_BOX[0] + 10, CARD_PHOTO_BOX[1] + 10)) == (230, 230, 230)
+
+    def test_cache_is_keyed_by_printed_content(self, app, profiles, tmp_path):
+        """Test cards are drawn once per version of what is printed on them"""
+        profile = profiles[0]
+        key = card_key(card_data(profile))
+        assert Image.open(io.BytesIO(card_image(profile))).size == CARD_SIZE
+        cached = tmp_path / 'cards' / key[:2] / f'{key}.jpg'
+        mtime = cached.stat().st_mtime_ns
+
+        card_image(profile, 'jpeg')
+        assert cached.stat().st_mtime_ns == mtime
+        assert card_key(card_data(profile)) == key
+
+        profile.user.name = 'Renamed Student'
+        db.session.commit()
+        assert card_key(card_data(profile)) != key
+        card_image(profile)
+        assert len(list((tmp_path / 'cards').rglob('*.jpg'))) == 2
+
+    def test_batch_lays_out_ten_cards_per_sheet(self, app, profiles):
+        """Test a batch PDF has one page per ten cards and reuses cached cards"""
+        cards = [dict(card_data(profiles[index % 3]), reg_number=f'GAU/B/{index}') for index in range(23)]
+        output = io.BytesIO()
+        stats = render_card_batch(cards, output, workers=1)
+        assert stats == dict(stats, cards=23, rendered=23, cached=0, sheets=3)
+        assert output.getvalue().startswith(b'%PDF-1.4')
+        assert pdf_pages(output.getvalue()) == 3
+
+        stats = render_card_batch(cards[:12], io.BytesIO(), workers=1)
+        assert (stats['rendered'], stats['cached'], stats['sheets']) == (0, 12, 2)
+
+    def test_card_endpoints(self, app, profiles):
+        """Test the single-card image and the print batch PDF, with the batch limit"""
+        client = app.test_client()
+        response = client.get(f'/admin/students/{profiles[0].user_id}/id-card', headers=self._headers())
+        assert response.status_code == 200 and response.mimetype == 'image/png'
+        assert Image.open(io.BytesIO(response.data)).size == CARD_SIZE
+
+        response = client.post('/admin/id-cards/print', headers=self._headers(), json={'status': 'approved'})
+        assert response.status_code == 200 and response.mimetype == 'application/pdf'
+        assert pdf_pages(response.data) == 1
+
+        app.config['CARD_BATCH_MAX'] = 2
+        response = client.post('/admin/id-cards/print', headers=self._headers(), json={})
+        assert response.status_code == 400 and 'print_cards.py' in response.get_json()['message']
+        response = client.post('/admin/id-cards/print', headers=self._headers(), json={'status': 'issued'})
+        assert response.status_code == 404
+
+class TestCardVerification:
+    """Test suite for signed card payloads, revocation and the public verify endpoint"""
+
+    @pytest.fixture
+    def app(self, tmp_path):
+        """Create application with one approved student and an admin"""
+        app = create_app('testing')
+        app.config['UPLOAD_FOLDER'] = str(tmp_path / 'uploads')
+        app.config['CARD_CACHE_FOLDER'] = str(tmp_path / 'cards')
+
+        with app.app_context():
+            db.create_all()
+            student = User(
+                name='Gate Student', reg_number='GAU/GATE/001', email='gate@students.gau.ac.ke',
+                department='Computer Science', password_hash='x'
+            )
+            admin = User(
+                name='Gate Admin', reg_number='GAU/ADM/GATE', email='gate-admin@gau.ac.ke',
+                department='Administration', password_hash='x', role='admin'
+            )
+            db.session.add_all([student, admin])
+            db.session.flush()
+            db.session.add(StudentProfile(user_id=student.id, status='approved', expiry_date=date(2027, 10, 19)))
+            db.session.commit()
+            yield app
+            db.session.remove()
+            db.drop_all()
+
+    @pytest.fixture
+    def profile(self, app):
+        return StudentProfile.query.first()
+
+    def _verify(self, app, payload):
+        response = app.test_client().get(f'/verify/{payload}')
+        return response.status_code, response.get_json()
+
+    def test_payload_round_trip(self, app, profile):
+        """Test a card's QR payload verifies, and tampered or expired payloads do not"""
+        payload = card_data(profile)['qr']
+        status, body = self._verify(app, payload)
+        assert status == 200 and body['data']['valid'] is True
+        assert body['data']['id_number'] == profile.id_number
+        assert body['data']['user_id'] == profile.user_id and body['data']['card_version'] == 1
+
+        # Another user id in the header breaks the signature
+        index = len('GAU1:') + 3
+        tampered = payload[:index] + ('A' if payload[index] != 'A' else 'B') + payload[index + 1:]
+        assert self._verify(app, tampered) == (200, {
+            'success': True, 'message': 'Card is not valid', 'data': {'valid': False, 'reason': 'invalid_signature'}
+        })
+
+        expired = sign_card_payload(profile.user_id, profile.id_number, date.today() - timedelta(days=1))
+        assert self._verify(app, expired)[1]['data']['reason'] == 'expired'
+
+        app.config['CARD_SIGNING_SECRET'] = 'another-secret'
+        assert self._verify(app, payload)[1]['data']['reason'] == 'invalid_signature'
+        assert self._verify(app, 'GAU-ID:GAU2024:GAU/1')[0] == 400
+
+    def test_verify_does_not_touch_database(self, app, profile):
+        """Test verification after the first load is a signature check and a dict lookup"""
+        payload = card_data(profile)['qr']
+        self._verify(app, payload)  # loads the revocation set
+        statements = []
+
+        def listener(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            for _ in range(5):
+                assert self._verify(app, payload)[1]['data']['valid'] is True
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+        assert statements == []
+
+    def test_revocation(self, app, profile):
+        """Test a revoked card stops verifying and the reprinted card verifies"""
+        admin = User.query.filter_by(role='admin').first()
+        headers = {'Authorization': f'Bearer {create_access_token(identity=admin.id)}'}
+        client = app.test_client()
+        old_data = card_data(profile)
+        assert self._verify(app, old_data['qr'])[1]['data']['valid'] is True
+
+        response = client.post(f'/admin/id-cards/{profile.user_id}/revoke', headers=headers, json={})
+        assert response.status_code == 400
+        response = client.post(f'/admin/id-cards/{profile.user_id}/revoke', headers=headers, json={'reason': 'Lost'})
+        assert response.status_code == 200 and response.get_json()['data']['card_version'] == 1
+        assert self._verify(app, old_data['qr'])[1]['data']['reason'] == 'revoked'
+
+        new_data = card_data(profile)
+        assert card_key(new_data) != card_key(old_data)
+        body = self._verify(app, new_data['qr'])[1]
+        assert body['data']['valid'] is True and body['data']['card_version'] == 2
+
+        # Another process picks the revocation up on its next refresh
+        revocations = get_revocation_set()
+        revocations.revoked.clear()
+        revocations.last_id = 0
+        assert revocations.refresh() == 1
+        assert verify_card_payload(old_data['qr'])['reason'] == 'revoked'
+
+        # Removing the student revokes the reprinted card too
+        response = client.delete(f'/admin/remove/{profile.user_id}', headers=headers, json={})
+        assert response.status_code == 200
+        assert self._verify(app, new_data['qr'])[1]['data']['reason'] == 'revoked'
+
+    def test_removing_student_with_printed_card_revokes_it(self, app, profile):
+        """Test a card that moved on to printed or issued still stops verifying when its student is removed"""
+        admin = User.query.filter_by(role='admin').first()
+        headers = {'Authorization': f'Bearer {create_access_token(identity=admin.id)}'}
+        payload = card_data(profile)['qr']
+        profile.status = 'printed'
+        db.session.commit()
+        assert self._verify(app, payload)[1]['data']['valid'] is True
+
+        response = app.test_client().delete(f'/admin/remove/{profile.user_id}', headers=headers, json={})
+        assert response.status_code == 200
+        assert self._verify(app, payload)[1]['data']['reason'] == 'revoked'
@@ -0,0 +1,302 @@
+# Tests for GAU-ID-View photo processing
+import io
+import os
+import sys
+import pytest
+from PIL import Image
+from werkzeug.datastructures import FileStorage
+
+# Add the server directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask_jwt_extended import create_access_token
+from app import create_app
+from models import db, User, StudentProfile, ImageJob
+from utils.file_handler import (
+    validate_image_file, process_photo, atomic_write, save_uploaded_file, get_file_url
+)
+from utils.image_jobs import ImageJobQueue, ImageQueueFull, complete_job, process_photo_file
+
+def make_photo(width=1500, height=2000, fmt='JPEG'):
+    """Encoded test photo with a gradient so JPEG has something to compress"""
+    img = Image.linear_gradient('L').resize((width, height)).convert('RGB')
+    output = io.BytesIO()
+    img.save(output, fmt, quality=90)
+    return output.getvalue()
+
+def upload(data, filename='photo.jpg'):
+    return FileStorage(stream=io.BytesIO(data), filename=filename, content_type='image/jpeg')
+
+class TestImagePipeline:
+    """Test suite for single-decode photo ingestion"""
+
+    @pytest.fixture
+    def app(self, tmp_path):
+        """Create application with a temporary upload folder"""
+        app = create_app('testing')
+        app.config['UPLOAD_FOLDER'] = str(tmp_path)
+
+        with app.app_context():
+            db.create_all()
+            yield app
+            db.session.remove()
+            db.drop_all()
+
+    def test_validation_reads_header_only(self):
+        """Test that dimensions are checked without decoding the body"""
+        data = make_photo()
+        truncated = data[:len(data) // 4]
+
+        assert validate_image_file(upload(truncated)) == (True, "Valid image")
+        assert validate_image_file(upload(make_photo(2000, 2000)))[1].startswith('Invalid aspect ratio')
+        assert validate_image_file(upload(b'not an image'))[0] is False
+
+    def test_process_photo_downscales_once(self):
+        """Test that JPEG and PNG input become an 800px-wide JPEG"""
+        for fmt in ('JPEG', 'PNG'):
+            with Image.open(io.BytesIO(process_photo(make_photo(fmt=fmt)))) as img:
+                assert img.format == 'JPEG'
+                assert img.size == (800, 1067)
+
+    def test_atomic_write_leaves_nothing_on_failure(self, tmp_path):
+        """Test that a failed write neither creates the file nor leaks a temp file"""
+        target = tmp_path / 'photo.jpg'
+        with pytest.raises(RuntimeError):
+            with atomic_write(str(target)) as f:
+                f.write(b'partial')
+                raise RuntimeError('disk full')
+
+        assert list(tmp_path.iterdir()) == []
+
+    def test_save_uploaded_photo(self, app):
+        """Test that an upload is stored as a processed JPEG"""
+        success, message, path = save_uploaded_file(upload(make_photo(), 'selfie.png'), 7, 'photo', 'profiles')
+
+        assert success, message
+        assert path.startswith('photos/profiles/') and path.endswith('.jpg')
+        with Image.open(os.path.join(app.config['UPLOAD_FOLDER'], path)) as img:
+            assert img.size == (800, 1067)
+        assert [name for name in os.listdir(os.path.dirname(os.path.join(app.config['UPLOAD_FOLDER'], path)))
+                if name.endswith('.tmp')] == []
+
+    def test_corrupt_photo_rejected_before_writing(self, app):
+        """Test that a body that fails to decode is reported and not stored"""
+        data = make_photo()
+        success, message, path = save_uploaded_file(upload(data[:len(data) // 4]), 7, 'photo', 'profiles')
+
+        assert not success
+        assert message.startswith('Invalid image file')
+        assert not os.path.exists(os.path.join(app.config['UPLOAD_FOLDER'], 'photos'))
+
+class TestImageJobs:
+    """Test suite for background photo processing"""
+
+    @pytest.fixture
+    def app(self, tmp_path):
+        """Create application with one student and a temporary upload folder"""
+        app = create_app('testing')
+        app.config['UPLOAD_FOLDER'] = str(tmp_path)
+
+        with app.app_context():
+            db.create_all()
+            student = User(
+                name='Photo Student', reg_number='GAU/IMG/001', email='photo@students.gau.ac.ke',
+                department='Computer Science', password_hash='x'
+            )
+            db.session.add(student)
+            db.session.flush()
+            db.session.add(StudentProfile(user_id=student.id, status='pending'))
+            db.session.commit()
+            yield app
+            db.session.remove()
+            db.drop_all()
+
+    @pytest.fixture
+    def student(self, app):
+        return User.query.filter_by(reg_number='GAU/IMG/001').first()
+
+    def _headers(self, user):
+        return {'Authorization': f'Bearer {create_access_token(identity=user.id)}'}
+
+    def _upload(self, client, user, data, filename='photo.jpg'):
+        return client.post(
+            '/student/upload-photo', headers=self._headers(user),
+            data={'photo': (io.BytesIO(data), filename)}, content_type='multipart/form-data'
+        )
+
+    def test_upload_processes_job_and_swaps_photo(self, app, student):
+        """Test that a completed job replaces the previous photo in one step"""
+        client = app.test_client()
+        first = self._upload(client, student, make_photo()).get_json()['data']
+        assert first['status'] == 'done'
+        old_photo = student.profile.photo_url
+        assert old_photo.startswith('photos/profiles/') and old_photo.endswith('.jpg')
+
+        response = self._upload(client, student, make_photo(fmt='PNG'), 'photo.png')
+        data = response.get_json()['data']
+        db.session.expire_all()
+
+        assert response.status_code == 200
+        assert data['photo_url'].startswith(f'/student/files/{student.profile.photo_url}?expires=')
+        assert not os.path.exists(os.path.join(app.config['UPLOAD_FOLDER'], old_photo))
+        assert os.listdir(os.path.join(app.config['UPLOAD_FOLDER'], 'photos', 'incoming')) == []
+
+        status = client.get(data['status_url'], headers=self._headers(student)).get_json()['data']
+        assert status['status'] == 'done'
+
+    def test_undecodable_photo_fails_job(self, app, student):
+        """Test that a photo that passes the header check but fails to decode is reported"""
+        data = make_photo()
+        response = self._upload(app.test_client(), student, data[:len(data) // 4])
+
+        assert response.status_code == 400
+        assert response.get_json()['message'].startswith('Photo processing failed')
+        assert ImageJob.query.one().status == 'failed'
+        assert student.profile.photo_url is None
+
+    def test_stale_result_does_not_replace_newer_photo(self, app, student):
+        """Test that an older job finishing last is marked superseded"""
+        older = ImageJob(user_id=student.id, source_path='photos/incoming/a.jpg', result_path='photos/profiles/a.jpg')
+        newer = ImageJob(user_id=student.id, source_path='photos/incoming/b.jpg', result_path='photos/profiles/b.jpg')
+        db.session.add_all([older, newer])
+        db.session.commit()
+
+        assert complete_job(newer.id).status == 'done'
+        assert complete_job(older.id).status == 'superseded'
+        assert student.profile.photo_url == 'photos/profiles/b.jpg'
+
+    def test_full_queue_returns_503(self, app, student, monkeypatch):
+        """Test backpressure when the worker already has its maximum of outstanding jobs"""
+        class FullQueue:
+            def reserve(self):
+                raise ImageQueueFull()
+        monkeypatch.setattr('routes.student.get_image_queue', lambda: FullQueue())
+
+        response = self._upload(app.test_client(), student, make_photo())
+
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '5'
+        assert ImageJob.query.count() == 0
+
+    def test_pool_processes_off_the_request_thread(self, app, tmp_path):
+        """Test the process pool completes a job and bounds outstanding work"""
+        student = User.query.first()
+        incoming = tmp_path / 'photos' / 'incoming'
+        incoming.mkdir(parents=True)
+        (incoming / 'raw.jpg').write_bytes(make_photo())
+
+        queue = ImageJobQueue(app, workers=1, max_pending=1)
+        try:
+            queue.reserve()
+            with pytest.raises(ImageQueueFull):
+                queue.reserve()
+
+            job = ImageJob(user_id=student.id, source_path='photos/incoming/raw.jpg')
+            db.session.add(job)
+            db.session.commit()
+            queue.submit(job)
+        finally:
+            queue.shutdown(timeout=60)
+
+        assert queue.in_flight == 0
+        db.session.expire_all()
+        job = ImageJob.query.one()
+        assert job.status == 'done'
+        assert (tmp_path / job.result_path).exists()
+
+class TestPhotoDerivatives:
+    """Test suite for photo sizes and format negotiation"""
+
+    @pytest.fixture
+    def app(self, tmp_path):
+        """Create application with a temporary upload folder"""
+        app = create_app('testing')
+        app.config['UPLOAD_FOLDER'] = str(tmp_path)
+
+        with app.app_context():
+            yield app
+
+    @pytest.fixture
+    def photo(self, app, tmp_path):
+        """Relative path of one processed photo"""
+        raw = tmp_path / 'raw.png'
+        raw.write_bytes(make_photo(fmt='PNG'))
+        return process_photo_file(str(raw), str(tmp_path))
+
+    def _image(self, data):
+        with Image.open(io.BytesIO(data)) as img:
+            return img.format, img.size
+
+    def test_all_derivatives_generated_once(self, tmp_path, photo):
+        """Test that every size is stored as JPEG and WebP with exact 3:4 dimensions"""
+        stem = os.path.splitext(os.path.basename(photo))[0]
+        shard = (tmp_path / photo).parent
+        assert sorted(path.name for path in shard.iterdir()) == [
+            f'{stem}.jpg', f'{stem}.webp',
+            f'{stem}@medium.jpg', f'{stem}@medium.webp',
+            f'{stem}@print.jpg', f'{stem}@print.webp',
+            f'{stem}@thumb.jpg', f'{stem}@thumb.webp'
+        ]
+        assert self._image((shard / f'{stem}@print.jpg').read_bytes()) == ('JPEG', (600, 800))
+        assert self._image((shard / f'{stem}@thumb.webp').read_bytes()) == ('WEBP', (150, 200))
+
+    def test_size_and_format_negotiation(self, app, photo):
+        """Test query parameters and the Accept header select the variant"""
+        client = app.test_client()
+        url = get_file_url(photo)
+
+        response = client.get(f'{url}&size=thumb', headers={'Accept': 'image/avif,image/webp,*/*'})
+        assert self._image(response.data) == ('WEBP', (150, 200))
+        assert 'Accept' in response.headers['Vary']
+
+        response = client.get(f'{url}&size=medium', headers={'Accept': '*/*'})
+        assert self._image(response.data) == ('JPEG', (360, 480))
+
+        response = client.get(f'{url}&size=print&format=jpeg', headers={'Accept': 'image/webp'})
+        assert self._image(response.data) == ('JPEG', (600, 800))
+        assert 'Accept' not in response.headers.get('Vary', '')
+
+        assert client.get(f'{url}&size=huge').status_code == 400
+        assert get_file_url(photo, 'thumb', 'webp').startswith(f"/student/files/{photo[:-len('.jpg')]}@thumb.webp?")
+
+    def test_admin_list_thumbnail_negotiated_by_image_request(self, app, photo):
+        """Test the admin list's thumbnail URL gets its format from the <img> request, not the JSON call"""
+        db.create_all()
+        student = User(
+            name='Thumb Student', reg_number='GAU/TH/001', email='thumb@students.gau.ac.ke',
+            department='Education', password_hash='x'
+        )
+        admin = User(
+            name='Thumb Admin', reg_number='GAU/ADM/TH', email='thumb-admin@gau.ac.ke',
+            department='Administration', password_hash='x', role='admin'
+        )
+        db.session.add_all([student, admin])
+        db.session.flush()
+        db.session.add(StudentProfile(user_id=student.id, status='pending', photo_url=photo))
+        db.session.commit()
+
+        client = app.test_client()
+        response = client.get('/admin/students', headers={
+            'Authorization': f'Bearer {create_access_token(identity=admin.id)}',
+            'Accept': 'application/json, text/plain, */*'
+        })
+        url = response.get_json()['data']['items'][0]['profile']['photo_thumb_url']
+        assert url.startswith(f'/student/files/{photo}?') and 'size=thumb' in url
+
+        response = client.get(url, headers={'Accept': 'image/avif,image/webp,image/apng,image/*,*/*;q=0.8'})
+        assert self._image(response.data) == ('WEBP', (150, 200))
+        assert 'Accept' in response.headers['Vary']
+        response = client.get(url, headers={'Accept': 'image/png,image/*;q=0.8,*/*;q=0.5'})
+        assert self._image(response.data) == ('JPEG', (150, 200))
+
+    def test_missing_derivatives_regenerated(self, app, tmp_path, photo):
+        """Test that a photo without derivatives gets them on first request"""
+        shard = (tmp_path / photo).parent
+        for path in shard.iterdir():
+            if '@' in path.name or path.suffix == '.webp':
+                path.unlink()
+
+        response = app.test_client().get(get_file_url(photo, 'thumb', 'webp'))
+
+        assert self._image(response.data) == ('WEBP', (150, 200))
+        assert len(list(shard.iterdir())) == 8
@@ -0,0 +1,100 @@
+# Tests for GAU-ID-View request instrumentation
+import os
+import sys
+import tempfile
+import pytest
+
+# Add the server directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import g
+from app import create_app
+from models import db, User
+from utils.profiling import generate_profile_token, verify_profile_token
+from utils.tracing import RequestTrace, span
+from trace_report import summarize
+
+class TestQueryInstrumentation:
+    """Test suite for per-request SQL statistics"""
+    
+    @pytest.fixture
+    def app(self):
+        """Create application for testing"""
+        db_fd, db_path = tempfile.mkstemp(suffix='.db')
+        
+        app = create_app('testing')
+        app.config.update({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}',
+            'SQL_N_PLUS_ONE_THRESHOLD': 3
+        })
+        
+        with app.app_context():
+            db.create_all()
+            yield app
+            db.session.remove()
+            db.drop_all()
+        
+        os.close(db_fd)
+        os.unlink(db_path)
+    
+    def test_query_counts_and_repeats(self, app):
+        """Test that repeated identical statements are flagged"""
+        with app.test_request_context('/admin/students'):
+            for user_id in range(4):
+                User.query.filter_by(id=user_id).first()
+            
+            summary = g.query_stats.summary()
+            assert summary['db_query_count'] == 4
+            assert len(summary['db_slowest']) == 3
+            assert summary['db_repeated'][0]['count'] == 4
+            assert summary['db_repeated'][0]['statement'].startswith('SELECT users.id')
+
+class TestProfilingTokens:
+    """Test suite for signed profiling tokens"""
+    
+    def test_token_bound_to_user_and_path(self):
+        """Test that a token only verifies for the admin and path it was issued for"""
+        app = create_app('testing')
+        
+        with app.app_context():
+            token, _ = generate_profile_token(1, '/admin/analytics/generate-report')
+            
+            assert verify_profile_token(token, 1, '/admin/analytics/generate-report')
+            assert not verify_profile_token(token, 2, '/admin/analytics/generate-report')
+            assert not verify_profile_token(token, 1, '/admin/dashboard')
+            assert not verify_profile_token('1.deadbeef', 1, '/admin/dashboard')
+
+class TestTracing:
+    """Test suite for request tracing spans"""
+    
+    def test_spans_nest_and_summarize(self):
+        """Test that nested spans record their parent and aggregate by path"""
+        app = create_app('testing')
+        
+        with app.test_request_context('/auth/register', method='POST'):
+            g.trace = RequestTrace()
+            with span('marshmallow.load', schema='RegisterSchema'):
+                pass
+            with span('upload.save'):
+                with span('pil.optimize'):
+                    pass
+            
+            response = app.response_class(status=201)
+            record = g.trace.to_record(response)
+        
+        names = {s['name']: s for s in record['spans']}
+        assert names['marshmallow.load']['parent'] is None
+        assert names['marshmallow.load']['attrs'] == {'schema': 'RegisterSchema'}
+        assert names['pil.optimize']['parent'] == names['upload.save']['id']
+        
+        assert record['endpoint'] == '/auth/register'
+        summaries = summarize([record, record])
+        summary = summaries['POST /auth/register']
+        assert summary.count == 2
+        assert summary.span_counts[('upload.save', 'pil.optimize')] == 2
+    
+    def test_span_is_noop_without_trace(self):
+        """Test that spans outside a traced request do nothing"""
+        with span('bcrypt.hash') as current:
+            assert current is None
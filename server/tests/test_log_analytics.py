@@ -0,0 +1,72 @@
+# Tests for GAU-ID-View offline log analytics
+import os
+import sys
+import gzip
+import json
+import tempfile
+from datetime import datetime
+
+# Add the server directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.log_analytics import (
+    LatencySketch, analyze, find_log_files, iter_records, normalize_path, parse_time
+)
+
+def _completed(path, duration, status_code, request_id, timestamp='2025-01-10T12:00:00.000000Z', endpoint=None):
+    extra = {'duration': duration, 'status_code': status_code, 'request_id': request_id}
+    if endpoint:
+        extra['endpoint'] = endpoint
+    return json.dumps({
+        'timestamp': timestamp,
+        'message': 'Request completed',
+        'request': {'method': 'GET', 'path': path},
+        'extra': extra
+    })
+
+class TestLogAnalytics:
+    """Test suite for the log analytics used by log_report.py"""
+
+    def test_sketch_quantiles_within_accuracy(self):
+        """Test that sketch percentiles stay within the configured relative error"""
+        sketch = LatencySketch(accuracy=0.01)
+        for ms in range(1, 1001):
+            sketch.add(ms / 1000)
+
+        assert abs(sketch.quantile(0.5) - 0.5) / 0.5 < 0.02
+        assert abs(sketch.quantile(0.99) - 0.99) / 0.99 < 0.02
+        assert len(sketch.buckets) < 400
+
+    def test_rotated_and_gzipped_logs(self):
+        """Test aggregation across current, rotated and gzipped files"""
+        with tempfile.TemporaryDirectory() as log_dir:
+            with open(os.path.join(log_dir, 'app.log'), 'w') as f:
+                f.write(_completed('/admin/approve/12', 0.2, 200, 'aaaa1111', endpoint='/admin/approve/<int:student_id>') + '\n')
+                f.write('{"message": "Logging system initialized"}\n')
+            with open(os.path.join(log_dir, 'app.log.1'), 'w') as f:
+                f.write(_completed('/admin/approve/7', 1.5, 500, 'bbbb2222') + '\n')
+            with gzip.open(os.path.join(log_dir, 'app.log.2.gz'), 'wt') as f:
+                f.write(_completed('/admin/approve/3', 0.1, 404, 'cccc3333', timestamp='2025-01-01T00:00:00Z') + '\n')
+            with open(os.path.join(log_dir, 'error.log'), 'w') as f:
+                f.write(_completed('/health', 9.0, 500, 'ignored') + '\n')
+
+            paths = find_log_files(log_dir, 'app.log')
+            assert len(paths) == 3
+
+            report = analyze(iter_records(paths))
+            assert report['overall']['count'] == 3
+            assert report['overall']['slowest'][0]['request_id'] == 'bbbb2222'
+
+            windowed = analyze(iter_records(paths), since=parse_time('2025-01-05T00:00:00'))
+            assert windowed['overall']['count'] == 2
+            assert windowed['overall']['error_rate'] == 0.5
+
+    def test_path_normalization_and_relative_time(self):
+        """Test id segments collapse and relative windows resolve"""
+        assert normalize_path('/admin/approve/42') == '/admin/approve/<id>'
+        assert normalize_path('/uploads/3f2b1c4d-1111-2222-3333-444455556666/photo') == '/uploads/<id>/photo'
+
+        now = datetime(2025, 1, 10, 12, 0, 0)
+        assert parse_time('6h', now=now) == datetime(2025, 1, 10, 6, 0, 0)
+        assert parse_time('2025-01-10T03:00:00+03:00') == datetime(2025, 1, 10, 0, 0, 0)
+        assert parse_time('2025-01-10T03:00:00Z') == datetime(2025, 1, 10, 3, 0, 0)
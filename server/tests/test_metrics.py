@@ -0,0 +1,56 @@
+# Unit Tests for the GAU-ID-View metrics registry
+import os
+import sys
+import tempfile
+
+# Add the server directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.metrics import MetricsRegistry
+
+class TestMetricsRegistry:
+    """Test suite for counters, gauges, histograms and worker aggregation"""
+    
+    def test_counter_and_histogram_rendering(self):
+        """Test Prometheus text output for a single process"""
+        registry = MetricsRegistry()
+        requests_total = registry.counter('requests_total', 'Requests')
+        latency = registry.histogram('latency_seconds', 'Latency', buckets=(0.1, 1.0))
+        
+        requests_total.inc(endpoint='/health', status=200)
+        requests_total.inc(endpoint='/health', status=200)
+        latency.observe(0.05, endpoint='/health')
+        latency.observe(0.5, endpoint='/health')
+        latency.observe(5.0, endpoint='/health')
+        
+        output = registry.render()
+        assert '# TYPE requests_total counter' in output
+        assert 'requests_total{endpoint="/health",status="200"} 2' in output
+        assert 'latency_seconds_bucket{endpoint="/health",le="0.1"} 1' in output
+        assert 'latency_seconds_bucket{endpoint="/health",le="1"} 2' in output
+        assert 'latency_seconds_bucket{endpoint="/health",le="+Inf"} 3' in output
+        assert 'latency_seconds_count{endpoint="/health"} 3' in output
+    
+    def test_aggregation_across_worker_files(self):
+        """Test that counters sum across workers and dead workers drop gauges"""
+        with tempfile.TemporaryDirectory() as directory:
+            registry = MetricsRegistry(directory)
+            registry.counter('jobs_total', 'Jobs').inc(3)
+            registry.gauge('busy', 'Busy').set(1)
+            
+            # A recycled worker left its final counters behind
+            with open(os.path.join(directory, 'metrics_999999999.json'), 'w') as f:
+                f.write('{"pid": 999999999, "metrics": {'
+                        '"jobs_total": {"type": "counter", "help": "Jobs", "buckets": null, "samples": [[[], 4]]},'
+                        '"busy": {"type": "gauge", "help": "Busy", "buckets": null, "samples": [[[], 5]]}}}')
+            
+            assert registry.sample_value('jobs_total') == 7
+            assert registry.sample_value('busy') == 1
+    
+    def test_metrics_endpoint_is_not_rate_limited(self):
+        """Test a frequent scraper stays under no rate limit (the default is 100 per hour)"""
+        from app import create_app
+        
+        client = create_app('testing').test_client()
+        statuses = {client.get('/metrics').status_code for _ in range(120)}
+        assert statuses == {200}
@@ -0,0 +1,537 @@
+# Tests for GAU-ID-View upload storage
+import io
+import os
+import sys
+import time
+import fcntl
+import hashlib
+import pytest
+from datetime import datetime, timedelta
+from PIL import Image
+
+# Add the server directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask_jwt_extended import create_access_token
+from app import create_app
+from models import db, User, StudentProfile, StoredBlob, UploadSession
+from utils.blob_store import blob_digest, blob_path, blob_ref_count, release_blob, hash_file, write_blob_bytes
+from utils.file_handler import delete_file, photo_variant_path, get_file_url, ensure_photo_variant
+from utils.file_serving import sign_file_path, verify_file_signature
+from utils import file_handler, upload_spool
+import migrate_uploads
+import upload_gc
+
+PDF = b'%PDF-1.4\n' + b'supporting document ' * 500
+
+def make_photo(color='gray'):
+    """A valid 3:4 passport photo; different colours give different bytes"""
+    output = io.BytesIO()
+    Image.new('RGB', (900, 1200), color).save(output, 'JPEG')
+    return output.getvalue()
+
+class TestContentAddressedStorage:
+    """Test suite for sharded, deduplicated upload storage"""
+
+    @pytest.fixture
+    def app(self, tmp_path):
+        """Create application with two students and a temporary upload folder"""
+        app = create_app('testing')
+        app.config['UPLOAD_FOLDER'] = str(tmp_path)
+
+        with app.app_context():
+            db.create_all()
+            for index in (1, 2):
+                student = User(
+                    name=f'Storage Student {index}', reg_number=f'GAU/CAS/00{index}',
+                    email=f'storage{index}@students.gau.ac.ke', department='Computer Science',
+                    password_hash='x'
+                )
+                db.session.add(student)
+                db.session.flush()
+                db.session.add(StudentProfile(user_id=student.id, status='pending'))
+            db.session.commit()
+            yield app
+            db.session.remove()
+            db.drop_all()
+
+    @pytest.fixture
+    def students(self, app):
+        return User.query.order_by(User.id).all()
+
+    def _post(self, client, user, endpoint, field, data, filename):
+        return client.post(
+            f'/student/{endpoint}',
+            headers={'Authorization': f'Bearer {create_access_token(identity=user.id)}'},
+            data={field: (io.BytesIO(data), filename)}, content_type='multipart/form-data'
+        )
+
+    def test_identical_documents_share_one_blob(self, app, students, tmp_path):
+        """Test that resubmitted bytes are stored once, sharded by their SHA-256"""
+        client = app.test_client()
+        paths = [
+            self._post(client, student, 'upload-document', 'document', PDF, 'transcript.PDF').get_json()['data']['file_path']
+            for student in students
+        ]
+
+        digest = blob_digest(paths[0])
+        assert paths[0] == paths[1] == f'documents/supporting/{digest[:2]}/{digest[2:4]}/{digest}.pdf'
+        assert hash_file(tmp_path / paths[0])[0] == digest
+        assert StoredBlob.query.one().ref_count == 2
+        assert os.listdir(tmp_path / 'documents' / 'supporting') == [digest[:2]]
+
+    def test_delete_only_unlinks_unreferenced_blobs(self, app, students, tmp_path):
+        """Test that a shared file survives until its last reference is released"""
+        path = self._post(app.test_client(), students[0], 'upload-document', 'document', PDF, 'a.pdf').get_json()['data']['file_path']
+        self._post(app.test_client(), students[1], 'upload-document', 'document', PDF, 'b.pdf')
+
+        assert release_blob(path) is False
+        db.session.commit()
+        assert delete_file(path) == (False, "File is still referenced")
+        assert (tmp_path / path).exists()
+
+        assert release_blob(path) is True
+        db.session.commit()
+        assert delete_file(path)[0] is True
+        assert not (tmp_path / path).exists()
+
+    def test_shared_photo_kept_until_both_students_replace_it(self, app, students, tmp_path):
+        """Test reference counts follow photo_url when two students upload the same photo"""
+        client = app.test_client()
+        photo = make_photo()
+        for student in students:
+            self._post(client, student, 'upload-photo', 'photo', photo, 'photo.jpg')
+        shared = students[0].profile.photo_url
+        assert students[1].profile.photo_url == shared
+        assert blob_ref_count(shared) == 2
+
+        self._post(client, students[0], 'upload-photo', 'photo', make_photo('navy'), 'photo.jpg')
+        db.session.expire_all()
+        assert blob_ref_count(shared) == 1
+        assert (tmp_path / shared).exists()
+
+        self._post(client, students[1], 'upload-photo', 'photo', make_photo('navy'), 'photo.jpg')
+        db.session.expire_all()
+        assert blob_ref_count(shared) == 0
+        assert not (tmp_path / shared).exists()
+        assert students[0].profile.photo_url == students[1].profile.photo_url != shared
+
+    def test_migration_moves_flat_uploads(self, app, students, tmp_path):
+        """Test that legacy files are moved, merged and counted, and the run can be repeated"""
+        profiles = tmp_path / 'photos' / 'profiles'
+        documents = tmp_path / 'documents' / 'supporting'
+        profiles.mkdir(parents=True)
+        documents.mkdir(parents=True)
+        photo = make_photo()
+        for student in students:
+            (profiles / f'photo_{student.id}_1700000000_abcd.jpg').write_bytes(photo)
+            student.profile.photo_url = f'photos/profiles/photo_{student.id}_1700000000_abcd.jpg'
+        (profiles / f'photo_{students[0].id}_1700000000_abcd@thumb.jpg').write_bytes(b'thumb')
+        (documents / 'document_1_1700000000_abcd.pdf').write_bytes(PDF)
+        db.session.commit()
+
+        stats = migrate_uploads.run(str(tmp_path), batch_size=1, dry_run=False)
+        db.session.expire_all()
+
+        new_path = students[0].profile.photo_url
+        assert blob_digest(new_path) and students[1].profile.photo_url == new_path
+        assert blob_ref_count(new_path) == 2
+        assert (tmp_path / photo_variant_path(new_path, 'thumb')).read_bytes() == b'thumb'
+        assert [path for path in profiles.iterdir() if path.is_file()] == []
+        assert [path for path in documents.iterdir() if path.is_file()] == []
+        assert stats['files'] == 3 and stats['duplicates'] == 1 and stats['references'] == 3
+
+        assert migrate_uploads.run(str(tmp_path), batch_size=1, dry_run=False)['files'] == 0
+
+class TestFileServing:
+    """Test suite for signed, cacheable upload URLs"""
+
+    @pytest.fixture
+    def app(self, tmp_path):
+        """Create application with one stored document and one legacy file"""
+        app = create_app('testing')
+        app.config['UPLOAD_FOLDER'] = str(tmp_path)
+
+        with app.app_context():
+            db.create_all()
+            write_blob_bytes(str(tmp_path), 'documents/supporting', PDF, 'pdf')
+            (tmp_path / 'documents' / 'legacy.pdf').write_bytes(PDF)
+            yield app
+            db.session.remove()
+            db.drop_all()
+
+    @pytest.fixture
+    def document(self, app):
+        return blob_path('documents/supporting', hashlib.sha256(PDF).hexdigest(), 'pdf')
+
+    def test_urls_must_be_signed(self, app, document):
+        """Test that unsigned, tampered and expired links are refused"""
+        client = app.test_client()
+        url = get_file_url(document)
+
+        assert client.get(url).status_code == 200
+        assert client.get(f'/student/files/{document}').status_code == 403
+        assert client.get(url.replace('documents/supporting', 'documents')).status_code == 403
+        assert client.get(url[:-1] + ('0' if url[-1] != '0' else '1')).status_code == 403
+        assert verify_file_signature(document, int(time.time()) - 1, sign_file_path(document)['sig']) is False
+        assert get_file_url(document) == url  # stable within the TTL, so browsers can cache it
+
+    def test_etag_cache_control_and_conditional_get(self, app, document):
+        """Test strong ETags from the content hash and immutable caching of blobs"""
+        client = app.test_client()
+        response = client.get(get_file_url(document))
+
+        assert response.headers['ETag'] == f'"{hashlib.sha256(PDF).hexdigest()}"'
+        assert response.cache_control.private and response.cache_control.immutable
+        assert 0 < response.cache_control.max_age <= 2 * app.config['FILE_URL_TTL']
+        assert response.data == PDF
+
+        response = client.get(get_file_url(document), headers={'If-None-Match': response.headers['ETag']})
+        assert response.status_code == 304 and response.data == b''
+
+        legacy = client.get(get_file_url('documents/legacy.pdf'))
+        assert legacy.headers['ETag'] == f'"{hashlib.sha256(PDF).hexdigest()}"'
+        assert legacy.cache_control.no_cache and not legacy.cache_control.immutable
+
+    def test_range_requests(self, app, document):
+        """Test that byte ranges are served for resumable downloads"""
+        response = app.test_client().get(get_file_url(document), headers={'Range': 'bytes=0-7'})
+
+        assert response.status_code == 206
+        assert response.data == PDF[:8]
+        assert response.headers['Content-Range'] == f'bytes 0-7/{len(PDF)}'
+
+    def test_offload_to_front_proxy(self, app, document, tmp_path):
+        """Test that X-Accel-Redirect and X-Sendfile leave the body to the web server"""
+        client = app.test_client()
+        app.config['FILE_SERVING'] = 'x-accel'
+        response = client.get(get_file_url(document))
+
+        assert response.headers['X-Accel-Redirect'] == f'/internal-uploads/{document}'
+        assert response.data == b''
+        assert response.headers['ETag'] == f'"{hashlib.sha256(PDF).hexdigest()}"'
+
+        response = client.get(get_file_url(document), headers={'If-None-Match': response.headers['ETag']})
+        assert response.status_code == 304
+        assert 'X-Accel-Redirect' not in response.headers
+
+        app.config['FILE_SERVING'] = 'x-sendfile'
+        response = client.get(get_file_url(document))
+        assert response.headers['X-Sendfile'] == str(tmp_path / document)
+
+    def test_paths_outside_upload_folder_are_refused(self, app, tmp_path):
+        """Test `..` paths get 404 and no derivative is written next to the target, even unsigned"""
+        app.config['FILE_URLS_SIGNED'] = False
+        uploads = tmp_path / 'uploads'
+        uploads.mkdir()
+        app.config['UPLOAD_FOLDER'] = str(uploads)
+        outside = tmp_path / 'outside'
+        outside.mkdir()
+        Image.new('RGB', (40, 40)).save(outside / 'x.jpg')
+
+        response = app.test_client().get('/student/files/photos/profiles/../../../outside/x.jpg?size=thumb')
+        assert response.status_code == 404
+        assert os.listdir(outside) == ['x.jpg']
+        with pytest.raises(ValueError):
+            ensure_photo_variant('photos/profiles/../../../outside/x.jpg', 'thumb')
+        assert os.listdir(outside) == ['x.jpg']
+
+class TestEarlyUploadRejection:
+    """Test suite for checking uploads before their body is read"""
+
+    @pytest.fixture
+    def app(self, tmp_path):
+        """Create application with one student and a temporary upload folder"""
+        app = create_app('testing')
+        app.config['UPLOAD_FOLDER'] = str(tmp_path)
+
+        with app.app_context():
+            db.create_all()
+            student = User(
+                name='Spool Student', reg_number='GAU/SP/001', email='spool@students.gau.ac.ke',
+                department='Computer Science', password_hash='x'
+            )
+            db.session.add(student)
+            db.session.flush()
+            db.session.add(StudentProfile(user_id=student.id, status='pending'))
+            db.session.commit()
+            yield app
+            db.session.remove()
+            db.drop_all()
+
+    def _post(self, app, endpoint, field, data, filename, headers=None):
+        student = User.query.one()
+        return app.test_client().post(
+            f'/student/{endpoint}',
+            headers={'Authorization': f'Bearer {create_access_token(identity=student.id)}', **(headers or {})},
+            data={field: (io.BytesIO(data), filename)}, content_type='multipart/form-data'
+        )
+
+    def _files(self, tmp_path):
+        return sorted(str(path.relative_to(tmp_path)) for path in tmp_path.rglob('*') if path.is_file())
+
+    def test_oversized_content_length_is_refused_before_parsing(self, app, tmp_path, monkeypatch):
+        """Test a Content-Length over the document limit is refused without spooling anything"""
+        monkeypatch.setattr(file_handler, 'MAX_DOCUMENT_SIZE', 1024)
+        response = self._post(app, 'upload-document', 'document', PDF + b' ' * (64 * 1024), 'big.pdf')
+        assert response.status_code == 413
+        assert self._files(tmp_path) == []
+
+    def test_part_over_the_limit_stops_while_streaming(self, app, tmp_path, monkeypatch):
+        """Test a file part is cut off at the limit even when the Content-Length looks acceptable"""
+        monkeypatch.setattr(file_handler, 'MAX_DOCUMENT_SIZE', 4096)
+        response = self._post(app, 'upload-document', 'document', PDF, 'a.pdf')
+        assert response.status_code == 413
+        assert 'Maximum size' in response.get_json()['message']
+        assert self._files(tmp_path) == []
+
+    def test_wrong_magic_bytes_are_rejected_from_the_first_chunk(self, app, tmp_path):
+        """Test files whose content does not match an allowed type are refused"""
+        response = self._post(app, 'upload-document', 'document', b'MZ\x90\x00' + b'\x00' * 4096, 'cv.pdf')
+        assert response.status_code == 415
+        response = self._post(app, 'upload-photo', 'photo', PDF, 'photo.jpg')
+        assert response.status_code == 415
+        # A document in the photo slot is no better than one renamed to .jpg
+        response = self._post(app, 'upload-document', 'document', make_photo(), 'scan.pdf')
+        assert response.status_code == 415
+        assert self._files(tmp_path) == []
+
+    def test_accepted_upload_is_renamed_from_the_spool(self, app, tmp_path):
+        """Test accepted files move from the spool into place and leave nothing behind"""
+        response = self._post(app, 'upload-document', 'document', PDF, 'a.pdf')
+        assert response.status_code == 200
+        digest = hashlib.sha256(PDF).hexdigest()
+        assert self._files(tmp_path) == [blob_path('documents/supporting', digest, 'pdf')]
+        assert os.listdir(tmp_path / upload_spool.SPOOL_DIR) == []
+
+class TestResumableUploads:
+    """Test suite for chunked, resumable document uploads"""
+
+    @pytest.fixture
+    def app(self, tmp_path):
+        """Create application with one student and a temporary upload folder"""
+        app = create_app('testing')
+        app.config['UPLOAD_FOLDER'] = str(tmp_path)
+
+        with app.app_context():
+            db.create_all()
+            student = User(
+                name='Resume Student', reg_number='GAU/RS/001', email='resume@students.gau.ac.ke',
+                department='Computer Science', password_hash='x'
+            )
+            db.session.add(student)
+            db.session.flush()
+            db.session.add(StudentProfile(user_id=student.id, status='pending'))
+            db.session.commit()
+            yield app
+            db.session.remove()
+            db.drop_all()
+
+    @pytest.fixture
+    def headers(self, app):
+        return {'Authorization': f'Bearer {create_access_token(identity=User.query.one().id)}'}
+
+    def _create(self, client, headers, size=len(PDF), filename='transcript.pdf'):
+        return client.post(
+            '/student/upload-sessions', headers=headers,
+            json={'filename': filename, 'size': size, 'description': 'Transcript'}
+        )
+
+    def _patch(self, client, headers, session, offset, data):
+        return client.patch(
+            session['upload_url'], headers={**headers, 'Upload-Offset': str(offset)},
+            data=data, content_type='application/offset+octet-stream'
+        )
+
+    def test_chunks_resume_from_the_server_offset(self, app, headers, tmp_path):
+        """Test a document sent in chunks, with a stale retry, is stored like a one-shot upload"""
+        client = app.test_client()
+        response = self._create(client, headers)
+        assert response.status_code == 201
+        session = response.get_json()['data']
+        assert session['offset'] == 0 and session['size'] == len(PDF)
+
+        assert self._patch(client, headers, session, 0, PDF[:4000]).headers['Upload-Offset'] == '4000'
+
+        # The client lost that response and resends the first chunk: told where to resume instead
+        response = self._patch(client, headers, session, 0, PDF[:4000])
+        assert response.status_code == 409 and response.headers['Upload-Offset'] == '4000'
+        assert client.get(session['upload_url'], headers=headers).get_json()['data']['offset'] == 4000
+
+        response = client.post(session['complete_url'], headers=headers)
+        assert response.status_code == 409  # not everything has arrived yet
+
+        assert self._patch(client, headers, session, 4000, PDF[4000:]).status_code == 200
+        response = client.post(session['complete_url'], headers=headers)
+        assert response.status_code == 200
+        data = response.get_json()['data']
+        digest = hashlib.sha256(PDF).hexdigest()
+        assert data['file_path'] == blob_path('documents/supporting', digest, 'pdf')
+        assert data['description'] == 'Transcript'
+        assert (tmp_path / data['file_path']).read_bytes() == PDF
+        assert blob_ref_count(data['file_path']) == 1
+        assert UploadSession.query.count() == 0
+        assert os.listdir(tmp_path / upload_spool.SPOOL_DIR) == []
+        assert client.get(session['upload_url'], headers=headers).status_code == 404
+
+    def test_appends_to_one_upload_are_serialized(self, app, headers, tmp_path):
+        """Test a chunk arriving while another is still being written gets 409 and leaves the spool alone"""
+        client = app.test_client()
+        session = self._create(client, headers).get_json()['data']
+        assert self._patch(client, headers, session, 0, PDF[:4000]).status_code == 200
+
+        spool = tmp_path / upload_spool.SPOOL_DIR / f"{session['id']}.part"
+        with open(spool, 'rb') as held:
+            fcntl.flock(held.fileno(), fcntl.LOCK_EX)  # the first request, still streaming
+            assert self._patch(client, headers, session, 4000, PDF[4000:]).status_code == 409
+        assert spool.read_bytes() == PDF[:4000]
+
+        assert self._patch(client, headers, session, 4000, PDF[4000:]).status_code == 200
+        assert client.post(session['complete_url'], headers=headers).status_code == 200
+
+    def test_limits_and_content_are_checked_early(self, app, headers, tmp_path):
+        """Test declared size, chunk overruns and magic bytes are refused before the upload completes"""
+        client = app.test_client()
+        assert self._create(client, headers, size=11 * 1024 * 1024).status_code == 413
+        assert self._create(client, headers, filename='setup.exe').status_code == 400
+
+        session = self._create(client, headers, size=100).get_json()['data']
+        assert self._patch(client, headers, session, 0, PDF[:101]).status_code == 413
+
+        response = self._patch(client, headers, session, 0, b'MZ\x90\x00' + b'\x00' * 60)
+        assert response.status_code == 415
+        assert UploadSession.query.count() == 0
+        assert os.listdir(tmp_path / upload_spool.SPOOL_DIR) == []
+
+    def test_stale_sessions_are_cleaned_up(self, app, headers, tmp_path):
+        """Test sessions idle past UPLOAD_SESSION_TTL are dropped with their spool files"""
+        client = app.test_client()
+        stale = self._create(client, headers).get_json()['data']
+        self._patch(client, headers, stale, 0, PDF[:1000])
+        UploadSession.query.filter_by(id=stale['id']).update(
+            {UploadSession.updated_at: datetime.utcnow() - timedelta(days=2)}
+        )
+        db.session.commit()
+
+        assert client.get(stale['upload_url'], headers=headers).status_code == 404
+        assert not (tmp_path / upload_spool.SPOOL_DIR / f"{stale['id']}.part").exists()
+
+        # Never touched again: swept when the next session starts
+        stale = self._create(client, headers).get_json()['data']
+        UploadSession.query.filter_by(id=stale['id']).update(
+            {UploadSession.updated_at: datetime.utcnow() - timedelta(days=2)}
+        )
+        db.session.commit()
+        fresh = self._create(client, headers).get_json()['data']
+        assert [session.id for session in UploadSession.query] == [fresh['id']]
+        assert os.listdir(tmp_path / upload_spool.SPOOL_DIR) == [f"{fresh['id']}.part"]
+
+class TestUploadGarbageCollector:
+    """Test suite for finding and removing orphaned uploads"""
+
+    @pytest.fixture
+    def app(self, tmp_path):
+        """Create application with one student whose photo and document are stored"""
+        app = create_app('testing')
+        app.config['UPLOAD_FOLDER'] = str(tmp_path)
+
+        with app.app_context():
+            db.create_all()
+            student = User(
+                name='GC Student', reg_number='GAU/GC/001', email='gc@students.gau.ac.ke',
+                department='Computer Science', password_hash='x'
+            )
+            admin = User(
+                name='GC Admin', reg_number='GAU/ADM/GC', email='gc-admin@gau.ac.ke',
+                department='Administration', password_hash='x', role='admin'
+            )
+            db.session.add_all([student, admin])
+            db.session.flush()
+            db.session.add(StudentProfile(user_id=student.id, status='pending'))
+            db.session.commit()
+            yield app
+            db.session.remove()
+            db.drop_all()
+
+    def _post(self, client, user, endpoint, field, data, filename):
+        return client.post(
+            f'/student/{endpoint}',
+            headers={'Authorization': f'Bearer {create_access_token(identity=user.id)}'},
+            data={field: (io.BytesIO(data), filename)}, content_type='multipart/form-data'
+        )
+
+    def _stored(self, app, tmp_path):
+        """Upload a photo and a document for the student; returns their paths"""
+        student = User.query.filter_by(role='student').one()
+        client = app.test_client()
+        self._post(client, student, 'upload-photo', 'photo', make_photo(), 'photo.jpg')
+        document = self._post(client, student, 'upload-document', 'document', PDF, 'a.pdf').get_json()['data']
+        return student.profile.photo_url, document['file_path']
+
+    def _age(self, tmp_path, days=2):
+        old = time.time() - days * 24 * 3600
+        for path in tmp_path.rglob('*'):
+            os.utime(path, (old, old))
+
+    def test_only_unreferenced_old_files_are_collected(self, app, tmp_path):
+        """Test referenced files, derivatives and recent files are kept and orphans quarantined"""
+        photo, document = self._stored(app, tmp_path)
+        (tmp_path / 'photos' / 'profiles' / 'photo_9_1700000000_dead.jpg').write_bytes(b'old photo')
+        (tmp_path / 'documents' / 'supporting' / '.upload-crashed.tmp').write_bytes(b'partial')
+        (tmp_path / 'photos' / '.gitkeep').write_bytes(b'')
+        self._age(tmp_path)
+        (tmp_path / 'photos' / 'incoming').mkdir(exist_ok=True)
+        (tmp_path / 'photos' / 'incoming' / 'photo_1_new.jpg').write_bytes(b'uploading')
+
+        out = io.StringIO()
+        stats = upload_gc.collect(str(tmp_path), dry_run=True, out=out)
+        assert sorted(out.getvalue().split()) == [
+            'documents/supporting/.upload-crashed.tmp', 'photos/profiles/photo_9_1700000000_dead.jpg'
+        ]
+        assert stats['orphans'] == 2 and stats['recent'] == 1 and stats['referenced'] == 9
+        assert (tmp_path / 'photos' / 'profiles' / 'photo_9_1700000000_dead.jpg').exists()
+
+        upload_gc.collect(str(tmp_path))
+        run = next((tmp_path / '.quarantine').iterdir())
+        assert sorted(str(path.relative_to(run)) for path in run.rglob('*') if path.is_file()) == [
+            'documents/supporting/.upload-crashed.tmp', 'photos/profiles/photo_9_1700000000_dead.jpg'
+        ]
+        assert (tmp_path / photo).exists() and (tmp_path / photo_variant_path(photo, 'thumb', 'webp')).exists()
+        assert (tmp_path / document).exists()
+        assert (tmp_path / 'photos' / 'incoming' / 'photo_1_new.jpg').exists()
+
+    def test_files_removed_during_the_run_are_skipped(self, app, tmp_path, monkeypatch):
+        """Test a file the app deletes between the scan and its removal is counted, not fatal"""
+        profiles = tmp_path / 'photos' / 'profiles'
+        profiles.mkdir(parents=True, exist_ok=True)
+        (profiles / 'photo_8_1700000000_gone.jpg').write_bytes(b'replaced photo')
+        (profiles / 'photo_9_1700000000_dead.jpg').write_bytes(b'old photo')
+        self._age(tmp_path)
+        recheck = upload_gc.still_referenced
+
+        def delete_photo_meanwhile(paths):
+            (profiles / 'photo_8_1700000000_gone.jpg').unlink(missing_ok=True)
+            return recheck(paths)
+
+        monkeypatch.setattr(upload_gc, 'still_referenced', delete_photo_meanwhile)
+        stats = upload_gc.collect(str(tmp_path), delete=True)
+        assert stats['vanished'] == 1 and stats['orphans'] == 1
+        assert not (profiles / 'photo_9_1700000000_dead.jpg').exists()
+
+    def test_permanently_deleted_student_files_are_released(self, app, tmp_path):
+        """Test removing a student frees their photo and documents, and the GC finds nothing left"""
+        photo, document = self._stored(app, tmp_path)
+        admin = User.query.filter_by(role='admin').one()
+        student = User.query.filter_by(role='student').one()
+
+        response = app.test_client().delete(
+            f'/admin/remove/{student.id}', json={'permanent': True},
+            headers={'Authorization': f'Bearer {create_access_token(identity=admin.id)}'}
+        )
+
+        assert response.status_code == 200
+        assert not (tmp_path / photo).exists() and not (tmp_path / document).exists()
+        assert not (tmp_path / photo_variant_path(photo, 'thumb', 'webp')).exists()
+        assert blob_ref_count(photo) == blob_ref_count(document) == 0
+        self._age(tmp_path)
+        assert upload_gc.collect(str(tmp_path), delete=True)['orphans'] == 0
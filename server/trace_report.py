@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Summarize request traces from logs/traces.jsonl
+
+Usage:
+    python trace_report.py                       # flame-style tree per endpoint
+    python trace_report.py --endpoint /admin/students --top 5
+    python trace_report.py --collapsed > traces.folded   # for flamegraph.pl / speedscope
+"""
+import os
+import sys
+import glob
+import json
+import argparse
+from collections import defaultdict
+
+DEFAULT_TRACE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs', 'traces.jsonl')
+BAR_WIDTH = 30
+
+def trace_files(path):
+    """The trace file plus its rotated backups, oldest first"""
+    files = [f for f in glob.glob(f'{path}.*') if f.rsplit('.', 1)[-1].isdigit()]
+    files.sort(key=lambda f: int(f.rsplit('.', 1)[-1]), reverse=True)
+    if os.path.exists(path):
+        files.append(path)
+    return files
+
+def read_traces(paths):
+    """Yield trace records, skipping lines that are not valid JSON"""
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+def span_paths(trace):
+    """Map each span to its stack of names from the request root"""
+    by_id = {s['id']: s for s in trace.get('spans', [])}
+    paths = {}
+    for s in trace.get('spans', []):
+        names = [s['name']]
+        parent = by_id.get(s.get('parent'))
+        while parent is not None:
+            names.append(parent['name'])
+            parent = by_id.get(parent.get('parent'))
+        paths[s['id']] = tuple(reversed(names))
+    return paths
+
+class EndpointSummary:
+    """Aggregated timings for one `METHOD endpoint`"""
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.total = 0.0
+        self.db_time = 0.0
+        self.db_queries = 0
+        self.errors = 0
+        self.span_totals = defaultdict(float)   # path -> total seconds
+        self.span_counts = defaultdict(int)     # path -> occurrences
+
+    def add(self, trace):
+        self.count += 1
+        self.total += trace.get('duration', 0.0)
+        self.db_time += trace.get('db_time', 0.0)
+        self.db_queries += trace.get('db_query_count', 0)
+        if trace.get('status', 200) >= 500:
+            self.errors += 1
+
+        paths = span_paths(trace)
+        for s in trace.get('spans', []):
+            path = paths[s['id']]
+            self.span_totals[path] += s.get('duration') or 0.0
+            self.span_counts[path] += 1
+
+    def self_times(self):
+        """Total minus time attributed to direct children, per path"""
+        child_time = defaultdict(float)
+        for path, total in self.span_totals.items():
+            if len(path) > 1:
+                child_time[path[:-1]] += total
+        return {path: max(total - child_time[path], 0.0) for path, total in self.span_totals.items()}
+
+def summarize(traces, endpoint=None):
+    summaries = {}
+    for trace in traces:
+        if endpoint and trace.get('endpoint') != endpoint:
+            continue
+        key = f"{trace.get('method', '?')} {trace.get('endpoint', 'unmatched')}"
+        summary = summaries.get(key)
+        if summary is None:
+            summary = summaries[key] = EndpointSummary(key)
+        summary.add(trace)
+    return summaries
+
+def _bar(fraction):
+    filled = int(round(min(max(fraction, 0.0), 1.0) * BAR_WIDTH))
+    return '#' * filled + '.' * (BAR_WIDTH - filled)
+
+def render_tree(summary, out):
+    mean = summary.total / summary.count
+    out.write(f'\n{summary.name}  requests={summary.count} errors={summary.errors} '
+              f'mean={mean * 1000:.1f}ms\n')
+    out.write(f"  {'request':<40} {_bar(1.0)} {mean * 1000:9.2f}ms 100.0%\n")
+
+    db_mean = summary.db_time / summary.count
+    if summary.db_queries:
+        share = db_mean / mean if mean else 0.0
+        out.write(f"  {'  [db] %.1f queries/req' % (summary.db_queries / summary.count):<40} "
+                  f"{_bar(share)} {db_mean * 1000:9.2f}ms {share * 100:5.1f}%\n")
+
+    # Depth-first over the recorded paths, children ordered by total time
+    children = defaultdict(list)
+    for path in summary.span_totals:
+        children[path[:-1]].append(path)
+
+    def walk(parent):
+        for path in sorted(children.get(parent, []), key=lambda p: summary.span_totals[p], reverse=True):
+            span_mean = summary.span_totals[path] / summary.count
+            share = span_mean / mean if mean else 0.0
+            label = '  ' * len(path) + path[-1]
+            calls = summary.span_counts[path] / summary.count
+            if calls != 1:
+                label += f' x{calls:.1f}'
+            out.write(f'  {label:<40} {_bar(share)} {span_mean * 1000:9.2f}ms {share * 100:5.1f}%\n')
+            walk(path)
+
+    walk(())
+
+def render_collapsed(summaries, out):
+    """Folded stacks (`frame;frame value`) in microseconds of self time"""
+    for summary in summaries.values():
+        root = summary.name.replace(';', ':').replace(' ', '_')
+        self_times = summary.self_times()
+        top_level = sum(total for path, total in summary.span_totals.items() if len(path) == 1)
+        untraced = max(summary.total - top_level, 0.0)
+        out.write(f'{root} {int(untraced * 1e6)}\n')
+        for path, seconds in sorted(self_times.items()):
+            frames = ';'.join([root] + [name.replace(';', ':') for name in path])
+            out.write(f'{frames} {int(seconds * 1e6)}\n')
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Summarize request tracing spans')
+    parser.add_argument('--file', default=DEFAULT_TRACE_FILE, help='trace file (rotated backups are included)')
+    parser.add_argument('--endpoint', help='only include this route rule, e.g. /admin/students')
+    parser.add_argument('--top', type=int, default=10, help='endpoints to show, by total time')
+    parser.add_argument('--collapsed', action='store_true', help='print folded stacks for flame graph tools')
+    args = parser.parse_args(argv)
+
+    files = trace_files(args.file)
+    if not files:
+        print(f'No trace files found at {args.file}', file=sys.stderr)
+        return 1
+
+    summaries = summarize(read_traces(files), endpoint=args.endpoint)
+    if not summaries:
+        print('No matching traces', file=sys.stderr)
+        return 1
+
+    if args.collapsed:
+        render_collapsed(summaries, sys.stdout)
+        return 0
+
+    ranked = sorted(summaries.values(), key=lambda s: s.total, reverse=True)[:args.top]
+    for summary in ranked:
+        render_tree(summary, sys.stdout)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
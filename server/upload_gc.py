@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Quarantine or delete uploaded files that no record refers to
+
+A file is kept if any of these point at it (derivatives such as
+<photo>@thumb.webp follow their photo):
+    student_profiles.photo_url, student_documents.file_path,
+    image_jobs.source_path of queued jobs, upload_sessions.spool_path,
+    stored_blobs with references
+
+Referenced paths are streamed from the database into a set of 64-bit keys
+(a blob's digest prefix, otherwise a hash of the path), about 150 bytes
+per reference, and the upload tree is walked with os.scandir one directory at
+a time, so memory does not grow with the number of files on disk. A key
+collision can only keep a file. Anything not matched is checked again
+against the database, exactly and in batches, just before it is touched
+(a concurrent upload may have just referenced it), and files newer
+than the grace period are left alone so uploads and photo jobs still in
+flight are never collected.
+
+Orphans are moved to <UPLOAD_FOLDER>/.quarantine/<run>/ (same relative
+path) unless --delete is given.
+
+Usage:
+    python upload_gc.py --dry-run
+    python upload_gc.py --grace-hours 48
+    python upload_gc.py --delete
+    python upload_gc.py --purge-quarantine-days 30
+"""
+import os
+import sys
+import time
+import shutil
+import hashlib
+import argparse
+from collections import Counter
+
+# Add the server directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+from models import db, StudentProfile, StudentDocument, ImageJob, UploadSession, StoredBlob
+from utils.blob_store import blob_digest
+from utils.file_handler import photo_variant_source
+from utils.upload_sessions import purge_stale_upload_sessions
+
+QUARANTINE_DIR = '.quarantine'
+RECHECK_BATCH = 500  # candidates re-checked against the database per round trip
+TEMP_PREFIX = '.upload-'  # atomic_write / write_blob temp files left by a crash
+
+def reference_queries():
+    """One single-column query per place an upload path is stored"""
+    return [
+        db.session.query(StudentProfile.photo_url),
+        db.session.query(StudentDocument.file_path),
+        db.session.query(ImageJob.source_path).filter(ImageJob.status == 'queued'),
+        db.session.query(UploadSession.spool_path),
+        db.session.query(StoredBlob.path).filter(StoredBlob.ref_count > 0),
+    ]
+
+def path_key(path):
+    """64-bit key: the digest prefix for content-addressed paths, else a hash of the path"""
+    digest = blob_digest(path)
+    if digest:
+        return int(digest[:16], 16)
+    return int.from_bytes(hashlib.blake2b(path.encode(), digest_size=8).digest(), 'big')
+
+def referenced_keys():
+    keys = set()
+    for query in reference_queries():
+        for (path,) in query.yield_per(1000):
+            if path:
+                keys.add(path_key(path))
+    return keys
+
+def still_referenced(paths):
+    """The subset of `paths` the database refers to right now (exact, one IN query per source)"""
+    found = set()
+    if not paths:
+        return found
+    for query in reference_queries():
+        column = query.column_descriptions[0]['expr']
+        found.update(path for (path,) in query.filter(column.in_(paths)))
+    return found
+
+def walk(upload_dir):
+    """Yield (relative path, DirEntry) for every file; holds one directory listing at a time"""
+    pending = ['']
+    while pending:
+        directory = pending.pop()
+        with os.scandir(os.path.join(upload_dir, directory)) as entries:
+            for entry in entries:
+                path = f"{directory}/{entry.name}" if directory else entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    if path != QUARANTINE_DIR:
+                        pending.append(path)
+                elif entry.is_file(follow_symlinks=False):
+                    yield path, entry
+
+def owner_path(path):
+    """The path a record would hold for this file (a derivative's photo)"""
+    source = photo_variant_source(path)
+    return source[0] if source else path
+
+def collect(upload_dir, grace_seconds=24 * 3600, delete=False, dry_run=False, out=sys.stdout):
+    """Walk the upload tree and remove orphans; returns counters"""
+    stats = Counter()
+    keys = referenced_keys()
+    cutoff = time.time() - grace_seconds
+    quarantine = os.path.join(upload_dir, QUARANTINE_DIR, time.strftime('%Y%m%d-%H%M%S'))
+    candidates = []  # (path, owner path or None for temp files, size)
+
+    def remove(batch):
+        referenced = still_referenced([owner for _, owner, _ in batch if owner])
+        for path, owner, size in batch:
+            if owner in referenced:
+                stats['referenced'] += 1
+                continue
+            if dry_run:
+                stats['orphans'] += 1
+                stats['orphan_bytes'] += size
+                print(path, file=out)
+                continue
+
+            source = os.path.join(upload_dir, path)
+            try:
+                if delete:
+                    os.unlink(source)
+                else:
+                    target = os.path.join(quarantine, path)
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    os.replace(source, target)
+            except FileNotFoundError:
+                # The app removed it since the scan (photo replaced, student deleted, upload completed)
+                stats['vanished'] += 1
+                continue
+            stats['orphans'] += 1
+            stats['orphan_bytes'] += size
+            if blob_digest(path):
+                StoredBlob.query.filter_by(path=path, ref_count=0).delete()
+        db.session.commit()
+        batch.clear()
+
+    for path, entry in walk(upload_dir):
+        name = entry.name
+        temporary = name.startswith(TEMP_PREFIX)
+        if name.startswith('.') and not temporary:
+            continue  # .gitkeep and friends
+
+        try:
+            stat = entry.stat(follow_symlinks=False)
+        except FileNotFoundError:
+            stats['vanished'] += 1
+            continue
+        stats['files'] += 1
+        stats['bytes'] += stat.st_size
+
+        owner = None if temporary else owner_path(path)
+        if owner and path_key(owner) in keys:
+            stats['referenced'] += 1
+        elif stat.st_mtime > cutoff:
+            stats['recent'] += 1
+        else:
+            candidates.append((path, owner, stat.st_size))
+            if len(candidates) >= RECHECK_BATCH:
+                remove(candidates)
+
+    remove(candidates)
+    return stats
+
+def purge_quarantine(upload_dir, days):
+    """Delete quarantine runs older than `days`; returns how many were removed"""
+    root = os.path.join(upload_dir, QUARANTINE_DIR)
+    if not os.path.isdir(root):
+        return 0
+    cutoff = time.time() - days * 24 * 3600
+    removed = 0
+    with os.scandir(root) as runs:
+        for run in runs:
+            if run.is_dir(follow_symlinks=False) and run.stat().st_mtime < cutoff:
+                shutil.rmtree(run.path)
+                removed += 1
+    return removed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--grace-hours', type=float, default=24, help='never touch files younger than this')
+    parser.add_argument('--delete', action='store_true', help='unlink orphans instead of quarantining them')
+    parser.add_argument('--dry-run', action='store_true', help='list orphans without changing anything')
+    parser.add_argument('--purge-quarantine-days', type=float,
+                        help='also remove quarantine runs older than this many days')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        upload_dir = app.config.get('UPLOAD_FOLDER', 'uploads')
+        if not args.dry_run:
+            print(f"{purge_stale_upload_sessions()} stale upload sessions dropped")
+        started = time.perf_counter()
+        stats = collect(upload_dir, args.grace_hours * 3600, args.delete, args.dry_run)
+        elapsed = time.perf_counter() - started
+
+    action = 'would be removed' if args.dry_run else ('deleted' if args.delete else 'quarantined')
+    print(f"Scanned {stats['files']} files ({stats['bytes'] / 1024 / 1024:.1f}MB) in {elapsed:.1f}s: "
+          f"{stats['referenced']} referenced, {stats['recent']} within the grace period, "
+          f"{stats['vanished']} removed by the app meanwhile")
+    print(f"{stats['orphans']} orphans ({stats['orphan_bytes'] / 1024 / 1024:.1f}MB) {action}")
+
+    if args.purge_quarantine_days is not None and not args.dry_run:
+        print(f"{purge_quarantine(upload_dir, args.purge_quarantine_days)} old quarantine runs purged")
+
+if __name__ == '__main__':
+    main()
@@ -3,12 +3,19 @@ from sqlalchemy import func, extract, text
 from models import db, User, StudentProfile, AdminActivity, Announcement
 from datetime import datetime, timedelta
 from flask import current_app
+from utils.metrics import count_server_errors
+from utils.analytics_cache import cached_analytics
+from utils.system_stats import (
+    get_memory_stats, get_process_stats, get_load_average,
+    get_disk_usage, get_db_pool_stats
+)
 import calendar
 
 class AnalyticsManager:
     """Manages analytics and reporting for the admin dashboard"""
     
     @staticmethod
+    @cached_analytics
     def get_overview_stats():
         """Get high-level overview statistics"""
         try:
@@ -63,6 +70,7 @@ class AnalyticsManager:
             return {}
     
     @staticmethod
+    @cached_analytics
     def get_monthly_trends(months=12):
         """Get monthly trends for the past N months"""
         try:
@@ -117,6 +125,7 @@ class AnalyticsManager:
             return []
     
     @staticmethod
+    @cached_analytics
     def get_department_statistics():
         """Get statistics by department"""
         try:
@@ -167,6 +176,7 @@ class AnalyticsManager:
             return []
     
     @staticmethod
+    @cached_analytics
     def get_status_distribution():
         """Get application status distribution"""
         try:
@@ -197,6 +207,7 @@ class AnalyticsManager:
             return {}
     
     @staticmethod
+    @cached_analytics
     def get_processing_times():
         """Calculate average processing times"""
         try:
@@ -259,6 +270,7 @@ class AnalyticsManager:
             return {}
     
     @staticmethod
+    @cached_analytics
     def get_recent_activities(limit=10):
         """Get recent admin activities"""
         try:
@@ -301,20 +313,29 @@ class AnalyticsManager:
             except Exception:
                 health['database'] = 'unhealthy'
             
-            # Recent error counts
-            # This would typically check log files or error tracking system
-            health['recent_errors'] = 0  # Placeholder
+            # Server errors recorded by the metrics registry since startup
+            health['recent_errors'] = count_server_errors()
             
             # Active sessions (simplified)
             health['active_sessions'] = User.query.filter(
                 User.updated_at >= datetime.utcnow() - timedelta(hours=1)
             ).count()
             
-            # Disk usage (placeholder - would check actual disk usage)
-            health['disk_usage_percent'] = 45  # Placeholder
-            
-            # Memory usage (placeholder - would check actual memory)
-            health['memory_usage_percent'] = 32  # Placeholder
+            # Disk usage of the upload volume
+            upload_dir = current_app.config.get('UPLOAD_FOLDER', 'uploads')
+            disk = get_disk_usage(upload_dir)
+            health['disk_usage_percent'] = disk['used_percent'] if disk else None
+            health['upload_disk'] = disk
+            
+            # Host memory and this worker's footprint
+            memory = get_memory_stats()
+            health['memory_usage_percent'] = memory['used_percent'] if memory else None
+            health['memory'] = memory
+            health['process'] = get_process_stats()
+            health['load_average'] = get_load_average()
+            
+            # Database connection pool
+            health['db_pool'] = get_db_pool_stats(db.engine)
             
             return health
             
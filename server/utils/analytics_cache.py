@@ -0,0 +1,197 @@
+# Cached analytics results and conditional analytics responses for GAU-ID-View
+import time
+import inspect
+import hashlib
+import functools
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import event
+from models import db, User, StudentProfile, AdminActivity, DataVersion
+from utils.metrics import metrics
+
+ANALYTICS_CACHE = metrics.counter('analytics_cache_total', 'Analytics lookups by method and result (hit, miss, not_modified)')
+
+ANALYTICS_VERSION = 'analytics'
+STUDENTS_VERSION = 'students'
+# Each data version and the models whose writes bump it
+VERSIONED_MODELS = {
+    ANALYTICS_VERSION: (User, StudentProfile, AdminActivity),
+    STUDENTS_VERSION: (User, StudentProfile),  # what student exports read
+}
+VERSIONED_TABLES = {
+    name: frozenset(model.__tablename__ for model in models) for name, models in VERSIONED_MODELS.items()
+}
+_CHANGED = 'changed_data_versions'
+
+def data_version(name=ANALYTICS_VERSION):
+    """The current value of a data version: one primary key read"""
+    return db.session.execute(db.select(DataVersion.version).filter_by(name=name)).scalar() or 0
+
+def bump_data_version(session, name=ANALYTICS_VERSION):
+    """Increment a data version inside the session's transaction"""
+    table = DataVersion.__table__
+    now = datetime.utcnow()
+    result = session.execute(
+        table.update().where(table.c.name == name).values(version=table.c.version + 1, updated_at=now)
+    )
+    if result.rowcount == 0:
+        session.execute(table.insert().values(name=name, version=1, updated_at=now))
+
+def ensure_data_version(*names):
+    """Create data version rows (all of them by default), so bumps never race to insert them"""
+    added = False
+    for name in names or VERSIONED_MODELS:
+        if db.session.get(DataVersion, name) is None:
+            db.session.add(DataVersion(name=name, version=0))
+            added = True
+    if added:
+        db.session.commit()
+
+def _after_flush(session, flush_context):
+    # new/dirty/deleted still hold what was just flushed
+    written = [obj for obj in session.new | session.deleted] + [
+        obj for obj in session.dirty if session.is_modified(obj)
+    ]
+    for name, models in VERSIONED_MODELS.items():
+        if any(isinstance(obj, models) for obj in written):
+            session.info.setdefault(_CHANGED, set()).add(name)
+
+def _do_orm_execute(state):
+    # Bulk statements (query.update(), Model.__table__.insert()) bypass the flush
+    if state.is_insert or state.is_update or state.is_delete:
+        table = getattr(getattr(state.statement, 'table', None), 'name', None)
+        for name, tables in VERSIONED_TABLES.items():
+            if table in tables:
+                state.session.info.setdefault(_CHANGED, set()).add(name)
+
+def _before_commit(session):
+    session.flush()
+    # Last statements of the transaction, so the row locks are held only until COMMIT
+    for name in sorted(session.info.pop(_CHANGED, ())):
+        bump_data_version(session, name)
+
+def _after_rollback(session):
+    session.info.pop(_CHANGED, None)
+
+def install_data_version_listeners():
+    """Bump the data versions on every commit that writes the models they cover"""
+    for name, listener in (('after_flush', _after_flush), ('do_orm_execute', _do_orm_execute),
+                           ('before_commit', _before_commit), ('after_rollback', _after_rollback)):
+        if not event.contains(db.session, name, listener):
+            event.listen(db.session, name, listener)
+
+class AnalyticsCache:
+    """Analytics results for one app in this process, least recently used dropped first"""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # key -> (expires, value)
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry
+
+    def set(self, key, value, expires):
+        with self.lock:
+            self.entries[key] = (expires, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+def get_analytics_cache(app=None):
+    app = app or current_app._get_current_object()
+    cache = app.extensions.get('analytics_cache')
+    if cache is None:
+        cache = app.extensions['analytics_cache'] = AnalyticsCache(app.config.get('ANALYTICS_CACHE_MAX_ENTRIES', 256))
+    return cache
+
+def _ttl(name):
+    if not current_app.config.get('ANALYTICS_CACHE_ENABLED', True):
+        return None
+    return current_app.config.get('ANALYTICS_CACHE_TTLS', {}).get(name)
+
+def _cache_key(method, args, kwargs):
+    """(key, expires): method, its bound arguments, the data version and the TTL window"""
+    name = method.__name__
+    ttl = _ttl(name)
+    if not ttl:
+        return None, None
+    bound = inspect.signature(inspect.unwrap(method)).bind(*args, **kwargs)
+    bound.apply_defaults()
+    window = int(time.time() // ttl)
+    return (name, tuple(bound.arguments.items()), data_version(), window), (window + 1) * ttl
+
+def cached_analytics(method):
+    """
+    Cache an AnalyticsManager method's result.
+
+    Results are shared until the analytics data version changes or the
+    method's TTL window (ANALYTICS_CACHE_TTLS, seconds) ends; the TTL
+    only bounds results that drift with the clock ("last 7 days").
+    Methods without a TTL are not cached. Empty results, which is also
+    what the methods return on error, are not kept. Callers must not
+    modify a returned result.
+    """
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        key, expires = _cache_key(method, args, kwargs)
+        if key is None:
+            return method(*args, **kwargs)
+        cache = get_analytics_cache()
+        entry = cache.get(key)
+        if entry is not None:
+            ANALYTICS_CACHE.inc(method=method.__name__, result='hit')
+            return entry[1]
+        ANALYTICS_CACHE.inc(method=method.__name__, result='miss')
+        value = method(*args, **kwargs)
+        if value:
+            cache.set(key, value, expires)
+        return value
+    return wrapper
+
+def analytics_etag(method, *args, **kwargs):
+    """
+    Weak ETag for a cached method's result with these arguments, or None.
+
+    It names the cache key, not the bytes, so every worker gives the same
+    ETag for the same data version and TTL window, and a request that
+    matches it can be answered without computing anything.
+    """
+    key, _ = _cache_key(method, args, kwargs)
+    if key is None:
+        return None
+    return hashlib.sha256(repr(key).encode()).hexdigest()[:32]
+
+def not_modified(etag, method):
+    """304 for a client that already holds the current result"""
+    ANALYTICS_CACHE.inc(method=method.__name__, result='not_modified')
+    response = current_app.response_class(status=304)
+    return with_etag((response, 304), etag)
+
+def with_etag(result, etag):
+    """Add the ETag to a (response, status) pair; clients must revalidate every time"""
+    response, status = result
+    if etag:
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response, status
+
+__all__ = [
+    'ANALYTICS_VERSION', 'STUDENTS_VERSION', 'data_version', 'bump_data_version', 'ensure_data_version',
+    'install_data_version_listeners',
+    'AnalyticsCache', 'get_analytics_cache', 'cached_analytics', 'analytics_etag', 'not_modified', 'with_etag'
+]
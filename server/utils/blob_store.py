@@ -0,0 +1,181 @@
+# Content-addressed upload storage for GAU-ID-View
+import io
+import os
+import re
+import shutil
+import hashlib
+import tempfile
+from sqlalchemy.exc import IntegrityError
+from models import db, StoredBlob
+
+CHUNK_SIZE = 64 * 1024
+
+# <namespace>/ab/cd/abcd...(64 hex).<ext>; the shard directories must match the digest
+BLOB_PATH = re.compile(r'(?:^|/)([0-9a-f]{2})/([0-9a-f]{2})/(\1\2[0-9a-f]{60})\.[a-z0-9]+$')
+DERIVED_PATH = re.compile(r'(?:^|/)([0-9a-f]{2})/([0-9a-f]{2})/(\1\2[0-9a-f]{60})(?:@\w+)?\.[a-z0-9]+$')
+
+def blob_path(namespace, digest, extension):
+    """
+    photos/profiles + sha256 -> photos/profiles/ab/cd/<sha256>.jpg
+
+    Two levels of 256-way fan-out keep every directory small: a million
+    uploads average about 15 files per leaf directory.
+    """
+    return f"{namespace}/{digest[:2]}/{digest[2:4]}/{digest}.{extension.lower()}"
+
+def blob_digest(path):
+    """The SHA-256 of a content-addressed path, or None for legacy and scratch paths"""
+    match = BLOB_PATH.search(path or '')
+    return match.group(3) if match else None
+
+def is_content_addressed(path):
+    """A blob or one of its derivatives (<sha256>@thumb.webp): its bytes never change"""
+    return DERIVED_PATH.search(path or '') is not None
+
+def hash_file(path):
+    """(sha256 hex digest, size) of a file, read in chunks"""
+    sha = hashlib.sha256()
+    size = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            sha.update(chunk)
+            size += len(chunk)
+    return sha.hexdigest(), size
+
+def _touch(full_path):
+    # A blob gaining a new reference counts as fresh, so upload_gc.py's grace period covers it
+    os.utime(full_path)
+
+def _publish(temp_path, full_path):
+    """Rename a finished temp file to its blob path unless identical bytes are already there"""
+    if os.path.exists(full_path):
+        os.unlink(temp_path)
+        _touch(full_path)
+        return False
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    os.chmod(temp_path, 0o644)
+    os.replace(temp_path, full_path)
+    return True
+
+def write_blob(upload_dir, namespace, stream, extension):
+    """
+    Stream an upload into the store; returns (relative path, digest, size).
+
+    The bytes are hashed while they are copied to a temporary file in the
+    namespace directory, which is then renamed to its content address, or
+    dropped if that blob already exists. Nothing is ever overwritten, so
+    readers of an existing blob are unaffected.
+    """
+    directory = os.path.join(upload_dir, namespace)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.upload-', suffix='.tmp')
+    sha = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                sha.update(chunk)
+                f.write(chunk)
+                size += len(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+        path = blob_path(namespace, sha.hexdigest(), extension)
+        _publish(temp_path, os.path.join(upload_dir, path))
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+    return path, sha.hexdigest(), size
+
+def write_blob_bytes(upload_dir, namespace, data, extension):
+    """`write_blob` for bytes already in memory; a duplicate is not written at all"""
+    digest = hashlib.sha256(data).hexdigest()
+    path = blob_path(namespace, digest, extension)
+    if os.path.exists(os.path.join(upload_dir, path)):
+        _touch(os.path.join(upload_dir, path))
+        return path, digest, len(data)
+    return write_blob(upload_dir, namespace, io.BytesIO(data), extension)
+
+def adopt_blob(upload_dir, namespace, spool, extension):
+    """
+    `write_blob` for an upload already spooled to the upload volume; returns (relative path, digest, size).
+
+    `spool` (a `SpooledUpload`) was hashed while it was received, so the
+    file is renamed to its content address without reading it again, or
+    left to be dropped if that blob already exists.
+    """
+    path = blob_path(namespace, spool.digest, extension)
+    full_path = os.path.join(upload_dir, path)
+    if os.path.exists(full_path):
+        _touch(full_path)
+    else:
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        spool.publish(full_path)
+    return path, spool.digest, spool.size
+
+def import_blob(upload_dir, namespace, source_path, extension, digest=None):
+    """
+    Give an existing file its content address; returns (relative path, digest, size).
+
+    The file is hard-linked (copied across filesystems) rather than moved,
+    so the original stays valid until the caller has committed the new
+    path and removes it.
+    """
+    if digest is None:
+        digest, size = hash_file(source_path)
+    else:
+        size = os.path.getsize(source_path)
+    path = blob_path(namespace, digest, extension)
+    full_path = os.path.join(upload_dir, path)
+    if not os.path.exists(full_path):
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        try:
+            os.link(source_path, full_path)
+        except OSError:
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(full_path), prefix='.upload-', suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f, open(source_path, 'rb') as source:
+                shutil.copyfileobj(source, f, CHUNK_SIZE)
+            _publish(temp_path, full_path)
+    return path, digest, size
+
+def acquire_blob(path, digest=None, size=None, count=1):
+    """
+    Count `count` more references to a blob, in the caller's transaction.
+
+    The increment is a single UPDATE, so concurrent workers cannot lose
+    counts; the first reference inserts the row. Legacy (not content-
+    addressed) paths belong to a single record and are not counted.
+    """
+    digest = digest or blob_digest(path)
+    if digest is None:
+        return
+    updated = StoredBlob.query.filter_by(path=path).update(
+        {StoredBlob.ref_count: StoredBlob.ref_count + count}, synchronize_session=False
+    )
+    if updated:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.add(StoredBlob(path=path, sha256=digest, size=size, ref_count=count))
+    except IntegrityError:
+        # Another worker inserted it between our UPDATE and INSERT
+        StoredBlob.query.filter_by(path=path).update(
+            {StoredBlob.ref_count: StoredBlob.ref_count + count}, synchronize_session=False
+        )
+
+def release_blob(path):
+    """Drop one reference, in the caller's transaction; True once nothing refers to the blob"""
+    StoredBlob.query.filter(StoredBlob.path == path, StoredBlob.ref_count > 0).update(
+        {StoredBlob.ref_count: StoredBlob.ref_count - 1}, synchronize_session=False
+    )
+    return blob_ref_count(path) == 0
+
+def blob_ref_count(path):
+    """References recorded for a blob (0 for unknown and legacy paths)"""
+    return db.session.query(StoredBlob.ref_count).filter_by(path=path).scalar() or 0
+
+__all__ = [
+    'blob_path', 'blob_digest', 'is_content_addressed', 'hash_file', 'write_blob', 'write_blob_bytes', 'adopt_blob',
+    'import_blob',
+    'acquire_blob', 'release_blob', 'blob_ref_count'
+]
@@ -0,0 +1,260 @@
+# Announcement Broadcasts for GAU-ID-View
+import smtplib
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from flask import current_app
+from sqlalchemy import or_
+from models import db, User, AnnouncementBroadcast
+from utils.email_service import email_service, EmailTemplateGenerator, render_email
+from utils.email_outbox import is_permanent_failure
+from utils.metrics import metrics
+
+BROADCAST_RECIPIENTS = metrics.counter(
+    'announcement_broadcast_recipients_total', 'Announcement recipients processed by outcome'
+)
+
+BROADCAST_ACTIONS = {
+    'pause': ('running',),
+    'resume': ('paused', 'failed'),
+    'cancel': ('running', 'paused', 'failed')
+}
+
+def audience_query(target_role):
+    """Active users an announcement is addressed to (id, name, email only)"""
+    query = db.session.query(User.id, User.name, User.email).filter(User.is_active == True)
+    if target_role != 'all':
+        query = query.filter(User.role == target_role)
+    return query
+
+def start_broadcast(announcement, created_by, mode=None, rate_per_minute=None):
+    """Create the broadcast for an announcement in the caller's transaction"""
+    config = current_app.config
+    mode = mode or config.get('BROADCAST_DEFAULT_MODE', 'merge')
+    if mode not in ('bcc', 'merge'):
+        raise ValueError("Broadcast mode must be 'bcc' or 'merge'")
+
+    chunk_size = config.get('BROADCAST_CHUNK_SIZE', 50)
+    if mode == 'bcc':
+        chunk_size = min(chunk_size, config.get('BROADCAST_BCC_MAX_RECIPIENTS', 50))
+
+    broadcast = AnnouncementBroadcast(
+        announcement=announcement,
+        mode=mode,
+        status='running',
+        target_role=announcement.target_role or 'all',
+        chunk_size=chunk_size,
+        rate_per_minute=rate_per_minute or config.get('BROADCAST_RATE_PER_MINUTE', 300),
+        total_recipients=audience_query(announcement.target_role or 'all').count(),
+        next_chunk_at=datetime.utcnow(),
+        created_by=created_by
+    )
+    db.session.add(broadcast)
+    return broadcast
+
+def apply_broadcast_action(broadcast, action):
+    """Pause, resume or cancel; returns False if not allowed from the current status"""
+    if broadcast.status not in BROADCAST_ACTIONS.get(action, ()):
+        return False
+    broadcast.status = {'pause': 'paused', 'resume': 'running', 'cancel': 'cancelled'}[action]
+    if action == 'resume':
+        broadcast.next_chunk_at = datetime.utcnow()
+        broadcast.last_error = None
+        broadcast.locked_until = None  # a worker still on an old chunk loses its lease and stops
+    return True
+
+def claim_due_broadcast():
+    """Lease one running broadcast whose next chunk is due (None if none)"""
+    now = datetime.utcnow()
+    lease = timedelta(seconds=current_app.config.get('BROADCAST_LEASE_SECONDS', 120))
+    claimable = (
+        AnnouncementBroadcast.status == 'running',
+        AnnouncementBroadcast.next_chunk_at <= now,
+        or_(AnnouncementBroadcast.locked_until.is_(None), AnnouncementBroadcast.locked_until < now)
+    )
+
+    candidate_ids = [
+        row.id for row in db.session.query(AnnouncementBroadcast.id)
+        .filter(*claimable).order_by(AnnouncementBroadcast.next_chunk_at).limit(5)
+    ]
+    for broadcast_id in candidate_ids:
+        claimed = AnnouncementBroadcast.query.filter(
+            AnnouncementBroadcast.id == broadcast_id, *claimable
+        ).update({'locked_until': now + lease}, synchronize_session=False)
+        db.session.commit()
+        if claimed:
+            return db.session.get(AnnouncementBroadcast, broadcast_id)
+    db.session.commit()
+    return None
+
+def next_recipients(broadcast):
+    """Keyset page of recipients after the broadcast's cursor"""
+    return (
+        audience_query(broadcast.target_role)
+        .filter(User.id > broadcast.last_user_id)
+        .order_by(User.id)
+        .limit(broadcast.chunk_size)
+        .all()
+    )
+
+class BroadcastLease:
+    """
+    A worker's claim on a broadcast, renewed as it sends.
+
+    Every write is a conditional UPDATE on the broadcast still running
+    under this lease, so a broadcast paused or cancelled meanwhile, or
+    claimed by another worker after the lease ran out, is left alone and
+    the chunk stops.
+    """
+
+    def __init__(self, broadcast):
+        self.broadcast_id = broadcast.id
+        self.until = broadcast.locked_until
+        self.held = True
+
+    def update(self, values, release=False):
+        """Apply `values` and renew (or release) the lease; False once the lease is lost"""
+        if not self.held:
+            return False
+        until = None if release else datetime.utcnow() + timedelta(
+            seconds=current_app.config.get('BROADCAST_LEASE_SECONDS', 120)
+        )
+        updated = AnnouncementBroadcast.query.filter(
+            AnnouncementBroadcast.id == self.broadcast_id,
+            AnnouncementBroadcast.status == 'running',
+            AnnouncementBroadcast.locked_until == self.until
+        ).update(dict(values, locked_until=until), synchronize_session=False)
+        db.session.commit()
+        self.until = until
+        self.held = bool(updated) and not release
+        return bool(updated)
+
+    def record(self, sent, failed, last_user_id):
+        """Save progress up to `last_user_id`; False if the chunk should stop"""
+        # Counted here, as the messages go out, so a chunk that later fails still reports them
+        BROADCAST_RECIPIENTS.inc(sent, outcome='sent')
+        if failed:
+            BROADCAST_RECIPIENTS.inc(failed, outcome='failed')
+        return self.update({
+            'last_user_id': last_user_id,
+            'sent_count': AnnouncementBroadcast.sent_count + sent,
+            'failed_count': AnnouncementBroadcast.failed_count + failed
+        })
+
+def _deferred(refused):
+    """Refused addresses answered with a temporary (4xx) reply, which may be accepted later"""
+    return {address for address, (code, message) in refused.items() if code < 500}
+
+def _send_bcc(broadcast, recipients, connection, lease):
+    """
+    One rendered message for the whole chunk, recipients in BCC.
+
+    Addresses refused with a 5xx reply are counted as failed. If one is
+    deferred (4xx), progress is saved up to the recipient before it and
+    the chunk stops, so the retry starts there; recipients accepted after
+    it in the same message get it again. Relays usually defer the whole
+    message rather than single recipients.
+    """
+    context = EmailTemplateGenerator.announcement_context(broadcast.announcement)
+    html_body, text_body = render_email('announcement.html', **context)
+    addresses = [recipient.email for recipient in recipients]
+
+    if connection is None:
+        email_service._log_email_for_development(context['subject'], addresses, html_body)
+        lease.record(len(addresses), 0, recipients[-1].id)
+        return len(addresses), 0
+
+    sender = current_app.config['MAIL_DEFAULT_SENDER']
+    sender, envelope, message_bytes = email_service.build_message(
+        context['subject'], [sender], html_body, text_body, bcc=addresses
+    )
+    try:
+        refused = connection.send(sender, envelope, message_bytes) or {}
+    except smtplib.SMTPRecipientsRefused as e:
+        refused = e.recipients
+    deferred = _deferred(refused) & set(addresses)
+    done = next((index for index, address in enumerate(addresses) if address in deferred), len(addresses))
+    failed = len([address for address in addresses[:done] if address in refused])
+    if done:
+        lease.record(done - failed, failed, recipients[done - 1].id)
+    if deferred:
+        raise smtplib.SMTPRecipientsRefused({address: refused[address] for address in deferred})
+    return done - failed, failed
+
+def _send_merge(broadcast, recipients, connection, lease):
+    """A personalised message per recipient; the template is compiled once per process"""
+    sent = failed = 0
+    for recipient in recipients:
+        user_data = SimpleNamespace(name=recipient.name, email=recipient.email)
+        context = EmailTemplateGenerator.announcement_context(broadcast.announcement, user_data)
+        html_body, text_body = render_email('announcement.html', **context)
+
+        if connection is None:
+            email_service._log_email_for_development(context['subject'], [recipient.email], html_body)
+            outcome = (1, 0)
+        else:
+            sender, envelope, message_bytes = email_service.build_message(
+                context['subject'], [recipient.email], html_body, text_body
+            )
+            try:
+                connection.send(sender, envelope, message_bytes)
+                outcome = (1, 0)
+            except smtplib.SMTPRecipientsRefused as e:
+                if _deferred(e.recipients):
+                    raise
+                outcome = (0, 1)  # refused for good; the session itself is still usable
+            except smtplib.SMTPResponseException as e:
+                if not is_permanent_failure(e):
+                    raise
+                outcome = (0, 1)
+            # Temporary (4xx) replies and connection-level failures propagate: progress up to
+            # the previous recipient is saved and the chunk is retried from there
+
+        sent += outcome[0]
+        failed += outcome[1]
+        # Saved per recipient, so a crash never mails anyone twice
+        if not lease.record(*outcome, recipient.id):
+            break
+    return sent, failed
+
+def send_broadcast_chunk(broadcast, connection=None):
+    """
+    Send the next keyset chunk of a leased broadcast and schedule the one after.
+
+    The cursor and counts are saved after every message (every recipient
+    in merge mode), renewing the lease, so a crash, SMTP outage or
+    temporary (4xx) reply resumes where it stopped. A broadcast paused or cancelled mid-chunk stops at
+    the next save. Pacing spreads recipients over `rate_per_minute`.
+    """
+    now = datetime.utcnow()
+    lease = BroadcastLease(broadcast)
+    recipients = next_recipients(broadcast)
+    if not recipients:
+        if lease.update({'status': 'completed', 'completed_at': now}, release=True):
+            current_app.logger.info(
+                f"Broadcast {broadcast.id} completed: {broadcast.sent_count} sent, {broadcast.failed_count} failed"
+            )
+        return 0
+
+    error = None
+    try:
+        if broadcast.mode == 'bcc':
+            sent, failed = _send_bcc(broadcast, recipients, connection, lease)
+        else:
+            sent, failed = _send_merge(broadcast, recipients, connection, lease)
+        delay = (sent + failed) * 60.0 / max(broadcast.rate_per_minute or 1, 1)
+    except (smtplib.SMTPException, OSError) as e:
+        db.session.rollback()
+        if connection is not None:
+            connection.close()
+        sent = failed = 0  # what went out before the failure is already saved and counted
+        error = f'{type(e).__name__}: {e}'[:1000]
+        delay = 60  # SMTP unavailable: retry the rest of the chunk shortly
+        current_app.logger.error(f"Broadcast {broadcast.id} chunk failed: {error}")
+
+    lease.update({'last_error': error, 'next_chunk_at': now + timedelta(seconds=delay)}, release=True)
+    return sent + failed
+
+__all__ = [
+    'start_broadcast', 'apply_broadcast_action', 'claim_due_broadcast',
+    'send_broadcast_chunk', 'audience_query', 'BroadcastLease'
+]
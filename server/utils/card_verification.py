@@ -0,0 +1,194 @@
+# Signed ID card payloads and offline verification for GAU-ID-View
+import os
+import hmac
+import time
+import base64
+import struct
+import hashlib
+import threading
+from datetime import date, datetime, timedelta
+from flask import current_app
+from sqlalchemy import func
+from models import db, CardRevocation
+from utils.metrics import metrics
+
+CARD_VERIFICATIONS = metrics.counter('card_verifications_total', 'ID card QR verifications, by result')
+CARD_REVOCATIONS_LOADED = metrics.counter('card_revocations_loaded_total', 'Revocations read into the in-memory set')
+
+# QR payload: "GAU1:" + base32(header | id_number | signature). Base32 keeps the
+# text inside the QR alphanumeric set, so the code stays small enough to scan fast.
+PAYLOAD_PREFIX = 'GAU1:'
+PAYLOAD_HEADER = struct.Struct('>IHH')  # user id, expiry (days since EPOCH, 0 = none), card version
+SIGNATURE_BYTES = 16
+EPOCH = date(2000, 1, 1)
+
+class InvalidCardPayload(ValueError):
+    """Text that is not a GAU card payload at all"""
+
+def _card_secret():
+    return (current_app.config.get('CARD_SIGNING_SECRET') or current_app.config['SECRET_KEY']).encode()
+
+def _sign(body, secret):
+    return hmac.new(secret, PAYLOAD_PREFIX.encode() + body, hashlib.sha256).digest()[:SIGNATURE_BYTES]
+
+def sign_card_payload(user_id, id_number, expiry_date=None, card_version=1):
+    """The signed text for a card's QR code"""
+    expiry_days = (expiry_date - EPOCH).days if expiry_date else 0
+    body = PAYLOAD_HEADER.pack(user_id, expiry_days, card_version) + id_number.encode('ascii')
+    signed = body + _sign(body, _card_secret())
+    return PAYLOAD_PREFIX + base64.b32encode(signed).decode('ascii').rstrip('=')
+
+def decode_card_payload(payload):
+    """
+    Split a payload into its fields and check the signature.
+
+    Returns (fields, signature_ok); raises InvalidCardPayload for text
+    that cannot be a card payload.
+    """
+    if not payload.startswith(PAYLOAD_PREFIX):
+        raise InvalidCardPayload("Not a GAU ID card payload")
+    text = payload[len(PAYLOAD_PREFIX):].upper()
+    try:
+        signed = base64.b32decode(text + '=' * (-len(text) % 8))
+        body, signature = signed[:-SIGNATURE_BYTES], signed[-SIGNATURE_BYTES:]
+        user_id, expiry_days, card_version = PAYLOAD_HEADER.unpack_from(body)
+        id_number = body[PAYLOAD_HEADER.size:].decode('ascii')
+    except (ValueError, struct.error):
+        raise InvalidCardPayload("Malformed card payload")
+
+    fields = {
+        'user_id': user_id,
+        'id_number': id_number,
+        'expiry_date': EPOCH + timedelta(days=expiry_days) if expiry_days else None,
+        'card_version': card_version,
+    }
+    return fields, hmac.compare_digest(signature, _sign(body, _card_secret()))
+
+class RevocationSet:
+    """
+    Revoked cards for this process: {user_id: highest revoked card version}.
+
+    Loaded once, then topped up with newer rows (by id) every `interval`
+    seconds from a daemon thread, so a verification is a dict lookup. A
+    revocation made in this process is applied straight away; other
+    processes see it within one interval.
+    """
+    def __init__(self, app, interval):
+        self.app = app
+        self.interval = interval
+        self.pid = os.getpid()
+        self.revoked = {}
+        self.last_id = 0
+        self.loaded_at = None
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self.refresh()
+        if interval > 0:
+            threading.Thread(target=self._run, name='card-revocations', daemon=True).start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                with self.app.app_context():
+                    self.refresh()
+            except Exception as e:
+                self.app.logger.error(f"Card revocation refresh failed: {str(e)}")
+
+    def refresh(self):
+        """Read revocations newer than the last one seen"""
+        rows = db.session.query(
+            CardRevocation.id, CardRevocation.user_id, CardRevocation.card_version
+        ).filter(CardRevocation.id > self.last_id).order_by(CardRevocation.id).all()
+        with self._lock:
+            for row_id, user_id, card_version in rows:
+                self.add(user_id, card_version)
+                self.last_id = max(self.last_id, row_id)
+            self.loaded_at = time.time()
+        CARD_REVOCATIONS_LOADED.inc(len(rows))
+        return len(rows)
+
+    def add(self, user_id, card_version):
+        with self._lock:
+            if card_version > self.revoked.get(user_id, 0):
+                self.revoked[user_id] = card_version
+
+    def is_revoked(self, user_id, card_version):
+        return card_version <= self.revoked.get(user_id, 0)
+
+    def stop(self):
+        self._stop.set()
+
+_revocations = None
+_revocations_lock = threading.Lock()
+
+def get_revocation_set(app=None):
+    """The revocation set for this process and app (re-created after fork)"""
+    global _revocations
+    app = app or current_app._get_current_object()
+    with _revocations_lock:
+        if _revocations is None or _revocations.pid != os.getpid() or _revocations.app is not app:
+            if _revocations is not None:
+                _revocations.stop()
+            _revocations = RevocationSet(app, int(app.config.get('CARD_REVOCATION_REFRESH', 60)))
+        return _revocations
+
+def card_versions(user_ids):
+    """Current card version per user: one past the highest revoked version"""
+    user_ids = list(user_ids)
+    versions = dict.fromkeys(user_ids, 1)
+    if user_ids:
+        rows = db.session.query(CardRevocation.user_id, func.max(CardRevocation.card_version)).filter(
+            CardRevocation.user_id.in_(user_ids)
+        ).group_by(CardRevocation.user_id)
+        for user_id, revoked_version in rows:
+            versions[user_id] = revoked_version + 1
+    return versions
+
+def revoke_card(user_id, id_number=None, reason=None, revoked_by=None):
+    """
+    Revoke a student's current card; the caller commits.
+
+    Cards printed afterwards carry the next version and verify again.
+    Returns the revocation row.
+    """
+    revocation = CardRevocation(
+        user_id=user_id, id_number=id_number, card_version=card_versions([user_id])[user_id],
+        reason=reason, revoked_by=revoked_by
+    )
+    db.session.add(revocation)
+    return revocation
+
+def apply_revocation(revocation):
+    """Put a committed revocation into this process's set without waiting for a refresh"""
+    get_revocation_set().add(revocation.user_id, revocation.card_version)
+
+def verify_card_payload(payload, today=None):
+    """
+    Check a scanned payload without a database read.
+
+    Returns a dict with `valid`, a `reason` ('valid', 'invalid_signature',
+    'expired' or 'revoked') and, when the signature checks out, the card's
+    fields. Raises InvalidCardPayload for text that is not a card payload.
+    """
+    fields, signature_ok = decode_card_payload(payload)
+    if not signature_ok:
+        CARD_VERIFICATIONS.inc(result='invalid_signature')
+        return {'valid': False, 'reason': 'invalid_signature'}
+
+    today = today or datetime.utcnow().date()
+    if fields['expiry_date'] and fields['expiry_date'] < today:
+        reason = 'expired'
+    elif get_revocation_set().is_revoked(fields['user_id'], fields['card_version']):
+        reason = 'revoked'
+    else:
+        reason = 'valid'
+    CARD_VERIFICATIONS.inc(result=reason)
+    return dict(
+        fields, valid=reason == 'valid', reason=reason,
+        expiry_date=fields['expiry_date'].isoformat() if fields['expiry_date'] else None
+    )
+
+__all__ = [
+    'InvalidCardPayload', 'sign_card_payload', 'decode_card_payload', 'verify_card_payload',
+    'RevocationSet', 'get_revocation_set', 'card_versions', 'revoke_card', 'apply_revocation'
+]
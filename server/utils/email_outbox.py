@@ -0,0 +1,262 @@
+# Durable Email Outbox for GAU-ID-View
+import json
+import uuid
+import random
+import smtplib
+import hashlib
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from flask import current_app
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import IntegrityError
+from models import db, EmailOutbox
+from utils.email_service import email_service, build_welcome_email, build_status_update_email
+from utils.metrics import metrics
+
+OUTBOX_DELIVERED = metrics.counter('email_outbox_delivered_total', 'Outbox emails accepted by SMTP')
+OUTBOX_RETRIED = metrics.counter('email_outbox_retries_total', 'Outbox deliveries rescheduled after a failure')
+OUTBOX_DEAD = metrics.counter('email_outbox_dead_total', 'Outbox emails moved to the dead-letter state')
+OUTBOX_LATENCY = metrics.histogram(
+    'email_outbox_delivery_seconds', 'Time from enqueue to SMTP acceptance',
+    buckets=(1, 5, 15, 30, 60, 300, 900, 3600, 21600)
+)
+
+# Snapshot of the user fields the templates need, taken at enqueue time
+USER_CONTEXT_FIELDS = ('name', 'email', 'reg_number', 'department')
+
+def _user_context(user):
+    return {field: getattr(user, field) for field in USER_CONTEXT_FIELDS}
+
+def enqueue_email(template, recipient, context, idempotency_key):
+    """
+    Add an email to the outbox in the caller's transaction.
+
+    Nothing is committed here: the row becomes visible to the delivery
+    worker only when the state change that caused it commits. A second
+    call with the same idempotency key, even a concurrent one, gets the
+    existing row.
+    """
+    existing = EmailOutbox.query.filter_by(idempotency_key=idempotency_key).first()
+    if existing is not None:
+        return existing
+
+    entry = EmailOutbox(
+        idempotency_key=idempotency_key,
+        recipient=recipient,
+        template=template,
+        context=json.dumps(context, default=str),
+        status='pending',
+        next_attempt_at=datetime.utcnow()
+    )
+    try:
+        with db.session.begin_nested():
+            db.session.add(entry)
+    except IntegrityError:
+        # Another request inserted it between our SELECT and INSERT
+        return EmailOutbox.query.filter_by(idempotency_key=idempotency_key).one()
+    return entry
+
+def queue_welcome_email(user):
+    """Outbox a welcome email for a newly registered student"""
+    return enqueue_email(
+        'welcome', user.email, {'user': _user_context(user)},
+        idempotency_key=f'welcome:{user.id}'
+    )
+
+def queue_status_update_email(user, status, details=None, event_time=None):
+    """Outbox an application status email; one per user, status and change time"""
+    event_time = event_time or datetime.utcnow()
+    return enqueue_email(
+        'status_update', user.email,
+        {'user': _user_context(user), 'status': status, 'details': details},
+        idempotency_key=f'status:{user.id}:{status}:{event_time.isoformat()}'
+    )
+
+def render_outbox_email(entry):
+    """Render the subject, HTML and plain-text bodies for an outbox row"""
+    context = json.loads(entry.context or '{}')
+    user_data = SimpleNamespace(**context.get('user', {}))
+
+    if entry.template == 'welcome':
+        return build_welcome_email(user_data)
+    if entry.template == 'status_update':
+        return build_status_update_email(user_data, context.get('status'), context.get('details'))
+    raise ValueError(f'Unknown email template: {entry.template}')
+
+def message_id_for(entry):
+    """Stable Message-ID so a redelivered message can be recognised as a duplicate"""
+    digest = hashlib.sha1(entry.idempotency_key.encode()).hexdigest()
+    return f'<{digest}@gau-id-view>'
+
+def claim_batch(worker_id, batch_size=None):
+    """
+    Atomically claim due outbox rows for this worker.
+
+    Rows stuck in `sending` longer than EMAIL_OUTBOX_LOCK_TIMEOUT (a worker
+    died mid-batch) become claimable again.
+    """
+    config = current_app.config
+    batch_size = batch_size or config.get('EMAIL_OUTBOX_BATCH_SIZE', 50)
+    now = datetime.utcnow()
+    stale_before = now - timedelta(seconds=config.get('EMAIL_OUTBOX_LOCK_TIMEOUT', 300))
+
+    claimable = or_(
+        and_(EmailOutbox.status == 'pending', EmailOutbox.next_attempt_at <= now),
+        and_(EmailOutbox.status == 'sending', EmailOutbox.locked_at < stale_before)
+    )
+
+    candidate_ids = [
+        row.id for row in db.session.query(EmailOutbox.id)
+        .filter(claimable)
+        .order_by(EmailOutbox.next_attempt_at, EmailOutbox.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    ]
+    if not candidate_ids:
+        db.session.commit()
+        return []
+
+    # Conditional update: a row another worker claimed in the meantime no longer matches
+    claim = f'{worker_id}:{uuid.uuid4().hex[:8]}'[:64]
+    EmailOutbox.query.filter(EmailOutbox.id.in_(candidate_ids), claimable).update(
+        {'status': 'sending', 'locked_by': claim, 'locked_at': now},
+        synchronize_session=False
+    )
+    db.session.commit()
+
+    return EmailOutbox.query.filter(
+        EmailOutbox.id.in_(candidate_ids),
+        EmailOutbox.status == 'sending',
+        EmailOutbox.locked_by == claim
+    ).order_by(EmailOutbox.id).all()
+
+def retry_delay(attempts):
+    """Exponential backoff with jitter, capped at EMAIL_OUTBOX_BACKOFF_MAX seconds"""
+    config = current_app.config
+    base = config.get('EMAIL_OUTBOX_BACKOFF_BASE', 30)
+    cap = config.get('EMAIL_OUTBOX_BACKOFF_MAX', 3600)
+    delay = min(base * (2 ** max(attempts - 1, 0)), cap)
+    return delay * random.uniform(0.8, 1.2)
+
+def is_permanent_failure(error):
+    """SMTP 5xx replies and refused recipients will not succeed on retry"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 500 <= error.smtp_code < 600
+    return isinstance(error, ValueError)
+
+def mark_sent(entry):
+    now = datetime.utcnow()
+    entry.status = 'sent'
+    entry.sent_at = now
+    entry.attempts = (entry.attempts or 0) + 1
+    entry.locked_by = None
+    entry.locked_at = None
+    entry.last_error = None
+    OUTBOX_DELIVERED.inc(template=entry.template)
+    if entry.created_at:
+        OUTBOX_LATENCY.observe((now - entry.created_at).total_seconds(), template=entry.template)
+
+def mark_failed(entry, error):
+    """Reschedule with backoff, or dead-letter permanent/exhausted failures"""
+    entry.attempts = (entry.attempts or 0) + 1
+    entry.last_error = f'{type(error).__name__}: {error}'[:1000]
+    entry.locked_by = None
+    entry.locked_at = None
+
+    max_attempts = current_app.config.get('EMAIL_OUTBOX_MAX_ATTEMPTS', 8)
+    if is_permanent_failure(error) or entry.attempts >= max_attempts:
+        entry.status = 'dead'
+        OUTBOX_DEAD.inc(template=entry.template)
+        current_app.logger.error(
+            f"Email {entry.idempotency_key} dead-lettered after {entry.attempts} attempts: {entry.last_error}"
+        )
+    else:
+        entry.status = 'pending'
+        entry.next_attempt_at = datetime.utcnow() + timedelta(seconds=retry_delay(entry.attempts))
+        OUTBOX_RETRIED.inc(template=entry.template)
+
+def deliver_batch(entries, connection=None):
+    """
+    Render and send claimed rows, recording each outcome.
+
+    `connection` is an open `SMTPConnection` reused for the whole batch;
+    without one (SMTP not configured) emails go to the development log.
+    """
+    delivered = 0
+    for entry in entries:
+        try:
+            subject, html_body, text_body = render_outbox_email(entry)
+            if connection is None:
+                email_service._log_email_for_development(subject, [entry.recipient], html_body)
+            else:
+                sender, recipients, message_bytes = email_service.build_message(
+                    subject, [entry.recipient], html_body, text_body, message_id=message_id_for(entry)
+                )
+                connection.send(sender, recipients, message_bytes)
+            mark_sent(entry)
+            delivered += 1
+        except Exception as e:
+            answered = (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused)
+            if connection is not None and not isinstance(e, answered):
+                connection.close()
+            mark_failed(entry, e)
+        # Commit per message so a crash never re-sends what was already accepted
+        db.session.commit()
+    return delivered
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[min(int(q * len(sorted_values)), len(sorted_values) - 1)]
+
+def outbox_stats(window_hours=24):
+    """Queue depth by status plus delivery latency over the recent window"""
+    counts = dict(
+        db.session.query(EmailOutbox.status, db.func.count(EmailOutbox.id))
+        .group_by(EmailOutbox.status).all()
+    )
+
+    oldest_pending = db.session.query(db.func.min(EmailOutbox.created_at)).filter(
+        EmailOutbox.status.in_(['pending', 'sending'])
+    ).scalar()
+
+    since = datetime.utcnow() - timedelta(hours=window_hours)
+    recent = db.session.query(EmailOutbox.created_at, EmailOutbox.sent_at).filter(
+        EmailOutbox.status == 'sent',
+        EmailOutbox.sent_at >= since
+    ).order_by(EmailOutbox.sent_at.desc()).limit(5000).all()
+    latencies = sorted((sent_at - created_at).total_seconds() for created_at, sent_at in recent)
+
+    return {
+        'queue_depth': counts.get('pending', 0) + counts.get('sending', 0),
+        'by_status': {status: counts.get(status, 0) for status in ('pending', 'sending', 'sent', 'dead')},
+        'oldest_pending_age_seconds': (
+            (datetime.utcnow() - oldest_pending).total_seconds() if oldest_pending else None
+        ),
+        'delivery_latency_seconds': {
+            'window_hours': window_hours,
+            'delivered': len(latencies),
+            'mean': sum(latencies) / len(latencies) if latencies else None,
+            'p50': _percentile(latencies, 0.50),
+            'p95': _percentile(latencies, 0.95),
+            'max': latencies[-1] if latencies else None
+        }
+    }
+
+def requeue_dead(entry_ids):
+    """Move dead-lettered emails back to pending; returns how many were requeued"""
+    count = EmailOutbox.query.filter(
+        EmailOutbox.id.in_(entry_ids), EmailOutbox.status == 'dead'
+    ).update(
+        {'status': 'pending', 'attempts': 0, 'next_attempt_at': datetime.utcnow(), 'last_error': None},
+        synchronize_session=False
+    )
+    db.session.commit()
+    return count
+
+__all__ = [
+    'enqueue_email', 'queue_welcome_email', 'queue_status_update_email',
+    'claim_batch', 'deliver_batch', 'outbox_stats', 'requeue_dead'
+]
@@ -5,12 +5,17 @@ from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.base import MIMEBase
 from email import encoders
-from flask import current_app, render_template_string
+from flask import current_app
 from flask_mail import Mail, Message
 from datetime import datetime, timedelta
-from threading import Thread
+from utils.mail_pool import get_mail_pool
+from utils.email_templates import CompiledEmailTemplates
+from utils.tracing import span
+import re
 import uuid
 
+_HTML_TAG = re.compile('<.*?>')
+
 class EmailService:
     """Professional email service for GAU-ID-View notifications"""
     
@@ -32,15 +37,6 @@ class EmailService:
         app.config.setdefault('MAIL_PASSWORD', os.environ.get('MAIL_PASSWORD'))
         app.config.setdefault('MAIL_DEFAULT_SENDER', os.environ.get('MAIL_DEFAULT_SENDER', 'admin@gau.ac.ke'))
     
-    def send_async_email(self, app, msg):
-        """Send email asynchronously"""
-        with app.app_context():
-            try:
-                self.mail.send(msg)
-                current_app.logger.info(f"Email sent successfully to {msg.recipients}")
-            except Exception as e:
-                current_app.logger.error(f"Failed to send email to {msg.recipients}: {str(e)}")
-
     def _log_email_for_development(self, subject, recipients, html_body):
         """Log email details for development/testing"""
         try:
@@ -65,47 +61,52 @@ class EmailService:
             print(f"Email logging error: {e}")
             current_app.logger.warning(f"Email logging failed: {e}")
 
+    def smtp_configured(self):
+        """True when real SMTP credentials are configured"""
+        username = current_app.config.get('MAIL_USERNAME')
+        return bool(username) and username != 'gauviewsystem@gmail.com'
+
+    def build_message(self, subject, recipients, html_body, text_body=None, attachments=None,
+                      message_id=None, bcc=None):
+        """Build a MIME message; returns (sender, envelope recipients, message bytes)"""
+        msg = Message(
+            subject=subject,
+            recipients=recipients,
+            html=html_body,
+            body=text_body or self._strip_html(html_body),
+            sender=current_app.config['MAIL_DEFAULT_SENDER'],
+            bcc=bcc
+        )
+        if message_id:
+            # Replaces Flask-Mail's random id; an extra header would duplicate it
+            msg.msgId = message_id
+        
+        # Add attachments if provided
+        if attachments:
+            for attachment in attachments:
+                msg.attach(
+                    attachment['filename'],
+                    attachment['content_type'],
+                    attachment['data']
+                )
+        
+        return msg.sender, msg.send_to, msg.as_bytes()
+
     def send_email(self, subject, recipients, html_body, text_body=None, attachments=None):
-        """Send email with professional formatting"""
+        """Queue an email on this worker's pooled SMTP senders"""
         try:
-            # Check if mail is configured
-            if not self.mail:
-                # Development mode - log email instead of sending
-                self._log_email_for_development(subject, recipients, html_body)
-                return True
-                
-            # Check if SMTP credentials are configured
-            if not current_app.config.get('MAIL_USERNAME') or current_app.config.get('MAIL_USERNAME') == 'gauviewsystem@gmail.com':
-                # Development mode - log email instead of sending
+            # Development mode - log email instead of sending
+            if not self.smtp_configured() or current_app.config.get('MAIL_SUPPRESS_SEND'):
                 self._log_email_for_development(subject, recipients, html_body)
                 return True
                 
-            msg = Message(
-                subject=subject,
-                recipients=recipients,
-                html=html_body,
-                body=text_body or self._strip_html(html_body),
-                sender=current_app.config['MAIL_DEFAULT_SENDER']
+            sender, send_to, message_bytes = self.build_message(
+                subject, recipients, html_body, text_body, attachments
             )
             
-            # Add attachments if provided
-            if attachments:
-                for attachment in attachments:
-                    msg.attach(
-                        attachment['filename'],
-                        attachment['content_type'],
-                        attachment['data']
-                    )
-            
-            # Send email asynchronously
-            thread = Thread(
-                target=self.send_async_email,
-                args=(current_app._get_current_object(), msg)
-            )
-            thread.daemon = True
-            thread.start()
-            
-            return True
+            # Hand off to the per-process sender pool (persistent SMTP connections)
+            pool = get_mail_pool(current_app.config)
+            return pool.submit(sender, send_to, message_bytes)
             
         except Exception as e:
             current_app.logger.error(f"Email sending error: {str(e)}")
@@ -113,11 +114,38 @@ class EmailService:
     
     def _strip_html(self, html_content):
         """Convert HTML to plain text for fallback"""
-        import re
-        clean = re.compile('<.*?>')
-        return re.sub(clean, '', html_content)
+        return _HTML_TAG.sub('', html_content)
 
 # Email template generator
+LOGIN_URL = 'http://localhost:5173/login'  # Update with actual frontend URL
+
+STATUS_MESSAGES = {
+    'approved': {
+        'title': 'Application Approved! 🎉',
+        'message': 'Great news! Your student ID card application has been approved.',
+        'color': '#48bb78',
+        'icon': '✅'
+    },
+    'rejected': {
+        'title': 'Application Update Required 📝',
+        'message': 'Your application needs some updates before we can proceed.',
+        'color': '#f56565',
+        'icon': '❌'
+    },
+    'printed': {
+        'title': 'ID Card Printed 🖨️',
+        'message': 'Your student ID card has been printed and is ready for collection.',
+        'color': '#667eea',
+        'icon': '🆔'
+    },
+    'issued': {
+        'title': 'ID Card Issued 🎊',
+        'message': 'Congratulations! Your student ID card has been issued.',
+        'color': '#38a169',
+        'icon': '🎯'
+    }
+}
+
 class EmailTemplateGenerator:
     """Generate professional email templates for GAU-ID-View"""
     
@@ -414,17 +442,17 @@ class EmailTemplateGenerator:
         </head>
         <body>
             <div class="email-container">
-                {{ content }}
+                {% block content %}{% endblock %}
             </div>
         </body>
         </html>
         """
     
     @staticmethod
-    def generate_welcome_email(user_data):
-        """Generate professional welcome email for new students"""
-        
-        content = """
+    def get_welcome_template():
+        """Welcome email body (extends the base template)"""
+        return """{% extends "base.html" %}
+        {% block content %}
         <div class="email-header">
             <div class="logo-container">
                 <div class="university-logo">GAU</div>
@@ -566,57 +594,14 @@ class EmailTemplateGenerator:
                 <a href="#" class="social-link">Help Center</a>
             </div>
         </div>
+        {% endblock %}
         """
-        
-        base_template = EmailTemplateGenerator.get_base_template()
-        
-        # Prepare template variables
-        template_vars = {
-            'subject': 'Welcome to GAU-ID-View - Your Account is Ready!',
-            'content': content,
-            'user_data': user_data,
-            'registration_date': datetime.now().strftime('%B %d, %Y'),
-            'login_url': 'http://localhost:5173/login',  # Update with actual frontend URL
-            'current_year': datetime.now().year
-        }
-        
-        return render_template_string(base_template, **template_vars)
     
     @staticmethod
-    def generate_application_status_email(user_data, status, details=None):
-        """Generate email for application status updates"""
-        
-        status_messages = {
-            'approved': {
-                'title': 'Application Approved! 🎉',
-                'message': 'Great news! Your student ID card application has been approved.',
-                'color': '#48bb78',
-                'icon': '✅'
-            },
-            'rejected': {
-                'title': 'Application Update Required 📝',
-                'message': 'Your application needs some updates before we can proceed.',
-                'color': '#f56565',
-                'icon': '❌'
-            },
-            'printed': {
-                'title': 'ID Card Printed 🖨️',
-                'message': 'Your student ID card has been printed and is ready for collection.',
-                'color': '#667eea',
-                'icon': '🆔'
-            },
-            'issued': {
-                'title': 'ID Card Issued 🎊',
-                'message': 'Congratulations! Your student ID card has been issued.',
-                'color': '#38a169',
-                'icon': '🎯'
-            }
-        }
-        
-        status_info = status_messages.get(status, status_messages['approved'])
-        login_url = 'http://localhost:5173/login'
-        
-        content = f"""
+    def get_status_template():
+        """Application status email body (extends the base template)"""
+        return """{% extends "base.html" %}
+        {% block content %}
         <div class="email-header">
             <div class="logo-container">
                 <div class="university-logo">GAU</div>
@@ -627,21 +612,21 @@ class EmailTemplateGenerator:
         
         <div class="email-body">
             <div class="welcome-message">
-                {status_info['icon']} {status_info['title']}
+                {{ status_info.icon }} {{ status_info.title }}
             </div>
             
             <div class="content-section">
                 <p style="font-size: 16px; color: #4a5568; line-height: 1.6; margin-bottom: 20px;">
-                    Hello {user_data.name}, {status_info['message']}
+                    Hello {{ user_data.name }}, {{ status_info.message }}
                 </p>
             </div>
             
-            <div class="highlight-box" style="background: linear-gradient(135deg, {status_info['color']} 0%, {status_info['color']}dd 100%);">
-                <h3 style="margin-bottom: 15px; font-size: 20px;">Application Status: {status.title()}</h3>
+            <div class="highlight-box" style="background: linear-gradient(135deg, {{ status_info.color }} 0%, {{ status_info.color }}dd 100%);">
+                <h3 style="margin-bottom: 15px; font-size: 20px;">Application Status: {{ status|title }}</h3>
                 <p style="margin-bottom: 20px; opacity: 0.95;">
-                    {details if details else 'Your application has been processed successfully.'}
+                    {{ details or 'Your application has been processed successfully.' }}
                 </p>
-                <a href="{login_url}" class="action-button">View Details</a>
+                <a href="{{ login_url }}" class="action-button">View Details</a>
             </div>
         </div>
         
@@ -652,30 +637,140 @@ class EmailTemplateGenerator:
                 Student ID Management System
             </div>
         </div>
+        {% endblock %}
         """
+    
+    @staticmethod
+    def get_announcement_template():
+        """Announcement broadcast body (extends the base template)"""
+        return """{% extends "base.html" %}
+        {% block content %}
+        <div class="email-header">
+            <div class="logo-container">
+                <div class="university-logo">GAU</div>
+                <div class="university-name">Garissa University</div>
+                <div class="system-name">Student ID Management System</div>
+            </div>
+        </div>
         
-        base_template = EmailTemplateGenerator.get_base_template()
+        <div class="email-body">
+            <div class="welcome-message">
+                {% if priority in ['high', 'urgent'] %}📢 {% endif %}{{ title }}
+            </div>
+            
+            <div class="content-section">
+                <p style="font-size: 16px; color: #4a5568; line-height: 1.6; margin-bottom: 20px;">
+                    {% if user_data %}Hello {{ user_data.name }},{% else %}Dear member of the Garissa University community,{% endif %}
+                </p>
+                <p style="font-size: 16px; color: #4a5568; line-height: 1.6; white-space: pre-line;">
+                    {{ message }}
+                </p>
+            </div>
+            
+            <div class="highlight-box">
+                <a href="{{ login_url }}" class="action-button">Open Student Portal</a>
+            </div>
+        </div>
         
-        template_vars = {
+        <div class="email-footer">
+            <div class="footer-logo">GAU</div>
+            <div class="footer-content">
+                <strong>Garissa University</strong><br>
+                Student ID Management System
+            </div>
+        </div>
+        {% endblock %}
+        """
+    
+    @staticmethod
+    def welcome_context(user_data):
+        """Template variables for the welcome email"""
+        return {
+            'subject': 'Welcome to GAU-ID-View - Your Account is Ready!',
+            'user_data': user_data,
+            'registration_date': datetime.now().strftime('%B %d, %Y'),
+            'login_url': LOGIN_URL,
+            'current_year': datetime.now().year
+        }
+    
+    @staticmethod
+    def status_context(user_data, status, details=None):
+        """Template variables for an application status email"""
+        status_info = STATUS_MESSAGES.get(status, STATUS_MESSAGES['approved'])
+        return {
             'subject': f'GAU-ID-View: {status_info["title"]}',
-            'content': content,
-            'login_url': login_url
+            'user_data': user_data,
+            'status': status,
+            'status_info': status_info,
+            'details': details,
+            'login_url': LOGIN_URL
         }
-        
-        return render_template_string(base_template, **template_vars)
+    
+    @staticmethod
+    def announcement_context(announcement, user_data=None):
+        """Template variables for an announcement; no user_data for BCC sends"""
+        return {
+            'subject': f'GAU-ID-View: {announcement.title}',
+            'title': announcement.title,
+            'message': announcement.message,
+            'priority': announcement.priority,
+            'user_data': user_data,
+            'login_url': LOGIN_URL
+        }
+    
+    @staticmethod
+    def generate_welcome_email(user_data):
+        """Generate professional welcome email for new students"""
+        return render_email('welcome.html', **EmailTemplateGenerator.welcome_context(user_data))[0]
+    
+    @staticmethod
+    def generate_application_status_email(user_data, status, details=None):
+        """Generate email for application status updates"""
+        context = EmailTemplateGenerator.status_context(user_data, status, details)
+        return render_email('status_update.html', **context)[0]
+
+# Templates are compiled (with CSS inlined) once per process on first use
+email_templates = CompiledEmailTemplates({
+    'base.html': EmailTemplateGenerator.get_base_template,
+    'welcome.html': EmailTemplateGenerator.get_welcome_template,
+    'status_update.html': EmailTemplateGenerator.get_status_template,
+    'announcement.html': EmailTemplateGenerator.get_announcement_template
+})
+
+def render_email(template_name, **context):
+    """Render (html, text) bodies from the compiled template cache"""
+    with span('jinja.render', template=template_name):
+        return email_templates.render(template_name, **context)
+
+# Shared instance, initialised in create_app
+email_service = EmailService()
+
+# Email content builders (subject, html, text)
+def build_welcome_email(user_data):
+    """Subject, HTML and plain-text bodies of the welcome email"""
+    subject = '🎉 Welcome to GAU-ID-View - Your Account is Ready!'
+    html_body, text_body = render_email('welcome.html', **EmailTemplateGenerator.welcome_context(user_data))
+    return subject, html_body, text_body
+
+def build_status_update_email(user_data, status, details=None):
+    """Subject, HTML and plain-text bodies of an application status email"""
+    title = STATUS_MESSAGES[status]['title'] if status in STATUS_MESSAGES else 'Status Update'
+    subject = f"GAU-ID-View: {title}"
+    context = EmailTemplateGenerator.status_context(user_data, status, details)
+    html_body, text_body = render_email('status_update.html', **context)
+    return subject, html_body, text_body
 
 # Email notification functions
 def send_welcome_email(user_data):
     """Send welcome email to new student"""
     try:
-        email_service = EmailService()
-        
-        html_content = EmailTemplateGenerator.generate_welcome_email(user_data)
+        subject, html_content, text_content = build_welcome_email(user_data)
         
         return email_service.send_email(
-            subject='🎉 Welcome to GAU-ID-View - Your Account is Ready!',
+            subject=subject,
             recipients=[user_data.email],
-            html_body=html_content
+            html_body=html_content,
+            text_body=text_content
         )
         
     except Exception as e:
@@ -685,25 +780,13 @@ def send_welcome_email(user_data):
 def send_status_update_email(user_data, status, details=None):
     """Send application status update email"""
     try:
-        email_service = EmailService()
-        
-        html_content = EmailTemplateGenerator.generate_application_status_email(
-            user_data, status, details
-        )
-        
-        status_titles = {
-            'approved': 'Application Approved! 🎉',
-            'rejected': 'Application Update Required 📝',
-            'printed': 'ID Card Printed 🖨️',
-            'issued': 'ID Card Issued 🎊'
-        }
-        
-        subject = f"GAU-ID-View: {status_titles.get(status, 'Status Update')}"
+        subject, html_content, text_content = build_status_update_email(user_data, status, details)
         
         return email_service.send_email(
             subject=subject,
             recipients=[user_data.email],
-            html_body=html_content
+            html_body=html_content,
+            text_body=text_content
         )
         
     except Exception as e:
@@ -712,6 +795,7 @@ def send_status_update_email(user_data, status, details=None):
 
 # Export main functions
 __all__ = [
-    'EmailService', 'EmailTemplateGenerator', 
+    'EmailService', 'EmailTemplateGenerator', 'email_service', 'email_templates', 'render_email',
+    'build_welcome_email', 'build_status_update_email',
     'send_welcome_email', 'send_status_update_email'
 ]
\ No newline at end of file
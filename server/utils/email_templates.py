@@ -0,0 +1,178 @@
+# Compiled Email Templates for GAU-ID-View
+import re
+import html
+import threading
+from jinja2 import Environment, FunctionLoader, StrictUndefined, TemplateNotFound
+
+_STYLE_BLOCK = re.compile(r'<style[^>]*>(.*?)</style>', re.S | re.I)
+_CSS_COMMENT = re.compile(r'/\*.*?\*/', re.S)
+_CSS_RULE = re.compile(r'([^{}]+)\{([^{}]*)\}')
+_SIMPLE_SELECTOR = re.compile(r'^([a-zA-Z][a-zA-Z0-9]*)?(?:\.([a-zA-Z0-9_-]+))?$')
+_START_TAG = re.compile(r'<([a-zA-Z][a-zA-Z0-9]*)(\s[^<>]*?)?(\s*/?)>')
+_CLASS_ATTR = re.compile(r'\sclass="([^"]*)"')
+_STYLE_ATTR = re.compile(r'\sstyle="([^"]*)"')
+
+# Plain-text conversion
+_HEAD = re.compile(r'<head[^>]*>.*?</head>', re.S | re.I)
+_LINK = re.compile(r'<a\s[^>]*href="([^"]*)"[^>]*>(.*?)</a>', re.S | re.I)
+_LINE_BREAK = re.compile(r'<br\s*/?>|<hr[^>]*>|</(?:p|div|h[1-6]|li|ul|tr)>', re.I)
+_LIST_ITEM = re.compile(r'<li[^>]*>', re.I)
+_TAG = re.compile(r'<[^>]+>')
+_SPACES = re.compile(r'[ \t]+')
+
+def _strip_at_rules(css):
+    """Drop @media/@supports blocks; they stay in <style> for clients that honour them"""
+    result = []
+    index = 0
+    while True:
+        start = css.find('@', index)
+        if start == -1:
+            result.append(css[index:])
+            return ''.join(result)
+        result.append(css[index:start])
+        brace = css.find('{', start)
+        if brace == -1:
+            return ''.join(result)
+        depth, position = 1, brace + 1
+        while position < len(css) and depth:
+            depth += {'{': 1, '}': -1}.get(css[position], 0)
+            position += 1
+        index = position
+
+def parse_css_rules(css):
+    """
+    Inlineable rules as (specificity, order, tag, class, declarations).
+
+    Only `tag`, `.class` and `tag.class` selectors are inlined; universal,
+    descendant and pseudo selectors cannot be expressed as a style attribute.
+    """
+    rules = []
+    css = _strip_at_rules(_CSS_COMMENT.sub('', css))
+    for order, match in enumerate(_CSS_RULE.finditer(css)):
+        declarations = [
+            (name.strip().lower(), value.strip())
+            for name, _, value in (item.partition(':') for item in match.group(2).split(';'))
+            if name.strip() and value.strip()
+        ]
+        for selector in match.group(1).split(','):
+            simple = _SIMPLE_SELECTOR.match(selector.strip())
+            if not simple or not selector.strip():
+                continue
+            tag, css_class = simple.group(1), simple.group(2)
+            specificity = (1 if css_class else 0, 1 if tag else 0)
+            rules.append((specificity, order, tag and tag.lower(), css_class, declarations))
+    rules.sort(key=lambda rule: (rule[0], rule[1]))
+    return rules
+
+def _parse_style(style):
+    declarations = {}
+    for item in style.split(';'):
+        name, _, value = item.partition(':')
+        if name.strip() and value.strip():
+            declarations[name.strip().lower()] = value.strip()
+    return declarations
+
+def inline_css(source, rules):
+    """Copy matching CSS declarations into each element's style attribute"""
+    body_start = source.lower().find('<body')
+    head, body = (source[:body_start], source[body_start:]) if body_start != -1 else ('', source)
+
+    def rewrite(match):
+        tag, attrs, closing = match.group(1).lower(), match.group(2) or '', match.group(3)
+        class_match = _CLASS_ATTR.search(attrs)
+        classes = set(class_match.group(1).split()) if class_match else set()
+
+        declarations = {}
+        for _, _, rule_tag, rule_class, rule_declarations in rules:
+            if (rule_tag is None or rule_tag == tag) and (rule_class is None or rule_class in classes):
+                declarations.update(rule_declarations)
+        if not declarations:
+            return match.group(0)
+
+        # Author-written inline styles still win
+        style_match = _STYLE_ATTR.search(attrs)
+        if style_match:
+            declarations.update(_parse_style(style_match.group(1)))
+            attrs = attrs[:style_match.start()] + attrs[style_match.end():]
+
+        style = '; '.join(f'{name}: {value}' for name, value in declarations.items())
+        return f'<{match.group(1)}{attrs} style="{style}"{closing}>'
+
+    return head + _START_TAG.sub(rewrite, body)
+
+def html_to_text(source):
+    """Plain-text rendering of an HTML template; Jinja tags pass through untouched"""
+    text = _HEAD.sub('', source)
+    text = _STYLE_BLOCK.sub('', text)
+    text = _LINK.sub(lambda m: f'{_TAG.sub("", m.group(2)).strip()}: {m.group(1)}', text)
+    text = _LIST_ITEM.sub('- ', text)
+    text = _LINE_BREAK.sub('\n', text)
+    text = html.unescape(_TAG.sub('', text))
+
+    lines = []
+    for line in text.splitlines():
+        line = _SPACES.sub(' ', line).strip()
+        if line or (lines and lines[-1]):
+            lines.append(line)
+    return '\n'.join(lines).strip() + '\n'
+
+class CompiledEmailTemplates:
+    """
+    Per-process cache of compiled email templates.
+
+    `sources` maps template names to functions returning Jinja source. On
+    first use each template has the base stylesheet inlined, is compiled once
+    and kept; a plain-text twin is derived from the same source and compiled
+    alongside it. Rendering only binds variables.
+    """
+
+    def __init__(self, sources, base_template='base.html'):
+        self.sources = sources
+        self.base_template = base_template
+        self._lock = threading.Lock()
+        self._html_env = None
+        self._text_env = None
+        self._raw = {}
+        self._compiled = {}
+
+    def _raw_source(self, name):
+        if name not in self._raw:
+            if name not in self.sources:
+                raise TemplateNotFound(name)
+            self._raw[name] = self.sources[name]()
+        return self._raw[name]
+
+    def _build(self):
+        base = self._raw_source(self.base_template)
+        style = _STYLE_BLOCK.search(base)
+        rules = parse_css_rules(style.group(1)) if style else []
+
+        def load_html(name):
+            return inline_css(self._raw_source(name), rules), None, lambda: True
+
+        def load_text(name):
+            return html_to_text(self._raw_source(name)), None, lambda: True
+
+        options = {'auto_reload': False, 'cache_size': -1, 'undefined': StrictUndefined,
+                   'trim_blocks': True, 'lstrip_blocks': True}
+        self._html_env = Environment(loader=FunctionLoader(load_html), autoescape=True, **options)
+        self._text_env = Environment(loader=FunctionLoader(load_text), autoescape=False, **options)
+
+    def get(self, name):
+        """Compiled (html, text) templates for `name`"""
+        compiled = self._compiled.get(name)
+        if compiled is None:
+            with self._lock:
+                if self._html_env is None:
+                    self._build()
+                compiled = self._compiled[name] = (
+                    self._html_env.get_template(name), self._text_env.get_template(name)
+                )
+        return compiled
+
+    def render(self, name, **context):
+        """Render the HTML and plain-text bodies of a template"""
+        html_template, text_template = self.get(name)
+        return html_template.render(**context), text_template.render(**context)
+
+__all__ = ['CompiledEmailTemplates', 'inline_css', 'parse_css_rules', 'html_to_text']
@@ -0,0 +1,338 @@
+# Cached student export artifacts and background export jobs for GAU-ID-View
+import os
+import json
+import uuid
+import zlib
+import atexit
+import hashlib
+import logging
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app, request
+from werkzeug.utils import send_file
+from models import db, ExportJob
+from utils.exports import student_export_query, export_rows, csv_chunks, gzip_chunks
+from utils.analytics_cache import data_version, STUDENTS_VERSION
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+EXPORT_JOBS = metrics.counter('export_jobs_total', 'Student exports by outcome (cached, done, failed)')
+EXPORTS_EVICTED = metrics.counter('export_artifacts_evicted_total', 'Export artifacts removed, by reason')
+
+# Bump when the CSV layout changes so no old artifact is served again
+EXPORT_FORMAT_VERSION = 1
+EXPORT_FILTERS = ('department', 'status', 'year_of_study', 'search')
+READ_SIZE = 64 * 1024
+
+def normalize_filters(filters):
+    """The export filters that are set, so equivalent requests share a key"""
+    normalized = {}
+    for name in EXPORT_FILTERS:
+        value = filters.get(name)
+        if value is not None and str(value).strip():
+            normalized[name] = str(value).strip()
+    return normalized
+
+def student_data_version():
+    """
+    A token that changes whenever exported data may have changed.
+
+    The 'students' data version, bumped in the same transaction as every
+    commit that writes users or profiles (see utils.analytics_cache), so
+    checking for a cached export is one primary key read.
+    """
+    return f'{STUDENTS_VERSION}:{data_version(STUDENTS_VERSION)}'
+
+def export_key(filters, data_version):
+    """(key, filter_hash) for normalized filters at a data version"""
+    filter_hash = hashlib.sha256(
+        f'{EXPORT_FORMAT_VERSION}:{json.dumps(filters, sort_keys=True)}'.encode()
+    ).hexdigest()
+    return hashlib.sha256(f'{filter_hash}:{data_version}'.encode()).hexdigest(), filter_hash
+
+def new_export_job(filters, requested_by=None):
+    """An unsaved job for the filters at the current data version"""
+    data_version = student_data_version()
+    key, filter_hash = export_key(filters, data_version)
+    return ExportJob(
+        id=uuid.uuid4().hex, key=key, filter_hash=filter_hash, filters=json.dumps(filters, sort_keys=True),
+        data_version=data_version, requested_by=requested_by
+    )
+
+def _export_folder():
+    return current_app.config.get('EXPORT_FOLDER', 'exports')
+
+def artifact_full_path(job):
+    return os.path.join(_export_folder(), job.path)
+
+def find_export(key):
+    """The finished export for a key, if its artifact is still on disk"""
+    job = ExportJob.query.filter_by(key=key, status='done').order_by(ExportJob.finished_at.desc()).first()
+    if job is None or not os.path.exists(artifact_full_path(job)):
+        return None
+    job.last_used_at = datetime.utcnow()
+    db.session.commit()
+    EXPORT_JOBS.inc(outcome='cached')
+    return job
+
+def stream_export(job, on_complete=None):
+    """
+    Gzipped CSV chunks for a job's export, saved as its artifact on the way out.
+
+    The chunks go to a temporary file in EXPORT_FOLDER as they are
+    yielded; once the last one is out the file is renamed to
+    `<job id>.csv.gz` and the job recorded as done (added to the session if
+    new). If the consumer stops early, the partial file is removed.
+    `on_complete(row_count)` runs after the job is committed.
+    """
+    filters = json.loads(job.filters) if job.filters else {}
+    count = 0
+
+    def rows():
+        nonlocal count
+        for row in export_rows(student_export_query(filters)):
+            count += 1
+            yield row
+
+    folder = _export_folder()
+    os.makedirs(folder, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=folder, prefix='.export-', suffix='.tmp')
+    published = False
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in gzip_chunks(csv_chunks(rows())):
+                f.write(chunk)
+                yield chunk
+        job.path = f'{job.id}.csv.gz'
+        job.size = os.path.getsize(temp_path)
+        os.replace(temp_path, artifact_full_path(job))
+        published = True
+
+        job.status = 'done'
+        job.row_count = count
+        job.finished_at = job.last_used_at = datetime.utcnow()
+        db.session.add(job)
+        db.session.commit()
+        EXPORT_JOBS.inc(outcome='done')
+        evict_exports()
+        if on_complete:
+            on_complete(count)
+    finally:
+        if not published:
+            os.unlink(temp_path)
+
+def gunzip_chunks(chunks):
+    """Decompress a stream of gzip chunks, for clients that do not accept gzip"""
+    decompressor = zlib.decompressobj(31)
+    for chunk in chunks:
+        while chunk:
+            # Bounded output: CSV compresses about 15:1
+            data = decompressor.decompress(chunk, READ_SIZE)
+            if data:
+                yield data
+            chunk = decompressor.unconsumed_tail
+    yield decompressor.flush()
+
+def _file_chunks(path):
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(READ_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+def accepts_gzip():
+    """Whether to answer this request gzipped (?gzip=0 opts out)"""
+    return (request.args.get('gzip', '1').lower() not in ['0', 'false', 'no']
+            and 'gzip' in request.accept_encodings)
+
+def send_export(job, download_name, gzip_ok):
+    """
+    Response for a finished export's artifact.
+
+    Gzip-capable clients get the stored file as is, with Range and
+    If-None-Match handled against its bytes (like a pre-compressed static
+    file); others get it decompressed as it is read.
+    """
+    full_path = artifact_full_path(job)
+    if gzip_ok:
+        response = send_file(
+            full_path, request.environ, mimetype='text/csv', as_attachment=True,
+            download_name=download_name, conditional=True, etag=job.key, max_age=0
+        )
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        # make_conditional would buffer a streamed body to set its length, so If-None-Match is checked here
+        etag = f'{job.key}-csv'
+        if request.if_none_match.contains(etag):
+            response = current_app.response_class(status=304)
+        else:
+            response = current_app.response_class(gunzip_chunks(_file_chunks(full_path)), mimetype='text/csv')
+            response.headers['Content-Disposition'] = f'attachment; filename="{download_name}"'
+        response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+def _remove_artifact(job, reason):
+    if job.path:
+        try:
+            os.unlink(artifact_full_path(job))
+        except FileNotFoundError:
+            pass
+    db.session.delete(job)
+    EXPORTS_EVICTED.inc(reason=reason)
+
+def evict_exports():
+    """
+    Drop export jobs older than EXPORT_MAX_AGE, then the least recently
+    used artifacts until the rest fit in EXPORT_CACHE_MAX_MB. Returns how
+    many were removed.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=current_app.config.get('EXPORT_MAX_AGE', 24 * 3600))
+    budget = current_app.config.get('EXPORT_CACHE_MAX_MB', 1024) * 1024 * 1024
+    active = ('queued', 'running')
+
+    removed = 0
+    for job in ExportJob.query.filter(ExportJob.created_at < cutoff, ExportJob.status.notin_(active)).all():
+        _remove_artifact(job, 'age')
+        removed += 1
+
+    total = 0
+    done = ExportJob.query.filter(ExportJob.status == 'done', ExportJob.created_at >= cutoff).order_by(
+        ExportJob.last_used_at.desc()
+    ).all()
+    for job in done:
+        total += job.size or 0
+        if total > budget:
+            _remove_artifact(job, 'size')
+            removed += 1
+    if removed:
+        db.session.commit()
+    return removed
+
+def expire_stale_export(job):
+    """Fail a job whose worker was recycled before it finished"""
+    timeout = current_app.config.get('EXPORT_JOB_TIMEOUT', 1800)
+    if job.status in ('queued', 'running') and job.created_at < datetime.utcnow() - timedelta(seconds=timeout):
+        job.status = 'failed'
+        job.error = 'Export was interrupted, please request it again'
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        EXPORT_JOBS.inc(outcome='failed')
+    return job
+
+def run_export_job(job_id):
+    """Write a queued job's artifact; failures are recorded on the job"""
+    job = db.session.get(ExportJob, job_id)
+    if job is None or job.status != 'queued':
+        return job
+    job.status = 'running'
+    job.started_at = datetime.utcnow()
+    db.session.commit()
+    try:
+        for _ in stream_export(job):
+            pass
+    except Exception as e:
+        db.session.rollback()
+        job.status = 'failed'
+        job.error = str(e)[:1000]
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        EXPORT_JOBS.inc(outcome='failed')
+        logger.error(f"Export job {job_id} failed: {str(e)}")
+    return job
+
+def request_export(filters, requested_by=None):
+    """
+    The export job for the filters at the current data version.
+
+    A finished artifact or a job already under way is reused. Otherwise a
+    job is queued: exports up to EXPORT_INLINE_MAX_ROWS rows are written
+    before returning, larger ones by the export workers.
+    """
+    job = new_export_job(filters, requested_by)
+    cached = find_export(job.key)
+    if cached:
+        return cached
+
+    pending = ExportJob.query.filter(
+        ExportJob.key == job.key, ExportJob.status.in_(('queued', 'running'))
+    ).order_by(ExportJob.created_at.desc()).first()
+    if pending and expire_stale_export(pending).status != 'failed':
+        return pending
+
+    db.session.add(job)
+    db.session.commit()
+    row_count = student_export_query(filters).order_by(None).count()
+    if row_count <= current_app.config.get('EXPORT_INLINE_MAX_ROWS', 5000):
+        return run_export_job(job.id)
+    get_export_queue().submit(job)
+    return job
+
+class ExportJobQueue:
+    """Per-process threads writing export artifacts; the export is database and I/O bound"""
+
+    def __init__(self, app, workers=2):
+        self.app = app
+        self.pid = os.getpid()
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix='export')
+
+    def submit(self, job):
+        self.executor.submit(self._run, job.id)
+
+    def _run(self, job_id):
+        try:
+            with self.app.app_context():
+                try:
+                    run_export_job(job_id)
+                finally:
+                    db.session.remove()
+        except Exception as e:
+            logger.error(f"Export job {job_id} crashed: {str(e)}")
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait, cancel_futures=True)
+
+class InlineExportJobQueue:
+    """Runs jobs synchronously in the request (tests and single-process dev servers)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    def submit(self, job):
+        run_export_job(job.id)
+
+_queue = None
+_queue_lock = threading.Lock()
+
+def get_export_queue(app=None):
+    """The export job queue for this process (re-created after fork)"""
+    global _queue
+    app = app or current_app._get_current_object()
+    if app.config.get('EXPORT_JOBS_INLINE'):
+        return InlineExportJobQueue(app)
+
+    with _queue_lock:
+        if _queue is None or _queue.pid != os.getpid():
+            _queue = ExportJobQueue(app, workers=int(app.config.get('EXPORT_WORKERS', 2)))
+        return _queue
+
+def shutdown_export_queue():
+    """Stop this process's export workers; unfinished jobs fail on their next poll"""
+    global _queue
+    with _queue_lock:
+        queue, _queue = _queue, None
+    if queue is not None and queue.pid == os.getpid():
+        queue.shutdown(wait=False)
+
+atexit.register(shutdown_export_queue)
+
+__all__ = [
+    'normalize_filters', 'student_data_version', 'export_key', 'new_export_job', 'artifact_full_path', 'find_export',
+    'stream_export', 'gunzip_chunks', 'accepts_gzip', 'send_export', 'evict_exports', 'expire_stale_export',
+    'run_export_job', 'request_export', 'get_export_queue', 'shutdown_export_queue'
+]
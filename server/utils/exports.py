@@ -0,0 +1,178 @@
+# Streaming student exports for GAU-ID-View
+import io
+import csv
+import json
+import zlib
+import base64
+import binascii
+from datetime import datetime
+from sqlalchemy import union, inspect
+from models import db, User, StudentProfile
+from utils.helpers import student_filter_conditions
+from utils.metrics import metrics
+
+EXPORT_ROWS = metrics.counter('export_rows_total', 'Rows written to student exports')
+
+EXPORT_BATCH_SIZE = 1000    # rows fetched per round trip
+EXPORT_CHUNK_SIZE = 64 * 1024  # bytes of CSV per response chunk
+
+def _date(value):
+    return value.strftime('%Y-%m-%d') if value else ''
+
+def _yes_no(value):
+    return 'Yes' if value else 'No'
+
+# (CSV header, column, formatter); the query selects just these columns
+EXPORT_COLUMNS = [
+    ('Name', User.name, None),
+    ('Registration Number', User.reg_number, None),
+    ('Email', User.email, None),
+    ('Department', User.department, None),
+    ('Phone', StudentProfile.phone, None),
+    ('Course', StudentProfile.course, None),
+    ('Year of Study', StudentProfile.year_of_study, None),
+    ('ID Number', StudentProfile.id_number, None),
+    ('Status', StudentProfile.status, None),
+    ('Submitted Date', StudentProfile.submitted_at, _date),
+    ('Approved Date', StudentProfile.approved_at, _date),
+    ('Card Printed', StudentProfile.card_printed, _yes_no),
+    ('Card Issued', StudentProfile.card_issued, _yes_no),
+    ('Created Date', User.created_at, _date),
+    ('Is Active', User.is_active, _yes_no),
+]
+
+EXPORT_HEADER = [header for header, _, _ in EXPORT_COLUMNS]
+
+def student_export_query(filters, columns=EXPORT_COLUMNS):
+    """
+    Column-only query for a student export, with the student list filters.
+
+    Students without a profile are kept (outer join) unless a profile
+    filter is set. Rows come back `EXPORT_BATCH_SIZE` at a time rather
+    than all at once.
+    """
+    conditions, _ = student_filter_conditions(filters)
+    return db.session.query(*[column for _, column, _ in columns]).select_from(User).outerjoin(
+        StudentProfile, StudentProfile.user_id == User.id
+    ).filter(User.role == 'student', *conditions).order_by(User.id).execution_options(
+        yield_per=EXPORT_BATCH_SIZE
+    )
+
+class InvalidCursor(ValueError):
+    """A change cursor this server did not issue"""
+
+# Incremental exports add the student's id and when the row last changed
+CHANGE_HEADER = ['Student ID'] + EXPORT_HEADER + ['Changed At']
+
+def encode_cursor(watermark):
+    """Opaque cursor for a change watermark"""
+    text = json.dumps({'v': 1, 'since': watermark.isoformat()})
+    return base64.urlsafe_b64encode(text.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """The watermark in a cursor; raises InvalidCursor"""
+    try:
+        text = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        return datetime.fromisoformat(json.loads(text)['since'])
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise InvalidCursor("Invalid cursor")
+
+def student_changes_query(since, until, filters=None):
+    """
+    Students whose user or profile row changed in (since, until].
+
+    Each table is range-scanned on its own timestamp index and the two
+    id lists are combined with UNION, so the cost follows the number of
+    changed rows, not the table size. Deactivations are included (they
+    move `users.updated_at`); permanent deletions leave no row behind.
+    """
+    changed = union(
+        db.select(User.id).where(User.updated_at > since, User.updated_at <= until),
+        db.select(StudentProfile.user_id).where(
+            StudentProfile.last_updated > since, StudentProfile.last_updated <= until
+        )
+    ).subquery()
+    conditions, _ = student_filter_conditions(filters or {})
+    columns = [User.id] + [column for _, column, _ in EXPORT_COLUMNS] + [User.updated_at, StudentProfile.last_updated]
+    return db.session.query(*columns).select_from(User).outerjoin(
+        StudentProfile, StudentProfile.user_id == User.id
+    ).filter(User.id.in_(db.select(changed.c[0])), User.role == 'student', *conditions).order_by(
+        User.id
+    ).execution_options(yield_per=EXPORT_BATCH_SIZE)
+
+def create_change_indexes():
+    """
+    Create the change-timestamp indexes on databases made before they were declared.
+
+    `db.create_all` does not add indexes to existing tables. Returns the
+    names of the indexes created.
+    """
+    inspector = inspect(db.engine)
+    created = []
+    for table, column in ((User.__table__, 'updated_at'), (StudentProfile.__table__, 'last_updated')):
+        if not inspector.has_table(table.name):
+            continue
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if [c.name for c in index.columns] == [column] and index.name not in existing:
+                index.create(db.engine, checkfirst=True)
+                created.append(index.name)
+    return created
+
+def _formatters(columns):
+    return [(index, formatter) for index, (_, _, formatter) in enumerate(columns) if formatter]
+
+def _format(values, formatters):
+    row = ['' if value is None else value for value in values]
+    for index, formatter in formatters:
+        row[index] = formatter(row[index])
+    return row
+
+def change_rows(query):
+    """Formatted rows from `student_changes_query`: id, the export columns, change time"""
+    formatters = _formatters(EXPORT_COLUMNS)
+    for row in query:
+        changed_at = max(timestamp for timestamp in row[-2:] if timestamp is not None)
+        yield [row[0]] + _format(row[1:-2], formatters) + [changed_at.isoformat()]
+
+def export_rows(query, columns=EXPORT_COLUMNS):
+    """Formatted CSV rows from `student_export_query`"""
+    formatters = _formatters(columns)
+    for row in query:
+        yield _format(row, formatters)
+
+def csv_chunks(rows, header=EXPORT_HEADER, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Encode rows as CSV, yielding UTF-8 chunks of about `chunk_size` bytes.
+
+    One small buffer is reused, so memory stays flat however many rows
+    there are. `rows` may be any iterable, including a generator.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+        if buffer.tell() >= chunk_size:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+    EXPORT_ROWS.inc(count)
+
+def gzip_chunks(chunks, level=6):
+    """Gzip a stream of byte chunks as it goes"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31: gzip header and trailer
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+__all__ = [
+    'EXPORT_COLUMNS', 'EXPORT_HEADER', 'CHANGE_HEADER', 'InvalidCursor', 'student_export_query', 'export_rows',
+    'encode_cursor', 'decode_cursor', 'student_changes_query', 'create_change_indexes', 'change_rows', 'csv_chunks', 'gzip_chunks'
+]
@@ -1,12 +1,26 @@
 # File upload handling for GAU-ID-View
+import io
 import os
 import uuid
+import hashlib
+import tempfile
+from contextlib import contextmanager
+from functools import wraps
 from datetime import datetime
+from urllib.parse import urlencode
 from werkzeug.utils import secure_filename
-from PIL import Image
+from werkzeug.security import safe_join
+from werkzeug.exceptions import HTTPException
+from PIL import Image, ImageOps
 import mimetypes
 from flask import current_app, request
 from utils.helpers import error_response, success_response
+from utils.tracing import span, traced
+from utils.file_serving import sign_file_path
+from utils.blob_store import (
+    blob_path, blob_digest, write_blob, write_blob_bytes, adopt_blob, acquire_blob, blob_ref_count
+)
+from utils.upload_spool import SpooledUpload, sniff_file_type, SNIFF_BYTES
 
 # Allowed file extensions
 ALLOWED_IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
@@ -17,6 +31,30 @@ ALL_ALLOWED_EXTENSIONS = ALLOWED_IMAGE_EXTENSIONS | ALLOWED_DOCUMENT_EXTENSIONS
 MAX_IMAGE_SIZE = 5 * 1024 * 1024  # 5MB
 MAX_DOCUMENT_SIZE = 10 * 1024 * 1024  # 10MB
 
+# What the first bytes of each kind of upload may be (see utils.upload_spool)
+IMAGE_CONTENT_TYPES = {'jpeg', 'png', 'gif'}
+DOCUMENT_CONTENT_TYPES = {'pdf', 'doc', 'docx'}
+
+# Room for multipart boundaries, part headers and small form fields in a Content-Length
+FORM_OVERHEAD = 64 * 1024
+
+# Stored profile photos are always JPEG
+PHOTO_MAX_WIDTH = 800
+PHOTO_QUALITY = 85
+PROFILE_PHOTO_DIR = 'photos/profiles'
+
+# Derivatives generated once per photo, all cropped to 3:4
+PHOTO_SIZES = {
+    'thumb': (150, 200),   # admin lists
+    'medium': (360, 480),  # application review
+    'print': (600, 800),   # ID card printer: 2 x 2.67 in at 300 dpi
+}
+PHOTO_FORMATS = {
+    # name: (PIL format, extension, MIME type)
+    'jpeg': ('JPEG', 'jpg', 'image/jpeg'),
+    'webp': ('WEBP', 'webp', 'image/webp'),
+}
+
 def allowed_file(filename, file_type='image'):
     """Check if file extension is allowed"""
     if '.' not in filename:
@@ -31,45 +69,144 @@ def allowed_file(filename, file_type='image'):
     else:
         return extension in ALL_ALLOWED_EXTENSIONS
 
+def upload_limits(file_type):
+    """(max size in bytes, allowed content types) for a 'photo' or 'document' upload"""
+    if file_type == 'photo':
+        return MAX_IMAGE_SIZE, IMAGE_CONTENT_TYPES
+    return MAX_DOCUMENT_SIZE, DOCUMENT_CONTENT_TYPES
+
+def accepts_upload(file_type):
+    """
+    Route decorator checking an upload before its body is read.
+    
+    A Content-Length that cannot fit `file_type`'s size limit is refused
+    with 413 straight away. Otherwise file parts are spooled to the upload
+    volume as they arrive (utils.upload_spool), and the transfer stops as
+    soon as a part grows past the limit (413) or starts with the wrong
+    magic bytes (415).
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            max_size, allowed_types = upload_limits(file_type)
+            if request.content_length is not None and request.content_length > max_size + FORM_OVERHEAD:
+                return error_response(f"File too large. Maximum size: {max_size // (1024*1024)}MB", status_code=413)
+            
+            request.upload_limits = (max_size, allowed_types)
+            try:
+                request.files  # parse the form now, inside the limits
+            except HTTPException as e:
+                return error_response(e.description, status_code=e.code)
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
+
+def check_photo_dimensions(width, height):
+    """Passport photo size and aspect ratio rules"""
+    if width < 300 or height < 400:
+        return False, "Image too small. Minimum size: 300x400 pixels"
+    
+    if width > 2000 or height > 2000:
+        return False, "Image too large. Maximum size: 2000x2000 pixels"
+    
+    # Check aspect ratio for passport photos (roughly 3:4)
+    aspect_ratio = width / height
+    if aspect_ratio < 0.6 or aspect_ratio > 0.9:
+        return False, "Invalid aspect ratio. Please use a passport-style photo"
+    
+    return True, "Valid image"
+
+@traced('pil.validate')
 def validate_image_file(file):
-    """Validate uploaded image file"""
+    """
+    Validate uploaded image file from its header.
+    
+    `Image.open` only parses the header, so format and dimensions are
+    checked without decoding any pixels; a corrupt body is caught when
+    the photo is processed.
+    """
     try:
-        # Check if it's a valid image
-        img = Image.open(file)
-        img.verify()
+        file.seek(0)
+        with Image.open(file) as img:
+            if img.format not in ('JPEG', 'PNG', 'GIF'):
+                return False, "Invalid image file: unsupported format"
+            width, height = img.size
         file.seek(0)  # Reset file pointer
-        
-        # Check image dimensions (optional constraints)
-        img = Image.open(file)
-        width, height = img.size
-        
-        # Passport photo constraints
-        if width < 300 or height < 400:
-            return False, "Image too small. Minimum size: 300x400 pixels"
-        
-        if width > 2000 or height > 2000:
-            return False, "Image too large. Maximum size: 2000x2000 pixels"
-        
-        # Check aspect ratio for passport photos (roughly 3:4)
-        aspect_ratio = width / height
-        if aspect_ratio < 0.6 or aspect_ratio > 0.9:
-            return False, "Invalid aspect ratio. Please use a passport-style photo"
-        
-        file.seek(0)  # Reset file pointer again
-        return True, "Valid image"
+        return check_photo_dimensions(width, height)
         
     except Exception as e:
         return False, f"Invalid image file: {str(e)}"
 
-def generate_unique_filename(original_filename, user_id, file_type):
+@traced('pil.decode')
+def decode_photo(data, max_width=PHOTO_MAX_WIDTH):
+    """
+    Decode an uploaded photo, at most `max_width` wide, as a loaded RGB image.
+    
+    For JPEG input the decoder is put in draft mode first, so libjpeg
+    downscales by 1/2, 1/4 or 1/8 while decoding and the full-size bitmap
+    is never materialised. LANCZOS then resizes the rest of the way, with a
+    reducing gap so large reductions start with a cheap integer box reduce.
+    """
+    with Image.open(io.BytesIO(data)) as img:
+        target = None
+        if img.width > max_width:
+            target = (max_width, round(img.height * max_width / img.width))
+            img.draft('RGB', target)  # no-op for non-JPEG formats
+        
+        # Convert to RGB if necessary
+        if img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+        img.load()
+        
+        if target and img.size != target:
+            img = img.resize(target, Image.Resampling.LANCZOS, reducing_gap=3.0)
+        return img
+
+def encode_image(img, image_format='jpeg', quality=PHOTO_QUALITY):
+    """Encode a decoded image as JPEG or WebP bytes"""
+    output = io.BytesIO()
+    if image_format == 'webp':
+        img.save(output, 'WEBP', quality=quality, method=4)
+    else:
+        img.save(output, 'JPEG', quality=quality, optimize=True)
+    return output.getvalue()
+
+@traced('pil.process')
+def process_photo(data, max_width=PHOTO_MAX_WIDTH, quality=PHOTO_QUALITY):
+    """Decode, resize and encode an uploaded photo in one pass; returns JPEG bytes"""
+    return encode_image(decode_photo(data, max_width), 'jpeg', quality)
+
+@contextmanager
+def atomic_write(file_path):
+    """
+    Write to a temporary file next to `file_path` and rename it into place.
+    
+    Readers never see a partially written upload, and a failed write
+    leaves nothing behind.
+    """
+    directory = os.path.dirname(file_path) or '.'
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.upload-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+def generate_unique_filename(original_filename, user_id, file_type, extension=None):
     """Generate unique filename for uploaded file"""
-    extension = original_filename.rsplit('.', 1)[1].lower()
+    extension = extension or original_filename.rsplit('.', 1)[1].lower()
     timestamp = int(datetime.utcnow().timestamp())
     unique_id = str(uuid.uuid4())[:8]
     
     return f"{file_type}_{user_id}_{timestamp}_{unique_id}.{extension}"
 
-def save_uploaded_file(file, user_id, file_type='photo', subfolder=None):
+def save_uploaded_file(file, user_id, file_type='photo', subfolder=None, process=True):
     """
     Save uploaded file to the appropriate directory
     
@@ -78,9 +215,16 @@ def save_uploaded_file(file, user_id, file_type='photo', subfolder=None):
         user_id: User ID for file organization
         file_type: 'photo' or 'document'
         subfolder: Optional subfolder (e.g., 'profiles', 'documents')
+        process: Resize and re-encode photos now; False stores the validated
+            original for a background image job
     
     Returns:
         tuple: (success, message, file_path)
+    
+    Stored files are content-addressed (see utils.blob_store) and one
+    reference is added to the session for the caller to commit. Raw photos
+    kept for an image job (`process=False`) are scratch files and keep a
+    unique name instead.
     """
     try:
         if not file or file.filename == '':
@@ -90,43 +234,60 @@ def save_uploaded_file(file, user_id, file_type='photo', subfolder=None):
         if not allowed_file(file.filename, 'image' if file_type == 'photo' else 'document'):
             return False, f"File type not allowed. Allowed types: {ALLOWED_IMAGE_EXTENSIONS if file_type == 'photo' else ALLOWED_DOCUMENT_EXTENSIONS}", None
         
-        # Check file size
+        # Check file size (spooled uploads were already stopped at the limit)
         file.seek(0, 2)  # Go to end of file
         file_size = file.tell()
         file.seek(0)  # Reset to beginning
         
-        max_size = MAX_IMAGE_SIZE if file_type == 'photo' else MAX_DOCUMENT_SIZE
+        max_size, allowed_types = upload_limits(file_type)
         if file_size > max_size:
             return False, f"File too large. Maximum size: {max_size // (1024*1024)}MB", None
         
-        # Validate image files
+        # Check the content really is what the extension claims
+        recognised, content_type = validate_file_type(file)
+        if not recognised or content_type not in allowed_types:
+            return False, "File content does not match an allowed file type", None
+        
+        # Validate image files from the header, then decode and encode once in memory
+        photo_bytes = None
         if file_type == 'photo':
             is_valid, message = validate_image_file(file)
             if not is_valid:
                 return False, message, None
         
-        # Generate secure filename
-        filename = generate_unique_filename(file.filename, user_id, file_type)
+        if file_type == 'photo' and process:
+            try:
+                photo_bytes = process_photo(file.read())
+            except Exception as e:
+                return False, f"Invalid image file: {str(e)}", None
         
-        # Create directory structure
         upload_dir = current_app.config.get('UPLOAD_FOLDER', 'uploads')
-        if subfolder:
-            save_dir = os.path.join(upload_dir, file_type + 's', subfolder)
-        else:
-            save_dir = os.path.join(upload_dir, file_type + 's')
-        
-        os.makedirs(save_dir, exist_ok=True)
-        
-        # Save file
-        file_path = os.path.join(save_dir, filename)
-        file.save(file_path)
+        namespace = f"{file_type}s/{subfolder}" if subfolder else f"{file_type}s"
         
-        # Generate relative path for database storage
-        relative_path = os.path.relpath(file_path, upload_dir)
+        # A body spooled by accepts_upload is already on the upload volume: rename it, don't copy it
+        spool = file.stream if isinstance(file.stream, SpooledUpload) and not file.stream.published else None
         
-        # Optimize image if it's a photo
-        if file_type == 'photo':
-            optimize_image(file_path)
+        with span('upload.save', file_type=file_type):
+            if file_type == 'photo' and not process:
+                filename = generate_unique_filename(file.filename, user_id, file_type)
+                os.makedirs(os.path.join(upload_dir, namespace), exist_ok=True)
+                relative_path = f"{namespace}/{filename}"
+                if spool is not None:
+                    spool.publish(os.path.join(upload_dir, relative_path))
+                else:
+                    with atomic_write(os.path.join(upload_dir, relative_path)) as f:
+                        file.save(f)
+            else:
+                # Processed photos are always JPEG
+                if photo_bytes is not None:
+                    relative_path, digest, size = write_blob_bytes(upload_dir, namespace, photo_bytes, 'jpg')
+                else:
+                    extension = file.filename.rsplit('.', 1)[1].lower()
+                    if spool is not None:
+                        relative_path, digest, size = adopt_blob(upload_dir, namespace, spool, extension)
+                    else:
+                        relative_path, digest, size = write_blob(upload_dir, namespace, file, extension)
+                acquire_blob(relative_path, digest, size)
         
         current_app.logger.info(f"File uploaded successfully: {relative_path}")
         return True, "File uploaded successfully", relative_path
@@ -135,29 +296,28 @@ def save_uploaded_file(file, user_id, file_type='photo', subfolder=None):
         current_app.logger.error(f"File upload error: {str(e)}")
         return False, f"Upload failed: {str(e)}", None
 
-def optimize_image(file_path, max_width=800, quality=85):
-    """Optimize uploaded image for web use"""
+def optimize_image(file_path, max_width=PHOTO_MAX_WIDTH, quality=PHOTO_QUALITY):
+    """Optimize an image already on disk for web use (rewritten atomically)"""
     try:
-        with Image.open(file_path) as img:
-            # Convert to RGB if necessary
-            if img.mode in ('RGBA', 'P'):
-                img = img.convert('RGB')
-            
-            # Resize if too large
-            if img.width > max_width:
-                ratio = max_width / img.width
-                new_height = int(img.height * ratio)
-                img = img.resize((max_width, new_height), Image.Resampling.LANCZOS)
-            
-            # Save with optimization
-            img.save(file_path, 'JPEG', quality=quality, optimize=True)
+        with open(file_path, 'rb') as f:
+            data = process_photo(f.read(), max_width, quality)
+        with atomic_write(file_path) as f:
+            f.write(data)
             
     except Exception as e:
         current_app.logger.error(f"Image optimization error: {str(e)}")
 
 def delete_file(file_path):
-    """Delete a file from the upload directory"""
+    """
+    Delete a file from the upload directory
+    
+    Content-addressed files may be shared, so one is only unlinked once
+    no reference to it remains (release it with `release_blob` first).
+    """
     try:
+        if blob_digest(file_path) and blob_ref_count(file_path) > 0:
+            return False, "File is still referenced"
+        
         upload_dir = current_app.config.get('UPLOAD_FOLDER', 'uploads')
         full_path = os.path.join(upload_dir, file_path)
         
@@ -172,44 +332,160 @@ def delete_file(file_path):
         current_app.logger.error(f"File deletion error: {str(e)}")
         return False, f"Delete failed: {str(e)}"
 
-def get_file_url(file_path):
-    """Generate URL for accessing uploaded file"""
+def photo_variant_path(file_path, size='full', image_format='jpeg'):
+    """photos/profiles/x.jpg -> photos/profiles/x@thumb.webp; full-size JPEG is the photo itself"""
+    if size == 'full' and image_format == 'jpeg':
+        return file_path
+    stem = os.path.splitext(file_path)[0]
+    suffix = '' if size == 'full' else f'@{size}'
+    return f"{stem}{suffix}.{PHOTO_FORMATS[image_format][1]}"
+
+def is_profile_photo(file_path):
+    """A processed profile photo (not one of its derivatives)"""
+    name = os.path.basename(file_path)
+    return file_path.startswith(PROFILE_PHOTO_DIR + '/') and '@' not in name and allowed_file(name)
+
+def write_photo_variants(full_path, img, only_missing=False, full_jpeg=None):
+    """
+    Encode and store every size/format derivative of a decoded photo.
+    
+    `full_path` is the absolute path of the full-size JPEG; derivatives are
+    written next to it, and the JPEG itself (`full_jpeg` if already
+    encoded) last so its presence means the set is complete.
+    """
+    variants = [(size, image_format) for size in PHOTO_SIZES for image_format in PHOTO_FORMATS]
+    variants += [('full', 'webp'), ('full', 'jpeg')]
+    for size, image_format in variants:
+        path = photo_variant_path(full_path, size, image_format)
+        if only_missing and os.path.exists(path):
+            continue
+        if (size, image_format) == ('full', 'jpeg') and full_jpeg is not None:
+            data = full_jpeg
+        else:
+            variant = img if size == 'full' else ImageOps.fit(img, PHOTO_SIZES[size], Image.Resampling.LANCZOS)
+            data = encode_image(variant, image_format)
+        with atomic_write(path) as f:
+            f.write(data)
+
+def store_photo(upload_dir, img):
+    """
+    Store a decoded photo and its derivatives under its content address.
+    
+    Returns the relative path of the full JPEG. When the same photo is
+    already stored, only derivatives that are missing get written.
+    """
+    data = encode_image(img)
+    path = blob_path(PROFILE_PHOTO_DIR, hashlib.sha256(data).hexdigest(), 'jpg')
+    full_path = os.path.join(upload_dir, path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    stored = os.path.exists(full_path)
+    write_photo_variants(full_path, img, only_missing=stored, full_jpeg=data)
+    if stored:
+        os.utime(full_path)  # fresh again for upload_gc.py's grace period
+    return path
+
+@traced('pil.derivatives')
+def ensure_photo_variant(file_path, size='full', image_format='jpeg'):
+    """
+    Relative path of a photo derivative, regenerating missing ones from the full photo.
+    
+    Photos stored before derivatives existed (or whose derivatives were
+    removed) are decoded once and every missing variant is written.
+    Raises ValueError for a path outside the upload folder.
+    """
+    upload_dir = current_app.config.get('UPLOAD_FOLDER', 'uploads')
+    full_path = safe_join(upload_dir, file_path)
+    if full_path is None:
+        raise ValueError(f"Photo path outside the upload folder: {file_path}")
+    
+    variant_path = photo_variant_path(file_path, size, image_format)
+    if os.path.exists(os.path.join(upload_dir, variant_path)):
+        return variant_path
+    
+    with open(full_path, 'rb') as f:
+        img = decode_photo(f.read())
+    write_photo_variants(os.path.join(upload_dir, photo_variant_path(file_path)), img, only_missing=True)
+    current_app.logger.info(f"Regenerated photo derivatives for {file_path}")
+    return variant_path
+
+def delete_photo(file_path):
+    """Delete a profile photo together with all of its derivatives"""
+    if blob_digest(file_path) and blob_ref_count(file_path) > 0:
+        return False, "File is still referenced"
+    
+    for size in ('full',) + tuple(PHOTO_SIZES):
+        for image_format in PHOTO_FORMATS:
+            variant_path = photo_variant_path(file_path, size, image_format)
+            if variant_path != file_path:
+                delete_file(variant_path)
+    return delete_file(file_path)
+
+def negotiate_image_format(requested=None, accept_mimetypes=None):
+    """
+    Explicit `format` wins; otherwise WebP only for clients that list image/webp.
+    
+    A bare `*/*` is not taken as WebP support, so older clients keep JPEG.
+    """
+    if requested:
+        return requested if requested in PHOTO_FORMATS else None
+    if accept_mimetypes is not None:
+        for mimetype, quality in accept_mimetypes:
+            if mimetype == 'image/webp' and quality > 0:
+                return 'webp'
+    return 'jpeg'
+
+def photo_variant_source(file_path):
+    """(photo path, size, format) for a derivative path, or None"""
+    stem, extension = os.path.splitext(file_path)
+    image_format = next((name for name, spec in PHOTO_FORMATS.items() if spec[1] == extension[1:]), None)
+    stem, _, size = stem.partition('@')
+    size = size or 'full'
+    if image_format is None or (size != 'full' and size not in PHOTO_SIZES):
+        return None
+    photo_path = f"{stem}.jpg"
+    if photo_path == file_path or not is_profile_photo(photo_path):
+        return None
+    return photo_path, size, image_format
+
+def get_file_url(file_path, size=None, image_format=None):
+    """
+    Generate URL for accessing uploaded file
+    
+    For profile photos, `size` (thumb/medium/print/full) selects a
+    derivative. With `image_format` the URL names that file; without it
+    the URL is the photo's with `?size=`, so `serve_file` picks the format
+    from the Accept header of the browser's image request (not of the API
+    call that returned the URL). URLs point at FILE_URL_PREFIX and, with
+    FILE_URLS_SIGNED, carry an expiring signature.
+    """
     if not file_path:
         return None
     
-    # In production, this would be served by nginx or CDN
-    return f"/uploads/{file_path}"
+    params = {}
+    if (size or image_format) and is_profile_photo(file_path):
+        if image_format:
+            file_path = photo_variant_path(file_path, size or 'full', image_format)
+        elif size != 'full':
+            params['size'] = size
+    
+    url = f"{current_app.config.get('FILE_URL_PREFIX', '/student/files')}/{file_path}"
+    if current_app.config.get('FILE_URLS_SIGNED', True):
+        params = dict(sign_file_path(file_path), **params)
+    if params:
+        url += '?' + urlencode(params)
+    return url
 
 def validate_file_type(file):
-    """Validate file type using multiple methods"""
+    """Identify a file from its magic bytes; returns (recognised, file type)"""
     try:
-        # Check MIME type
-        mime_type, _ = mimetypes.guess_type(file.filename)
-        
-        # Read file header to verify actual type
         file.seek(0)
-        header = file.read(512)
+        header = file.read(SNIFF_BYTES)
         file.seek(0)
         
-        # Common file signatures
-        image_signatures = {
-            b'\xFF\xD8\xFF': 'jpeg',
-            b'\x89PNG': 'png',
-            b'GIF8': 'gif',
-        }
-        
-        pdf_signature = b'%PDF'
-        
-        # Check for image files
-        for signature, file_type in image_signatures.items():
-            if header.startswith(signature):
-                return True, file_type
-        
-        # Check for PDF
-        if header.startswith(pdf_signature):
-            return True, 'pdf'
-        
+        file_type = sniff_file_type(header)
+        if file_type:
+            return True, file_type
         return False, 'unknown'
         
     except Exception as e:
-        return False, f'validation_error: {str(e)}'
\ No newline at end of file
+        return False, f'validation_error: {str(e)}'
@@ -0,0 +1,115 @@
+# Uploaded File Serving for GAU-ID-View
+import os
+import hmac
+import time
+import hashlib
+import mimetypes
+from functools import lru_cache
+from urllib.parse import quote
+from werkzeug.security import safe_join
+from werkzeug.utils import send_file
+from flask import current_app, request
+from utils.blob_store import hash_file, blob_digest, is_content_addressed
+from utils.metrics import metrics
+
+FILES_SERVED = metrics.counter('upload_files_served_total', 'Uploaded files served, by serving mode and status')
+
+# Stored files are named <sha256>[@size].<ext> in the blob store, so their bytes never change
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+def _file_url_secret():
+    return (current_app.config.get('FILE_URL_SECRET') or current_app.config['SECRET_KEY']).encode()
+
+def _sign(path, expires):
+    message = f'{path}:{expires}'.encode()
+    return hmac.new(_file_url_secret(), message, hashlib.sha256).hexdigest()[:32]
+
+def sign_file_path(path, ttl=None):
+    """
+    Signature parameters (`expires`, `sig`) for an upload path.
+
+    The expiry is rounded up to a TTL boundary, so a file keeps the same
+    URL, and stays in browser caches, for at least one TTL rather than
+    getting a new URL on every API response.
+    """
+    ttl = ttl or current_app.config.get('FILE_URL_TTL', 3600)
+    expires = (int(time.time()) // ttl + 2) * ttl
+    return {'expires': expires, 'sig': _sign(path, expires)}
+
+def verify_file_signature(path, expires, signature):
+    """Check a signed upload URL's signature and expiry"""
+    try:
+        expires = int(expires)
+    except (TypeError, ValueError):
+        return False
+
+    if expires < time.time() or not signature:
+        return False
+    return hmac.compare_digest(signature, _sign(path, expires))
+
+@lru_cache(maxsize=4096)
+def _content_etag(full_path, mtime_ns, size):
+    # Keyed on mtime and size, so a rewritten file is hashed again
+    return hash_file(full_path)[0]
+
+def file_etag(relative_path, full_path, stat):
+    """Strong ETag: the SHA-256 of the file's bytes (already in a blob's name)"""
+    return blob_digest(relative_path) or _content_etag(full_path, stat.st_mtime_ns, stat.st_size)
+
+def send_upload(relative_path, max_age=None):
+    """
+    Response for an uploaded file, or None if it does not exist.
+
+    Every response has a strong ETag and Cache-Control. Content-addressed
+    files are immutable, so browsers keep them for `max_age` (normally
+    what is left of the signed URL's lifetime) without revalidating;
+    other files must revalidate with If-None-Match.
+
+    With FILE_SERVING = 'x-accel' the body is left to nginx through
+    X-Accel-Redirect to the internal FILE_ACCEL_PREFIX location, and with
+    'x-sendfile' to Apache/lighttpd; 'flask' streams it from this worker.
+    Range requests are answered by whichever of them sends the body.
+    """
+    upload_dir = os.path.abspath(current_app.config.get('UPLOAD_FOLDER', 'uploads'))
+    full_path = safe_join(upload_dir, relative_path)
+    if full_path is None:
+        return None
+    try:
+        stat = os.stat(full_path)
+    except OSError:
+        return None
+
+    mode = current_app.config.get('FILE_SERVING', 'flask')
+    etag = file_etag(relative_path, full_path, stat)
+    mimetype = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+
+    if mode == 'x-accel':
+        response = current_app.response_class(mimetype=mimetype)
+        prefix = current_app.config.get('FILE_ACCEL_PREFIX', '/internal-uploads/')
+        response.headers['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + quote(relative_path)
+        response.set_etag(etag)
+        response.last_modified = stat.st_mtime
+        response.make_conditional(request.environ)
+        if response.status_code == 304:
+            del response.headers['X-Accel-Redirect']
+    else:
+        response = send_file(
+            full_path, request.environ, mimetype=mimetype, etag=etag, last_modified=stat.st_mtime,
+            use_x_sendfile=(mode == 'x-sendfile'), response_class=current_app.response_class
+        )
+
+    response.cache_control.private = True
+    if is_content_addressed(relative_path):
+        response.cache_control.no_cache = None
+        response.cache_control.max_age = max(0, IMMUTABLE_MAX_AGE if max_age is None else max_age)
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+        response.cache_control.max_age = 0
+
+    FILES_SERVED.inc(mode=mode, status=str(response.status_code))
+    return response
+
+__all__ = [
+    'sign_file_path', 'verify_file_signature', 'send_upload', 'file_etag'
+]
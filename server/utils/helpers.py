@@ -4,7 +4,8 @@ import logging
 from functools import wraps
 from flask import jsonify, request, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity, verify_jwt_in_request
-from models import User, AdminActivity, db
+from models import User, StudentProfile, AdminActivity, db
+from utils.tracing import span
 from werkzeug.utils import secure_filename
 import uuid
 from datetime import datetime
@@ -40,7 +41,8 @@ def success_response(message="Success", data=None, status_code=200):
     if data is not None:
         response['data'] = data
     
-    return jsonify(response), status_code
+    with span('serialize.json'):
+        return jsonify(response), status_code
 
 def error_response(message="An error occurred", errors=None, status_code=400):
     """Standard error response format"""
@@ -186,20 +188,29 @@ def paginate_query(query, page=1, per_page=20):
     except ValueError:
         return None
 
-def filter_students(query, filters):
-    """Apply filters to student query"""
+def student_filter_conditions(filters):
+    """
+    WHERE clauses for the student list filters.
+
+    Returns (conditions, needs_profile); when `needs_profile` is set the
+    query must include student_profiles.
+    """
+    conditions = []
+    needs_profile = False
     if filters.get('department'):
-        query = query.filter(User.department.ilike(f"%{filters['department']}%"))
+        conditions.append(User.department.ilike(f"%{filters['department']}%"))
     
     if filters.get('status'):
-        query = query.join(User.profile).filter(StudentProfile.status == filters['status'])
+        conditions.append(StudentProfile.status == filters['status'])
+        needs_profile = True
     
     if filters.get('year_of_study'):
-        query = query.join(User.profile).filter(StudentProfile.year_of_study == filters['year_of_study'])
+        conditions.append(StudentProfile.year_of_study == filters['year_of_study'])
+        needs_profile = True
     
     if filters.get('search'):
         search_term = f"%{filters['search']}%"
-        query = query.filter(
+        conditions.append(
             db.or_(
                 User.name.ilike(search_term),
                 User.reg_number.ilike(search_term),
@@ -207,7 +218,14 @@ def filter_students(query, filters):
             )
         )
     
-    return query
+    return conditions, needs_profile
+
+def filter_students(query, filters):
+    """Apply filters to student query"""
+    conditions, needs_profile = student_filter_conditions(filters)
+    if needs_profile:
+        query = query.join(User.profile)
+    return query.filter(*conditions)
 
 def generate_csv_export(data, filename):
     """Generate CSV export for data"""
@@ -0,0 +1,319 @@
+# ID card rendering for GAU-ID-View
+import io
+import os
+import json
+import time
+import hashlib
+import tempfile
+import multiprocessing
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+import qrcode
+from PIL import Image, ImageDraw, ImageFont, ImageOps
+from flask import current_app
+from utils.file_handler import photo_variant_path, is_profile_photo
+from utils.card_verification import sign_card_payload, card_versions
+from utils.metrics import metrics
+from utils.tracing import traced
+
+CARDS_RENDERED = metrics.counter('id_cards_rendered_total', 'ID cards drawn, by whether the card cache had them')
+
+# Bump whenever the layout changes so every cached card is drawn again
+CARD_TEMPLATE_VERSION = 1
+
+CARD_DPI = 300
+CARD_SIZE = (1011, 638)     # CR80 (85.6 x 54 mm) at 300 dpi
+SHEET_SIZE = (2480, 3508)   # A4 at 300 dpi
+SHEET_GRID = (2, 5)         # columns x rows: 10 cards per sheet
+SHEET_GAP = 24              # 2mm between cards for the guillotine
+CARD_QUALITY = 95
+
+CARD_PHOTO_BOX = (40, 150, 340, 550)  # 3:4, filled from the photo's 600x800 'print' derivative
+CARD_QR_BOX = (791, 398, 971, 578)
+CARD_HEADER_HEIGHT = 120
+CARD_BLUE = (0, 61, 121)
+CARD_INK = (25, 25, 25)
+CARD_MUTED = (105, 105, 105)
+
+def card_qr_payload(profile, card_version=1):
+    """Text encoded in a card's QR code: the signed payload /verify checks"""
+    return sign_card_payload(profile.user_id, profile.id_number, profile.expiry_date, card_version)
+
+def card_data(profile, card_version=None):
+    """
+    Everything printed on a profile's card, as plain values for a pool process.
+
+    Photos are content-addressed, so a new photo changes `photo` and with
+    it the card's cache key; so does any edit to the printed fields, and
+    revoking the card (the QR payload carries the card version). Batches
+    pass `card_version` from one `card_versions` query.
+    """
+    user = profile.user
+    if card_version is None:
+        card_version = card_versions([profile.user_id])[profile.user_id]
+    return {
+        'university': current_app.config.get('UNIVERSITY_NAME', 'Garissa University'),
+        'name': user.name,
+        'reg_number': user.reg_number,
+        'id_number': profile.id_number,
+        'department': user.department,
+        'expiry_date': profile.expiry_date.strftime('%d %b %Y') if profile.expiry_date else '',
+        'photo': profile.photo_url,
+        'qr': card_qr_payload(profile, card_version),
+    }
+
+def card_key(data):
+    """Cache key: a digest of the card's printed content and the template version"""
+    content = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.sha256(f'{CARD_TEMPLATE_VERSION}:{content}'.encode()).hexdigest()
+
+def card_cache_path(cache_dir, key):
+    return os.path.join(cache_dir, key[:2], f'{key}.jpg')
+
+@lru_cache(maxsize=16)
+def _font(size, font_path=None):
+    if font_path:
+        return ImageFont.truetype(font_path, size)
+    return ImageFont.load_default(size=size)
+
+def _fit_text(draw, text, size, width, font_path=None):
+    """The largest font (down to 60% of `size`) that fits `text` in `width`, then truncated"""
+    for candidate in range(size, int(size * 0.6) - 1, -2):
+        font = _font(candidate, font_path)
+        if draw.textlength(text, font=font) <= width:
+            return text, font
+    while text and draw.textlength(text + '…', font=font) > width:
+        text = text[:-1]
+    return text + '…', font
+
+def _load_photo(upload_dir, photo):
+    """The card-sized photo, or None; JPEG draft mode decodes straight at the reduced size"""
+    if not photo:
+        return None
+    candidates = [photo]
+    if is_profile_photo(photo):
+        candidates.insert(0, photo_variant_path(photo, 'print', 'jpeg'))
+    box = (CARD_PHOTO_BOX[2] - CARD_PHOTO_BOX[0], CARD_PHOTO_BOX[3] - CARD_PHOTO_BOX[1])
+    for path in candidates:
+        full_path = os.path.join(upload_dir, path)
+        if os.path.exists(full_path):
+            with Image.open(full_path) as img:
+                img.draft('RGB', box)
+                return ImageOps.fit(img.convert('RGB'), box, Image.Resampling.LANCZOS)
+    return None
+
+def _qr_image(payload, size):
+    qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_M, border=2)
+    qr.add_data(payload)
+    matrix = qr.get_matrix()
+    modules = len(matrix)
+    pixels = bytes(0 if dark else 255 for row in matrix for dark in row)
+    img = Image.frombytes('L', (modules, modules), pixels)
+    return img.resize((size, size), Image.Resampling.NEAREST)
+
+@traced('pil.id_card')
+def render_card(data, upload_dir, font_path=None):
+    """Draw one card from `card_data` output; returns an RGB image of CARD_SIZE"""
+    card = Image.new('RGB', CARD_SIZE, 'white')
+    draw = ImageDraw.Draw(card)
+    width = CARD_SIZE[0]
+
+    draw.rectangle((0, 0, width, CARD_HEADER_HEIGHT), fill=CARD_BLUE)
+    text, font = _fit_text(draw, data['university'].upper(), 46, width - 80, font_path)
+    draw.text((40, 22), text, font=font, fill='white')
+    draw.text((40, 78), 'STUDENT IDENTITY CARD', font=_font(26, font_path), fill=(200, 215, 235))
+
+    photo = _load_photo(upload_dir, data.get('photo'))
+    if photo is not None:
+        card.paste(photo, CARD_PHOTO_BOX[:2])
+    else:
+        draw.rectangle(CARD_PHOTO_BOX, fill=(230, 230, 230))
+        draw.text((CARD_PHOTO_BOX[0] + 85, CARD_PHOTO_BOX[1] + 185), 'NO PHOTO', font=_font(28, font_path), fill=CARD_MUTED)
+    draw.rectangle(CARD_PHOTO_BOX, outline=CARD_BLUE, width=3)
+
+    x = CARD_PHOTO_BOX[2] + 40
+    text, font = _fit_text(draw, data['name'], 42, width - x - 40, font_path)
+    draw.text((x, 150), text, font=font, fill=CARD_INK)
+
+    label_font = _font(22, font_path)
+    y = 215
+    for label, value, value_width in (
+        ('REG. NUMBER', data['reg_number'], width - x - 40),
+        ('ID NUMBER', data['id_number'], width - x - 40),
+        ('DEPARTMENT', data['department'], CARD_QR_BOX[0] - x - 20),
+        ('EXPIRES', data['expiry_date'] or '—', CARD_QR_BOX[0] - x - 20),
+    ):
+        draw.text((x, y), label, font=label_font, fill=CARD_MUTED)
+        text, font = _fit_text(draw, value or '', 32, value_width, font_path)
+        draw.text((x, y + 26), text, font=font, fill=CARD_INK)
+        y += 85
+
+    card.paste(_qr_image(data['qr'], CARD_QR_BOX[2] - CARD_QR_BOX[0]), CARD_QR_BOX[:2])
+    draw.rectangle((0, CARD_SIZE[1] - 12, width, CARD_SIZE[1]), fill=CARD_BLUE)
+    return card
+
+def _save_jpeg(img, path):
+    """Write atomically, so a concurrent run never reads half a cached card"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.card-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            img.save(f, 'JPEG', quality=CARD_QUALITY, subsampling=0, dpi=(CARD_DPI, CARD_DPI))
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+def render_card_file(data, upload_dir, cache_path, font_path=None):
+    """Runs in a pool process: draw a card into the cache"""
+    _save_jpeg(render_card(data, upload_dir, font_path), cache_path)
+    return cache_path
+
+def compose_sheet(card_paths):
+    """Runs in a pool process: lay cached cards out on an A4 sheet; returns JPEG bytes"""
+    sheet = Image.new('RGB', SHEET_SIZE, 'white')
+    draw = ImageDraw.Draw(sheet)
+    columns, rows = SHEET_GRID
+    block_width = columns * CARD_SIZE[0] + (columns - 1) * SHEET_GAP
+    block_height = rows * CARD_SIZE[1] + (rows - 1) * SHEET_GAP
+    left = (SHEET_SIZE[0] - block_width) // 2
+    top = (SHEET_SIZE[1] - block_height) // 2
+    for index, path in enumerate(card_paths):
+        row, column = divmod(index, columns)
+        x = left + column * (CARD_SIZE[0] + SHEET_GAP)
+        y = top + row * (CARD_SIZE[1] + SHEET_GAP)
+        with Image.open(path) as card:
+            sheet.paste(card, (x, y))
+        draw.rectangle((x - 1, y - 1, x + CARD_SIZE[0], y + CARD_SIZE[1]), outline=(190, 190, 190))  # cutting guide
+
+    output = io.BytesIO()
+    sheet.save(output, 'JPEG', quality=CARD_QUALITY, subsampling=0, dpi=(CARD_DPI, CARD_DPI))
+    return output.getvalue()
+
+def write_pdf(pages, out, page_size=SHEET_SIZE, dpi=CARD_DPI):
+    """
+    Stream JPEG pages into a PDF, one full-page image per page.
+
+    The JPEG bytes are embedded as they are (DCTDecode), so nothing is
+    re-encoded and only one page is held in memory at a time, where
+    Pillow's multi-page PDF writer needs every page decoded at once.
+    Returns the number of pages.
+    """
+    width_pt = page_size[0] * 72 / dpi
+    height_pt = page_size[1] * 72 / dpi
+    offsets = {}
+    position = 0
+
+    def write(data):
+        nonlocal position
+        out.write(data)
+        position += len(data)
+
+    def begin(number):
+        offsets[number] = position
+        write(f'{number} 0 obj\n'.encode())
+
+    write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+    begin(1)
+    write(b'<< /Type /Catalog /Pages 2 0 R >>\nendobj\n')
+
+    kids = []
+    for index, jpeg in enumerate(pages):
+        page, contents, image = 3 + index * 3, 4 + index * 3, 5 + index * 3
+        kids.append(f'{page} 0 R')
+        begin(page)
+        write((f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width_pt:.2f} {height_pt:.2f}] '
+               f'/Resources << /XObject << /Im0 {image} 0 R >> >> /Contents {contents} 0 R >>\nendobj\n').encode())
+        drawing = f'q {width_pt:.2f} 0 0 {height_pt:.2f} 0 0 cm /Im0 Do Q'.encode()
+        begin(contents)
+        write(f'<< /Length {len(drawing)} >>\nstream\n'.encode() + drawing + b'\nendstream\nendobj\n')
+        begin(image)
+        write((f'<< /Type /XObject /Subtype /Image /Width {page_size[0]} /Height {page_size[1]} '
+               f'/ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter /DCTDecode /Length {len(jpeg)} >>\nstream\n').encode())
+        write(jpeg)
+        write(b'\nendstream\nendobj\n')
+
+    begin(2)
+    write(f'<< /Type /Pages /Kids [{" ".join(kids)}] /Count {len(kids)} >>\nendobj\n'.encode())
+
+    xref = position
+    size = 3 + len(kids) * 3
+    write(f'xref\n0 {size}\n0000000000 65535 f \n'.encode())
+    for number in range(1, size):
+        write(f'{offsets[number]:010d} 00000 n \n'.encode())
+    write(f'trailer\n<< /Size {size} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode())
+    return len(kids)
+
+def render_card_batch(cards, out=None, upload_dir=None, cache_dir=None, workers=None, font_path=None):
+    """
+    Render `card_data` dicts into the card cache and, with `out`, an A4 PDF.
+
+    Cards already in the cache (same printed content and template) are
+    reused; the rest are drawn in a process pool, and the sheets are
+    composed there too, so a print run uses every core. Returns counters.
+    """
+    config = current_app.config
+    upload_dir = upload_dir or config.get('UPLOAD_FOLDER', 'uploads')
+    cache_dir = cache_dir or config.get('CARD_CACHE_FOLDER', 'card_cache')
+    workers = workers or int(config.get('CARD_WORKERS') or os.cpu_count() or 1)
+    font_path = font_path or config.get('CARD_FONT')
+
+    started = time.perf_counter()
+    paths, missing = [], {}
+    for data in cards:
+        path = card_cache_path(cache_dir, card_key(data))
+        paths.append(path)
+        if path not in missing and not os.path.exists(path):
+            missing[path] = data
+
+    per_sheet = SHEET_GRID[0] * SHEET_GRID[1]
+    sheets = [paths[i:i + per_sheet] for i in range(0, len(paths), per_sheet)] if out is not None else []
+    stats = {'cards': len(paths), 'rendered': len(missing), 'cached': len(paths) - len(missing), 'sheets': 0}
+
+    # A handful of cards is quicker to draw here than to start a pool for
+    if workers == 1 or len(missing) + len(sheets) <= 2 * workers:
+        for path, data in missing.items():
+            render_card_file(data, upload_dir, path, font_path)
+        if sheets:
+            stats['sheets'] = write_pdf((compose_sheet(sheet) for sheet in sheets), out)
+    else:
+        # spawn: forking a threaded gunicorn worker can copy held locks
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            if missing:
+                count = len(missing)
+                for _ in pool.map(
+                    render_card_file, missing.values(), [upload_dir] * count, missing.keys(), [font_path] * count,
+                    chunksize=max(1, count // (workers * 8))
+                ):
+                    pass
+            if sheets:
+                # Pages come back in order and are written as each arrives
+                stats['sheets'] = write_pdf(pool.map(compose_sheet, sheets), out)
+
+    CARDS_RENDERED.inc(stats['rendered'], source='rendered')
+    CARDS_RENDERED.inc(stats['cached'], source='cache')
+    stats['seconds'] = round(time.perf_counter() - started, 2)
+    return stats
+
+def card_image(profile, image_format='png'):
+    """One profile's card as PNG or JPEG bytes, through the card cache"""
+    data = card_data(profile)
+    path = card_cache_path(current_app.config.get('CARD_CACHE_FOLDER', 'card_cache'), card_key(data))
+    if not os.path.exists(path):
+        render_card_file(data, current_app.config.get('UPLOAD_FOLDER', 'uploads'), path, current_app.config.get('CARD_FONT'))
+        CARDS_RENDERED.inc(source='rendered')
+    else:
+        CARDS_RENDERED.inc(source='cache')
+    if image_format == 'jpeg':
+        with open(path, 'rb') as f:
+            return f.read()
+    output = io.BytesIO()
+    with Image.open(path) as card:
+        card.save(output, 'PNG', dpi=(CARD_DPI, CARD_DPI))
+    return output.getvalue()
+
+__all__ = [
+    'card_data', 'card_key', 'render_card', 'render_card_batch', 'card_image', 'write_pdf',
+    'CARD_SIZE', 'SHEET_GRID'
+]
@@ -0,0 +1,213 @@
+# Background Image Processing for GAU-ID-View
+import os
+import time
+import atexit
+import logging
+import threading
+import multiprocessing
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+from flask import current_app
+from models import db, ImageJob, StudentProfile
+from utils.file_handler import decode_photo, store_photo, delete_file, delete_photo
+from utils.blob_store import acquire_blob, release_blob
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+IMAGE_JOBS = metrics.counter('image_jobs_total', 'Photo processing jobs by outcome')
+IMAGE_JOBS_REJECTED = metrics.counter('image_jobs_rejected_total', 'Photo uploads refused because the job queue was full')
+IMAGE_JOB_SECONDS = metrics.histogram(
+    'image_job_seconds', 'Time from upload to processed photo',
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+)
+IMAGE_JOBS_IN_FLIGHT = metrics.gauge('image_jobs_in_flight', 'Photo jobs queued or running in this worker')
+
+class ImageQueueFull(Exception):
+    """Raised when this worker already has IMAGE_QUEUE_MAX jobs outstanding"""
+
+def process_photo_file(source_path, upload_dir):
+    """
+    Runs in a pool process: raw upload -> full JPEG plus its derivatives, one decode.
+
+    Returns the stored photo's relative (content-addressed) path.
+    """
+    with open(source_path, 'rb') as f:
+        img = decode_photo(f.read())
+    return store_photo(upload_dir, img)
+
+def complete_job(job_id, error=None, result_path=None):
+    """
+    Record a finished job and, if it is the student's newest photo, swap it in.
+
+    The processed file is already complete on disk, so `photo_url` flips
+    from the old photo to the new one, together with both reference
+    counts, in a single commit; the old file (unless another student
+    shares it) and the raw upload are removed only after that commit.
+    """
+    job = db.session.get(ImageJob, job_id)
+    if job is None or job.status != 'queued':
+        return job
+
+    job.finished_at = datetime.utcnow()
+    if result_path:
+        job.result_path = result_path
+    previous_photo = None
+    if error is not None:
+        job.status = 'failed'
+        job.error = str(error)[:1000]
+    else:
+        newer = ImageJob.query.filter(
+            ImageJob.user_id == job.user_id,
+            ImageJob.id > job.id,
+            ImageJob.status == 'done'
+        ).first()
+        profile = StudentProfile.query.filter_by(user_id=job.user_id).first()
+        if newer is not None or profile is None:
+            job.status = 'superseded'
+        else:
+            previous_photo = profile.photo_url
+            profile.photo_url = job.result_path
+            profile.last_updated = job.finished_at
+            acquire_blob(job.result_path)
+            if previous_photo:
+                release_blob(previous_photo)
+            job.status = 'done'
+    db.session.commit()
+
+    if job.status != 'done' and job.result_path:
+        delete_photo(job.result_path)
+    if previous_photo and previous_photo != job.result_path:
+        delete_photo(previous_photo)
+    delete_file(job.source_path)
+
+    IMAGE_JOBS.inc(outcome=job.status)
+    if job.created_at:
+        IMAGE_JOB_SECONDS.observe((job.finished_at - job.created_at).total_seconds())
+    return job
+
+def expire_stale_job(job):
+    """Fail a job whose worker was recycled before it finished"""
+    timeout = current_app.config.get('IMAGE_JOB_TIMEOUT', 120)
+    if job.status == 'queued' and job.created_at < datetime.utcnow() - timedelta(seconds=timeout):
+        complete_job(job.id, 'Photo processing was interrupted, please upload again')
+    return job
+
+class ImageJobQueue:
+    """
+    Per-process pool of image workers with a bounded number of outstanding jobs.
+
+    Decoding and resizing run in separate processes, so a burst of uploads
+    neither holds the request worker nor competes with it for the GIL.
+    Once `max_pending` jobs are outstanding, `reserve` fails and the upload
+    endpoint answers 503 instead of letting the backlog grow.
+    """
+
+    def __init__(self, app, workers=2, max_pending=16):
+        self.app = app
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.in_flight = 0
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+        # spawn: forking a threaded gunicorn worker can copy held locks
+        self.executor = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'))
+
+    def reserve(self):
+        """Claim a slot before storing the upload; raises ImageQueueFull"""
+        if not self.slots.acquire(blocking=False):
+            IMAGE_JOBS_REJECTED.inc()
+            raise ImageQueueFull()
+        with self.lock:
+            self.in_flight += 1
+            IMAGE_JOBS_IN_FLIGHT.set(self.in_flight)
+
+    def release(self):
+        with self.lock:
+            self.in_flight -= 1
+            IMAGE_JOBS_IN_FLIGHT.set(self.in_flight)
+        self.slots.release()
+
+    def submit(self, job):
+        """Process a committed job in the pool; its slot is released on completion"""
+        upload_dir = self.app.config.get('UPLOAD_FOLDER', 'uploads')
+        future = self.executor.submit(process_photo_file, os.path.join(upload_dir, job.source_path), upload_dir)
+        future.add_done_callback(lambda done, job_id=job.id: self._finished(job_id, done))
+
+    def _finished(self, job_id, future):
+        try:
+            error = future.exception()
+            with self.app.app_context():
+                try:
+                    if error is None:
+                        complete_job(job_id, result_path=future.result())
+                    else:
+                        complete_job(job_id, f'Photo processing failed: {error}')
+                finally:
+                    db.session.remove()
+        except Exception as e:
+            logger.error(f"Image job {job_id} completion failed: {str(e)}")
+        finally:
+            self.release()
+
+    def shutdown(self, timeout=10.0):
+        """Wait up to `timeout` for outstanding jobs, then stop the pool"""
+        deadline = time.monotonic() + timeout
+        while self.in_flight and time.monotonic() < deadline:
+            time.sleep(0.1)
+        self.executor.shutdown(wait=not self.in_flight, cancel_futures=True)
+
+class InlineImageJobQueue:
+    """Runs jobs synchronously in the request (tests and single-process dev servers)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    def reserve(self):
+        pass
+
+    def release(self):
+        pass
+
+    def submit(self, job):
+        """Process the job now; failures are recorded on the job, not raised"""
+        upload_dir = self.app.config.get('UPLOAD_FOLDER', 'uploads')
+        try:
+            result_path = process_photo_file(os.path.join(upload_dir, job.source_path), upload_dir)
+        except Exception as e:
+            complete_job(job.id, f'Photo processing failed: {e}')
+        else:
+            complete_job(job.id, result_path=result_path)
+
+_queue = None
+_queue_lock = threading.Lock()
+
+def get_image_queue(app=None):
+    """The image job queue for this process (re-created after fork)"""
+    global _queue
+    app = app or current_app._get_current_object()
+    if app.config.get('IMAGE_JOBS_INLINE'):
+        return InlineImageJobQueue(app)
+    
+    with _queue_lock:
+        if _queue is None or _queue.pid != os.getpid():
+            _queue = ImageJobQueue(
+                app,
+                workers=int(app.config.get('IMAGE_WORKERS', 2)),
+                max_pending=int(app.config.get('IMAGE_QUEUE_MAX', 16))
+            )
+        return _queue
+
+def shutdown_image_queue(timeout=10.0):
+    """Finish this process's outstanding image jobs, if a pool was started"""
+    global _queue
+    with _queue_lock:
+        queue, _queue = _queue, None
+    if queue is not None and queue.pid == os.getpid():
+        queue.shutdown(timeout)
+
+atexit.register(shutdown_image_queue)
+
+__all__ = [
+    'ImageJobQueue', 'ImageQueueFull', 'get_image_queue', 'shutdown_image_queue',
+    'complete_job', 'expire_stale_job', 'process_photo_file'
+]
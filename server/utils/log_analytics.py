@@ -0,0 +1,212 @@
+# Offline Log Analytics for GAU-ID-View
+import os
+import re
+import gzip
+import json
+import math
+import heapq
+from datetime import datetime, timedelta, timezone
+
+REQUEST_COMPLETED = 'Request completed'
+SLOW_QUERY = 'Slow database query'
+N_PLUS_ONE = 'Possible N+1 query pattern'
+
+# Cheap substring checks so uninteresting lines are never JSON-decoded
+_INTERESTING = tuple(f'"{message}"' for message in (REQUEST_COMPLETED, SLOW_QUERY, N_PLUS_ONE))
+
+_ID_SEGMENT = re.compile(r'/(?:\d+|[0-9a-f]{8}(?:-[0-9a-f]{4}){3}-[0-9a-f]{12}|[0-9a-f]{16,})(?=/|$)')
+_RELATIVE_TIME = re.compile(r'^(\d+)([smhd])$')
+_RELATIVE_UNITS = {'s': 'seconds', 'm': 'minutes', 'h': 'hours', 'd': 'days'}
+
+class LatencySketch:
+    """
+    Fixed-memory latency distribution.
+
+    Durations are counted in logarithmic buckets (each `accuracy` wider than
+    the last), so quantiles are within that relative error regardless of how
+    many requests are added.
+    """
+
+    def __init__(self, accuracy=0.01):
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+        index = math.ceil(math.log(max(value, 1e-6)) / self.log_gamma)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                estimate = 2 * self.gamma ** index / (self.gamma + 1)
+                return min(max(estimate, self.min), self.max)
+        return self.max
+
+class EndpointStats:
+    """Request totals for one `METHOD endpoint`"""
+
+    def __init__(self, slowest_limit=5):
+        self.latency = LatencySketch()
+        self.server_errors = 0
+        self.client_errors = 0
+        self.slow_queries = 0
+        self.n_plus_one = 0
+        self.slowest = []  # min-heap of (duration, request_id)
+        self.slowest_limit = slowest_limit
+
+    def add_request(self, duration, status_code, request_id):
+        self.latency.add(duration)
+        if status_code >= 500:
+            self.server_errors += 1
+        elif status_code >= 400:
+            self.client_errors += 1
+
+        item = (duration, request_id or '')
+        if len(self.slowest) < self.slowest_limit:
+            heapq.heappush(self.slowest, item)
+        elif item > self.slowest[0]:
+            heapq.heapreplace(self.slowest, item)
+
+    def to_dict(self):
+        count = self.latency.count
+
+        def ms(value):
+            return round(value * 1000, 2) if value is not None else None
+
+        return {
+            'count': count,
+            'error_rate': round(self.server_errors / count, 4) if count else 0.0,
+            'client_error_rate': round(self.client_errors / count, 4) if count else 0.0,
+            'mean_ms': ms(self.latency.total / count) if count else None,
+            'p50_ms': ms(self.latency.quantile(0.50)),
+            'p95_ms': ms(self.latency.quantile(0.95)),
+            'p99_ms': ms(self.latency.quantile(0.99)),
+            'max_ms': ms(self.latency.max),
+            'slow_queries': self.slow_queries,
+            'n_plus_one': self.n_plus_one,
+            'slowest': [
+                {'request_id': request_id, 'duration_ms': ms(duration)}
+                for duration, request_id in sorted(self.slowest, reverse=True)
+            ]
+        }
+
+def parse_time(value, now=None):
+    """
+    Parse an ISO timestamp or a relative window such as `15m`, `6h`, `7d`.
+
+    Returns naive UTC, like the log records; a timestamp with an offset is
+    converted, one without is taken as UTC.
+    """
+    if value is None:
+        return None
+    match = _RELATIVE_TIME.match(value.strip())
+    if match:
+        now = now or datetime.utcnow()
+        return now - timedelta(**{_RELATIVE_UNITS[match.group(2)]: int(match.group(1))})
+    parsed = datetime.fromisoformat(value.strip().rstrip('Z'))
+    if parsed.tzinfo:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def normalize_path(path):
+    """Collapse numeric and hex/uuid path segments so routes group together"""
+    return _ID_SEGMENT.sub('/<id>', path or '')
+
+def find_log_files(log_dir, base_name):
+    """`base_name` plus rotated copies (`.1`, `.2.gz`, `-20250101.gz`), oldest first"""
+    pattern = re.compile(rf'^{re.escape(base_name)}(?:[.-](\d+))?(?:\.gz)?$')
+    found = []
+    for entry in os.scandir(log_dir):
+        match = pattern.match(entry.name)
+        if match and entry.is_file():
+            found.append((entry.stat().st_mtime, entry.path))
+    found.sort()
+    return [path for _, path in found]
+
+def open_log(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', errors='replace')
+    return open(path, encoding='utf-8', errors='replace')
+
+def iter_records(paths):
+    """Yield decoded JSON records of interest, one line at a time"""
+    for path in paths:
+        with open_log(path) as f:
+            for line in f:
+                if not any(marker in line for marker in _INTERESTING):
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+def _record_time(record):
+    try:
+        return datetime.fromisoformat(record['timestamp'].rstrip('Z'))
+    except (KeyError, TypeError, ValueError):
+        return None
+
+def _endpoint_key(record, extra):
+    method = (record.get('request') or {}).get('method', '?')
+    endpoint = extra.get('endpoint') or normalize_path((record.get('request') or {}).get('path'))
+    return f'{method} {endpoint or "unmatched"}'
+
+def analyze(records, since=None, until=None, slowest_limit=5):
+    """Aggregate request, slow query and N+1 records into per-endpoint stats"""
+    endpoints = {}
+    overall = EndpointStats(slowest_limit)
+
+    def stats_for(key):
+        stats = endpoints.get(key)
+        if stats is None:
+            stats = endpoints[key] = EndpointStats(slowest_limit)
+        return stats
+
+    for record in records:
+        if since or until:
+            timestamp = _record_time(record)
+            if timestamp is None or (since and timestamp < since) or (until and timestamp > until):
+                continue
+
+        extra = record.get('extra') or {}
+        message = record.get('message')
+
+        if message == REQUEST_COMPLETED:
+            if 'duration' not in extra:
+                continue
+            duration = float(extra['duration'])
+            status_code = int(extra.get('status_code') or 0)
+            request_id = extra.get('request_id') or record.get('request_id')
+            stats_for(_endpoint_key(record, extra)).add_request(duration, status_code, request_id)
+            overall.add_request(duration, status_code, request_id)
+        elif message == SLOW_QUERY:
+            stats_for(_endpoint_key(record, extra)).slow_queries += 1
+            overall.slow_queries += 1
+        elif message == N_PLUS_ONE:
+            stats_for(_endpoint_key(record, extra)).n_plus_one += 1
+            overall.n_plus_one += 1
+
+    return {
+        'overall': overall.to_dict(),
+        'endpoints': {key: stats.to_dict() for key, stats in endpoints.items()}
+    }
+
+__all__ = [
+    'LatencySketch', 'EndpointStats', 'analyze', 'find_log_files',
+    'iter_records', 'normalize_path', 'parse_time'
+]
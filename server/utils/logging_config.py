@@ -3,7 +3,7 @@ import os
 import logging
 import logging.handlers
 from datetime import datetime
-from flask import request, g, current_app
+from flask import request, g, current_app, has_request_context
 import json
 import traceback
 from functools import wraps
@@ -193,13 +193,22 @@ def log_request_end(response):
                 }
             })
         
+        completed = {
+            'endpoint': request.url_rule.rule if request.url_rule is not None else None,
+            'duration': duration,
+            'status_code': response.status_code,
+            # From the header: get_data() fails on send_file and buffers streamed bodies
+            'response_size': response.content_length,
+            'request_id': g.request_id
+        }
+        
+        # Per-request database statistics from the query instrumentation
+        query_stats = g.get('query_stats')
+        if query_stats is not None:
+            completed.update(query_stats.summary())
+        
         current_app.logger.info('Request completed', extra={
-            'extra_data': {
-                'duration': duration,
-                'status_code': response.status_code,
-                'response_size': len(response.get_data()),
-                'request_id': g.request_id
-            }
+            'extra_data': completed
         })
     
     return response
@@ -242,15 +251,23 @@ def generate_request_id():
     import uuid
     return str(uuid.uuid4())[:8]
 
-def log_database_query(query, duration=None):
-    """Log slow database queries"""
-    if duration and duration > 0.5:  # Log queries > 500ms
-        current_app.logger.warning('Slow database query', extra={
-            'extra_data': {
-                'query': str(query),
-                'duration': duration,
-                'type': 'database_performance'
-            }
+def log_database_query(query, duration=None, threshold=0.5, parameter_count=None, plan=None, endpoint=None):
+    """Log slow database queries (parameter values are never logged)"""
+    if duration and duration > threshold:
+        extra_data = {
+            'query': str(query),
+            'duration': duration,
+            'parameter_count': parameter_count,
+            'endpoint': endpoint,
+            'type': 'database_performance'
+        }
+        if plan:
+            extra_data['query_plan'] = plan
+        if has_request_context() and hasattr(g, 'request_id'):
+            extra_data['request_id'] = g.request_id
+        
+        logging.getLogger('performance').warning('Slow database query', extra={
+            'extra_data': extra_data
         })
 
 def log_user_activity(action, details=None):
@@ -0,0 +1,223 @@
+# Pooled SMTP Delivery for GAU-ID-View
+import os
+import time
+import queue
+import atexit
+import logging
+import smtplib
+import threading
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+EMAILS_SENT = metrics.counter('emails_sent_total', 'Emails accepted by the SMTP server')
+EMAILS_FAILED = metrics.counter('emails_failed_total', 'Emails dropped after exhausting retries')
+EMAILS_REJECTED = metrics.counter('emails_rejected_total', 'Emails refused because the send queue was full')
+SMTP_CONNECTIONS = metrics.counter('smtp_connections_total', 'SMTP connections opened')
+EMAIL_QUEUE_DEPTH = metrics.gauge('email_queue_depth', 'Emails waiting in this worker\'s send queue')
+
+_STOP = object()
+
+def smtp_settings(config):
+    """SMTP settings needed by background senders (no app context required)"""
+    return {
+        'server': config.get('MAIL_SERVER', 'localhost'),
+        'port': int(config.get('MAIL_PORT', 25)),
+        'use_tls': bool(config.get('MAIL_USE_TLS', False)),
+        'use_ssl': bool(config.get('MAIL_USE_SSL', False)),
+        'username': config.get('MAIL_USERNAME'),
+        'password': config.get('MAIL_PASSWORD'),
+        'timeout': float(config.get('MAIL_TIMEOUT', 30)),
+        'max_messages': int(config.get('MAIL_MAX_MESSAGES_PER_CONNECTION', 100)),
+        'idle_timeout': float(config.get('MAIL_CONNECTION_IDLE_TIMEOUT', 60))
+    }
+
+class SMTPConnection:
+    """
+    One authenticated SMTP session reused across messages.
+
+    Reconnects transparently when the server drops the session, after
+    `max_messages` messages (providers cap messages per session) or when the
+    connection has sat idle longer than `idle_timeout`.
+    """
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.smtp = None
+        self.sent_on_connection = 0
+        self.last_used = 0.0
+
+    def connect(self):
+        settings = self.settings
+        if settings['use_ssl']:
+            smtp = smtplib.SMTP_SSL(settings['server'], settings['port'], timeout=settings['timeout'])
+        else:
+            smtp = smtplib.SMTP(settings['server'], settings['port'], timeout=settings['timeout'])
+            if settings['use_tls']:
+                smtp.starttls()
+        if settings['username'] and settings['password']:
+            smtp.login(settings['username'], settings['password'])
+
+        SMTP_CONNECTIONS.inc()
+        self.smtp = smtp
+        self.sent_on_connection = 0
+        self.last_used = time.monotonic()
+
+    def close(self):
+        if self.smtp is None:
+            return
+        try:
+            self.smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            self.smtp.close()
+        finally:
+            self.smtp = None
+
+    def _drop(self):
+        # The session is gone: close the socket without a QUIT
+        try:
+            self.smtp.close()
+        except OSError:
+            pass
+        finally:
+            self.smtp = None
+
+    def _ensure_connected(self):
+        if self.smtp is not None:
+            stale = time.monotonic() - self.last_used > self.settings['idle_timeout']
+            if stale or self.sent_on_connection >= self.settings['max_messages']:
+                self.close()
+        if self.smtp is None:
+            self.connect()
+
+    def send(self, sender, recipients, message_bytes):
+        """Send one message, reconnecting once if the session was lost"""
+        for attempt in (1, 2):
+            self._ensure_connected()
+            try:
+                refused = self.smtp.sendmail(sender, recipients, message_bytes)
+                self.sent_on_connection += 1
+                self.last_used = time.monotonic()
+                return refused
+            except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused):
+                # The server answered: resending on a new session would not change the reply
+                raise
+            except (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, ConnectionError, OSError):
+                self._drop()
+                if attempt == 2:
+                    raise
+
+class MailPool:
+    """
+    Bounded per-process queue drained by a few sender threads.
+
+    Each thread owns one `SMTPConnection` (smtplib sessions are not
+    thread-safe), so a burst of N emails costs at most `workers` handshakes
+    instead of N threads and N handshakes.
+    """
+
+    def __init__(self, settings, workers=2, queue_size=1000, retries=2):
+        self.settings = settings
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.retries = retries
+        self.pid = os.getpid()
+        self.threads = []
+        self.closed = False
+        for index in range(workers):
+            thread = threading.Thread(target=self._run, name=f'mail-sender-{index}', daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def submit(self, sender, recipients, message_bytes, timeout=0.5):
+        """Queue a message; returns False when the pool is closed or full"""
+        if self.closed:
+            return False
+        try:
+            self.queue.put((sender, list(recipients), message_bytes), timeout=timeout)
+        except queue.Full:
+            EMAILS_REJECTED.inc()
+            logger.error(f"Email queue full, dropping message to {recipients}")
+            return False
+        EMAIL_QUEUE_DEPTH.set(self.queue.qsize())
+        return True
+
+    def _deliver(self, connection, sender, recipients, message_bytes):
+        for attempt in range(self.retries + 1):
+            try:
+                connection.send(sender, recipients, message_bytes)
+                EMAILS_SENT.inc()
+                logger.info(f"Email sent successfully to {recipients}")
+                return True
+            except (smtplib.SMTPException, OSError) as e:
+                connection.close()
+                if attempt == self.retries:
+                    EMAILS_FAILED.inc()
+                    logger.error(f"Failed to send email to {recipients}: {str(e)}")
+                    return False
+                time.sleep(min(2 ** attempt, 10))
+
+    def _run(self):
+        connection = SMTPConnection(self.settings)
+        try:
+            while True:
+                item = self.queue.get()
+                try:
+                    if item is _STOP:
+                        return
+                    self._deliver(connection, *item)
+                finally:
+                    self.queue.task_done()
+                    EMAIL_QUEUE_DEPTH.set(self.queue.qsize())
+        finally:
+            connection.close()
+
+    def shutdown(self, timeout=10.0):
+        """Stop accepting mail, send what is queued and close connections"""
+        if self.closed:
+            return
+        self.closed = True
+        deadline = time.monotonic() + timeout
+        stops = 0
+        for _ in self.threads:
+            # Sentinels queue behind pending mail, so everything queued is sent first.
+            # A full queue (SMTP down) must not hold up worker exit past the deadline;
+            # the sender threads are daemons and end with the process.
+            try:
+                self.queue.put(_STOP, timeout=max(deadline - time.monotonic(), 0))
+            except queue.Full:
+                break
+            stops += 1
+        for thread in self.threads:
+            thread.join(max(deadline - time.monotonic(), 0))
+
+        pending = self.queue.qsize() - min(stops, sum(1 for thread in self.threads if thread.is_alive()))
+        if pending > 0:
+            logger.warning(f"Mail pool shut down with {pending} unsent emails")
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_mail_pool(config):
+    """The sender pool for this process (re-created after fork)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.pid != os.getpid():
+            _pool = MailPool(
+                smtp_settings(config),
+                workers=int(config.get('MAIL_POOL_WORKERS', 2)),
+                queue_size=int(config.get('MAIL_QUEUE_SIZE', 1000)),
+                retries=int(config.get('MAIL_SEND_RETRIES', 2))
+            )
+        return _pool
+
+def shutdown_mail_pool(timeout=10.0):
+    """Drain this process's pool, if one was started"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None and pool.pid == os.getpid():
+        pool.shutdown(timeout)
+
+atexit.register(shutdown_mail_pool)
+
+__all__ = ['MailPool', 'SMTPConnection', 'get_mail_pool', 'shutdown_mail_pool', 'smtp_settings']
@@ -0,0 +1,403 @@
+# Metrics Registry for GAU-ID-View
+import os
+import json
+import time
+import threading
+from flask import Response, current_app, g, request
+
+# Upper bounds (seconds) for request latency histograms
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRICS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+METRICS_FILE_PREFIX = 'metrics_'
+
+def _labels_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+def _escape_label_value(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(labels_key, extra=None):
+    pairs = list(labels_key) + list(extra or [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape_label_value(value)}"' for key, value in pairs) + '}'
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+class Metric:
+    """A named counter, gauge or histogram with labelled samples"""
+
+    def __init__(self, registry, name, metric_type, help_text, buckets=None):
+        self.registry = registry
+        self.name = name
+        self.type = metric_type
+        self.help = help_text
+        self.buckets = tuple(buckets) if buckets else None
+        self.samples = {}
+
+    def inc(self, amount=1, **labels):
+        """Increment a counter or gauge"""
+        key = _labels_key(labels)
+        with self.registry.lock:
+            self.samples[key] = self.samples.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        """Decrement a gauge"""
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        """Set a gauge to an absolute value"""
+        key = _labels_key(labels)
+        with self.registry.lock:
+            self.samples[key] = value
+
+    def observe(self, value, **labels):
+        """Record an observation in a histogram"""
+        key = _labels_key(labels)
+        with self.registry.lock:
+            state = self.samples.get(key)
+            if state is None:
+                # Per-bucket (non-cumulative) counts, the last slot is +Inf
+                state = self.samples[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    break
+            else:
+                index = len(self.buckets)
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def snapshot(self):
+        """Serialisable copy of this metric (caller holds the lock)"""
+        samples = []
+        for key, value in self.samples.items():
+            if self.type == 'histogram':
+                value = [list(value[0]), value[1], value[2]]
+            samples.append([list(key), value])
+        return {
+            'type': self.type,
+            'help': self.help,
+            'buckets': list(self.buckets) if self.buckets else None,
+            'samples': samples
+        }
+
+class MetricsRegistry:
+    """
+    Process-local metrics with file-based aggregation across workers.
+
+    Each process periodically writes its samples to `metrics_<pid>.json` in a
+    shared directory. A scrape merges every file: counters and histograms are
+    summed over all files (including workers recycled by `max_requests`),
+    gauges only over processes that are still alive.
+    """
+
+    def __init__(self, directory=None, flush_interval=1.0):
+        self.lock = threading.RLock()
+        self.metrics = {}
+        self.collectors = []
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._last_flush = 0.0
+
+    def configure(self, directory=None, flush_interval=None):
+        """Point the registry at a shared multi-process directory"""
+        self.directory = directory
+        if flush_interval is not None:
+            self.flush_interval = flush_interval
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _get_or_create(self, name, metric_type, help_text, buckets=None):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = Metric(self, name, metric_type, help_text, buckets)
+            elif metric.type != metric_type:
+                raise ValueError(f"Metric {name} already registered as {metric.type}")
+            return metric
+
+    def counter(self, name, help_text):
+        return self._get_or_create(name, 'counter', help_text)
+
+    def gauge(self, name, help_text):
+        return self._get_or_create(name, 'gauge', help_text)
+
+    def histogram(self, name, help_text, buckets=DEFAULT_LATENCY_BUCKETS):
+        return self._get_or_create(name, 'histogram', help_text, sorted(buckets))
+
+    def add_collector(self, collector):
+        """
+        Register a callable run at scrape time in the scraping process only.
+
+        It returns a list of (name, type, help, [(labels_dict, value), ...])
+        tuples describing host-wide values that must not be summed per worker.
+        """
+        self.collectors.append(collector)
+
+    def _process_file(self, pid=None):
+        return os.path.join(self.directory, f'{METRICS_FILE_PREFIX}{pid or os.getpid()}.json')
+
+    def flush(self, force=False):
+        """Write this process's samples to the shared directory"""
+        if not self.directory:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_flush < self.flush_interval:
+            return
+
+        with self.lock:
+            self._last_flush = now
+            payload = {
+                'pid': os.getpid(),
+                'metrics': {name: metric.snapshot() for name, metric in self.metrics.items()}
+            }
+
+        path = self._process_file()
+        tmp_path = f'{path}.tmp'
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(payload, f, separators=(',', ':'))
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+
+    def _load_snapshots(self):
+        """Yield (pid, metrics) for every process file in the directory"""
+        if not self.directory:
+            with self.lock:
+                yield os.getpid(), {name: metric.snapshot() for name, metric in self.metrics.items()}
+            return
+
+        self.flush(force=True)
+        try:
+            entries = os.listdir(self.directory)
+        except OSError:
+            return
+
+        for entry in entries:
+            if not (entry.startswith(METRICS_FILE_PREFIX) and entry.endswith('.json')):
+                continue
+            try:
+                with open(os.path.join(self.directory, entry), 'r') as f:
+                    payload = json.load(f)
+            except (OSError, ValueError):
+                continue
+            yield payload.get('pid'), payload.get('metrics', {})
+
+    def aggregate(self):
+        """Merge samples from all worker files into one view"""
+        merged = {}
+        for pid, metrics in self._load_snapshots():
+            alive = pid == os.getpid() or (pid is not None and _pid_alive(pid))
+            for name, data in metrics.items():
+                if data['type'] == 'gauge' and not alive:
+                    continue
+
+                target = merged.setdefault(name, {
+                    'type': data['type'],
+                    'help': data['help'],
+                    'buckets': data.get('buckets'),
+                    'samples': {}
+                })
+                for labels, value in data['samples']:
+                    key = tuple(tuple(pair) for pair in labels)
+                    if data['type'] == 'histogram':
+                        current = target['samples'].get(key)
+                        if current is None:
+                            target['samples'][key] = [list(value[0]), value[1], value[2]]
+                        else:
+                            current[0] = [a + b for a, b in zip(current[0], value[0])]
+                            current[1] += value[1]
+                            current[2] += value[2]
+                    else:
+                        target['samples'][key] = target['samples'].get(key, 0) + value
+        return merged
+
+    def sample_value(self, name, **labels):
+        """Aggregated value of one counter/gauge sample (0 when absent)"""
+        metric = self.aggregate().get(name)
+        if not metric:
+            return 0
+        return metric['samples'].get(_labels_key(labels), 0)
+
+    def render(self):
+        """Render all metrics in the Prometheus text exposition format"""
+        lines = []
+        for name, data in sorted(self.aggregate().items()):
+            lines.append(f'# HELP {name} {data["help"]}')
+            lines.append(f'# TYPE {name} {data["type"]}')
+            for key, value in sorted(data['samples'].items()):
+                if data['type'] == 'histogram':
+                    cumulative = 0
+                    bounds = list(data['buckets']) + [float('inf')]
+                    for bound, count in zip(bounds, value[0]):
+                        cumulative += count
+                        labels = _format_labels(key, [('le', _format_value(bound))])
+                        lines.append(f'{name}_bucket{labels} {cumulative}')
+                    lines.append(f'{name}_sum{_format_labels(key)} {_format_value(value[1])}')
+                    lines.append(f'{name}_count{_format_labels(key)} {value[2]}')
+                else:
+                    lines.append(f'{name}{_format_labels(key)} {_format_value(value)}')
+
+        for collector in self.collectors:
+            try:
+                families = collector()
+            except Exception:
+                continue
+            for name, metric_type, help_text, samples in families:
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {metric_type}')
+                for labels, value in samples:
+                    lines.append(f'{name}{_format_labels(_labels_key(labels))} {_format_value(value)}')
+
+        return '\n'.join(lines) + '\n'
+
+def clear_metrics_directory(directory):
+    """Remove stale per-process files (call once from the master on startup)"""
+    if not directory or not os.path.isdir(directory):
+        return
+    for entry in os.listdir(directory):
+        if entry.startswith(METRICS_FILE_PREFIX):
+            try:
+                os.remove(os.path.join(directory, entry))
+            except OSError:
+                pass
+
+# Process-wide registry shared by all instrumentation
+metrics = MetricsRegistry()
+
+HTTP_REQUESTS = metrics.counter(
+    'http_requests_total', 'Total HTTP requests by endpoint, method and status'
+)
+HTTP_LATENCY = metrics.histogram(
+    'http_request_duration_seconds', 'HTTP request latency by endpoint, method and status'
+)
+HTTP_IN_PROGRESS = metrics.gauge(
+    'http_requests_in_progress', 'HTTP requests currently being handled'
+)
+
+def request_endpoint_label():
+    """Route template for the current request, to keep label cardinality bounded"""
+    if request.url_rule is not None:
+        return request.url_rule.rule
+    return 'unmatched'
+
+def count_server_errors():
+    """Total 5xx responses across all workers"""
+    data = metrics.aggregate().get(HTTP_REQUESTS.name)
+    if not data:
+        return 0
+    return int(sum(
+        value for key, value in data['samples'].items()
+        if dict(key).get('status', '').startswith('5')
+    ))
+
+def collect_system_metrics():
+    """Scrape-time host and database gauges"""
+    from models import db
+    from utils.system_stats import (
+        get_memory_stats, get_process_stats, get_disk_usage, get_db_pool_stats
+    )
+
+    families = []
+
+    process = get_process_stats()
+    if 'rss_bytes' in process:
+        families.append(('process_resident_memory_bytes', 'gauge',
+                         'Resident memory of the scraping worker', [({}, process['rss_bytes'])]))
+    if 'cpu_seconds' in process:
+        families.append(('process_cpu_seconds_total', 'counter',
+                         'CPU time of the scraping worker', [({}, process['cpu_seconds'])]))
+
+    memory = get_memory_stats()
+    if memory:
+        families.append(('host_memory_available_bytes', 'gauge', 'Host memory available',
+                         [({}, memory['available_bytes'])]))
+        families.append(('host_memory_total_bytes', 'gauge', 'Host memory total',
+                         [({}, memory['total_bytes'])]))
+
+    disk = get_disk_usage(current_app.config.get('UPLOAD_FOLDER', 'uploads'))
+    if disk:
+        families.append(('upload_disk_free_bytes', 'gauge', 'Free space on the upload volume',
+                         [({}, disk['free_bytes'])]))
+        families.append(('upload_disk_total_bytes', 'gauge', 'Size of the upload volume',
+                         [({}, disk['total_bytes'])]))
+
+    pool = get_db_pool_stats(db.engine)
+    pool_samples = [({'state': name}, pool[name]) for name in ('checkedin', 'checkedout', 'overflow') if name in pool]
+    if pool_samples:
+        families.append(('db_pool_connections', 'gauge',
+                         'Database pool connections of the scraping worker', pool_samples))
+
+    return families
+
+def metrics_response():
+    """Build the `/metrics` response, honouring an optional bearer token"""
+    token = current_app.config.get('METRICS_AUTH_TOKEN')
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
+class MetricsManager:
+    """Request instrumentation feeding the metrics registry"""
+
+    def __init__(self, app=None):
+        self.app = app
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Register request hooks and scrape-time collectors"""
+        metrics.configure(
+            app.config.get('METRICS_DIR'),
+            app.config.get('METRICS_FLUSH_INTERVAL', 1.0)
+        )
+        if collect_system_metrics not in metrics.collectors:
+            metrics.add_collector(collect_system_metrics)
+
+        @app.before_request
+        def start_request_timer():
+            g.metrics_start = time.perf_counter()
+            HTTP_IN_PROGRESS.inc()
+
+        @app.after_request
+        def record_request_metrics(response):
+            if hasattr(g, 'metrics_start'):
+                duration = time.perf_counter() - g.metrics_start
+                labels = {
+                    'endpoint': request_endpoint_label(),
+                    'method': request.method,
+                    'status': response.status_code
+                }
+                HTTP_REQUESTS.inc(**labels)
+                HTTP_LATENCY.observe(duration, **labels)
+            return response
+
+        @app.teardown_request
+        def finish_request_metrics(exc):
+            if hasattr(g, 'metrics_start'):
+                HTTP_IN_PROGRESS.dec()
+            metrics.flush()
+
+__all__ = [
+    'MetricsRegistry', 'MetricsManager', 'metrics', 'metrics_response',
+    'clear_metrics_directory', 'count_server_errors', 'request_endpoint_label',
+    'DEFAULT_LATENCY_BUCKETS'
+]
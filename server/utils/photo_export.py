@@ -0,0 +1,112 @@
+# Streaming photo archives for the ID card print vendor, GAU-ID-View
+import io
+import os
+import csv
+import zipfile
+from datetime import datetime
+from models import db, User, StudentProfile
+from utils.helpers import student_filter_conditions
+from utils.file_handler import photo_variant_path, is_profile_photo
+from utils.metrics import metrics
+
+PHOTO_ARCHIVE_ENTRIES = metrics.counter('photo_archive_entries_total', 'Photos written to print vendor archives')
+
+READ_SIZE = 64 * 1024
+MANIFEST_NAME = 'manifest.csv'
+MANIFEST_HEADER = ['id_number', 'file', 'reg_number', 'name', 'department', 'bytes']
+
+class _ZipStream:
+    """
+    Write-only file for ZipFile that hands its bytes to a generator.
+
+    It has `tell` but no `seek`, so ZipFile streams: each entry's CRC and
+    sizes follow its data in a data descriptor, and nothing is written
+    twice.
+    """
+    def __init__(self):
+        self.buffer = io.BytesIO()
+        self.offset = 0
+
+    def write(self, data):
+        self.offset += len(data)
+        return self.buffer.write(data)
+
+    def tell(self):
+        return self.offset
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = self.buffer.getvalue()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return data
+
+def photo_archive_query(filters):
+    """ID number, names and photo of each matching student with a photo, in ID number order"""
+    conditions, _ = student_filter_conditions(filters)
+    return db.session.query(
+        StudentProfile.id_number, StudentProfile.photo_url, User.reg_number, User.name, User.department
+    ).select_from(StudentProfile).join(User, User.id == StudentProfile.user_id).filter(
+        User.role == 'student', StudentProfile.photo_url.isnot(None), *conditions
+    ).order_by(StudentProfile.id_number).execution_options(yield_per=1000)
+
+def _photo_file(upload_dir, photo, size):
+    """Full path of the photo size to ship, falling back to the stored photo"""
+    if size != 'full' and is_profile_photo(photo):
+        variant = os.path.join(upload_dir, photo_variant_path(photo, size, 'jpeg'))
+        if os.path.exists(variant):
+            return variant
+    full_path = os.path.join(upload_dir, photo)
+    return full_path if os.path.exists(full_path) else None
+
+def photo_archive_chunks(rows, upload_dir, size='print', stats=None):
+    """
+    A ZIP of student photos plus `manifest.csv`, yielded as it is built.
+
+    Entries are stored, not deflated (JPEGs do not compress), as
+    `photos/<id_number>.jpg`, and each file is copied in 64KB reads, so
+    memory stays at one read buffer however many photos there are (plus
+    the manifest, a short line per student). The manifest maps ID
+    numbers to files; students whose photo file is missing are listed
+    with an empty `file`. `stats`, if given, is filled with photo,
+    missing and byte counts.
+    """
+    stats = stats if stats is not None else {}
+    stats.update(photos=0, missing=0, bytes=0)
+    stream = _ZipStream()
+    manifest = io.StringIO()
+    writer = csv.writer(manifest)
+    writer.writerow(MANIFEST_HEADER)
+
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for id_number, photo, reg_number, name, department in rows:
+            source = _photo_file(upload_dir, photo, size)
+            if source is None:
+                writer.writerow([id_number, '', reg_number, name, department, ''])
+                stats['missing'] += 1
+                continue
+
+            entry_name = f'photos/{id_number}.jpg'
+            entry = zipfile.ZipInfo(entry_name, date_time=datetime.utcnow().timetuple()[:6])
+            entry.compress_type = zipfile.ZIP_STORED
+            entry.file_size = os.path.getsize(source)  # lets ZipFile decide on Zip64 up front
+            with open(source, 'rb') as src, archive.open(entry, 'w') as dest:
+                while True:
+                    data = src.read(READ_SIZE)
+                    if not data:
+                        break
+                    dest.write(data)
+                    yield stream.drain()  # the entry header, then the bytes just read
+            yield stream.drain()  # the entry's data descriptor
+
+            writer.writerow([id_number, entry_name, reg_number, name, department, entry.file_size])
+            stats['photos'] += 1
+            stats['bytes'] += entry.file_size
+
+        archive.writestr(MANIFEST_NAME, manifest.getvalue().encode('utf-8'))
+    yield stream.drain()  # manifest and central directory
+    PHOTO_ARCHIVE_ENTRIES.inc(stats['photos'])
+
+__all__ = ['photo_archive_query', 'photo_archive_chunks', 'MANIFEST_NAME']
@@ -0,0 +1,156 @@
+# On-demand Request Profiling for GAU-ID-View
+import os
+import io
+import re
+import hmac
+import time
+import pstats
+import cProfile
+import hashlib
+from collections import deque
+from functools import wraps
+from flask import current_app, g, request, make_response
+from utils.logging_config import log_security_event
+
+PROFILE_HEADER = 'X-Profile-Token'
+PROFILE_QUERY_PARAM = '_profile'
+
+# In-memory record of recent profiling runs per admin (use Redis in production)
+PROFILE_RUNS = {}  # user_id -> deque of run timestamps
+PROFILE_RATE_WINDOW = 3600  # 1 hour
+
+def _profiling_secret():
+    return (current_app.config.get('PROFILING_SECRET') or current_app.config['SECRET_KEY']).encode()
+
+def _sign(user_id, path, expires):
+    message = f'{user_id}:{path}:{expires}'.encode()
+    return hmac.new(_profiling_secret(), message, hashlib.sha256).hexdigest()[:32]
+
+def generate_profile_token(user_id, path, ttl=None):
+    """Create a short-lived token allowing `user_id` to profile `path`"""
+    ttl = ttl or current_app.config.get('PROFILING_TOKEN_TTL', 300)
+    expires = int(time.time()) + ttl
+    return f'{expires}.{_sign(user_id, path, expires)}', expires
+
+def verify_profile_token(token, user_id, path):
+    """Check a profiling token's signature and expiry"""
+    try:
+        expires_text, signature = token.split('.', 1)
+        expires = int(expires_text)
+    except (ValueError, AttributeError):
+        return False
+
+    if expires < time.time():
+        return False
+    return hmac.compare_digest(signature, _sign(user_id, path, expires))
+
+def profiling_rate_limited(user_id):
+    """Check and record a profiling run against the per-admin hourly budget"""
+    limit = current_app.config.get('PROFILING_RATE_LIMIT', 10)
+    now = time.time()
+
+    runs = PROFILE_RUNS.setdefault(user_id, deque())
+    while runs and now - runs[0] > PROFILE_RATE_WINDOW:
+        runs.popleft()
+
+    if len(runs) >= limit:
+        return True
+    runs.append(now)
+    return False
+
+def get_profile_dir():
+    """Directory holding saved profiles (next to the application logs)"""
+    profile_dir = os.path.join(current_app.root_path, 'logs', 'profiles')
+    os.makedirs(profile_dir, exist_ok=True)
+    return profile_dir
+
+def save_profile(profiler, request_id):
+    """Write pstats data plus a readable summary; returns the profile name"""
+    endpoint = re.sub(r'[^A-Za-z0-9_.-]+', '_', request.endpoint or 'unknown')
+    name = f"{time.strftime('%Y%m%dT%H%M%S')}_{request_id}_{endpoint}"
+    profile_dir = get_profile_dir()
+
+    profiler.dump_stats(os.path.join(profile_dir, f'{name}.pstats'))
+
+    summary = io.StringIO()
+    summary.write(f'{request.method} {request.full_path} request_id={request_id}\n\n')
+    stats = pstats.Stats(profiler, stream=summary)
+    stats.sort_stats('cumulative').print_stats(40)
+    with open(os.path.join(profile_dir, f'{name}.txt'), 'w') as f:
+        f.write(summary.getvalue())
+
+    return name
+
+def profiled_endpoint():
+    """
+    Allow an admin to profile a single call of the decorated view.
+
+    The request must carry a token from `/admin/profiling/token` in the
+    `X-Profile-Token` header or `_profile` query parameter. Requests without
+    a token only pay for the header lookup.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            token = request.headers.get(PROFILE_HEADER) or request.args.get(PROFILE_QUERY_PARAM)
+            if not token or not current_app.config.get('PROFILING_ENABLED', True):
+                return func(*args, **kwargs)
+
+            from utils.helpers import get_current_user
+            user = get_current_user()
+
+            if not user or user.role != 'admin' or not verify_profile_token(token, user.id, request.path):
+                log_security_event(
+                    'INVALID_PROFILING_REQUEST',
+                    {'path': request.path, 'user_id': user.id if user else None},
+                    'WARNING'
+                )
+                return func(*args, **kwargs)
+
+            if profiling_rate_limited(user.id):
+                response = make_response(func(*args, **kwargs))
+                response.headers['X-Profile-Status'] = 'rate-limited'
+                return response
+
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                result = func(*args, **kwargs)
+            finally:
+                profiler.disable()
+
+            request_id = g.get('request_id', 'unknown')
+            try:
+                name = save_profile(profiler, request_id)
+            except Exception as e:
+                current_app.logger.error(f"Failed to save profile: {str(e)}")
+                return result
+
+            current_app.logger.info(f"Request profiled by admin {user.id}: {name}")
+            response = make_response(result)
+            response.headers['X-Profile-Status'] = 'saved'
+            response.headers['X-Profile-Id'] = name
+            return response
+
+        return wrapper
+    return decorator
+
+def list_profiles(limit=50):
+    """Most recent saved profiles"""
+    profile_dir = get_profile_dir()
+    entries = []
+    for entry in os.scandir(profile_dir):
+        if entry.name.endswith('.pstats'):
+            stat = entry.stat()
+            entries.append({
+                'profile_id': entry.name[:-len('.pstats')],
+                'size': stat.st_size,
+                'created_at': stat.st_mtime
+            })
+    entries.sort(key=lambda item: item['created_at'], reverse=True)
+    return entries[:limit]
+
+__all__ = [
+    'profiled_endpoint', 'generate_profile_token', 'verify_profile_token',
+    'list_profiles', 'PROFILE_HEADER', 'PROFILE_QUERY_PARAM'
+]
@@ -0,0 +1,199 @@
+# Database Query Instrumentation for GAU-ID-View
+import re
+import time
+import logging
+from flask import current_app, g, has_app_context, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from utils.logging_config import log_database_query
+from utils.metrics import metrics, request_endpoint_label
+
+# Finer buckets than HTTP latency: most statements finish in well under 10ms
+QUERY_LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+DB_QUERY_LATENCY = metrics.histogram(
+    'db_query_duration_seconds', 'Duration of individual SQL statements by endpoint',
+    buckets=QUERY_LATENCY_BUCKETS
+)
+DB_QUERIES = metrics.counter('db_queries_total', 'SQL statements executed by endpoint')
+DB_TIME = metrics.counter('db_query_seconds_total', 'Time spent in SQL statements by endpoint')
+DB_N_PLUS_ONE = metrics.counter('db_n_plus_one_total', 'Requests flagged for repeated identical statements')
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMERIC_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_WHITESPACE = re.compile(r'\s+')
+
+_listeners_installed = False
+
+def normalize_statement(statement):
+    """Collapse whitespace and redact inline literals from a SQL statement"""
+    statement = _STRING_LITERAL.sub("'?'", statement)
+    statement = _NUMERIC_LITERAL.sub('?', statement)
+    return _WHITESPACE.sub(' ', statement).strip()
+
+def _parameter_count(parameters):
+    if parameters is None:
+        return 0
+    if isinstance(parameters, (list, tuple)) and parameters and isinstance(parameters[0], (list, tuple, dict)):
+        # executemany: report the number of parameter sets
+        return len(parameters)
+    try:
+        return len(parameters)
+    except TypeError:
+        return 1
+
+class QueryStats:
+    """Per-request query counters kept on `g.query_stats`"""
+
+    def __init__(self, slowest_limit=3, repeat_threshold=10):
+        self.count = 0
+        self.total_time = 0.0
+        self.slowest = []
+        self.slowest_limit = slowest_limit
+        self.repeat_threshold = repeat_threshold
+        self.statement_counts = {}
+        self.repeated = []
+
+    def record(self, statement, duration):
+        """Record one statement; returns True the first time it looks like N+1"""
+        self.count += 1
+        self.total_time += duration
+
+        if len(self.slowest) < self.slowest_limit or duration > self.slowest[-1][0]:
+            self.slowest.append((duration, statement))
+            self.slowest.sort(key=lambda item: item[0], reverse=True)
+            del self.slowest[self.slowest_limit:]
+
+        seen = self.statement_counts.get(statement, 0) + 1
+        self.statement_counts[statement] = seen
+        if seen == self.repeat_threshold:
+            self.repeated.append(statement)
+            return True
+        return False
+
+    def summary(self):
+        """Compact form attached to the request-completed log line"""
+        data = {
+            'db_query_count': self.count,
+            'db_time': round(self.total_time, 6),
+            'db_slowest': [
+                {'statement': normalize_statement(statement)[:300], 'duration': round(duration, 6)}
+                for duration, statement in self.slowest
+            ]
+        }
+        if self.repeated:
+            data['db_repeated'] = [
+                {'statement': normalize_statement(statement)[:300], 'count': self.statement_counts[statement]}
+                for statement in self.repeated
+            ]
+        return data
+
+def get_query_stats():
+    """Query stats for the current request (created on first use)"""
+    stats = g.get('query_stats')
+    if stats is None:
+        config = current_app.config
+        stats = g.query_stats = QueryStats(
+            slowest_limit=config.get('SQL_SLOWEST_STATEMENTS', 3),
+            repeat_threshold=config.get('SQL_N_PLUS_ONE_THRESHOLD', 10)
+        )
+    return stats
+
+def explain_statement(connection, statement, parameters):
+    """Run EXPLAIN (QUERY PLAN) for a statement on the raw DBAPI connection"""
+    if not statement.lstrip().upper().startswith('SELECT'):
+        return None
+
+    prefix = 'EXPLAIN QUERY PLAN ' if connection.dialect.name == 'sqlite' else 'EXPLAIN '
+    cursor = None
+    try:
+        # Raw DBAPI cursor so the EXPLAIN itself is not instrumented
+        cursor = connection.connection.dbapi_connection.cursor()
+        cursor.execute(prefix + statement, parameters or ())
+        return [' '.join(str(column) for column in row) for row in cursor.fetchall()]
+    except Exception:
+        return None
+    finally:
+        if cursor is not None:
+            cursor.close()
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start_times', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start_times = conn.info.get('query_start_times')
+    if not start_times:
+        return
+    duration = time.perf_counter() - start_times.pop()
+
+    if not has_app_context():
+        return
+
+    config = current_app.config
+    endpoint = None
+
+    if has_request_context():
+        endpoint = request_endpoint_label()
+        DB_QUERY_LATENCY.observe(duration, endpoint=endpoint)
+
+        stats = get_query_stats()
+        if stats.record(statement, duration):
+            DB_N_PLUS_ONE.inc(endpoint=endpoint)
+            logging.getLogger('performance').warning('Possible N+1 query pattern', extra={
+                'extra_data': {
+                    'statement': normalize_statement(statement)[:500],
+                    'count': stats.repeat_threshold,
+                    'endpoint': endpoint,
+                    'request_id': g.get('request_id'),
+                    'type': 'n_plus_one'
+                }
+            })
+
+    threshold = config.get('SQL_SLOW_QUERY_THRESHOLD', 0.5)
+    if duration > threshold:
+        plan = None
+        if config.get('SQL_EXPLAIN_SLOW_QUERIES'):
+            plan = explain_statement(conn, statement, parameters)
+        log_database_query(
+            normalize_statement(statement),
+            duration,
+            threshold=threshold,
+            parameter_count=_parameter_count(parameters),
+            plan=plan,
+            endpoint=endpoint
+        )
+
+def install_query_listeners():
+    """Attach timing hooks to every SQLAlchemy engine (idempotent)"""
+    global _listeners_installed
+    if _listeners_installed:
+        return
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    _listeners_installed = True
+
+class QueryInstrumentation:
+    """Per-request SQL statistics, slow query log and N+1 detection"""
+
+    def __init__(self, app=None):
+        self.app = app
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Install engine listeners and publish per-request totals"""
+        install_query_listeners()
+
+        @app.after_request
+        def record_query_metrics(response):
+            stats = g.get('query_stats')
+            if stats is not None and stats.count:
+                endpoint = request_endpoint_label()
+                DB_QUERIES.inc(stats.count, endpoint=endpoint)
+                DB_TIME.inc(stats.total_time, endpoint=endpoint)
+            return response
+
+__all__ = [
+    'QueryInstrumentation', 'QueryStats', 'get_query_stats',
+    'install_query_listeners', 'normalize_statement'
+]
@@ -0,0 +1,107 @@
+# System Resource Statistics for GAU-ID-View
+import os
+import shutil
+
+PROC_MEMINFO = '/proc/meminfo'
+PROC_LOADAVG = '/proc/loadavg'
+PROC_SELF_STATUS = '/proc/self/status'
+PROC_SELF_STAT = '/proc/self/stat'
+PROC_SELF_FD = '/proc/self/fd'
+
+def _read_kib_fields(path, fields):
+    """Read `Key:   123 kB` style fields from a /proc file as bytes"""
+    values = {}
+    try:
+        with open(path, 'r') as f:
+            for line in f:
+                key, _, rest = line.partition(':')
+                if key in fields:
+                    values[key] = int(rest.split()[0]) * 1024
+                    if len(values) == len(fields):
+                        break
+    except (OSError, ValueError, IndexError):
+        return {}
+    return values
+
+def get_memory_stats():
+    """Get host memory totals from /proc/meminfo"""
+    info = _read_kib_fields(PROC_MEMINFO, {'MemTotal', 'MemAvailable'})
+    total = info.get('MemTotal')
+    available = info.get('MemAvailable')
+    if not total or available is None:
+        return None
+
+    return {
+        'total_bytes': total,
+        'available_bytes': available,
+        'used_percent': round((total - available) / total * 100, 1)
+    }
+
+def get_process_stats():
+    """Get resident memory, CPU time and open files for this process"""
+    stats = {'pid': os.getpid()}
+
+    rss = _read_kib_fields(PROC_SELF_STATUS, {'VmRSS'}).get('VmRSS')
+    if rss is not None:
+        stats['rss_bytes'] = rss
+
+    try:
+        with open(PROC_SELF_STAT, 'r') as f:
+            # Fields after the parenthesised command name; utime/stime are 14/15
+            fields = f.read().rsplit(')', 1)[1].split()
+        ticks = os.sysconf('SC_CLK_TCK')
+        stats['cpu_seconds'] = (int(fields[11]) + int(fields[12])) / ticks
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+
+    try:
+        stats['open_fds'] = len(os.listdir(PROC_SELF_FD))
+    except OSError:
+        pass
+
+    return stats
+
+def get_load_average():
+    """Get 1/5/15 minute load averages"""
+    try:
+        with open(PROC_LOADAVG, 'r') as f:
+            one, five, fifteen = f.read().split()[:3]
+        return {'1m': float(one), '5m': float(five), '15m': float(fifteen)}
+    except (OSError, ValueError):
+        return None
+
+def get_disk_usage(path):
+    """Get disk usage for the filesystem holding `path`"""
+    try:
+        usage = shutil.disk_usage(path)
+    except OSError:
+        return None
+
+    return {
+        'path': path,
+        'total_bytes': usage.total,
+        'used_bytes': usage.used,
+        'free_bytes': usage.free,
+        'used_percent': round(usage.used / usage.total * 100, 1) if usage.total else 0
+    }
+
+def get_db_pool_stats(engine):
+    """Get connection pool statistics for a SQLAlchemy engine"""
+    pool = engine.pool
+    stats = {'pool_class': type(pool).__name__}
+
+    # Only QueuePool-style pools expose sizing counters
+    for name in ('size', 'checkedin', 'checkedout', 'overflow'):
+        method = getattr(pool, name, None)
+        if callable(method):
+            try:
+                stats[name] = method()
+            except Exception:
+                pass
+
+    return stats
+
+__all__ = [
+    'get_memory_stats', 'get_process_stats', 'get_load_average',
+    'get_disk_usage', 'get_db_pool_stats'
+]
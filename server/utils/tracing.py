@@ -0,0 +1,144 @@
+# Lightweight Request Tracing for GAU-ID-View
+import os
+import json
+import time
+import random
+import logging
+import logging.handlers
+from contextlib import contextmanager
+from functools import wraps
+from flask import current_app, g, has_request_context, request
+
+TRACE_LOGGER = 'tracing'
+TRACE_FILE = 'traces.jsonl'
+
+class RequestTrace:
+    """Spans collected for one request, keyed to `g.request_id`"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.spans = []
+        self.stack = []
+
+    def open_span(self, name, attributes):
+        span = {
+            'id': len(self.spans) + 1,
+            'parent': self.stack[-1]['id'] if self.stack else None,
+            'name': name,
+            'start': time.perf_counter() - self.start,
+            'duration': None
+        }
+        if attributes:
+            span['attrs'] = attributes
+        self.spans.append(span)
+        self.stack.append(span)
+        return span
+
+    def close_span(self, span):
+        span['duration'] = time.perf_counter() - self.start - span['start']
+        if self.stack and self.stack[-1] is span:
+            self.stack.pop()
+
+    def to_record(self, response):
+        record = {
+            'timestamp': time.time(),
+            'request_id': g.get('request_id'),
+            'endpoint': request.url_rule.rule if request.url_rule is not None else 'unmatched',
+            'method': request.method,
+            'status': response.status_code,
+            'duration': round(time.perf_counter() - self.start, 6),
+            'spans': [
+                dict(span, start=round(span['start'], 6), duration=round(span['duration'] or 0, 6))
+                for span in self.spans
+            ]
+        }
+
+        query_stats = g.get('query_stats')
+        if query_stats is not None:
+            record['db_time'] = round(query_stats.total_time, 6)
+            record['db_query_count'] = query_stats.count
+        return record
+
+def _current_trace():
+    if not has_request_context():
+        return None
+    return g.get('trace')
+
+@contextmanager
+def span(name, **attributes):
+    """Time a block of work as a child of the current request's active span"""
+    trace = _current_trace()
+    if trace is None:
+        yield None
+        return
+
+    current = trace.open_span(name, attributes)
+    try:
+        yield current
+    finally:
+        trace.close_span(current)
+
+def traced(name):
+    """Decorator form of `span`"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def setup_trace_logger(app):
+    """JSON-lines trace file next to the application logs"""
+    trace_logger = logging.getLogger(TRACE_LOGGER)
+    if trace_logger.handlers:
+        return trace_logger
+
+    log_dir = os.path.join(app.root_path, 'logs')
+    os.makedirs(log_dir, exist_ok=True)
+
+    handler = logging.handlers.RotatingFileHandler(
+        os.path.join(log_dir, TRACE_FILE),
+        maxBytes=10485760,  # 10MB
+        backupCount=5
+    )
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    trace_logger.addHandler(handler)
+    trace_logger.setLevel(logging.INFO)
+    trace_logger.propagate = False
+    return trace_logger
+
+class TracingManager:
+    """Starts a trace per sampled request and exports it on completion"""
+
+    def __init__(self, app=None):
+        self.app = app
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Register trace lifecycle hooks"""
+        if not app.config.get('TRACING_ENABLED', True):
+            return
+
+        setup_trace_logger(app)
+
+        @app.before_request
+        def start_trace():
+            sample_rate = current_app.config.get('TRACING_SAMPLE_RATE', 1.0)
+            if sample_rate >= 1.0 or random.random() < sample_rate:
+                g.trace = RequestTrace()
+
+        @app.after_request
+        def export_trace(response):
+            trace = g.pop('trace', None)
+            if trace is not None:
+                try:
+                    logging.getLogger(TRACE_LOGGER).info(
+                        json.dumps(trace.to_record(response), separators=(',', ':'), default=str)
+                    )
+                except Exception as e:
+                    current_app.logger.warning(f"Trace export failed: {str(e)}")
+            return response
+
+__all__ = ['span', 'traced', 'TracingManager', 'RequestTrace', 'TRACE_FILE']
@@ -0,0 +1,188 @@
+# Resumable document uploads for GAU-ID-View
+import os
+import uuid
+import fcntl
+from datetime import datetime, timedelta
+from flask import current_app
+from werkzeug.datastructures import FileStorage
+from werkzeug.exceptions import ClientDisconnected
+from models import db, UploadSession
+from utils.blob_store import CHUNK_SIZE
+from utils.upload_spool import SpooledUpload, sniff_file_type, SNIFF_BYTES, SPOOL_DIR
+from utils.file_handler import allowed_file, upload_limits, save_uploaded_file, ALLOWED_DOCUMENT_EXTENSIONS
+from utils.metrics import metrics
+
+UPLOAD_SESSIONS = metrics.counter('upload_sessions_total', 'Resumable uploads by outcome')
+UPLOAD_CHUNK_BYTES = metrics.counter('upload_chunk_bytes_total', 'Bytes received in resumable upload chunks')
+
+class UploadSessionError(Exception):
+    """A request the upload session cannot accept, with the HTTP status to answer it with"""
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+def _full_path(path):
+    return os.path.join(current_app.config.get('UPLOAD_FOLDER', 'uploads'), path)
+
+def _remove_spool(path):
+    try:
+        os.unlink(_full_path(path))
+    except FileNotFoundError:
+        pass
+
+def _stale_before():
+    return datetime.utcnow() - timedelta(seconds=current_app.config.get('UPLOAD_SESSION_TTL', 24 * 3600))
+
+def create_upload_session(user_id, filename, size, description=None):
+    """
+    Start a resumable document upload; the caller commits.
+
+    The file name and size are checked against the document rules up
+    front, and an empty spool file is created on the upload volume for
+    the chunks. Stale sessions are swept on the way.
+    """
+    max_size, _ = upload_limits('document')
+    if not allowed_file(filename, 'document'):
+        raise UploadSessionError(f"File type not allowed. Allowed types: {ALLOWED_DOCUMENT_EXTENSIONS}")
+    if size > max_size:
+        raise UploadSessionError(f"File too large. Maximum size: {max_size // (1024*1024)}MB", 413)
+
+    purge_stale_upload_sessions()
+
+    session_id = uuid.uuid4().hex
+    session = UploadSession(
+        id=session_id, user_id=user_id, filename=filename, description=description,
+        total_size=size, received=0, spool_path=f"{SPOOL_DIR}/{session_id}.part"
+    )
+    full_path = _full_path(session.spool_path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    open(full_path, 'wb').close()
+    db.session.add(session)
+    UPLOAD_SESSIONS.inc(outcome='created')
+    return session
+
+def get_upload_session(session_id, user_id):
+    """A user's live upload session, or None (stale sessions are dropped here)"""
+    session = UploadSession.query.filter_by(id=session_id, user_id=user_id).first()
+    if session and session.updated_at < _stale_before():
+        discard_upload_session(session, 'expired')
+        return None
+    return session
+
+def append_chunk(session, offset, stream, content_length=None):
+    """
+    Append a request body to the session's spool file at `offset`; the caller commits.
+
+    `offset` must be what the server already has, so a client that lost
+    a response asks for the offset and resends from there. The first
+    bytes of the file are checked for a document signature. If the
+    connection drops, the bytes that did arrive are kept and the offset
+    moves past them. Returns the number of bytes appended.
+
+    Appends hold an exclusive lock on the spool file, so a retry sent while
+    the first request is still streaming gets 409 instead of writing into
+    the same bytes.
+    """
+    if offset != session.received:
+        raise UploadSessionError(f"Upload is at offset {session.received}", 409)
+
+    remaining = session.total_size - session.received
+    if content_length is not None and content_length > remaining:
+        raise UploadSessionError(f"Chunk runs past the declared size of {session.total_size} bytes", 413)
+
+    _, allowed_types = upload_limits('document')
+    head = b''
+    written = 0
+    with open(_full_path(session.spool_path), 'r+b') as f:
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)  # released when the file closes
+        except BlockingIOError:
+            raise UploadSessionError("Another chunk of this upload is still being received", 409)
+        # The request holding the lock before us may have moved the offset
+        db.session.refresh(session)
+        if offset != session.received:
+            raise UploadSessionError(f"Upload is at offset {session.received}", 409)
+
+        f.seek(offset)
+        f.truncate()  # drop bytes an interrupted earlier request wrote but never recorded
+        while True:
+            try:
+                chunk = stream.read(CHUNK_SIZE)
+            except ClientDisconnected:
+                break
+            if not chunk:
+                break
+            if written + len(chunk) > remaining:
+                raise UploadSessionError(f"Chunk runs past the declared size of {session.total_size} bytes", 413)
+
+            if offset == 0 and len(head) < SNIFF_BYTES:
+                head += chunk[:SNIFF_BYTES]
+                if len(head) >= SNIFF_BYTES and sniff_file_type(head) not in allowed_types:
+                    raise UploadSessionError("File content does not match an allowed file type", 415)
+
+            f.write(chunk)
+            written += len(chunk)
+        f.flush()
+        os.fsync(f.fileno())  # never record an offset for bytes that are not on disk
+
+    # Conditional on the offset, so of two concurrent appends only one is recorded
+    updated = UploadSession.query.filter_by(id=session.id, received=offset).update(
+        {UploadSession.received: offset + written, UploadSession.updated_at: datetime.utcnow()},
+        synchronize_session=False
+    )
+    if not updated:
+        raise UploadSessionError("Upload was changed by another request", 409)
+    db.session.refresh(session)
+    UPLOAD_CHUNK_BYTES.inc(written)
+    return written
+
+def complete_upload_session(session):
+    """
+    Validate and store a fully received upload, like a one-shot upload.
+
+    The spool file is handed to `save_uploaded_file` as if it had arrived
+    in one request, so it goes through the same checks and is renamed
+    into the blob store without a copy. Returns (success, message,
+    file_path); the session row is left for the caller to delete with the
+    same commit that records the document.
+    """
+    if session.received != session.total_size:
+        raise UploadSessionError(
+            f"Upload is incomplete: {session.received} of {session.total_size} bytes received", 409
+        )
+
+    spool = SpooledUpload.reopen(_full_path(session.spool_path))
+    try:
+        file = FileStorage(stream=spool, filename=session.filename)
+        success, message, file_path = save_uploaded_file(file, session.user_id, 'document', 'supporting')
+    finally:
+        spool.close()  # unlinks the spool unless it was published
+    UPLOAD_SESSIONS.inc(outcome='completed' if success else 'rejected')
+    return success, message, file_path
+
+def discard_upload_session(session, outcome='cancelled'):
+    """Delete a session and its spool file"""
+    spool_path = session.spool_path
+    db.session.delete(session)
+    db.session.commit()
+    _remove_spool(spool_path)
+    UPLOAD_SESSIONS.inc(outcome=outcome)
+
+def purge_stale_upload_sessions():
+    """Drop sessions idle for longer than UPLOAD_SESSION_TTL; returns how many"""
+    stale = UploadSession.query.filter(UploadSession.updated_at < _stale_before()).all()
+    for session in stale:
+        db.session.delete(session)
+    if not stale:
+        return 0
+    db.session.commit()
+    for session in stale:
+        _remove_spool(session.spool_path)
+    UPLOAD_SESSIONS.inc(len(stale), outcome='expired')
+    return len(stale)
+
+__all__ = [
+    'UploadSessionError', 'create_upload_session', 'get_upload_session', 'append_chunk',
+    'complete_upload_session', 'discard_upload_session', 'purge_stale_upload_sessions'
+]
@@ -0,0 +1,139 @@
+# Upload body spooling for GAU-ID-View
+import io
+import os
+import hashlib
+import tempfile
+from flask import Request, current_app
+from werkzeug.exceptions import RequestEntityTooLarge, UnsupportedMediaType
+from utils.blob_store import CHUNK_SIZE
+
+# Directory under UPLOAD_FOLDER that request bodies are written to while they arrive
+SPOOL_DIR = '.spool'
+
+# Enough of a file's first bytes to recognise every signature below
+SNIFF_BYTES = 8
+
+FILE_SIGNATURES = {
+    b'\xFF\xD8\xFF': 'jpeg',
+    b'\x89PNG\r\n\x1a\n': 'png',
+    b'GIF87a': 'gif',
+    b'GIF89a': 'gif',
+    b'%PDF': 'pdf',
+    b'\xD0\xCF\x11\xE0\xA1\xB1\x1A\xE1': 'doc',  # OLE2 (Word 97-2003)
+    b'PK\x03\x04': 'docx',  # zip container (Office Open XML)
+}
+
+def sniff_file_type(header):
+    """File type from its magic bytes ('jpeg', 'png', 'gif', 'pdf', 'doc', 'docx'), or None"""
+    for signature, file_type in FILE_SIGNATURES.items():
+        if header.startswith(signature):
+            return file_type
+    return None
+
+class SpooledUpload(io.FileIO):
+    """
+    An uploaded file part, written to a temp file on the upload volume as it arrives.
+
+    The bytes are hashed and counted on the way in, so a part over
+    `max_size` or whose first bytes are not one of `allowed_types` stops
+    the request there instead of after the whole body has been read. An
+    accepted file is renamed into place with `publish`; anything not
+    published is removed when the request closes.
+    """
+    def __init__(self, directory, max_size=None, allowed_types=None):
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.upload-', suffix='.tmp')
+        super().__init__(fd, 'r+b')
+        self._setup(temp_path, max_size, allowed_types)
+
+    def _setup(self, temp_path, max_size, allowed_types):
+        self.temp_path = temp_path
+        self.max_size = max_size
+        self.allowed_types = allowed_types
+        self.file_type = None
+        self.size = 0
+        self.published = False
+        self._sha = hashlib.sha256()
+        self._head = b''
+
+    @classmethod
+    def reopen(cls, temp_path):
+        """
+        A spool file filled across several requests (resumable uploads).
+
+        Its bytes are hashed once here, so it can be published like a
+        file spooled within one request.
+        """
+        spool = cls.__new__(cls)
+        io.FileIO.__init__(spool, temp_path, 'r+b')
+        spool._setup(temp_path, None, None)
+        for chunk in iter(lambda: spool.read(CHUNK_SIZE), b''):
+            spool._sha.update(chunk)
+            spool.size += len(chunk)
+        spool.seek(0)
+        return spool
+
+    @property
+    def digest(self):
+        return self._sha.hexdigest()
+
+    def write(self, data):
+        self.size += len(data)
+        if self.max_size is not None and self.size > self.max_size:
+            raise RequestEntityTooLarge(f"File too large. Maximum size: {self.max_size // (1024*1024)}MB")
+
+        if self.allowed_types and self.file_type is None and len(self._head) < SNIFF_BYTES:
+            self._head += bytes(data[:SNIFF_BYTES])
+            if len(self._head) >= SNIFF_BYTES:
+                self.file_type = sniff_file_type(self._head)
+                if self.file_type not in self.allowed_types:
+                    raise UnsupportedMediaType("File content does not match an allowed file type")
+
+        self._sha.update(data)
+        view = memoryview(data)
+        while view:
+            view = view[super().write(view):]
+        return len(data)
+
+    def publish(self, full_path):
+        """Flush to disk and rename the spooled file to `full_path`"""
+        self.flush()
+        os.fsync(self.fileno())
+        os.chmod(self.temp_path, 0o644)
+        os.replace(self.temp_path, full_path)
+        self.published = True
+
+    def close(self):
+        super().close()
+        if not self.published and os.path.exists(self.temp_path):
+            os.unlink(self.temp_path)
+
+class UploadRequest(Request):
+    """
+    Request whose file parts go to a `SpooledUpload` when the view set limits.
+
+    Views opt in through `file_handler.accepts_upload`, which sets
+    `upload_limits` to (max size, allowed types) before the form is parsed.
+    Other requests keep Werkzeug's in-memory/tmp spooling.
+    """
+    upload_limits = None
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if self.upload_limits is None:
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+
+        max_size, allowed_types = self.upload_limits
+        directory = os.path.join(current_app.config.get('UPLOAD_FOLDER', 'uploads'), SPOOL_DIR)
+        spool = SpooledUpload(directory, max_size, allowed_types)
+        self.__dict__.setdefault('_spools', []).append(spool)
+        return spool
+
+    def close(self):
+        super().close()
+        # Parts rejected mid-stream never reach request.files, so close them here too
+        for spool in self.__dict__.pop('_spools', []):
+            spool.close()
+
+__all__ = [
+    'SpooledUpload', 'UploadRequest', 'sniff_file_type', 'SPOOL_DIR'
+]